@@ -1,5 +1,6 @@
 from logging.config import fileConfig
 import os
+import re
 import sys
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
@@ -21,6 +22,13 @@ sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..'
 # Import project models for Alembic's autogenerate
 from app.db.models import Base  # noqa: E402
 target_metadata = Base.metadata
+# Partitions are created and dropped by app/services/partitions.py, not by autogenerate
+PARTITION_TABLE = re.compile(r"^(logs|tickets|responses)_(p\d{8}|archive|archive_base|default)$")
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == "table" and reflected and PARTITION_TABLE.match(name))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -72,6 +80,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -98,7 +107,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
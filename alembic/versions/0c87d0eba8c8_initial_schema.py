@@ -0,0 +1,68 @@
+"""Initial schema: tickets, responses and logs
+
+Revision ID: 0c87d0eba8c8
+Revises:
+Create Date: 2026-10-19 08:00:00.000000
+
+The tables as the app created them at startup before migrations existed.
+Databases that already have them only get stamped.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c87d0eba8c8'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+    if "tickets" not in tables:
+        op.create_table(
+            "tickets",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("subject", sa.Text()),
+            sa.Column("body", sa.Text()),
+            sa.Column("category", sa.String(50), nullable=True),
+            sa.Column("priority", sa.String(20), nullable=True),
+            sa.Column("language", sa.String(10), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_tickets_id", "tickets", ["id"])
+    if "responses" not in tables:
+        op.create_table(
+            "responses",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("ticket_id", sa.Integer(), sa.ForeignKey("tickets.id")),
+            sa.Column("generated_response", sa.Text()),
+            sa.Column("reviewed", sa.Boolean()),
+            sa.Column("sent", sa.Boolean()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("status", sa.String(20), nullable=True),
+        )
+        op.create_index("ix_responses_id", "responses", ["id"])
+    if "logs" not in tables:
+        op.create_table(
+            "logs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("ticket_id", sa.Integer(), sa.ForeignKey("tickets.id"), nullable=True),
+            sa.Column("event_type", sa.String(50), nullable=True),
+            sa.Column("message", sa.Text()),
+            sa.Column("level", sa.String(20)),
+            sa.Column("details", sa.JSON(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_logs_id", "logs", ["id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("logs")
+    op.drop_table("responses")
+    op.drop_table("tickets")
@@ -0,0 +1,40 @@
+"""Analytics rollups
+
+Revision ID: 10ebc5d7b21c
+Revises: f592a0e20507
+Create Date: 2026-10-19 08:30:00.000000
+
+Incrementally maintained ticket and draft aggregates (see
+app/services/analytics.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '10ebc5d7b21c'
+down_revision: Union[str, None] = 'f592a0e20507'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if sa.inspect(op.get_bind()).has_table("analytics_rollups"):
+        return
+    op.create_table(
+        "analytics_rollups",
+        sa.Column("metric", sa.String(20), primary_key=True),
+        sa.Column("granularity", sa.String(10), primary_key=True),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("dimension", sa.String(50), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("value_sum", sa.Float(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("analytics_rollups")
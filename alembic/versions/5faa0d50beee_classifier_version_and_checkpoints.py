@@ -0,0 +1,46 @@
+"""Ticket classifier version and job checkpoints
+
+Revision ID: 5faa0d50beee
+Revises: 0c87d0eba8c8
+Create Date: 2026-10-19 08:10:00.000000
+
+`tickets.classifier_version` records which model and label set produced
+`category`; `job_checkpoints` holds the reclassify job's cursor (see
+app/services/reclassify.py). The app creates missing tables at startup but
+never adds columns, so each step checks what is already there.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5faa0d50beee'
+down_revision: Union[str, None] = '0c87d0eba8c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if "classifier_version" not in {c["name"] for c in inspector.get_columns("tickets")}:
+        op.add_column("tickets", sa.Column("classifier_version", sa.String(120), nullable=True))
+    if "ix_tickets_classifier_version" not in {i["name"] for i in inspector.get_indexes("tickets")}:
+        op.create_index("ix_tickets_classifier_version", "tickets", ["classifier_version"])
+    if not inspector.has_table("job_checkpoints"):
+        op.create_table(
+            "job_checkpoints",
+            sa.Column("name", sa.String(50), primary_key=True),
+            sa.Column("cursor", sa.Integer(), nullable=False),
+            sa.Column("details", sa.JSON(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("job_checkpoints")
+    op.drop_index("ix_tickets_classifier_version", table_name="tickets")
+    op.drop_column("tickets", "classifier_version")
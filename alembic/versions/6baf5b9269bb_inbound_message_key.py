@@ -0,0 +1,35 @@
+"""Inbound email idempotency key
+
+Revision ID: 6baf5b9269bb
+Revises: 10ebc5d7b21c
+Create Date: 2026-10-19 08:40:00.000000
+
+`tickets.message_key` with a unique index (see app/services/inbound_dedup.py).
+The partitioning revision later moves uniqueness to `inbound_message_keys`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6baf5b9269bb'
+down_revision: Union[str, None] = '10ebc5d7b21c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if "message_key" in {c["name"] for c in inspector.get_columns("tickets")}:
+        return
+    op.add_column("tickets", sa.Column("message_key", sa.String(80), nullable=True))
+    op.create_index("ix_tickets_message_key", "tickets", ["message_key"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_tickets_message_key", table_name="tickets")
+    op.drop_column("tickets", "message_key")
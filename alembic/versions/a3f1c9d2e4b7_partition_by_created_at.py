@@ -0,0 +1,205 @@
+"""Partition tickets, responses and logs by created_at
+
+Revision ID: a3f1c9d2e4b7
+Revises: c8b9b5e2c0ef
+Create Date: 2026-10-19 09:00:00.000000
+
+Inbound idempotency moves from a unique index on `tickets.message_key` to
+the `inbound_message_keys` table, seeded from existing tickets, and
+`responses.ticket_id` gets an index. On Postgres each of `logs`, `tickets`
+and `responses` is then rebuilt as `PARTITION BY RANGE (created_at)`:
+
+- `<table>_archive` holds rows older than the retention window. It is
+  itself partitioned by `created_at`, starting with `<table>_archive_base`,
+  so expired months can later be moved under it without copying rows;
+- there is one partition per period from the retention window up to
+  `PARTITION_PREMAKE` periods ahead, daily for logs and monthly otherwise;
+- `<table>_default` catches rows no other partition covers.
+
+Unique indexes on a partitioned table must include the partition key. So
+the primary keys become (id, created_at) and foreign keys to or from these
+tables are dropped. See app/services/partitions.py for the maintenance job;
+the period helpers below are copied from it as of this revision.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1c9d2e4b7'
+down_revision: Union[str, None] = 'c8b9b5e2c0ef'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREMAKE = int(os.getenv("PARTITION_PREMAKE", "3"))
+# (table, interval, retention)
+PARTITIONS = (
+    ("logs", "day", timedelta(days=int(os.getenv("LOG_RETENTION_DAYS", "30")))),
+    ("tickets", "month", timedelta(days=int(os.getenv("ARCHIVE_AFTER_DAYS", "180")))),
+    ("responses", "month", timedelta(days=int(os.getenv("ARCHIVE_AFTER_DAYS", "180")))),
+)
+PARTITIONED = tuple(table for table, _, _ in PARTITIONS)
+# Non-unique indexes of the partitioned tables as of this revision
+INDEXES = {
+    "logs": (("ix_logs_id", ["id"]),),
+    "tickets": (
+        ("ix_tickets_id", ["id"]),
+        ("ix_tickets_priority", ["priority"]),
+        ("ix_tickets_language", ["language"]),
+        ("ix_tickets_classifier_version", ["classifier_version"]),
+        ("ix_tickets_message_key", ["message_key"]),
+    ),
+    "responses": (("ix_responses_id", ["id"]), ("ix_responses_ticket_id", ["ticket_id"])),
+}
+# Foreign keys dropped on upgrade and restored on downgrade: (table, column, referred table)
+FOREIGN_KEYS = (
+    ("responses", "ticket_id", "tickets"),
+    ("responses", "source_response_id", "responses"),
+    ("logs", "ticket_id", "tickets"),
+    ("attachments", "ticket_id", "tickets"),
+    ("raw_emails", "ticket_id", "tickets"),
+)
+
+
+def _period_start(ts: datetime, interval: str) -> datetime:
+    ts = ts.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts if interval == "day" else ts.replace(day=1)
+
+
+def _next_period(start: datetime, interval: str) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _sql_timestamp(value: datetime) -> str:
+    return f"'{value.astimezone(timezone.utc).isoformat()}'"
+
+
+def _serial_sequence(bind, table: str):
+    return bind.scalar(sa.text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table})
+
+
+def _create_indexes(table: str) -> None:
+    for name, columns in INDEXES[table]:
+        op.create_index(name, table, columns)
+
+
+def _drop_foreign_keys(bind) -> None:
+    rows = bind.execute(
+        sa.text(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE contype = 'f' "
+            "AND (conrelid::regclass::text = ANY(:t) OR confrelid::regclass::text = ANY(:t))"
+        ),
+        {"t": list(PARTITIONED)},
+    ).all()
+    for table, name in rows:
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+
+
+def _partition(bind, table: str, interval: str, keep: timedelta, now: datetime) -> None:
+    first = _period_start(now - keep, interval)
+    end = _period_start(now, interval)
+    for _ in range(PREMAKE + 1):
+        end = _next_period(end, interval)
+
+    op.execute(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL")
+    sequence = _serial_sequence(bind, table)
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    op.execute(
+        f"CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+    )
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL")
+    op.execute(
+        f"CREATE TABLE {table}_archive PARTITION OF {table} FOR VALUES FROM (MINVALUE) TO ({_sql_timestamp(first)}) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute(
+        f"CREATE TABLE {table}_archive_base PARTITION OF {table}_archive "
+        f"FOR VALUES FROM (MINVALUE) TO ({_sql_timestamp(first)})"
+    )
+    # Lets the archive be re-attached with a wider bound without scanning it
+    op.execute(
+        f"ALTER TABLE {table}_archive_base ADD CONSTRAINT {table}_archive_base_bounds "
+        f"CHECK (created_at < {_sql_timestamp(first)})"
+    )
+    lower = first
+    while lower < end:
+        upper = _next_period(lower, interval)
+        op.execute(
+            f"CREATE TABLE {table}_p{lower:%Y%m%d} PARTITION OF {table} "
+            f"FOR VALUES FROM ({_sql_timestamp(lower)}) TO ({_sql_timestamp(upper)})"
+        )
+        lower = upper
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    op.execute(f"INSERT INTO {table} SELECT * FROM {table}_unpartitioned")
+    op.execute(f"DROP TABLE {table}_unpartitioned")
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+    op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)")
+    _create_indexes(table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table("inbound_message_keys"):
+        op.create_table(
+            "inbound_message_keys",
+            sa.Column("message_key", sa.String(80), primary_key=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+    op.execute(
+        "INSERT INTO inbound_message_keys (message_key, created_at) "
+        "SELECT message_key, min(created_at) FROM tickets WHERE message_key IS NOT NULL "
+        "GROUP BY message_key ON CONFLICT DO NOTHING"
+    )
+    ticket_indexes = {i["name"]: i for i in inspector.get_indexes("tickets")}
+    if ticket_indexes.get("ix_tickets_message_key", {}).get("unique"):
+        op.drop_index("ix_tickets_message_key", table_name="tickets")
+        del ticket_indexes["ix_tickets_message_key"]
+    if bind.dialect.name == "postgresql":
+        # Unnamed unique constraint left by create_all on a database created before the migrations
+        op.execute("ALTER TABLE tickets DROP CONSTRAINT IF EXISTS tickets_message_key_key")
+    if "ix_tickets_message_key" not in ticket_indexes:
+        op.create_index("ix_tickets_message_key", "tickets", ["message_key"])
+    if "ix_responses_ticket_id" not in {i["name"] for i in inspector.get_indexes("responses")}:
+        op.create_index("ix_responses_ticket_id", "responses", ["ticket_id"])
+
+    if bind.dialect.name != "postgresql":
+        return
+    _drop_foreign_keys(bind)
+    now = datetime.now(timezone.utc)
+    for table, interval, keep in PARTITIONS:
+        _partition(bind, table, interval, keep, now)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        for table in PARTITIONED:
+            sequence = _serial_sequence(bind, table)
+            op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+            if sequence:
+                op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+            op.execute(f"CREATE TABLE {table} (LIKE {table}_partitioned INCLUDING DEFAULTS)")
+            op.execute(f"INSERT INTO {table} SELECT * FROM {table}_partitioned")
+            op.execute(f"DROP TABLE {table}_partitioned CASCADE")
+            if sequence:
+                op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+            op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+            _create_indexes(table)
+        for table, column, referred in FOREIGN_KEYS:
+            op.create_foreign_key(f"{table}_{column}_fkey", table, referred, [column], ["id"])
+    op.drop_index("ix_responses_ticket_id", table_name="responses")
+    op.drop_index("ix_tickets_message_key", table_name="tickets")
+    op.create_index("ix_tickets_message_key", "tickets", ["message_key"], unique=True)
+    op.drop_table("inbound_message_keys")
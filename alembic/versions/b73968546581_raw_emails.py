@@ -0,0 +1,38 @@
+"""Compressed raw inbound email parts
+
+Revision ID: b73968546581
+Revises: 71c07f296e4d
+Create Date: 2026-10-19 08:55:00.000000
+
+The original text / HTML parts of each inbound email, kept for audit
+while `tickets.body` holds the normalized text (see app/services/normalize.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b73968546581'
+down_revision: Union[str, None] = '71c07f296e4d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if sa.inspect(op.get_bind()).has_table("raw_emails"):
+        return
+    op.create_table(
+        "raw_emails",
+        sa.Column("ticket_id", sa.Integer(), sa.ForeignKey("tickets.id"), primary_key=True),
+        sa.Column("content", sa.LargeBinary(), nullable=False),
+        sa.Column("raw_size", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("raw_emails")
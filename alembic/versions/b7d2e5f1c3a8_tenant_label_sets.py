@@ -0,0 +1,46 @@
+"""Per-tenant label sets
+
+Revision ID: b7d2e5f1c3a8
+Revises: a3f1c9d2e4b7
+Create Date: 2026-10-19 12:00:00.000000
+
+Adds the `tenants` table and `tickets.tenant` (see app/services/tenants.py).
+The app creates missing tables at startup, so each step checks first.
+Existing tickets keep `tenant` NULL: the default labels.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e5f1c3a8'
+down_revision: Union[str, None] = 'a3f1c9d2e4b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table("tenants"):
+        op.create_table(
+            "tenants",
+            sa.Column("name", sa.String(50), primary_key=True),
+            sa.Column("mailboxes", sa.JSON(), nullable=False),
+            sa.Column("labels", sa.JSON(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+    if "tenant" not in {column["name"] for column in inspector.get_columns("tickets")}:
+        op.add_column("tickets", sa.Column("tenant", sa.String(50), nullable=True))
+    if "ix_tickets_tenant" not in {index["name"] for index in inspector.get_indexes("tickets")}:
+        op.create_index("ix_tickets_tenant", "tickets", ["tenant"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_tickets_tenant", table_name="tickets")
+    op.drop_column("tickets", "tenant")
+    op.drop_table("tenants")
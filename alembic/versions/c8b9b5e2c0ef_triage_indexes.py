@@ -0,0 +1,34 @@
+"""Index ticket priority and language
+
+Revision ID: c8b9b5e2c0ef
+Revises: b73968546581
+Create Date: 2026-10-19 08:58:00.000000
+
+Both are filled at ingest (see app/services/triage.py) and filtered on by
+`GET /tickets/`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8b9b5e2c0ef'
+down_revision: Union[str, None] = 'b73968546581'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    indexes = {i["name"] for i in sa.inspect(op.get_bind()).get_indexes("tickets")}
+    for column in ("priority", "language"):
+        if f"ix_tickets_{column}" not in indexes:
+            op.create_index(f"ix_tickets_{column}", "tickets", [column])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_tickets_language", table_name="tickets")
+    op.drop_index("ix_tickets_priority", table_name="tickets")
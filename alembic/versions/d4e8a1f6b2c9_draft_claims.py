@@ -0,0 +1,32 @@
+"""Batch drafter claims
+
+Revision ID: d4e8a1f6b2c9
+Revises: b7d2e5f1c3a8
+Create Date: 2026-10-19 14:00:00.000000
+
+Adds `tickets.draft_claimed_at`, set by the batch drafter in a short
+transaction before it calls the LLM (see app/services/batch_drafting.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8a1f6b2c9'
+down_revision: Union[str, None] = 'b7d2e5f1c3a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("tickets")}
+    if "draft_claimed_at" not in columns:
+        op.add_column("tickets", sa.Column("draft_claimed_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("tickets", "draft_claimed_at")
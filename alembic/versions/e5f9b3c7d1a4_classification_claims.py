@@ -0,0 +1,33 @@
+"""Classification stage claims
+
+Revision ID: e5f9b3c7d1a4
+Revises: d4e8a1f6b2c9
+Create Date: 2026-10-19 16:00:00.000000
+
+Adds `tickets.classification_claimed_at`, set by the deferred
+classification stage before it runs inference on a ticket (see
+app/services/classification_stage.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f9b3c7d1a4'
+down_revision: Union[str, None] = 'd4e8a1f6b2c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("tickets")}
+    if "classification_claimed_at" not in columns:
+        op.add_column("tickets", sa.Column("classification_claimed_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("tickets", "classification_claimed_at")
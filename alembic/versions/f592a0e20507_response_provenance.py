@@ -0,0 +1,43 @@
+"""Response provenance for cached drafts
+
+Revision ID: f592a0e20507
+Revises: 5faa0d50beee
+Create Date: 2026-10-19 08:20:00.000000
+
+`responses.source` ("llm", "cache_exact" or "cache_similar") and the
+response a cached draft was copied from (see app/services/draft_cache.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f592a0e20507'
+down_revision: Union[str, None] = '5faa0d50beee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    columns = {c["name"] for c in sa.inspect(bind).get_columns("responses")}
+    if "source" not in columns:
+        op.add_column("responses", sa.Column("source", sa.String(20), nullable=True))
+    if "source_response_id" not in columns:
+        op.add_column("responses", sa.Column("source_response_id", sa.Integer(), nullable=True))
+        # SQLite cannot add a constraint to an existing table
+        if bind.dialect.name != "sqlite":
+            op.create_foreign_key(
+                "responses_source_response_id_fkey", "responses", "responses", ["source_response_id"], ["id"]
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        op.drop_constraint("responses_source_response_id_fkey", "responses", type_="foreignkey")
+    op.drop_column("responses", "source_response_id")
+    op.drop_column("responses", "source")
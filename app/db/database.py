@@ -1,9 +1,14 @@
 # app/db/database.py
 
 import os
+from typing import Optional
+
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
 
+from app.db.pool import InstrumentedAsyncQueuePool, instrument_pool
+
 # Load .env for local development if DATABASE_URL is not set,
 # but environment variables from Docker Compose will take precedence.
 load_dotenv()
@@ -31,8 +36,60 @@ else:
         f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     )
 
-engine = create_async_engine(DATABASE_URL, echo=True)  # Set echo=False in production
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def engine_options(url: str) -> dict:
+    """create_async_engine kwargs from env, with production-safe defaults.
+
+    DB_ECHO                          log every SQL statement (default off)
+    DB_POOL_SIZE / DB_MAX_OVERFLOW   persistent / burst connections per process
+                                     (default 10 / 10; size the pool to the
+                                     concurrent requests + background tasks a
+                                     worker runs, times workers <= max_connections)
+    DB_POOL_TIMEOUT                  seconds to wait for a free connection (10)
+    DB_POOL_RECYCLE                  reconnect connections older than this (1800)
+    DB_POOL_PRE_PING                 check connections on checkout (default on)
+    DB_STATEMENT_CACHE_SIZE          asyncpg prepared statements per connection
+                                     (100; set 0 behind pgbouncer transaction pooling)
+    DB_QUERY_CACHE_SIZE              SQLAlchemy compiled-statement cache (500)
+    """
+    options = {
+        "echo": _env_flag("DB_ECHO", "0"),
+        "query_cache_size": int(os.getenv("DB_QUERY_CACHE_SIZE", "500")),
+    }
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite picks its own pool (StaticPool for :memory:); sizing does not apply
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=_env_flag("DB_POOL_PRE_PING", "1"),
+    )
+    if make_url(url).get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100")),
+        }
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+instrument_pool(engine, "primary")
 # Factory that creates AsyncSession and supports async context manager
 AsyncSessionLocal: async_sessionmaker[AsyncSession] = async_sessionmaker(
     bind=engine, expire_on_commit=False
 )
+
+# Optional read replica for read-only routes (see app/db/routing.py)
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL") or None
+replica_engine = None
+ReplicaSessionLocal: Optional[async_sessionmaker[AsyncSession]] = None
+if DATABASE_REPLICA_URL:
+    replica_engine = create_async_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL))
+    instrument_pool(replica_engine, "replica")
+    ReplicaSessionLocal = async_sessionmaker(bind=replica_engine, expire_on_commit=False)
@@ -6,6 +6,8 @@ from sqlalchemy import (
     ForeignKey,
     Boolean,
     DateTime,
+    Float,
+    LargeBinary,
     func,
     JSON,
 )
@@ -21,8 +23,20 @@ class Ticket(Base):
     subject = Column(Text)
     body = Column(Text)
     category = Column(String(50), nullable=True)  # Made nullable
-    priority = Column(String(20), nullable=True)  # Made nullable
-    language = Column(String(10), nullable=True)  # Made nullable
+    # Filled at ingest (app/services/triage.py) unless the client sent them
+    priority = Column(String(20), nullable=True, index=True)
+    language = Column(String(10), nullable=True, index=True)
+    # Tenant whose label set `category` comes from; None for the default labels
+    tenant = Column(String(50), nullable=True, index=True)
+    # Model + label-set fingerprint that produced `category` (see reclassify job)
+    classifier_version = Column(String(120), nullable=True, index=True)
+    # Idempotency key for inbound email (see app/services/inbound_dedup.py);
+    # uniqueness is enforced by `inbound_message_keys`
+    message_key = Column(String(80), nullable=True, index=True)
+    # Set while the batch drafter has this ticket in flight (app/services/batch_drafting.py)
+    draft_claimed_at = Column(DateTime(timezone=True), nullable=True)
+    # Set while a deferred classification stage runs inference on it (app/services/classification_stage.py)
+    classification_claimed_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     responses = relationship("Response", back_populates="ticket")
 
@@ -30,13 +44,68 @@ class Ticket(Base):
 class Response(Base):
     __tablename__ = "responses"
     id = Column(Integer, primary_key=True, index=True)
-    ticket_id = Column(Integer, ForeignKey("tickets.id"))
+    ticket_id = Column(Integer, ForeignKey("tickets.id"), index=True)
     generated_response = Column(Text)
     reviewed = Column(Boolean, default=False)
     sent = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     ticket = relationship("Ticket", back_populates="responses")
     status = Column(String(20), nullable=True)
+    # Provenance: "llm", "cache_exact" or "cache_similar" (see draft_cache)
+    source = Column(String(20), nullable=True)
+    source_response_id = Column(Integer, ForeignKey("responses.id"), nullable=True)
+
+
+class Tenant(Base):
+    """A mailbox / customer with its own label taxonomy (see app/services/tenants.py)."""
+
+    __tablename__ = "tenants"
+    name = Column(String(50), primary_key=True)
+    # Inbound addresses ("support@acme.com") or whole domains ("@acme.com")
+    mailboxes = Column(JSON, nullable=False, default=list)
+    labels = Column(JSON, nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class InboundMessageKey(Base):
+    """Claimed inbound message keys, the arbiter for idempotent ticket inserts.
+
+    On Postgres `tickets` is range-partitioned (app/services/partitions.py),
+    and a unique index there would have to include `created_at`.
+    """
+
+    __tablename__ = "inbound_message_keys"
+    message_key = Column(String(80), primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class TicketAttachment(Base):
+    """Reference to an inbound attachment in the blob store (see app/services/attachments.py)."""
+
+    __tablename__ = "attachments"
+    id = Column(Integer, primary_key=True)
+    ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=False, index=True)
+    filename = Column(String(255), nullable=True)
+    content_type = Column(String(100), nullable=True)
+    sha256 = Column(String(64), nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class RawEmail(Base):
+    """Original inbound email parts, compressed, kept for audit.
+
+    `tickets.body` holds the normalized text (app/services/normalize.py).
+    """
+
+    __tablename__ = "raw_emails"
+    ticket_id = Column(Integer, ForeignKey("tickets.id"), primary_key=True)
+    # zlib-compressed JSON {"text": ..., "html": ...}
+    content = Column(LargeBinary, nullable=False)
+    raw_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
 class LogLevel(str, enum.Enum):  # This enum is fine here or in logging_config.py
@@ -57,4 +126,33 @@ class Log(Base):
     message = Column(Text)  # For record.getMessage()
     level = Column(String(20))  # For record.levelname
     details = Column(JSON, nullable=True)  # NEW: For structured details
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class JobCheckpoint(Base):
+    """Resumable cursor for long-running maintenance jobs (e.g. reclassify)."""
+
+    __tablename__ = "job_checkpoints"
+    name = Column(String(50), primary_key=True)
+    cursor = Column(Integer, nullable=False, default=0)
+    details = Column(JSON, nullable=True)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class AnalyticsRollup(Base):
+    """Incrementally maintained aggregates (see app/services/analytics.py).
+
+    metric: "tickets" (dimension = category) or "drafts" (dimension = status)
+    granularity: "hour", "day" or "all" (bucket_start = 1970-01-01)
+    value_sum: summed ticket-to-draft latency in seconds for "drafts"
+    """
+
+    __tablename__ = "analytics_rollups"
+    metric = Column(String(20), primary_key=True)
+    granularity = Column(String(10), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    dimension = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    value_sum = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,114 @@
+# app/db/pool.py
+"""Connection-pool instrumentation for the async engines.
+
+Checked-out connections, overflow and pool size are tracked from pool
+checkout/checkin/connect events. The time a caller waits for a connection
+is measured around QueuePool's `_do_get`, which has no event of its own.
+The API handlers, background tasks and the DB log consumer all share the
+pool, so a rising wait time or timeout count means it is saturated.
+"""
+
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    labelnames=("pool",),
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Connections open beyond pool_size (negative while the pool is not full)",
+    labelnames=("pool",),
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured pool_size",
+    labelnames=("pool",),
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    labelnames=("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Checkouts that gave up after pool_timeout",
+    labelnames=("pool",),
+)
+DB_POOL_CONNECTIONS_OPENED = Counter(
+    "db_pool_connections_opened_total",
+    "New DBAPI connections opened by the pool",
+    labelnames=("pool",),
+)
+DB_POOL_INVALIDATED = Counter(
+    "db_pool_invalidated_total",
+    "Connections invalidated (e.g. failed pre-ping or disconnect)",
+    labelnames=("pool",),
+)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout wait time."""
+
+    metrics_name = "primary"
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.metrics_name).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.metrics_name).observe(time.perf_counter() - start)
+
+
+def _update_overflow(pool, name: str) -> None:
+    overflow = getattr(pool, "overflow", None)
+    if overflow is not None:
+        DB_POOL_OVERFLOW.labels(name).set(overflow())
+
+
+def instrument_pool(engine, name: str = "primary") -> None:
+    """Export pool metrics for an (async) engine under the `pool` label `name`."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    pool = sync_engine.pool
+    if isinstance(pool, InstrumentedAsyncQueuePool):
+        pool.metrics_name = name
+    size = getattr(pool, "size", None)
+    if size is not None:
+        DB_POOL_SIZE.labels(name).set(size())
+
+    # Listeners are registered on the engine so they survive pool.recreate()
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        DB_POOL_CHECKED_OUT.labels(name).inc()
+        _update_overflow(sync_engine.pool, name)
+
+    # Fires before the connection is back in the pool, hence inc/dec rather
+    # than reading pool.checkedout()
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        DB_POOL_CHECKED_OUT.labels(name).dec()
+        _update_overflow(sync_engine.pool, name)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        DB_POOL_CONNECTIONS_OPENED.labels(name).inc()
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _on_invalidate(dbapi_conn, record, exception):
+        DB_POOL_INVALIDATED.labels(name).inc()
+
+
+__all__ = ["InstrumentedAsyncQueuePool", "instrument_pool"]
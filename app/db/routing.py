@@ -0,0 +1,208 @@
+# app/db/routing.py
+"""Primary / read-replica session routing for read-only endpoints.
+
+With DATABASE_REPLICA_URL set, GET endpoints that only read use
+`get_read_session`, which hands out a replica session unless:
+
+- the client wrote through this API within `READ_YOUR_WRITES_SECONDS`
+  (tracked per client via the `last_write` cookie, plus an in-process map
+  keyed on `X-Client-Id` for cookie-less callers). Callers sending neither
+  are not pinned: a client address is shared by everyone behind the same
+  proxy or NAT, so keying on it would pin unrelated clients;
+- the last replica check found it down or lagging more than
+  `REPLICA_MAX_LAG_SECONDS` (re-checked every `REPLICA_CHECK_INTERVAL_SECONDS`);
+- the replica connection could not be opened for this request, or a
+  query on it failed; either marks it down until the next check.
+
+In all of those cases the read goes to the primary. Without a replica every
+read goes to the primary.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncGenerator, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import AsyncSessionLocal, ReplicaSessionLocal
+
+logger = logging.getLogger(__name__)
+
+DB_READS = Counter(
+    "db_read_sessions_total",
+    "Read-only sessions by target and routing reason",
+    labelnames=("target", "reason"),
+)
+DB_REPLICA_ERRORS = Counter(
+    "db_replica_errors_total",
+    "Replica lag checks or reads that failed",
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Replication lag measured on the read replica",
+)
+DB_REPLICA_HEALTHY = Gauge(
+    "db_replica_healthy",
+    "1 if reads may be routed to the replica",
+)
+
+LAST_WRITE_COOKIE = "last_write"
+_LAG_SQL = text(
+    "SELECT CASE WHEN pg_is_in_recovery() "
+    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "ELSE 0 END"
+)
+
+
+def client_key(request: Request) -> Optional[str]:
+    """Explicit client identity for read-your-writes, if the caller sent one."""
+    return request.headers.get("x-client-id") or None
+
+
+class ReadRouter:
+    def __init__(
+        self,
+        primary=AsyncSessionLocal,
+        replica=ReplicaSessionLocal,
+        read_your_writes: float = 5.0,
+        max_lag: float = 10.0,
+        check_interval: float = 5.0,
+        check_timeout: float = 1.0,
+    ):
+        self.primary = primary
+        self.replica = replica
+        self.read_your_writes = read_your_writes
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.healthy = replica is not None
+        self.lag: Optional[float] = None
+        self._checked_at = float("-inf")
+        self._check_lock = asyncio.Lock()
+        self._recent_writes: Dict[str, float] = {}
+
+    # -- read-your-writes ----------------------------------------------
+
+    def record_write(self, request: Request, response: Optional[Response] = None) -> None:
+        now = time.time()
+        key = client_key(request)
+        if key is not None:
+            self._recent_writes[key] = now
+        if len(self._recent_writes) > 10_000:
+            cutoff = now - self.read_your_writes
+            self._recent_writes = {k: t for k, t in self._recent_writes.items() if t >= cutoff}
+        if response is not None and self.replica is not None:
+            response.set_cookie(LAST_WRITE_COOKIE, f"{now:.3f}", max_age=max(1, int(self.read_your_writes) + 1))
+
+    def wrote_recently(self, request: Request) -> bool:
+        key = client_key(request)
+        last = self._recent_writes.get(key, 0.0) if key is not None else 0.0
+        try:
+            last = max(last, float(request.cookies.get(LAST_WRITE_COOKIE, 0)))
+        except ValueError:
+            pass
+        return time.time() - last < self.read_your_writes
+
+    # -- replica health --------------------------------------------------
+
+    async def _measure_lag(self) -> float:
+        async with self.replica() as session:
+            if session.bind.dialect.name != "postgresql":
+                await session.execute(text("SELECT 1"))
+                return 0.0
+            return float((await session.execute(_LAG_SQL)).scalar() or 0.0)
+
+    async def check_replica(self, force: bool = False) -> bool:
+        if self.replica is None:
+            return False
+        if not force and time.monotonic() - self._checked_at < self.check_interval:
+            return self.healthy
+        async with self._check_lock:
+            if not force and time.monotonic() - self._checked_at < self.check_interval:
+                return self.healthy
+            try:
+                self.lag = await asyncio.wait_for(self._measure_lag(), timeout=self.check_timeout)
+                DB_REPLICA_LAG.set(self.lag)
+                healthy = self.lag <= self.max_lag
+                if not healthy:
+                    logger.warning(f"Read replica lagging {self.lag:.1f}s; routing reads to the primary.")
+            except Exception as e:
+                DB_REPLICA_ERRORS.inc()
+                logger.warning(f"Read replica check failed, routing reads to the primary: {e}")
+                healthy = False
+            self._set_healthy(healthy)
+            self._checked_at = time.monotonic()
+        return self.healthy
+
+    def _set_healthy(self, healthy: bool) -> None:
+        self.healthy = healthy
+        DB_REPLICA_HEALTHY.set(1 if healthy else 0)
+
+    def mark_replica_failed(self, error: BaseException) -> None:
+        DB_REPLICA_ERRORS.inc()
+        logger.warning(f"Read on replica failed, routing reads to the primary until the next check: {error}")
+        self._set_healthy(False)
+        self._checked_at = time.monotonic()
+
+    # -- routing -----------------------------------------------------------
+
+    async def choose(self, request: Request) -> Tuple[str, str]:
+        """Return (target, reason) for a read-only request."""
+        if self.replica is None:
+            return "primary", "no_replica"
+        if self.wrote_recently(request):
+            return "primary", "read_your_writes"
+        if not await self.check_replica():
+            return "primary", "replica_unhealthy"
+        return "replica", "ok"
+
+
+read_router = ReadRouter(
+    read_your_writes=float(os.getenv("READ_YOUR_WRITES_SECONDS", "5")),
+    max_lag=float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10")),
+    check_interval=float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "5")),
+)
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Session dependency for read-only endpoints (replica when safe)."""
+    target, reason = await read_router.choose(request)
+    session = None
+    if target == "replica":
+        session = read_router.replica()
+        try:
+            # Connect now so an unreachable replica falls back to the primary
+            await session.connection()
+        except (OSError, DBAPIError) as e:
+            await session.close()
+            read_router.mark_replica_failed(e)
+            session, target, reason = None, "primary", "replica_error"
+    DB_READS.labels(target, reason).inc()
+    # For the read cache (app/services/read_cache.py)
+    request.state.read_target, request.state.read_reason = target, reason
+    if session is None:
+        session = read_router.primary()
+    async with session:
+        try:
+            yield session
+        except (OSError, DBAPIError) as e:
+            # Connection lost, recovery conflict, ... on the replica
+            if target == "replica":
+                read_router.mark_replica_failed(e)
+            raise
+
+
+async def get_write_session(request: Request, response: Response) -> AsyncGenerator[AsyncSession, None]:
+    """Primary session for endpoints that write; opens the read-your-writes window."""
+    read_router.record_write(request, response)
+    async with read_router.primary() as session:
+        yield session
+
+
+__all__ = ["ReadRouter", "read_router", "get_read_session", "get_write_session", "client_key"]
@@ -1,16 +1,188 @@
-"""Logging configuration with async DB sink.
+"""Logging configuration: stderr and async DB sinks with sampling and rate limits.
 
-This module installs standard stderr logging and an optional async DB writer
-that consumes records from an asyncio.Queue to avoid blocking the event loop.
+`setup_logging` installs two sinks, each with its own level:
+
+- stderr (`LOG_STDERR_LEVEL`, default WARNING). Output is text, or one JSON
+  object per line with `LOG_FORMAT=json`.
+- the DB (`LOG_DB_LEVEL`, default WARNING). `AsyncDBQueueHandler` pushes
+  records onto an asyncio.Queue, and `log_writer` stores them with one INSERT
+  per batch of up to `LOG_DB_BATCH` rows. The event loop never waits on the
+  database.
+
+Both sinks share one `SamplingFilter`, which applies below ERROR:
+
+- each call site (file:line) passes at most `LOG_RATE_LIMIT_PER_SITE`
+  records per second (burst `LOG_RATE_LIMIT_BURST`; 0 disables the limit);
+- loggers listed in `LOG_SAMPLE_RATES` keep that fraction of their records.
+  The format is `app.routers.tickets=0.1,app.services.classifier=0.1`, and
+  the longest matching prefix wins.
+
+Errors are never dropped. Dropped records are counted in
+`log_records_suppressed_total{logger,reason}`, and the next record that
+passes from the same call site carries `suppressed=<n>`.
+
+Pass values as arguments (`logger.warning("Ticket %s stored", ticket_id)`)
+rather than with f-strings, so a dropped record is never formatted.
+`ticket_id` and `event_type` given in `extra=` go to their own DB columns
+and JSON fields.
 """
 
-import logging
 import asyncio
-from typing import Optional
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import insert
 
 from app.db.database import AsyncSessionLocal
 from app.db.models import Log
-from prometheus_client import Gauge
+
+STDERR_LEVEL = os.getenv("LOG_STDERR_LEVEL", "WARNING")
+DB_LEVEL = os.getenv("LOG_DB_LEVEL", "WARNING")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+DB_BATCH = int(os.getenv("LOG_DB_BATCH", "100"))
+
+# Record attributes copied to DB columns / JSON fields when present
+EXTRA_KEYS = ("ticket_id", "event_type")
+
+LOG_QUEUE_DEPTH = Gauge(
+    "log_queue_depth",
+    "Depth of the async log queue"
+)
+LOG_SUPPRESSED = Counter(
+    "log_records_suppressed_total",
+    "Log records not written, by logger and reason (sampled, rate_limited, queue_full, db_error)",
+    labelnames=("logger", "reason"),
+)
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in spec.split(","):
+        name, sep, rate = item.strip().partition("=")
+        if sep and name:
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class _Site:
+    __slots__ = ("tokens", "updated", "credit", "suppressed")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.credit = 1.0
+        self.suppressed = 0
+
+
+class SamplingFilter(logging.Filter):
+    """Per-call-site sampling and token-bucket rate limiting (ERROR and above always pass).
+
+    The decision is stored on the record, so every handler sharing this
+    filter sees the same answer and each record is counted once.
+    """
+
+    def __init__(
+        self,
+        rates: Optional[Dict[str, float]] = None,
+        per_second: float = 0.0,
+        burst: float = 0.0,
+        clock=time.monotonic,
+    ):
+        super().__init__()
+        # Longest prefix first
+        self.rates = sorted((rates or {}).items(), key=lambda item: -len(item[0]))
+        self.per_second = per_second
+        self.burst = max(burst, per_second, 1.0)
+        self._clock = clock
+        self._sites: Dict[Tuple[str, int], _Site] = {}
+        self._lock = threading.Lock()
+
+    def rate_for(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        decision = getattr(record, "_sampled", None)
+        if decision is None:
+            decision = record._sampled = self._decide(record)
+        return decision
+
+    def _decide(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0 and self.per_second <= 0:
+            return True
+        now = self._clock()
+        with self._lock:
+            site = self._sites.get((record.pathname, record.lineno))
+            if site is None:
+                site = self._sites[(record.pathname, record.lineno)] = _Site(self.burst, now)
+            reason = None
+            if rate < 1.0:
+                # Evenly spaced: keeps the first record, then one in every 1/rate
+                keep = site.credit >= 1.0
+                site.credit = min(1.0, site.credit - (1.0 if keep else 0.0) + rate)
+                if not keep:
+                    reason = "sampled"
+            if reason is None and self.per_second > 0:
+                site.tokens = min(self.burst, site.tokens + (now - site.updated) * self.per_second)
+                site.updated = now
+                if site.tokens >= 1.0:
+                    site.tokens -= 1.0
+                else:
+                    reason = "rate_limited"
+            if reason is not None:
+                site.suppressed += 1
+            elif site.suppressed:
+                record.suppressed = site.suppressed
+                site.suppressed = 0
+        if reason is not None:
+            LOG_SUPPRESSED.labels(record.name, reason).inc()
+            return False
+        return True
+
+
+log_sampler = SamplingFilter(
+    rates=_parse_rates(os.getenv("LOG_SAMPLE_RATES", "")),
+    per_second=float(os.getenv("LOG_RATE_LIMIT_PER_SITE", "50")),
+    burst=float(os.getenv("LOG_RATE_LIMIT_BURST", "100")),
+)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} [+{suppressed} suppressed]" if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with `ticket_id` / `event_type` extras when present."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "site": f"{record.module}:{record.funcName}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        for key in EXTRA_KEYS + ("suppressed",):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
 
 
 class AsyncDBQueueHandler(logging.Handler):
@@ -22,69 +194,87 @@ class AsyncDBQueueHandler(logging.Handler):
 
     def emit(self, record: logging.LogRecord):
         try:
+            details = {
+                "pathname": record.pathname,
+                "lineno": record.lineno,
+                "funcName": record.funcName,
+                "module": record.module,
+                "name": record.name,
+            }
+            if getattr(record, "suppressed", 0):
+                details["suppressed"] = record.suppressed
             payload = {
                 "level": record.levelname,
                 "message": record.getMessage(),
-                "details": {
-                    "pathname": record.pathname,
-                    "lineno": record.lineno,
-                    "funcName": record.funcName,
-                    "module": record.module,
-                    "name": record.name,
-                },
+                "details": details,
             }
-            # Optional extras if present
-            for key in ("ticket_id", "event_type"):
-                if hasattr(record, key):
-                    payload[key] = getattr(record, key)
-            # Try put_nowait; drop on full queue to avoid backpressure
+            # Same keys for every row so a batch is one executemany INSERT
+            for key in EXTRA_KEYS:
+                payload[key] = getattr(record, key, None)
+            # Drop on full queue to avoid backpressure
             self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            LOG_SUPPRESSED.labels(record.name, "queue_full").inc()
         except Exception:
             self.handleError(record)
 
 
-LOG_QUEUE_DEPTH = Gauge(
-    "log_queue_depth",
-    "Depth of the async log queue"
-)
-
-
-async def log_writer(queue: asyncio.Queue):
-    """Async consumer that persists log records to the DB."""
+async def log_writer(queue: asyncio.Queue, batch_size: int = DB_BATCH):
+    """Async consumer that persists log records to the DB, one INSERT per batch."""
     while True:
-        item = await queue.get()
-        if item is None:  # shutdown sentinel
-            try:
-                LOG_QUEUE_DEPTH.set(0)
-            except Exception:
-                pass
-            queue.task_done()
-            break
+        items = [await queue.get()]
+        while len(items) < batch_size and not queue.empty():
+            items.append(queue.get_nowait())
+        rows = [item for item in items if item is not None]
         try:
-            async with AsyncSessionLocal() as session:
-                session.add(Log(**item))
-                await session.commit()
+            if rows:
+                async with AsyncSessionLocal() as session:
+                    await session.execute(insert(Log), rows)
+                    await session.commit()
         except Exception:
             # Intentionally avoid logging here to prevent recursion loops
-            pass
+            for row in rows:
+                LOG_SUPPRESSED.labels(row["details"]["name"], "db_error").inc()
         finally:
             try:
                 LOG_QUEUE_DEPTH.set(queue.qsize())
             except Exception:
                 pass
-            queue.task_done()
+            for _ in items:
+                queue.task_done()
+        if len(rows) < len(items):  # shutdown sentinel
+            LOG_QUEUE_DEPTH.set(0)
+            break
+
+
+def _level(value) -> int:
+    return value if isinstance(value, int) else logging.getLevelName(str(value).upper())
 
 
-def setup_logging(queue: Optional[asyncio.Queue] = None) -> None:
+def setup_logging(
+    queue: Optional[asyncio.Queue] = None,
+    stderr_level=None,
+    db_level=None,
+    json_output: Optional[bool] = None,
+) -> None:
+    stderr_level = _level(stderr_level or STDERR_LEVEL)
+    db_level = _level(db_level or DB_LEVEL)
+    if json_output is None:
+        json_output = LOG_FORMAT == "json"
     root = logging.getLogger()
-    root.setLevel(logging.WARNING)
+    root.setLevel(min(stderr_level, db_level) if queue is not None else stderr_level)
 
     # stderr handler
     stderr_handler = logging.StreamHandler()
-    formatter = logging.Formatter(
-        "%(asctime)s %(levelname)s [%(name)s:%(funcName)s:%(lineno)d] %(message)s"
-    )
+    if json_output:
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter(
+            "%(asctime)s %(levelname)s [%(name)s:%(funcName)s:%(lineno)d] %(message)s"
+        )
     stderr_handler.setFormatter(formatter)
+    stderr_handler.setLevel(stderr_level)
+    stderr_handler.addFilter(log_sampler)
     if not any(isinstance(h, logging.StreamHandler) for h in root.handlers):
         root.addHandler(stderr_handler)
 
@@ -97,7 +287,16 @@ def setup_logging(queue: Optional[asyncio.Queue] = None) -> None:
     # Async DB sink via queue
     if queue is not None and not any(isinstance(h, AsyncDBQueueHandler) for h in root.handlers):
         db_handler = AsyncDBQueueHandler(queue)
-        db_handler.setLevel(logging.WARNING)
+        db_handler.setLevel(db_level)
+        db_handler.addFilter(log_sampler)
         root.addHandler(db_handler)
 
-__all__ = ["setup_logging", "log_writer", "AsyncDBQueueHandler"]
+__all__ = [
+    "setup_logging",
+    "log_writer",
+    "AsyncDBQueueHandler",
+    "SamplingFilter",
+    "JsonFormatter",
+    "log_sampler",
+    "LOG_SUPPRESSED",
+]
@@ -1,9 +1,19 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 import asyncio
+import logging
 import os
-from app.routers import tickets, inbound_email, health
+import threading
+from app.routers import tickets, inbound_email, health, events, analytics
 from app.logging_config import setup_logging, log_writer
+from app.services.classification_stage import classification_stage
+from app.services.events import event_bus
+from app.services.batch_drafting import DRAFT_MODE, batch_drafter, draft_recovery
+from app.services.analytics import analytics_rollup
+from app.services.partitions import partition_maintenance
+from app.services.response_gen import shutdown_response_backend
+from app.services.autotune import autotune_in_background
+from app.services import classifier as classifier_module
 from app.services.classifier import (
     get_zero_shot_classifier,
     get_model_info,
@@ -22,12 +32,15 @@ from prometheus_fastapi_instrumentator import Instrumentator
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Ensure DB schema exists before serving
+    # Ensure DB schema exists before serving. Not on Postgres: the schema
+    # there (partitioned tables) comes from `alembic upgrade head`, and
+    # create_all would leave plain tables for the migration to trip over
     try:
         from app.db.database import engine
         from app.db.models import Base
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        if engine.dialect.name != "postgresql":
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
     except Exception:
         # Avoid failing startup in test/mock environments
         pass
@@ -41,29 +54,74 @@ async def lifespan(app: FastAPI):
         created_logging = True
     # Warm ML model (eager load and run a tiny inference to fill caches)
     app.state.model_loaded = False
+    autotune_stop = threading.Event()
+    autotune_task = None
     app.state.model_backend = "unknown"
     app.state.model_name = "unknown"
     app.state.model_device = "cpu"
-    try:
-        classifier = get_zero_shot_classifier()
-        # Record model info
-        info = get_model_info()
-        app.state.model_backend = info.get("backend", "unknown")
-        app.state.model_name = info.get("model", "unknown")
-        app.state.model_device = info.get("device", "cpu")
-        # Tiny warmup (will be cheap with mock)
-        _ = classifier(
-            "Subject: warmup\nBody: test\n",
-            candidate_labels=CANDIDATE_LABELS,
-            multi_label=False,
-        )
-        app.state.model_loaded = True
-    except Exception:
-        app.state.model_loaded = False
+    if classifier_module.model_client is not None:
+        # The model lives in the standalone model server (serve_model.py)
+        app.state.model_backend = "model_server"
+        try:
+            info = await classifier_module.model_client.fetch_info()
+            app.state.model_name = info.get("model", "unknown")
+            app.state.model_device = info.get("device", "cpu")
+            app.state.model_loaded = True
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Model server not reachable at startup: {e}")
+    else:
+        try:
+            classifier = get_zero_shot_classifier()
+            # Record model info
+            info = get_model_info()
+            app.state.model_backend = info.get("backend", "unknown")
+            app.state.model_name = info.get("model", "unknown")
+            app.state.model_device = info.get("device", "cpu")
+            # Tiny warmup (will be cheap with mock)
+            _ = classifier(
+                "Subject: warmup\nBody: test\n",
+                candidate_labels=CANDIDATE_LABELS,
+                multi_label=False,
+            )
+            app.state.model_loaded = True
+            # Batch size / length buckets / torch threads for this host
+            # (CLASSIFIER_AUTOTUNE), in the background so startup is not blocked
+            autotune_task = asyncio.create_task(autotune_in_background(classifier, autotune_stop))
+        except Exception:
+            app.state.model_loaded = False
+    # Batched classification stage for deferred ingest / degraded mode
+    classification_stage.start()
+    # LISTEN/NOTIFY fan-out for SSE/WebSocket subscribers (Postgres only)
+    await event_bus.start()
+    if DRAFT_MODE == "batch":
+        batch_drafter.start()
+    elif draft_recovery.interval > 0:
+        # Drafts lost to a restart or an open LLM circuit (first pass at startup)
+        draft_recovery.start()
+    # Incremental analytics rollups (ANALYTICS_ROLLUP_INTERVAL_SECONDS=0 disables)
+    analytics_rollup.start()
+    # Partition creation / retention (PARTITION_MAINTENANCE_INTERVAL_SECONDS=0 disables)
+    partition_maintenance.start()
     # OpenTelemetry: Set up tracing *here* (if any context needs app)
     try:
         yield
     finally:
+        if autotune_task is not None:
+            # Ends a sweep after its current trial, or a wait for another worker's
+            autotune_stop.set()
+            try:
+                await asyncio.wait_for(autotune_task, timeout=10)
+            except Exception:
+                pass
+        await partition_maintenance.stop()
+        await analytics_rollup.stop()
+        await batch_drafter.stop()
+        await draft_recovery.stop()
+        await classification_stage.stop()
+        await event_bus.stop()
+        shutdown_response_backend()
+        if classifier_module.model_client is not None:
+            await classifier_module.model_client.close()
         # graceful shutdown of log consumer only if we created it here
         if created_logging:
             try:
@@ -78,6 +136,8 @@ app = FastAPI(lifespan=lifespan)
 app.include_router(tickets.router, prefix="/tickets", tags=["tickets"])
 app.include_router(health.router)
 app.include_router(inbound_email.router, prefix="/email", tags=["email"]) # <--- INCLUDE NEW ROUTER
+app.include_router(events.router, prefix="/events", tags=["events"])
+app.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
 
 # Now instrument your app for telemetry & metrics
 # OpenTelemetry tracing (disable in tests/CI by setting DISABLE_OTEL=1)
@@ -0,0 +1,26 @@
+# app/routers/analytics.py
+"""Dashboard aggregates served from the precomputed rollups.
+
+`GET /analytics/summary?granularity=day&buckets=30` returns ticket counts by
+category, draft counts by status, draft success rate, mean ticket-to-draft
+latency and a per-bucket series. It reads only `analytics_rollups`, so it is
+cheap regardless of table size. Numbers lag by at most one rollup interval;
+`watermark` tells how far the rollups have got.
+"""
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.routing import get_read_session
+from app.services.analytics import summary
+
+router = APIRouter()
+
+
+@router.get("/summary")
+async def analytics_summary(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    buckets: int = Query(30, ge=1, le=366),
+    session: AsyncSession = Depends(get_read_session),
+):
+    return await summary(session, granularity=granularity, buckets=buckets)
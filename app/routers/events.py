@@ -0,0 +1,154 @@
+# app/routers/events.py
+"""Push channels for ticket classification and draft events.
+
+- `GET /events/tickets/{ticket_id}` : SSE stream for one ticket. Starts with a
+  `ticket.snapshot` event so a late subscriber never misses a finished draft.
+  `?until=draft` closes the stream after the first draft event.
+- `GET /events/categories/{category}` : SSE feed for all tickets in a category.
+- `WS /events/ws` : send `{"subscribe": "ticket", "id": 7}` or
+  `{"subscribe": "category", "id": "Refund"}`; events arrive as JSON messages.
+"""
+
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Response
+from app.services.events import event_bus
+from app.services.partitions import get_recent_ticket, response_filter
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15.0
+DRAFT_EVENTS = ("response.completed", "response.failed")
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def _ticket_snapshot(ticket_id: int) -> Optional[dict]:
+    async with AsyncSessionLocal() as session:
+        ticket = await get_recent_ticket(session, ticket_id)
+        if ticket is None:
+            return None
+        latest = (
+            await session.execute(
+                select(Response)
+                .where(*response_filter(ticket))
+                .order_by(Response.created_at.desc(), Response.id.desc())
+                .limit(1)
+            )
+        ).scalars().first()
+    snapshot = {"type": "ticket.snapshot", "ticket_id": ticket_id, "category": ticket.category}
+    if latest is not None:
+        snapshot.update(response_id=latest.id, status=latest.status)
+    return snapshot
+
+
+async def _stream(request: Request, kind: str, value, queue: asyncio.Queue, first: Optional[dict], until: Optional[str]):
+    try:
+        if first is not None:
+            yield _sse(first)
+            if until == "draft" and first.get("status") in ("completed", "failed"):
+                return
+        while True:
+            if await request.is_disconnected():
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _sse(event)
+            if until == "draft" and event.get("type") in DRAFT_EVENTS:
+                return
+    finally:
+        event_bus.unsubscribe(kind, value, queue)
+
+
+@router.get("/tickets/{ticket_id}")
+async def stream_ticket_events(ticket_id: int, request: Request, until: Optional[str] = None):
+    # Subscribe before taking the snapshot so nothing falls in between
+    queue = event_bus.subscribe("ticket", ticket_id)
+    snapshot = await _ticket_snapshot(ticket_id)
+    if snapshot is None:
+        event_bus.unsubscribe("ticket", ticket_id, queue)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+    return StreamingResponse(
+        _stream(request, "ticket", ticket_id, queue, snapshot, until),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/categories/{category}")
+async def stream_category_events(category: str, request: Request):
+    queue = event_bus.subscribe("category", category)
+    return StreamingResponse(
+        _stream(request, "category", category, queue, None, None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _subscription_value(kind: str, raw):
+    """Ticket ids as int, category names as str; None if `raw` is not valid for `kind`."""
+    if kind == "category":
+        return raw if isinstance(raw, str) and raw else None
+    if isinstance(raw, bool):
+        return None
+    if isinstance(raw, int):
+        return raw
+    if isinstance(raw, str) and raw.isdigit():
+        return int(raw)
+    return None
+
+
+@router.websocket("/ws")
+async def events_websocket(websocket: WebSocket):
+    await websocket.accept()
+    # One outbound queue shared by all of this socket's subscriptions
+    queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+    subscriptions = []
+
+    async def pump():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    sender = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except (KeyError, TypeError, ValueError):
+                # Not JSON, or a binary frame: answer it and keep the socket open
+                await websocket.send_json({"type": "error", "detail": "message is not valid JSON"})
+                continue
+            kind = message.get("subscribe") if isinstance(message, dict) else None
+            if kind not in ("ticket", "category") or "id" not in message:
+                await websocket.send_json({"type": "error", "detail": "expected {subscribe: ticket|category, id: ...}"})
+                continue
+            value = _subscription_value(kind, message["id"])
+            if value is None:
+                await websocket.send_json({"type": "error", "detail": f"invalid {kind} id: {message['id']!r}"})
+                continue
+            if (kind, value) in subscriptions:
+                continue
+            event_bus.subscribe(kind, value, queue)
+            subscriptions.append((kind, value))
+            if kind == "ticket":
+                snapshot = await _ticket_snapshot(value)
+                if snapshot is not None:
+                    await queue.put(snapshot)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        for kind, value in subscriptions:
+            event_bus.unsubscribe(kind, value, queue)
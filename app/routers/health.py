@@ -1,6 +1,10 @@
 from fastapi import APIRouter, Request
 from sqlalchemy import text
 from app.db.database import AsyncSessionLocal
+from app.db.routing import read_router
+from app.services import classifier
+from app.services.classifier import get_inference_config
+from app.services.response_gen import get_response_backend_info
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -14,7 +18,12 @@ async def health_root():
         db_status = "up"
     except Exception:
         db_status = "down"
-    return {"status": "ok", "db": db_status}
+    result = {"status": "ok", "db": db_status}
+    if read_router.replica is not None:
+        healthy = await read_router.check_replica(force=True)
+        result["replica"] = "up" if healthy else "down"
+        result["replica_lag_seconds"] = read_router.lag
+    return result
 
 
 @router.get("/ml")
@@ -40,4 +49,7 @@ async def health_ml(request: Request):
         "model": model,
         "device": device,
         "loaded": loaded,
+        "inference": get_inference_config().as_dict(),
+        "model_server": classifier.model_client.status() if classifier.model_client is not None else None,
+        "response_backend": get_response_backend_info(),
     }
@@ -1,31 +1,58 @@
 # In app/routers/inbound_email.py
 
+import asyncio
 import hashlib
 import hmac
 import os
-from typing import List, Optional
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
 
 from fastapi import (APIRouter, BackgroundTasks, Depends, Header, HTTPException,
-                     Request, status)
-from pydantic import BaseModel, Field
+                     Request, Response, status)
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.database import AsyncSessionLocal
-from app.db.models import Ticket
-from app.routers.tickets import draft_and_store_response
+from app.db.models import RawEmail, Ticket, TicketAttachment
+from app.routers.tickets import (TICKET_INGEST_MODE, classification_slot,
+                                 classify_for_insert, classify_many_for_insert,
+                                 defer_classification, insert_ticket,
+                                 insert_tickets, schedule_draft)
 from app.schemas import TicketOut
-
-# --- ADDED IMPORTS ---
-from app.services.classifier import classify_ticket
+from app.services.attachments import (MAX_ATTACHMENTS, MAX_BODY_BYTES,
+                                      MAX_TEXT_BYTES, PayloadTooLarge,
+                                      StoredBlob, StreamingEmailParser,
+                                      attachment_store)
+from app.services.events import publish_ticket_event
+from app.services.inbound_dedup import (INBOUND_DUPLICATES, message_key,
+                                        recent_inbound_keys)
+from app.services.normalize import compress_raw, normalize_email
+from app.services.tenants import tenant_directory
+from app.services.triage import triage
 
 
 router = APIRouter()
 
+# Most emails accepted in one POST /email/inbound/batch
+INBOUND_BATCH_MAX_ITEMS = int(os.getenv("INBOUND_BATCH_MAX_ITEMS", "100"))
+# Store the cleaned body (quoted history, signatures, footers removed)
+INBOUND_NORMALIZE = os.getenv("INBOUND_NORMALIZE", "1") == "1"
+# Keep the original text / HTML parts, compressed, in raw_emails
+INBOUND_KEEP_RAW = os.getenv("INBOUND_KEEP_RAW", "1") == "1"
+# Bound on all non-attachment fields of a batch together
+INBOUND_BATCH_MAX_TEXT_BYTES = int(os.getenv("INBOUND_BATCH_MAX_TEXT_BYTES", str(8 * 1024 * 1024)))
+# Bound on a whole batch body, attachments included
+INBOUND_BATCH_MAX_BODY_BYTES = int(os.getenv("INBOUND_BATCH_MAX_BODY_BYTES", str(256 * 1024 * 1024)))
+
 
 # Pydantic models for the incoming email payload
 class Attachment(BaseModel):
     filename: Optional[str] = None
     contentType: Optional[str] = None
+    # Base64 content; spooled to the blob store while the body streams in,
+    # so it is always None here
     data: Optional[str] = None
 
 
@@ -34,7 +61,10 @@ class EmailPayload(BaseModel):
     from_: str = Field(..., alias='from')
     subject: str
     date: str
-    text: str
+    # Empty when the email only has an HTML part
+    text: str = ""
+    # Message-ID header of the email; the idempotency key when present
+    messageId: Optional[str] = None
     html: Optional[str] = None
     attachments: List[Attachment] = []
 
@@ -44,8 +74,47 @@ async def get_session() -> AsyncSession:
         yield session
 
 
-# Dependency to verify the HMAC signature
-async def verify_signature(request: Request, x_signature: str = Header(...)):
+class PreparedEmail(NamedTuple):
+    body: str
+    # (zlib content, uncompressed size) for raw_emails, or None
+    raw: Optional[Tuple[bytes, int]]
+
+
+def _prepare(payload: EmailPayload) -> PreparedEmail:
+    """Stored body (normalized) and the compressed original; CPU-bound, run in a thread."""
+    if INBOUND_NORMALIZE:
+        body = normalize_email(payload.text, payload.html).body
+    else:
+        body = payload.text
+    raw = compress_raw(payload.text, payload.html) if INBOUND_KEEP_RAW else None
+    return PreparedEmail(body, raw)
+
+
+class SignedEmail(NamedTuple):
+    payload: EmailPayload
+    # Attachments spooled to temp blobs; committed once the ticket is stored
+    parser: StreamingEmailParser
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Request body exceeds {limit} bytes"
+    )
+
+
+async def _read_signed_body(
+    request: Request, x_signature: str, parser: StreamingEmailParser, max_body_bytes: int
+) -> dict:
+    """Stream the body once: update the HMAC, parse it and spool attachments to temp blobs.
+
+    Returns the parsed document once the signature over the whole body checks
+    out. The caller commits or discards the parser's blobs; on any failure
+    here their temp files are removed. Nothing is authenticated while the
+    body streams in, so its size is capped before it reaches the disk.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_body_bytes:
+        raise _too_large(max_body_bytes)
     shared_secret = os.getenv("CLOUDFLARE_WORKER_SHARED_SECRET")
     if not shared_secret:
         raise HTTPException(
@@ -53,54 +122,393 @@ async def verify_signature(request: Request, x_signature: str = Header(...)):
             detail="CLOUDFLARE_WORKER_SHARED_SECRET is not set",
         )
 
-    body = await request.body()
-    expected_signature = hmac.new(
-        shared_secret.encode(), body, hashlib.sha256
-    ).hexdigest()
+    mac = hmac.new(shared_secret.encode(), digestmod=hashlib.sha256)
+    parse_error: Optional[ValueError] = None
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_body_bytes:
+                raise _too_large(max_body_bytes)
+            mac.update(chunk)
+            if parse_error is not None:
+                # Keep hashing so a bad signature is still reported as 401
+                continue
+            try:
+                # Decoding + disk writes off the event loop
+                await asyncio.to_thread(parser.feed, chunk)
+            except PayloadTooLarge as e:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+            except ValueError as e:
+                parse_error = e
 
-    if not hmac.compare_digest(expected_signature, x_signature):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid signature"
-        )
+        if not hmac.compare_digest(mac.hexdigest(), x_signature):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid signature"
+            )
+        try:
+            if parse_error is not None:
+                raise parse_error
+            doc, _ = parser.result()
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Malformed JSON body: {e}")
+    except BaseException:
+        parser.discard()
+        raise
+    return doc
+
+
+async def read_signed_email(request: Request, x_signature: str = Header(...)) -> AsyncIterator[SignedEmail]:
+    """Verified single email; attachment blobs not committed by the endpoint are removed afterwards."""
+    parser = StreamingEmailParser(attachment_store, max_text_bytes=MAX_TEXT_BYTES, max_attachments=MAX_ATTACHMENTS)
+    doc = await _read_signed_body(request, x_signature, parser, MAX_BODY_BYTES)
+    try:
+        try:
+            payload = EmailPayload.model_validate(doc)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        yield SignedEmail(payload, parser)
+    finally:
+        # Replayed duplicates, insert conflicts and failures never commit their blobs
+        parser.discard()
+
+
+async def _replay(session: AsyncSession, response: Response, key: str, ticket_id: int, source: str) -> Optional[Ticket]:
+    """The ticket created by an earlier delivery of the same email, or None if it is gone."""
+    ticket = await session.get(Ticket, ticket_id)
+    if ticket is None:
+        recent_inbound_keys.forget(key)
+        return None
+    recent_inbound_keys.remember(key, ticket.id)
+    INBOUND_DUPLICATES.labels(source).inc()
+    response.status_code = status.HTTP_200_OK
+    response.headers["Idempotent-Replayed"] = "true"
+    return ticket
 
 
 @router.post(
     "/inbound",
     status_code=status.HTTP_201_CREATED,
     response_model=TicketOut,
-    dependencies=[Depends(verify_signature)],
 )
 async def receive_inbound_email(
-    payload: EmailPayload,
     background_tasks: BackgroundTasks,
+    response: Response,
+    email: SignedEmail = Depends(read_signed_email),
     session: AsyncSession = Depends(get_session),
 ):
     """
     Receives an inbound email from the Cloudflare worker, verifies the signature,
     and creates a new ticket.
+
+    Deliveries are idempotent: a retry of an email that already has a ticket
+    gets that ticket back with 200 and `Idempotent-Replayed: true`, without
+    classifying or drafting again.
     """
-    ticket_in = {"subject": payload.subject, "body": payload.text}
-    db_ticket = Ticket(**ticket_in)
-    session.add(db_ticket)
-    await session.commit()
-    await session.refresh(db_ticket)
-
-    # --- ADDED CLASSIFICATION LOGIC ---
-    # Classify the ticket synchronously and save the category
+    payload = email.payload
+    key = message_key(payload.messageId, payload.from_, payload.date, payload.subject, payload.text or payload.html or "")
+    while True:
+        ticket_id = await recent_inbound_keys.wait(key)
+        source = "memory"
+        if ticket_id is None:
+            ticket_id = await session.scalar(select(Ticket.id).where(Ticket.message_key == key))
+            source = "db"
+        if ticket_id is not None:
+            replayed = await _replay(session, response, key, ticket_id, source)
+            if replayed is not None:
+                return replayed
+        if recent_inbound_keys.begin(key):
+            break
+
     try:
-        category = await classify_ticket(db_ticket.subject, db_ticket.body)
-        db_ticket.category = category
+        db_ticket = await _create_ticket(email, key, background_tasks, session)
+        if db_ticket is None:
+            # Another worker stored the same email first
+            ticket_id = await session.scalar(select(Ticket.id).where(Ticket.message_key == key))
+            if ticket_id is not None:
+                db_ticket = await _replay(session, response, key, ticket_id, "conflict")
+            if db_ticket is None:
+                # Its key is stored but the ticket is not readable (deleted or archived)
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Email was already received but its ticket is no longer available",
+                )
+    except BaseException as e:
+        recent_inbound_keys.abort(key, e if isinstance(e, Exception) else RuntimeError("cancelled"))
+        raise
+    recent_inbound_keys.finish(key, db_ticket.id)
+    return db_ticket
+
+
+def _related_rows(
+    ticket_id: int, payload: EmailPayload, blobs: Dict[int, StoredBlob], prepared: PreparedEmail
+) -> Tuple[List[dict], List[dict]]:
+    """(attachments rows, raw_emails rows) for a new ticket."""
+    attachments = [
+        {
+            "ticket_id": ticket_id,
+            "filename": payload.attachments[index].filename,
+            "content_type": payload.attachments[index].contentType,
+            "sha256": blob.sha256,
+            "size": blob.size,
+        }
+        for index, blob in sorted(blobs.items())
+    ]
+    raw = []
+    if prepared.raw is not None:
+        raw.append({"ticket_id": ticket_id, "content": prepared.raw[0], "raw_size": prepared.raw[1]})
+    return attachments, raw
+
+
+async def _store_related(
+    session: AsyncSession, attachments: List[dict], raw_emails: List[dict], blobs: List[StoredBlob]
+) -> None:
+    """Insert attachment / raw email rows; on failure, remove the blobs they would have referenced."""
+    if not attachments and not raw_emails:
+        return
+    try:
+        if attachments:
+            await session.execute(insert(TicketAttachment), attachments)
+        if raw_emails:
+            await session.execute(insert(RawEmail), raw_emails)
         await session.commit()
-        await session.refresh(db_ticket)
-    except Exception as e:
-        # If classification fails, log it but don't crash the request
-        print(f"Error during classification for ticket {db_ticket.id}: {e}")
-    # --- END OF ADDED LOGIC ---
+    except BaseException:
+        await asyncio.to_thread(attachment_store.remove_created, blobs)
+        raise
+
+
+async def _create_ticket(
+    email: SignedEmail, key: str, background_tasks: BackgroundTasks, session: AsyncSession
+) -> Optional[Ticket]:
+    """Classify and store a new email; None if its key was inserted concurrently."""
+    payload = email.payload
+    prepared = await asyncio.to_thread(_prepare, payload)
+    label_set = await tenant_directory.for_recipients(payload.to)
+    values = {
+        "subject": payload.subject,
+        "body": prepared.body,
+        "message_key": key,
+        "tenant": label_set.tenant if label_set else None,
+    }
+    if TICKET_INGEST_MODE == "deferred":
+        values.update(triage(payload.subject, prepared.body))
+        db_ticket = await insert_ticket(session, values, endpoint="email_inbound", idempotent=True)
+        if db_ticket is not None:
+            blobs = await asyncio.to_thread(email.parser.commit)
+            await _store_related(session, *_related_rows(db_ticket.id, payload, blobs, prepared), list(blobs.values()))
+            defer_classification(db_ticket.id, background_tasks)
+        return db_ticket
 
+    async with classification_slot("email_inbound") as admitted:
+        # Classify first so the ticket is stored with its category in one round-trip
+        if admitted:
+            classified = await classify_for_insert(
+                payload.subject, prepared.body, span_name="email.inbound", label_set=label_set
+            )
+        else:
+            classified = triage(payload.subject, prepared.body)
+    db_ticket = await insert_ticket(session, {**values, **classified}, endpoint="email_inbound", idempotent=True)
+    if db_ticket is None:
+        return None
+    blobs = await asyncio.to_thread(email.parser.commit)
+    await _store_related(session, *_related_rows(db_ticket.id, payload, blobs, prepared), list(blobs.values()))
+
+    if "category" not in classified:
+        # Overloaded or classification failed: classify and draft in the background
+        defer_classification(db_ticket.id, background_tasks)
+        return db_ticket
+    await publish_ticket_event("ticket.classified", db_ticket.id, category=db_ticket.category)
 
     # Start response generation in the background
-    background_tasks.add_task(
-        draft_and_store_response, db_ticket.id, AsyncSessionLocal
+    schedule_draft(db_ticket.id, background_tasks, db_ticket.priority)
+
+    return db_ticket
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    # "created", "duplicate", "invalid" or "failed" (retry this item)
+    status: str
+    ticket: Optional[TicketOut] = None
+    error: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    results: List[BatchItemResult]
+
+
+async def read_signed_batch(
+    request: Request, x_signature: str = Header(...)
+) -> AsyncIterator[Tuple[dict, StreamingEmailParser]]:
+    """Verified `{"emails": [...]}` body (items not yet validated) and its pending blobs."""
+    parser = StreamingEmailParser(
+        attachment_store,
+        max_text_bytes=INBOUND_BATCH_MAX_TEXT_BYTES,
+        batch_key="emails",
+        max_attachments=MAX_ATTACHMENTS,
     )
+    doc = await _read_signed_body(request, x_signature, parser, INBOUND_BATCH_MAX_BODY_BYTES)
+    try:
+        emails = doc.get("emails")
+        if not isinstance(emails, list) or len(emails) > INBOUND_BATCH_MAX_ITEMS:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Expected {{\"emails\": [...]}} with at most {INBOUND_BATCH_MAX_ITEMS} items",
+            )
+        yield doc, parser
+    finally:
+        # Blobs of duplicate, invalid or failed items
+        parser.discard()
+
+
+@router.post("/inbound/batch", response_model=BatchResult)
+async def receive_inbound_email_batch(
+    background_tasks: BackgroundTasks,
+    batch: Tuple[dict, StreamingEmailParser] = Depends(read_signed_batch),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Receives many emails in one signed request (`{"emails": [EmailPayload, ...]}`).
+
+    New emails are classified in one batched inference call and stored with a
+    single INSERT. The answer has one result per input item, in order; only
+    items with status "failed" need to be sent again.
+    """
+    doc, parser = batch
+    results: List[Optional[BatchItemResult]] = [None] * len(doc["emails"])
+
+    # Validate items and resolve keys; the first occurrence of a key owns it
+    payloads: Dict[int, EmailPayload] = {}
+    keys: Dict[str, int] = {}
+    repeats: Dict[int, int] = {}
+    for index, item in enumerate(doc["emails"]):
+        try:
+            payload = EmailPayload.model_validate(item)
+        except ValidationError as e:
+            results[index] = BatchItemResult(index=index, status="invalid", error=str(e))
+            continue
+        key = message_key(payload.messageId, payload.from_, payload.date, payload.subject, payload.text or payload.html or "")
+        if key in keys:
+            repeats[index] = keys[key]
+            continue
+        keys[key] = index
+        payloads[index] = payload
+
+    known = {key: recent_inbound_keys.get(key) for key in keys}
+    unknown = [key for key, ticket_id in known.items() if ticket_id is None]
+    if unknown:
+        rows = await session.execute(select(Ticket.message_key, Ticket.id).where(Ticket.message_key.in_(unknown)))
+        known.update({key: ticket_id for key, ticket_id in rows.all()})
+    existing = {key: ticket_id for key, ticket_id in known.items() if ticket_id is not None}
+    INBOUND_DUPLICATES.labels("batch").inc(len(existing))
+
+    owned = [key for key in keys if key not in existing and recent_inbound_keys.begin(key)]
+    # Keys another request is processing right now
+    in_flight = [key for key in keys if key not in existing and key not in owned]
+
+    try:
+        created = await _create_batch(
+            [(key, payloads[keys[key]], keys[key]) for key in owned], parser, background_tasks, session
+        )
+    except BaseException as e:
+        for key in owned:
+            recent_inbound_keys.abort(key, e if isinstance(e, Exception) else RuntimeError("cancelled"))
+        raise
+    for key in owned:
+        if key in created:
+            recent_inbound_keys.finish(key, created[key].id)
+        else:
+            # Stored concurrently by another worker
+            recent_inbound_keys.abort(key, RuntimeError("conflict"))
+            in_flight.append(key)
+
+    for key in in_flight:
+        ticket_id = await recent_inbound_keys.wait(key)
+        if ticket_id is None:
+            ticket_id = await session.scalar(select(Ticket.id).where(Ticket.message_key == key))
+        if ticket_id is not None:
+            existing[key] = ticket_id
+
+    tickets = {t.id: t for t in created.values()}
+    missing = [ticket_id for ticket_id in existing.values() if ticket_id not in tickets]
+    if missing:
+        rows = await session.execute(select(Ticket).where(Ticket.id.in_(missing)))
+        tickets.update({t.id: t for t in rows.scalars().all()})
+
+    for key, index in keys.items():
+        if key in created:
+            results[index] = BatchItemResult(index=index, status="created", ticket=created[key])
+        elif existing.get(key) in tickets:
+            recent_inbound_keys.remember(key, existing[key])
+            results[index] = BatchItemResult(index=index, status="duplicate", ticket=tickets[existing[key]])
+        else:
+            results[index] = BatchItemResult(index=index, status="failed", error="Not stored, retry this item")
+    for index, first in repeats.items():
+        result = results[first]
+        if result.ticket is not None:
+            result = BatchItemResult(index=index, status="duplicate", ticket=result.ticket)
+        else:
+            result = result.model_copy(update={"index": index})
+        results[index] = result
+    return BatchResult(results=results)
+
+
+async def _create_batch(
+    items: List[Tuple[str, EmailPayload, int]],
+    parser: StreamingEmailParser,
+    background_tasks: BackgroundTasks,
+    session: AsyncSession,
+) -> Dict[str, Ticket]:
+    """Classify and store new emails (key, payload, index in the batch) in one pass; returns the created tickets by key."""
+    if not items:
+        return {}
+    prepared = await asyncio.to_thread(lambda: [_prepare(payload) for _, payload, _ in items])
+    texts = [(payload.subject, p.body) for (_, payload, _), p in zip(items, prepared)]
+    label_sets = [await tenant_directory.for_recipients(payload.to) for _, payload, _ in items]
+    classified: Optional[List[dict]] = None
+    if TICKET_INGEST_MODE != "deferred":
+        async with classification_slot("email_inbound_batch") as admitted:
+            if admitted:
+                # Mixed tenants still make one inference call
+                classified = await classify_many_for_insert(texts, span_name="email.inbound_batch", label_sets=label_sets)
+    if classified is None:
+        classified = [triage(subject, body) for subject, body in texts]
+    rows = [
+        {
+            "subject": payload.subject,
+            "body": p.body,
+            "message_key": key,
+            "tenant": label_set.tenant if label_set else None,
+            "category": labels.get("category"),
+            "classifier_version": labels.get("classifier_version"),
+            "language": labels["language"],
+            "priority": labels["priority"],
+        }
+        for (key, payload, _), p, labels, label_set in zip(items, prepared, classified, label_sets)
+    ]
+    created = {
+        t.message_key: t
+        for t in await insert_tickets(session, rows, endpoint="email_inbound_batch", idempotent=True)
+    }
 
-    return db_ticket
\ No newline at end of file
+    by_key = {key: (payload, index, p) for (key, payload, index), p in zip(items, prepared)}
+    # Only emails that became tickets keep their attachments
+    blobs = await asyncio.to_thread(parser.commit, [by_key[key][1] for key in created])
+    email_blobs: Dict[int, Dict[int, StoredBlob]] = defaultdict(dict)
+    for (email_index, attachment_index), blob in blobs.items():
+        email_blobs[email_index][attachment_index] = blob
+    attachments: List[dict] = []
+    raw_emails: List[dict] = []
+    for key, t in created.items():
+        payload, index, p = by_key[key]
+        item_attachments, item_raw = _related_rows(t.id, payload, email_blobs.get(index, {}), p)
+        attachments += item_attachments
+        raw_emails += item_raw
+    await _store_related(session, attachments, raw_emails, list(blobs.values()))
+    for t in created.values():
+        if t.category is None:
+            defer_classification(t.id, background_tasks)
+            continue
+        await publish_ticket_event("ticket.classified", t.id, category=t.category)
+        schedule_draft(t.id, background_tasks, t.priority)
+    return created
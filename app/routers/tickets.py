@@ -1,49 +1,195 @@
 # app/routers/tickets.py
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, status, BackgroundTasks
+from fastapi import Response as HTTPResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import AsyncGenerator # Ensure this is imported if not already
+from typing import AsyncGenerator, Optional # Ensure this is imported if not already
 from app.db.database import AsyncSessionLocal
-from app.db.models import Ticket, Response  
+from app.db.routing import get_read_session, get_write_session
+from app.db.models import InboundMessageKey, Ticket, Response
 from app import schemas
-from sqlalchemy import select # Ensure select is imported
-from app.services.classifier import classify_ticket, get_model_info
-from app.services.response_gen import generate_response
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.services.classifier import (
+    LabelSet,
+    classify_batch_scored,
+    classify_ticket_scored,
+    get_classifier_version,
+    get_model_info,
+)
+from app.services.llm_client import CircuitOpenError, LLMError, llm_caller
+from app.services.response_gen import generate_response, generate_response_streaming
+from app.services.admission import (
+    ADMISSION_DEGRADED,
+    ADMISSION_REJECTED,
+    CLASSIFY_OVERLOAD_MODE,
+    AdmissionRejected,
+    classification_admission,
+)
+from app.services.classification_stage import classification_stage
+from app.services.events import DeltaPublisher, publish_ticket_event
+from app.services.draft_cache import draft_cache
+from app.services.read_cache import READ_CACHE_LOOKUPS, etag_matches, read_cache
+from app.services.batch_drafting import DRAFT_MODE
+from app.services.partitions import get_recent_ticket
+from app.services.tenants import tenant_directory
+from app.services.triage import triage
+from contextlib import asynccontextmanager
+import asyncio
 import logging # Added for logging
+import os
 import traceback # Added for full traceback
 import time
 from opentelemetry import trace
+from prometheus_client import Histogram
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+TICKET_INSERT_DB_SECONDS = Histogram(
+    "ticket_insert_db_seconds",
+    "Database time to persist new tickets (one INSERT ... RETURNING + COMMIT; a whole batch on batch endpoints)",
+    labelnames=("endpoint",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+
+# "sync": classify before returning 201 (default)
+# "deferred": return right after the insert; the batched stage classifies, then drafts
+TICKET_INGEST_MODE = os.getenv("TICKET_INGEST_MODE", "sync").lower()
+# Upper bound for GET /tickets/{id}/category?wait=...
+MAX_CATEGORY_WAIT_SECONDS = 30.0
+# Stream draft tokens to event subscribers while generating; the final text
+# is still stored with a single INSERT once the stream ends
+DRAFT_STREAMING = os.getenv("DRAFT_STREAMING", "0") == "1"
+DRAFT_STREAM_FLUSH_SECONDS = float(os.getenv("DRAFT_STREAM_FLUSH_MS", "100")) / 1000.0
+# In-process re-drafts of one ticket while the LLM circuit is open; after
+# that (or after a restart) the draft recovery sweep picks the ticket up
+DRAFT_CIRCUIT_RETRIES = int(os.getenv("DRAFT_CIRCUIT_RETRIES", "3"))
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
 
-async def draft_and_store_response(ticket_id: int, session_maker):
-    logger.warning(f"Background task 'draft_and_store_response' started for ticket_id: {ticket_id}")
+@asynccontextmanager
+async def classification_slot(endpoint: str):
+    """Admission control around synchronous classification.
+
+    Yields True when the caller may classify inline. When the stage is
+    saturated, either raises 503 with Retry-After (reject mode) or yields
+    False so the caller stores the ticket and classifies later (defer mode).
+    Acquired before the insert, so a rejected request leaves no row behind.
+    """
+    try:
+        await classification_admission.acquire()
+    except AdmissionRejected as e:
+        if CLASSIFY_OVERLOAD_MODE == "defer":
+            ADMISSION_DEGRADED.labels(endpoint=endpoint, reason=e.reason).inc()
+            yield False
+            return
+        ADMISSION_REJECTED.labels(endpoint=endpoint, reason=e.reason).inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Classification capacity exceeded, retry later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    start = time.perf_counter()
+    try:
+        yield True
+    finally:
+        classification_admission.release(held_for=time.perf_counter() - start)
+
+
+# Drafts waiting for the LLM circuit breaker; referenced so they are not GC'd
+_draft_retries: set[asyncio.Task] = set()
+
+
+def retry_draft_later(ticket_id: int, session_maker, use_cache: bool = True, retry: int = 1) -> None:
+    """Draft again once the LLM circuit breaker may let a probe through."""
+
+    async def run():
+        await asyncio.sleep(llm_caller.breaker.reset_timeout)
+        await draft_and_store_response(ticket_id, session_maker, use_cache, retry=retry)
+
+    task = asyncio.create_task(run())
+    _draft_retries.add(task)
+    task.add_done_callback(_draft_retries.discard)
+
+
+async def draft_and_store_response(ticket_id: int, session_maker, use_cache: bool = True, retry: int = 0):
+    logger.warning(
+        "Background task 'draft_and_store_response' started for ticket_id: %s", ticket_id,
+        extra={"ticket_id": ticket_id, "event_type": "draft.started"},
+    )
+    category_for_response = None
+    source, source_response_id = "llm", None
     async with session_maker() as session:
         try:
-            ticket = await session.get(Ticket, ticket_id)
+            ticket = await get_recent_ticket(session, ticket_id)
             if not ticket:
                 logger.error(f"Ticket {ticket_id} not found in background task 'draft_and_store_response'.")
                 return
 
-            logger.warning(f"Generating OpenAI response for ticket {ticket_id} - Subject: {ticket.subject[:30]}...")
+            logger.warning(
+                "Generating OpenAI response for ticket %s - Subject: %.30s...", ticket_id, ticket.subject,
+                extra={"ticket_id": ticket_id, "event_type": "draft.generating"},
+            )
             # Pass the category if it's available, otherwise "Other" or None.
             # The classification task might not have completed yet.
             # generate_response should handle a None category if necessary.
             category_for_response = ticket.category if ticket.category else "Other"
-            response_text = await generate_response(
-                ticket.subject, ticket.body, category_for_response
-            )
-            
-            if "Error:" in response_text: # Check if generate_response itself returned an error string
+            cached = None
+            if use_cache:
+                cached = await draft_cache.lookup(
+                    session, ticket.subject, ticket.body, category_for_response, ticket.language
+                )
+            generation_start = time.perf_counter()
+            current_status = "completed"
+            try:
+                if cached is not None:
+                    logger.warning(
+                        "Reusing %s draft for ticket %s (from response %s).", cached.source, ticket_id, cached.response_id,
+                        extra={"ticket_id": ticket_id, "event_type": "draft.reused"},
+                    )
+                    response_text = cached.text
+                    source, source_response_id = cached.source, cached.response_id
+                elif DRAFT_STREAMING:
+                    deltas = DeltaPublisher(ticket_id, interval=DRAFT_STREAM_FLUSH_SECONDS)
+                    try:
+                        response_text = await generate_response_streaming(
+                            ticket.subject, ticket.body, category_for_response,
+                            on_delta=deltas.add, language=ticket.language,
+                        )
+                    finally:
+                        await deltas.flush()
+                else:
+                    response_text = await generate_response(
+                        ticket.subject, ticket.body, category_for_response, ticket.language
+                    )
+            except CircuitOpenError:
+                # A failed draft is never retried: leave the ticket pending instead
+                if retry < DRAFT_CIRCUIT_RETRIES:
+                    logger.warning(
+                        "LLM circuit open; retrying the draft for ticket %s later.", ticket_id,
+                        extra={"ticket_id": ticket_id, "event_type": "draft.deferred"},
+                    )
+                    retry_draft_later(ticket_id, session_maker, use_cache, retry + 1)
+                else:
+                    logger.warning(
+                        "LLM circuit still open; leaving the draft for ticket %s to the recovery sweep.", ticket_id,
+                        extra={"ticket_id": ticket_id, "event_type": "draft.deferred"},
+                    )
+                return
+            except LLMError as e:
                 current_status = "failed"
-                logger.error(f"Response generation for ticket {ticket_id} indicated failure: {response_text}")
-            else:
-                current_status = "completed"
-                logger.warning(f"Response generation for ticket {ticket_id} completed.")
+                response_text = f"Error: {e}"
+                logger.error(f"Response generation for ticket {ticket_id} failed ({e.kind}): {e}")
+            generation_seconds = time.perf_counter() - generation_start
+
+            if current_status == "completed":
+                logger.warning(
+                    "Response generation for ticket %s completed.", ticket_id,
+                    extra={"ticket_id": ticket_id, "event_type": "draft.generated"},
+                )
 
         except Exception as e:
             logger.error(f"EXCEPTION in draft_and_store_response for ticket {ticket_id}: {e}")
@@ -51,37 +197,82 @@ async def draft_and_store_response(ticket_id: int, session_maker):
             response_text = f"Response generation failed due to an unexpected error: {str(e)}"
             current_status = "failed"
         
-        logger.warning(f"Attempting to store response for ticket {ticket_id} with status: {current_status}")
+        logger.warning(
+            "Attempting to store response for ticket %s with status: %s", ticket_id, current_status,
+            extra={"ticket_id": ticket_id, "event_type": "draft.storing"},
+        )
         try:
             resp = Response(
                 ticket_id=ticket_id,
                 generated_response=response_text,
                 reviewed=False,
                 sent=False,
-                status=current_status
+                status=current_status,
+                source=source,
+                source_response_id=source_response_id,
             )
             session.add(resp)
             await session.commit()
             await session.refresh(resp)
-            logger.warning(f"Response for ticket {ticket_id} stored successfully with ID: {resp.id}")
+            logger.warning(
+                "Response for ticket %s stored successfully with ID: %s", ticket_id, resp.id,
+                extra={"ticket_id": ticket_id, "event_type": "draft.stored"},
+            )
+            if current_status == "completed" and source == "llm":
+                draft_cache.put(
+                    ticket.subject, ticket.body, category_for_response,
+                    response_text, resp.id, generation_seconds, language=ticket.language,
+                )
+            await publish_ticket_event(
+                f"response.{current_status}",
+                ticket_id,
+                response_id=resp.id,
+                status=current_status,
+                category=category_for_response,
+                generated_response=response_text,
+            )
         except Exception as e_db:
             logger.error(f"EXCEPTION storing response for ticket {ticket_id} to DB: {e_db}")
             traceback.print_exc()
             await session.rollback()
 
 
-async def classify_and_update_ticket(ticket_id: int, session_maker):
-    logger.warning(f"Background task 'classify_and_update_ticket' started for ticket_id: {ticket_id}")
+async def classify_and_update_ticket(ticket_id: int, session_maker) -> Optional[str]:
+    """Classify and triage a stored ticket; returns its priority (None if it failed)."""
+    logger.warning(
+        "Background task 'classify_and_update_ticket' started for ticket_id: %s", ticket_id,
+        extra={"ticket_id": ticket_id, "event_type": "classify.started"},
+    )
     async with session_maker() as session:
         try:
-            ticket = await session.get(Ticket, ticket_id)
+            ticket = await get_recent_ticket(session, ticket_id)
             if ticket is not None:
-                logger.warning(f"Classifying ticket {ticket_id} - Subject: {ticket.subject[:30]}...")
-                category = await classify_ticket(ticket.subject, ticket.body)
+                logger.warning(
+                    "Classifying ticket %s - Subject: %.30s...", ticket_id, ticket.subject,
+                    extra={"ticket_id": ticket_id, "event_type": "classify.running"},
+                )
+                label_set = await tenant_directory.for_tenant(ticket.tenant)
+                # Deferred work waits its turn for a model slot but is never shed
+                await classification_admission.acquire(deadline=None, shed=False)
+                start = time.perf_counter()
+                try:
+                    category, score = await classify_ticket_scored(ticket.subject, ticket.body, label_set)
+                finally:
+                    classification_admission.release(held_for=time.perf_counter() - start)
                 # setattr avoids Pylance Column typing confusion
                 setattr(ticket, "category", category)
+                setattr(ticket, "classifier_version", get_classifier_version(label_set))
+                for column, value in triage(
+                    ticket.subject, ticket.body, category, score, language=ticket.language, priority=ticket.priority
+                ).items():
+                    setattr(ticket, column, value)
                 await session.commit()
-                logger.warning(f"Ticket {ticket_id} category updated to: {category}")
+                logger.warning(
+                    "Ticket %s category updated to: %s", ticket_id, category,
+                    extra={"ticket_id": ticket_id, "event_type": "ticket.classified"},
+                )
+                await publish_ticket_event("ticket.classified", ticket_id, category=category)
+                return ticket.priority
             else:
                 logger.error(f"Ticket {ticket_id} not found in classify_and_update_ticket task.")
         except Exception as e:
@@ -90,78 +281,296 @@ async def classify_and_update_ticket(ticket_id: int, session_maker):
             await session.rollback()
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.TicketOut)
-async def create_ticket(
-    ticket_in: schemas.TicketIn,
-    background_tasks: BackgroundTasks,
-    session: AsyncSession = Depends(get_session)
-):
-    logger.warning(f"Creating ticket with subject: {ticket_in.subject[:30]}...")
-    db_ticket = Ticket(**ticket_in.model_dump())
-    session.add(db_ticket)
+async def classify_then_draft(ticket_id: int, session_maker):
+    """Degraded-mode follow-up: classify a stored ticket, then draft a reply."""
+    priority = await classify_and_update_ticket(ticket_id, session_maker)
+    if priority is None:
+        # Classification failed: the ticket stays uncategorised for the
+        # classification stage's sweep, which drafts once it has a category
+        return
+    # Mirrors schedule_draft: the batch drafter leaves urgent tickets to this path
+    if DRAFT_MODE != "batch" or priority == "urgent":
+        await draft_and_store_response(ticket_id, session_maker)
+
+
+def schedule_draft(ticket_id: int, background_tasks: BackgroundTasks, priority: Optional[str] = None) -> None:
+    """Draft a reply after the request; in batch mode the periodic drafter does it.
+
+    Urgent tickets skip the batch window and are drafted right away.
+    """
+    if DRAFT_MODE == "batch" and priority != "urgent":
+        return
+    background_tasks.add_task(draft_and_store_response, ticket_id, AsyncSessionLocal)
+
+
+def defer_classification(ticket_id: int, background_tasks: BackgroundTasks) -> None:
+    """Classify a stored ticket later; drafting starts once the category is known.
+
+    Uses the batched classification stage when it is running (app lifespan),
+    otherwise falls back to a per-ticket background task.
+    """
+    if classification_stage.running:
+        classification_stage.submit(ticket_id)
+    else:
+        background_tasks.add_task(classify_then_draft, ticket_id, AsyncSessionLocal)
+
+
+async def _claim_message_keys(session: AsyncSession, rows: list[dict]) -> list[dict]:
+    """Rows whose message_key this transaction claimed (first row per key)."""
+    keys = list(dict.fromkeys(row["message_key"] for row in rows))
+    stmt = (pg_insert if session.bind.dialect.name == "postgresql" else sqlite_insert)(InboundMessageKey)
+    stmt = stmt.values([{"message_key": key} for key in keys]).on_conflict_do_nothing()
+    claimed = set((await session.execute(stmt.returning(InboundMessageKey.message_key))).scalars())
+    unique_rows = []
+    for row in rows:
+        if row["message_key"] in claimed:
+            claimed.discard(row["message_key"])
+            unique_rows.append(row)
+    return unique_rows
+
+
+async def insert_tickets(
+    session: AsyncSession, rows: list[dict], endpoint: str = "tickets", idempotent: bool = False
+) -> list[Ticket]:
+    """Persist tickets with one (multi-row) INSERT ... RETURNING and commit.
+
+    The returned rows carry server defaults (id, created_at), so no
+    follow-up SELECT/refresh is needed. Tables must already exist; they are
+    created at startup, not on the request path.
+
+    With `idempotent=True` each row's message_key is first claimed in
+    `inbound_message_keys` (INSERT ... ON CONFLICT DO NOTHING, same
+    transaction), and rows whose key already exists are missing from the
+    result. Returned rows are not guaranteed to be in input order.
+    """
+    if not rows:
+        return []
+    start = time.perf_counter()
     try:
+        if idempotent:
+            rows = await _claim_message_keys(session, rows)
+        db_tickets = []
+        if rows:
+            stmt = insert(Ticket).values(rows).returning(Ticket)
+            db_tickets = list((await session.execute(stmt)).scalars().all())
         await session.commit()
-    except Exception as e:
-        # On first run in certain CI flows, tables may not be initialized yet.
-        # Attempt to initialize schema and retry once.
-        from sqlalchemy.exc import OperationalError
-        if isinstance(e, OperationalError) and "no such table" in str(e).lower():
-            await session.rollback()
-            try:
-                from app.db.database import engine
-                from app.db.models import Base
-                async with engine.begin() as conn:
-                    await conn.run_sync(Base.metadata.create_all)
-                session.add(db_ticket)
-                await session.commit()
-            except Exception:
-                await session.rollback()
-                raise
-        else:
-            await session.rollback()
-            raise
-    await session.refresh(db_ticket)
-    logger.warning(f"Ticket {db_ticket.id} created. Classifying and scheduling background tasks.")
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        TICKET_INSERT_DB_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+    return db_tickets
+
+
+async def insert_ticket(
+    session: AsyncSession, values: dict, endpoint: str = "tickets", idempotent: bool = False
+) -> Optional[Ticket]:
+    """Single-ticket `insert_tickets`; None when `idempotent` and the key already exists."""
+    db_tickets = await insert_tickets(session, [values], endpoint=endpoint, idempotent=idempotent)
+    return db_tickets[0] if db_tickets else None
 
-    # Classify synchronously to capture span attributes and set category immediately
+
+async def classify_for_insert(
+    subject: str,
+    body: str,
+    span_name: str = "tickets.create",
+    language: Optional[str] = None,
+    priority: Optional[str] = None,
+    label_set: Optional[LabelSet] = None,
+) -> dict:
+    """Classify (with the tenant's `label_set`, if any) and triage before the insert.
+
+    Returns the category, language and priority columns. Without "category"
+    (classification failed) the caller defers classification.
+    """
     tracer = trace.get_tracer(__name__)
     info = get_model_info()
     start = time.perf_counter()
     label = "Unknown"
     try:
-        label = await classify_ticket(ticket_in.subject, ticket_in.body)
-        setattr(db_ticket, "category", label)
-        await session.commit()
+        label, score = await classify_ticket_scored(subject, body, label_set)
+        return {
+            "category": label,
+            "classifier_version": get_classifier_version(label_set),
+            **triage(subject, body, label, score, language=language, priority=priority),
+        }
+    except Exception as e:
+        logger.error(f"Classification failed before insert, deferring it: {e}")
+        return triage(subject, body, language=language, priority=priority)
     finally:
         latency_ms = int((time.perf_counter() - start) * 1000)
-        with tracer.start_as_current_span("tickets.create") as span:
+        with tracer.start_as_current_span(span_name) as span:
             span.set_attribute("classifier.backend", info.get("backend", "unknown"))
             span.set_attribute("classifier.model", info.get("model", "unknown"))
             span.set_attribute("classifier.device", info.get("device", "cpu"))
             span.set_attribute("latency_ms", latency_ms)
             span.set_attribute("label", label)
-    
-    # Start response generation in background, in parallel
-    background_tasks.add_task(
-        draft_and_store_response, db_ticket.id, AsyncSessionLocal # <<<--- THIS LINE IS ADDED/ENSURED
+
+
+async def classify_many_for_insert(
+    items: list[tuple[str, str]],
+    span_name: str = "tickets.create_batch",
+    label_sets: Optional[list[Optional[LabelSet]]] = None,
+) -> list[dict]:
+    """Batched `classify_for_insert`: one inference call, whatever the tenants; no "category" keys when it fails."""
+    tracer = trace.get_tracer(__name__)
+    info = get_model_info()
+    start = time.perf_counter()
+    label_sets = label_sets or [None] * len(items)
+    try:
+        scored = await classify_batch_scored(items, label_sets=label_sets)
+        versions = {label_set: get_classifier_version(label_set) for label_set in set(label_sets)}
+        return [
+            {"category": label, "classifier_version": versions[label_set], **triage(subject, body, label, score)}
+            for (subject, body), (label, score), label_set in zip(items, scored, label_sets)
+        ]
+    except Exception as e:
+        logger.error(f"Batch classification failed before insert, deferring it: {e}")
+        return [triage(subject, body) for subject, body in items]
+    finally:
+        with tracer.start_as_current_span(span_name) as span:
+            span.set_attribute("classifier.backend", info.get("backend", "unknown"))
+            span.set_attribute("classifier.model", info.get("model", "unknown"))
+            span.set_attribute("batch_size", len(items))
+            span.set_attribute("latency_ms", int((time.perf_counter() - start) * 1000))
+
+
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.TicketOut)
+async def create_ticket(
+    ticket_in: schemas.TicketIn,
+    background_tasks: BackgroundTasks,
+    session: AsyncSession = Depends(get_write_session)
+):
+    logger.warning("Creating ticket with subject: %.30s...", ticket_in.subject, extra={"event_type": "ticket.creating"})
+    label_set = await tenant_directory.for_tenant(ticket_in.tenant)
+    if ticket_in.tenant is not None and label_set is None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Unknown tenant {ticket_in.tenant!r}")
+    values = ticket_in.model_dump()
+    if TICKET_INGEST_MODE == "deferred":
+        values.update(triage(ticket_in.subject, ticket_in.body, language=ticket_in.language, priority=ticket_in.priority))
+        db_ticket = await insert_ticket(session, values)
+        logger.warning(
+            "Ticket %s created. Classification deferred to the batch stage.", db_ticket.id,
+            extra={"ticket_id": db_ticket.id, "event_type": "ticket.created"},
+        )
+        defer_classification(db_ticket.id, background_tasks)
+        return db_ticket
+
+    async with classification_slot("tickets") as admitted:
+        # Classify first so the ticket is stored with its category in one round-trip
+        if admitted:
+            classified = await classify_for_insert(
+                ticket_in.subject, ticket_in.body, language=ticket_in.language, priority=ticket_in.priority,
+                label_set=label_set,
+            )
+        else:
+            classified = triage(ticket_in.subject, ticket_in.body, language=ticket_in.language, priority=ticket_in.priority)
+    db_ticket = await insert_ticket(session, {**values, **classified})
+
+    if "category" not in classified:
+        # Overloaded or classification failed: category pending; classify, then draft
+        logger.warning(
+            "Ticket %s created without a category. Classification deferred.", db_ticket.id,
+            extra={"ticket_id": db_ticket.id, "event_type": "ticket.created"},
+        )
+        defer_classification(db_ticket.id, background_tasks)
+        return db_ticket
+
+    logger.warning(
+        "Ticket %s created as %s. Scheduling background tasks.", db_ticket.id, db_ticket.category,
+        extra={"ticket_id": db_ticket.id, "event_type": "ticket.created"},
     )
+    await publish_ticket_event("ticket.classified", db_ticket.id, category=db_ticket.category)
+
+    # Start response generation in background, in parallel
+    schedule_draft(db_ticket.id, background_tasks, db_ticket.priority)
 
     return db_ticket
 
 
 @router.get("/", response_model=list[schemas.TicketOut])
-async def list_tickets(limit: int = 50, offset: int = 0, session: AsyncSession = Depends(get_session)):
+async def list_tickets(
+    limit: int = 50,
+    offset: int = 0,
+    priority: Optional[str] = None,
+    language: Optional[str] = None,
+    tenant: Optional[str] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    query = select(Ticket)
+    if tenant is not None:
+        query = query.where(Ticket.tenant == tenant)
+    if priority is not None:
+        query = query.where(Ticket.priority == priority)
+    if language is not None:
+        query = query.where(Ticket.language == language)
     result = await session.execute(
-        select(Ticket).order_by(Ticket.id.desc()).offset(offset).limit(limit) # Added order_by
+        query.order_by(Ticket.id.desc()).offset(offset).limit(limit) # Added order_by
     )
     tickets = result.scalars().all()
     return tickets
 
+async def cached_json(request: Request, kind: str, ticket_id: int, load) -> HTTPResponse:
+    """Serve a ticket payload from the read cache, with ETag / If-None-Match.
+
+    `load` runs only on a cache miss and returns the JSON-ready payload.
+    Clients pinned to the primary (read-your-writes) skip the lookup, and
+    only primary reads are stored.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    pinned = getattr(request.state, "read_reason", None) == "read_your_writes"
+    cached = None if pinned else read_cache.get(kind, ticket_id)
+    if cached is None:
+        version = read_cache.version(ticket_id)
+        from_primary = getattr(request.state, "read_target", "primary") == "primary"
+        etag, body = read_cache.put(kind, ticket_id, await load(), version, store=from_primary)
+        result = "miss"
+    else:
+        etag, body = cached
+        result = "hit"
+    if etag_matches(if_none_match, etag):
+        READ_CACHE_LOOKUPS.labels(kind, "not_modified").inc()
+        return HTTPResponse(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    READ_CACHE_LOOKUPS.labels(kind, result).inc()
+    return HTTPResponse(content=body, media_type="application/json", headers={"ETag": etag})
+
+
 @router.get("/{ticket_id}", response_model=schemas.TicketOut)
-async def get_ticket(ticket_id: int, session: AsyncSession = Depends(get_session)):
-    ticket = await session.get(Ticket, ticket_id)
+async def get_ticket(ticket_id: int, request: Request, session: AsyncSession = Depends(get_read_session)):
+    async def load():
+        ticket = await session.get(Ticket, ticket_id)
+        if ticket is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+        return schemas.TicketOut.model_validate(ticket).model_dump(mode="json")
+
+    return await cached_json(request, "ticket", ticket_id, load)
+
+async def _load_ticket(ticket_id: int) -> Optional[Ticket]:
+    async with AsyncSessionLocal() as session:
+        return await session.get(Ticket, ticket_id)
+
+
+@router.get("/{ticket_id}/category", response_model=schemas.TicketOut)
+async def wait_for_category(ticket_id: int, wait: float = 0.0):
+    """Long-poll for a deferred ticket's category.
+
+    Returns as soon as the category is set, or after `wait` seconds (capped)
+    with `category: null` if it is still pending. Each check uses its own
+    short-lived session, so a waiting client does not hold a pool connection.
+    """
+    ticket = await _load_ticket(ticket_id)
     if ticket is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+    deadline = time.monotonic() + min(max(wait, 0.0), MAX_CATEGORY_WAIT_SECONDS)
+    while ticket.category is None and time.monotonic() < deadline:
+        # Wake immediately if this process classified it; otherwise re-check
+        # the row periodically (another worker may have done it)
+        remaining = deadline - time.monotonic()
+        if classification_stage.running:
+            await classification_stage.wait_for(ticket_id, timeout=min(remaining, 1.0))
+        else:
+            await asyncio.sleep(min(remaining, 0.25))
+        ticket = await _load_ticket(ticket_id) or ticket
     return ticket
 
 # This endpoint can still be useful for manually re-triggering a response if needed,
@@ -170,7 +579,7 @@ async def get_ticket(ticket_id: int, session: AsyncSession = Depends(get_session
 async def respond_to_ticket(
     ticket_id: int,
     background_tasks: BackgroundTasks,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_write_session),
 ):
     logger.warning(f"Received request to MANUALLY respond to ticket_id: {ticket_id}")
     ticket = await session.get(Ticket, ticket_id)
@@ -179,14 +588,18 @@ async def respond_to_ticket(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
 
     logger.warning(f"Scheduling 'draft_and_store_response' for ticket {ticket_id} (manual trigger).")
-    background_tasks.add_task(draft_and_store_response, ticket_id, AsyncSessionLocal)
+    # A manual re-trigger asks for a fresh draft, so skip the draft cache
+    background_tasks.add_task(draft_and_store_response, ticket_id, AsyncSessionLocal, use_cache=False)
 
     return {"message": "Response generation has been re-initiated in the background."}
 
 @router.get("/{ticket_id}/responses", response_model=list[schemas.ResponseOut])
-async def get_ticket_responses(ticket_id: int, session: AsyncSession = Depends(get_session)):
-    result = await session.execute(
-        select(Response).where(Response.ticket_id == ticket_id).order_by(Response.created_at.desc()) # Added order_by
-    )
-    responses = result.scalars().all()
-    return responses
+async def get_ticket_responses(ticket_id: int, request: Request, session: AsyncSession = Depends(get_read_session)):
+    async def load():
+        result = await session.execute(
+            select(Response).where(Response.ticket_id == ticket_id).order_by(Response.created_at.desc()) # Added order_by
+        )
+        responses = result.scalars().all()
+        return [schemas.ResponseOut.model_validate(r).model_dump(mode="json") for r in responses]
+
+    return await cached_json(request, "responses", ticket_id, load)
@@ -5,7 +5,11 @@ from datetime import datetime
 class TicketIn(BaseModel):
     subject: str
     body: str
-    # Add more fields if your Ticket model has them
+    # Detected / scored at ingest when not given
+    priority: str | None = None
+    language: str | None = None
+    # Label set to classify with (see app/services/tenants.py); default labels when None
+    tenant: str | None = None
 
 
 class TicketOut(TicketIn):
@@ -22,6 +26,8 @@ class ResponseOut(BaseModel):
     reviewed: bool
     sent: bool
     status: str | None
+    source: str | None = None
+    source_response_id: int | None = None
     created_at: datetime  # from typing import datetime
 
     model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
@@ -0,0 +1,131 @@
+# app/services/admission.py
+"""Admission control for the classification stage.
+
+A fixed number of classifications run at once; a bounded number of requests
+may wait for a slot, each for at most a deadline. Anything beyond that is
+refused immediately with a retry hint, so latency stays bounded under bursts
+instead of growing until clients time out and retry.
+"""
+
+import asyncio
+import math
+import os
+import time
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight",
+    "Work items currently holding an admission slot",
+    labelnames=("stage",),
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Work items waiting for an admission slot",
+    labelnames=("stage",),
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds",
+    "Time spent waiting for an admission slot",
+    labelnames=("stage",),
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Requests refused by admission control",
+    labelnames=("endpoint", "reason"),
+)
+ADMISSION_DEGRADED = Counter(
+    "admission_degraded_total",
+    "Requests accepted in degraded mode (stored now, classified later)",
+    labelnames=("endpoint", "reason"),
+)
+
+# Sentinel so callers can pass deadline=None to wait indefinitely
+_DEFAULT = object()
+
+
+class AdmissionRejected(Exception):
+    """Raised when a work item cannot be admitted in time."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"admission rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency + bounded wait queue + per-item deadline."""
+
+    def __init__(self, stage: str, max_concurrency: int, max_queue: int, deadline: float):
+        self.stage = stage
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.deadline = deadline
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._waiting = 0
+        self._in_flight = 0
+        # EWMA of how long a slot is held, used for Retry-After estimates
+        self._service_time = 0.5
+
+    def retry_after(self) -> int:
+        backlog = (self._waiting + self._in_flight) / self.max_concurrency
+        return max(1, math.ceil(backlog * self._service_time))
+
+    async def acquire(self, deadline=_DEFAULT, shed: bool = True) -> None:
+        """Wait for a slot.
+
+        With `shed=True` the item is refused when the wait queue is full or
+        the deadline passes. Deferred background work uses `shed=False` and
+        `deadline=None` so it waits its turn without being dropped.
+        """
+        if deadline is _DEFAULT:
+            deadline = self.deadline
+        if shed and self._slots.locked() and self._waiting >= self.max_queue:
+            raise AdmissionRejected("queue_full", self.retry_after())
+
+        self._waiting += 1
+        ADMISSION_QUEUE_DEPTH.labels(self.stage).set(self._waiting)
+        start = time.perf_counter()
+        try:
+            if deadline is None or not shed:
+                await self._slots.acquire()
+            else:
+                await asyncio.wait_for(self._slots.acquire(), timeout=deadline)
+        except asyncio.TimeoutError:
+            raise AdmissionRejected("deadline", self.retry_after()) from None
+        finally:
+            self._waiting -= 1
+            ADMISSION_QUEUE_DEPTH.labels(self.stage).set(self._waiting)
+            ADMISSION_WAIT.labels(self.stage).observe(time.perf_counter() - start)
+
+        self._in_flight += 1
+        ADMISSION_IN_FLIGHT.labels(self.stage).set(self._in_flight)
+
+    def release(self, held_for: Optional[float] = None) -> None:
+        if held_for is not None:
+            self._service_time = 0.8 * self._service_time + 0.2 * held_for
+        self._in_flight -= 1
+        ADMISSION_IN_FLIGHT.labels(self.stage).set(self._in_flight)
+        self._slots.release()
+
+
+classification_admission = AdmissionController(
+    "classification",
+    max_concurrency=int(os.getenv("CLASSIFY_MAX_CONCURRENCY", "2")),
+    max_queue=int(os.getenv("CLASSIFY_MAX_QUEUE", "32")),
+    deadline=float(os.getenv("CLASSIFY_DEADLINE_SECONDS", "5")),
+)
+
+# "reject": answer 503 + Retry-After; "defer": store now, classify in background
+CLASSIFY_OVERLOAD_MODE = os.getenv("CLASSIFY_OVERLOAD_MODE", "reject").lower()
+
+
+__all__ = [
+    "AdmissionController",
+    "AdmissionRejected",
+    "classification_admission",
+    "CLASSIFY_OVERLOAD_MODE",
+    "ADMISSION_REJECTED",
+    "ADMISSION_DEGRADED",
+]
@@ -0,0 +1,278 @@
+# app/services/analytics.py
+"""Incremental ticket / draft rollups behind GET /analytics/summary.
+
+A periodic job (`ANALYTICS_ROLLUP_INTERVAL_SECONDS`, started in the app
+lifespan) reads only rows past its watermarks (ticket id / response id,
+kept in `job_checkpoints`) and adds them to `analytics_rollups`. Tickets are
+counted per category and drafts per status, each per hour, per day and all
+time. Drafts also sum their ticket-to-draft latency. The summary endpoint
+reads a bounded number of rollup rows, so it costs the same however large
+`tickets` grows.
+
+A ticket still waiting for its category is not counted until it is
+classified, unless it has been pending longer than
+`ANALYTICS_PENDING_GRACE_SECONDS`; then it is counted as "Unclassified".
+Later re-labelling (reclassify job) does not move already counted tickets.
+Rows younger than `ANALYTICS_SETTLE_SECONDS` are left for the next run: ids
+are handed out before commit, so a lower id can still become visible after a
+higher one has been folded.
+"""
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import Gauge
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import AnalyticsRollup, JobCheckpoint, Response, Ticket
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "analytics_rollup"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+GRANULARITIES = ("hour", "day", "all")
+UNCLASSIFIED = "Unclassified"
+
+ANALYTICS_TICKETS = Gauge(
+    "analytics_tickets",
+    "Tickets counted by the analytics rollup, by category",
+    labelnames=("category",),
+)
+ANALYTICS_DRAFTS = Gauge(
+    "analytics_drafts",
+    "Drafts counted by the analytics rollup, by status",
+    labelnames=("status",),
+)
+ANALYTICS_WATERMARK = Gauge(
+    "analytics_rollup_watermark",
+    "Last row id folded into the analytics rollups",
+    labelnames=("source",),
+)
+
+# (metric, granularity, bucket_start, dimension) -> [count, value_sum]
+Deltas = Dict[Tuple[str, str, datetime, str], List[float]]
+
+
+def _utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def bucket(value: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return EPOCH
+
+
+def _add(deltas: Deltas, metric: str, at: datetime, dimension: str, value: float = 0.0) -> None:
+    for granularity in GRANULARITIES:
+        entry = deltas[(metric, granularity, bucket(at, granularity), dimension)]
+        entry[0] += 1
+        entry[1] += value
+
+
+async def _upsert(session, deltas: Deltas) -> None:
+    if not deltas:
+        return
+    rows = [
+        {"metric": m, "granularity": g, "bucket_start": b, "dimension": d, "count": int(c), "value_sum": v}
+        for (m, g, b, d), (c, v) in deltas.items()
+    ]
+    insert = pg_insert if session.bind.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(AnalyticsRollup).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["metric", "granularity", "bucket_start", "dimension"],
+        set_={
+            "count": AnalyticsRollup.count + stmt.excluded.count,
+            "value_sum": AnalyticsRollup.value_sum + stmt.excluded.value_sum,
+        },
+    )
+    await session.execute(stmt)
+
+
+async def _checkpoint(session) -> JobCheckpoint:
+    # FOR UPDATE serializes concurrent runs (several workers) on Postgres
+    checkpoint = (
+        await session.execute(select(JobCheckpoint).where(JobCheckpoint.name == JOB_NAME).with_for_update())
+    ).scalar_one_or_none()
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(name=JOB_NAME, cursor=0, details={"response_id": 0})
+        session.add(checkpoint)
+        await session.flush()
+    return checkpoint
+
+
+async def refresh_rollups_once(session_maker=AsyncSessionLocal, batch_size: int = 1000, grace_seconds: float = 300.0, settle_seconds: float = 5.0) -> int:
+    """Fold up to `batch_size` new tickets and drafts into the rollups. Returns rows folded."""
+    async with session_maker() as session:
+        checkpoint = await _checkpoint(session)
+        ticket_mark = int(checkpoint.cursor or 0)
+        response_mark = int((checkpoint.details or {}).get("response_id", 0))
+        deltas: Deltas = defaultdict(lambda: [0, 0.0])
+
+        tickets = (
+            await session.execute(
+                select(Ticket.id, Ticket.category, Ticket.created_at)
+                .where(Ticket.id > ticket_mark)
+                .order_by(Ticket.id)
+                .limit(batch_size)
+            )
+        ).all()
+        now = datetime.now(timezone.utc)
+        settled = now - timedelta(seconds=settle_seconds)
+        cutoff = now - timedelta(seconds=grace_seconds)
+        folded = 0
+        for row in tickets:
+            created = _utc(row.created_at)
+            if created > settled or (row.category is None and created > cutoff):
+                # Wait for classification; the watermark must not pass it
+                break
+            _add(deltas, "tickets", created, row.category or UNCLASSIFIED)
+            ticket_mark = row.id
+            folded += 1
+
+        drafts = (
+            await session.execute(
+                select(Response.id, Response.status, Response.created_at, Ticket.created_at.label("ticket_created_at"))
+                .join(Ticket, Ticket.id == Response.ticket_id, isouter=True)
+                .where(Response.id > response_mark)
+                .order_by(Response.id)
+                .limit(batch_size)
+            )
+        ).all()
+        for row in drafts:
+            created = _utc(row.created_at)
+            if created > settled:
+                break
+            latency = max(0.0, (created - _utc(row.ticket_created_at)).total_seconds()) if row.ticket_created_at else 0.0
+            _add(deltas, "drafts", created, row.status or "unknown", latency)
+            response_mark = row.id
+            folded += 1
+
+        await _upsert(session, deltas)
+        checkpoint.cursor = ticket_mark
+        checkpoint.details = {"response_id": response_mark}
+        await session.commit()
+
+    ANALYTICS_WATERMARK.labels("tickets").set(ticket_mark)
+    ANALYTICS_WATERMARK.labels("responses").set(response_mark)
+    return folded
+
+
+async def refresh_rollups(session_maker=AsyncSessionLocal, batch_size: int = 1000, grace_seconds: float = 300.0, settle_seconds: float = 5.0) -> int:
+    total = 0
+    while True:
+        folded = await refresh_rollups_once(session_maker, batch_size, grace_seconds, settle_seconds)
+        total += folded
+        if folded < batch_size:
+            break
+    if total:
+        await _export_totals(session_maker)
+    return total
+
+
+async def _export_totals(session_maker) -> None:
+    async with session_maker() as session:
+        rows = (
+            await session.execute(select(AnalyticsRollup).where(AnalyticsRollup.granularity == "all"))
+        ).scalars().all()
+    for row in rows:
+        gauge = ANALYTICS_TICKETS if row.metric == "tickets" else ANALYTICS_DRAFTS
+        gauge.labels(row.dimension).set(row.count)
+
+
+async def summary(session, granularity: str = "day", buckets: int = 30) -> dict:
+    """Totals plus the last `buckets` hour/day buckets, read from the rollups only."""
+    since = bucket(datetime.now(timezone.utc), granularity)
+    since -= timedelta(hours=buckets - 1) if granularity == "hour" else timedelta(days=buckets - 1)
+    rows = (
+        await session.execute(
+            select(AnalyticsRollup).where(
+                (AnalyticsRollup.granularity == "all")
+                | ((AnalyticsRollup.granularity == granularity) & (AnalyticsRollup.bucket_start >= since))
+            )
+        )
+    ).scalars().all()
+    checkpoint = await session.get(JobCheckpoint, JOB_NAME)
+
+    totals = {"tickets": {}, "drafts": {}}
+    series: Dict[str, dict] = defaultdict(lambda: {"tickets": {}, "drafts": {}})
+    latency = {"sum": 0.0, "count": 0}
+    for row in rows:
+        if row.granularity == "all":
+            totals[row.metric][row.dimension] = row.count
+            if row.metric == "drafts" and row.dimension == "completed":
+                latency = {"sum": row.value_sum, "count": row.count}
+        else:
+            series[_utc(row.bucket_start).isoformat()][row.metric][row.dimension] = row.count
+
+    completed = totals["drafts"].get("completed", 0)
+    finished = completed + totals["drafts"].get("failed", 0)
+    return {
+        "tickets_by_category": totals["tickets"],
+        "drafts_by_status": totals["drafts"],
+        "draft_success_rate": (completed / finished) if finished else None,
+        "mean_draft_latency_seconds": (latency["sum"] / latency["count"]) if latency["count"] else None,
+        "granularity": granularity,
+        "series": [{"bucket_start": k, **v} for k, v in sorted(series.items())],
+        "watermark": {
+            "ticket_id": int(checkpoint.cursor or 0) if checkpoint else 0,
+            "response_id": int((checkpoint.details or {}).get("response_id", 0)) if checkpoint else 0,
+            "updated_at": checkpoint.updated_at if checkpoint else None,
+        },
+    }
+
+
+class PeriodicRollup:
+    """Lifespan task that folds new rows into the rollups every `interval` seconds."""
+
+    def __init__(self, interval: float = 60.0, batch_size: int = 1000, grace_seconds: float = 300.0, settle_seconds: float = 5.0):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.grace_seconds = grace_seconds
+        self.settle_seconds = settle_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await refresh_rollups(
+                    batch_size=self.batch_size, grace_seconds=self.grace_seconds, settle_seconds=self.settle_seconds
+                )
+            except Exception as e:
+                logger.error(f"EXCEPTION in analytics rollup job: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+
+analytics_rollup = PeriodicRollup(
+    interval=float(os.getenv("ANALYTICS_ROLLUP_INTERVAL_SECONDS", "60")),
+    batch_size=int(os.getenv("ANALYTICS_ROLLUP_BATCH_SIZE", "1000")),
+    grace_seconds=float(os.getenv("ANALYTICS_PENDING_GRACE_SECONDS", "300")),
+    settle_seconds=float(os.getenv("ANALYTICS_SETTLE_SECONDS", "5")),
+)
+
+
+__all__ = ["refresh_rollups", "refresh_rollups_once", "summary", "analytics_rollup", "bucket"]
@@ -0,0 +1,353 @@
+# app/services/attachments.py
+"""Streaming inbound-email parsing and the content-addressed attachment store.
+
+`POST /email/inbound` bodies carry attachments as base64 strings inside the
+JSON. `StreamingEmailParser` is fed the request body chunk by chunk. It
+copies everything except `attachments[i].data` into a small "skeleton"
+document. Each data string is base64-decoded as it arrives and written
+straight to a temporary blob file, and the skeleton gets `null` in its place.
+So memory use per request is bounded by the non-attachment fields
+(`INBOUND_MAX_TEXT_BYTES`) plus one chunk, whatever the attachment sizes.
+
+Blobs are named by SHA-256 under `INBOUND_ATTACHMENT_DIR` (`ab/abcdef...`),
+so the same file sent twice is stored once. The parser only moves temp
+files into place on `commit()`, which the router calls once the HMAC over
+the whole body has been verified and the ticket row exists; duplicates and
+failed inserts discard them. Rows in the `attachments` table hold only the
+reference.
+
+Before the signature is known, disk use per request is bounded by the
+body size (`INBOUND_MAX_BODY_BYTES`, enforced by the router) and the
+number of attachments per email (`INBOUND_MAX_ATTACHMENTS`). Blobs spooled
+for a body whose signature fails, or that repeats an attachment's `data`
+key, stay in the temp directory only until the parser is discarded.
+"""
+
+import binascii
+import hashlib
+import json
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from prometheus_client import Counter
+
+ATTACHMENT_BLOBS = Counter(
+    "inbound_attachment_blobs_total",
+    "Inbound attachments by storage result (stored, deduplicated)",
+    labelnames=("result",),
+)
+ATTACHMENT_BYTES = Counter(
+    "inbound_attachment_bytes_total",
+    "Decoded inbound attachment bytes by storage result (stored, deduplicated)",
+    labelnames=("result",),
+)
+
+_STRING_SPECIAL = re.compile(rb'["\\]')
+
+# Attachment position: index in `attachments`, or (email, attachment) in a batch
+BlobIndex = Union[int, Tuple[int, int]]
+
+
+class PayloadTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class StoredBlob:
+    sha256: str
+    size: int
+    path: str
+    # False when the content was already in the store
+    created: bool = True
+
+
+class BlobWriter:
+    """Temp file + running SHA-256 for one attachment; moved into place on commit."""
+
+    def __init__(self, store: "BlobStore"):
+        self.store = store
+        self.tmp_path = os.path.join(store.tmp_dir, uuid.uuid4().hex)
+        self._file = open(self.tmp_path, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > self.store.max_blob_bytes:
+            raise PayloadTooLarge(f"Attachment exceeds {self.store.max_blob_bytes} bytes")
+        self._hash.update(data)
+        self._file.write(data)
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def commit(self) -> StoredBlob:
+        self.close()
+        sha = self._hash.hexdigest()
+        path = self.store.path(sha)
+        if os.path.exists(path):
+            os.unlink(self.tmp_path)
+            result = "deduplicated"
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.tmp_path, path)
+            result = "stored"
+        ATTACHMENT_BLOBS.labels(result).inc()
+        ATTACHMENT_BYTES.labels(result).inc(self.size)
+        return StoredBlob(sha256=sha, size=self.size, path=path, created=result == "stored")
+
+    def discard(self) -> None:
+        self.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class BlobStore:
+    def __init__(self, root: str, max_blob_bytes: int = 50 * 1024 * 1024):
+        self.root = root
+        self.max_blob_bytes = max_blob_bytes
+
+    @property
+    def tmp_dir(self) -> str:
+        path = os.path.join(self.root, "tmp")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def open(self, sha256: str):
+        return open(self.path(sha256), "rb")
+
+    def writer(self) -> BlobWriter:
+        return BlobWriter(self)
+
+    def remove_created(self, blobs) -> None:
+        """Undo `commit()` for blobs this request added, e.g. when their rows could not be stored."""
+        for blob in blobs:
+            if blob.created:
+                try:
+                    os.unlink(blob.path)
+                except FileNotFoundError:
+                    pass
+
+
+class StreamingEmailParser:
+    """Incremental JSON scanner for the inbound email payload.
+
+    Only the structure needed to find `attachments[i].data` is tracked. The
+    skeleton keeps the raw JSON text of everything else and is parsed with
+    `json.loads` at the end.
+    """
+
+    def __init__(
+        self,
+        store: BlobStore,
+        max_text_bytes: int = 2 * 1024 * 1024,
+        batch_key: Optional[str] = None,
+        max_attachments: int = 20,
+    ):
+        self.store = store
+        self.max_text_bytes = max_text_bytes
+        # Per email
+        self.max_attachments = max_attachments
+        # Batch bodies ({"emails": [payload, ...]}) key blobs by (email index, attachment index)
+        self.batch_key = batch_key
+        self.skeleton = bytearray()
+        # [kind, key in parent, last key, child count]
+        self._stack: List[list] = []
+        self._expecting_key = False
+        self._in_string = False
+        self._string_is_key = False
+        self._key = bytearray()
+        self._carry = b""
+        self._blob: Optional[BlobWriter] = None
+        self._b64 = b""
+        self._writers: Dict[BlobIndex, BlobWriter] = {}
+
+    # -- scanning ------------------------------------------------------------
+
+    def feed(self, chunk: bytes) -> None:
+        data = self._carry + chunk if self._carry else chunk
+        self._carry = b""
+        i, n = 0, len(data)
+        while i < n:
+            if self._blob is not None or self._in_string:
+                match = _STRING_SPECIAL.search(data, i)
+                if match is None:
+                    self._string_bytes(data[i:])
+                    break
+                j = match.start()
+                self._string_bytes(data[i:j])
+                if data[j] == 0x22:  # closing quote
+                    self._end_string()
+                    i = j + 1
+                    continue
+                if j + 1 >= n or (data[j + 1] == 0x75 and j + 6 > n):
+                    # Escape split across chunks; finish it with the next one
+                    self._carry = data[j:]
+                    break
+                width = 6 if data[j + 1] == 0x75 else 2
+                self._escape(data[j : j + width])
+                i = j + width
+                continue
+            self._structural(data[i])
+            i += 1
+        if len(self.skeleton) > self.max_text_bytes:
+            raise PayloadTooLarge(f"Email fields exceed {self.max_text_bytes} bytes")
+
+    def _string_bytes(self, data: bytes) -> None:
+        if self._blob is not None:
+            self._decode(data)
+            return
+        self.skeleton += data
+        if self._string_is_key:
+            self._key += data
+
+    def _escape(self, seq: bytes) -> None:
+        if self._blob is None:
+            self._string_bytes(seq)
+        elif seq == b"\\/":
+            self._decode(b"/")
+        elif seq not in (b"\\n", b"\\r", b"\\t"):
+            raise ValueError("Unexpected escape in base64 attachment data")
+
+    def _end_string(self) -> None:
+        if self._blob is not None:
+            self._finish_blob()
+            self.skeleton += b"null"
+            return
+        self.skeleton += b'"'
+        self._in_string = False
+        if self._string_is_key:
+            self._string_is_key = False
+            self._expecting_key = False
+            self._stack[-1][2] = json.loads(b'"' + bytes(self._key) + b'"')
+            self._key.clear()
+
+    def _structural(self, c: int) -> None:
+        if c == 0x22:  # opening quote
+            if self._expecting_key:
+                self._in_string = self._string_is_key = True
+                self.skeleton += b'"'
+            elif (index := self._attachment_index()) is not None:
+                if (index if isinstance(index, int) else index[1]) >= self.max_attachments:
+                    raise PayloadTooLarge(f"More than {self.max_attachments} attachments in one email")
+                if index in self._writers:
+                    # A second "data" key would replace (and leak) the first blob
+                    raise ValueError(f"Duplicate data key in attachment {index}")
+                self._blob = self.store.writer()
+                self._writers[index] = self._blob
+            else:
+                self._in_string = True
+                self.skeleton += b'"'
+            return
+        self.skeleton.append(c)
+        if c in (0x7B, 0x5B):  # { [
+            parent = self._stack[-1] if self._stack else None
+            key = parent[2] if parent is not None and parent[0] == "{" else None
+            if parent is not None and parent[0] == "[":
+                parent[3] += 1
+            self._stack.append(["{" if c == 0x7B else "[", key, None, 0])
+            self._expecting_key = c == 0x7B
+        elif c in (0x7D, 0x5D):  # } ]
+            if not self._stack:
+                raise ValueError("Unbalanced JSON")
+            self._stack.pop()
+            self._expecting_key = False
+        elif c == 0x2C:  # ,
+            self._expecting_key = bool(self._stack) and self._stack[-1][0] == "{"
+
+    def _attachment_index(self) -> Optional[BlobIndex]:
+        """Index of the attachment whose `data` string starts here, else None."""
+        s = self._stack
+        if self.batch_key is None:
+            email, rest = None, s
+        else:
+            if len(s) < 2 or s[0][0] != "{" or s[1][0] != "[" or s[1][1] != self.batch_key:
+                return None
+            email, rest = s[1][3] - 1, s[2:]
+        if not (
+            len(rest) == 3
+            and rest[0][0] == "{"
+            and rest[1][0] == "["
+            and rest[1][1] == "attachments"
+            and rest[2][0] == "{"
+            and rest[2][2] == "data"
+        ):
+            return None
+        return rest[1][3] - 1 if email is None else (email, rest[1][3] - 1)
+
+    # -- base64 --------------------------------------------------------------
+
+    def _decode(self, data: bytes) -> None:
+        buf = self._b64 + data if self._b64 else data
+        cut = len(buf) - len(buf) % 4
+        if cut:
+            self._blob.write(binascii.a2b_base64(buf[:cut]))
+        self._b64 = buf[cut:]
+
+    def _finish_blob(self) -> None:
+        if self._b64:
+            self._blob.write(binascii.a2b_base64(self._b64 + b"=" * (-len(self._b64) % 4)))
+            self._b64 = b""
+        self._blob.close()
+        self._blob = None
+
+    # -- results -------------------------------------------------------------
+
+    def result(self) -> Tuple[dict, Dict[BlobIndex, BlobWriter]]:
+        """Parsed skeleton and pending blobs by attachment index (not yet committed)."""
+        if self._stack or self._in_string or self._blob is not None or self._carry:
+            raise ValueError("Truncated JSON body")
+        doc = json.loads(bytes(self.skeleton))
+        if not isinstance(doc, dict):
+            raise ValueError("Expected a JSON object")
+        return doc, self._writers
+
+    def commit(self, emails: Optional[Iterable[int]] = None) -> Dict[BlobIndex, StoredBlob]:
+        """Move pending blobs into the store; in a batch, only those of `emails` (indexes)."""
+        if emails is None:
+            indexes = list(self._writers)
+        else:
+            wanted = set(emails)
+            indexes = [index for index in self._writers if index[0] in wanted]
+        return {index: self._writers.pop(index).commit() for index in indexes}
+
+    def discard(self) -> None:
+        if self._blob is not None:
+            self._writers.setdefault(-1, self._blob)
+        for writer in self._writers.values():
+            writer.discard()
+        self._writers = {}
+        self._blob = None
+
+
+attachment_store = BlobStore(
+    root=os.getenv("INBOUND_ATTACHMENT_DIR", "./data/attachments"),
+    max_blob_bytes=int(os.getenv("INBOUND_MAX_ATTACHMENT_BYTES", str(50 * 1024 * 1024))),
+)
+MAX_TEXT_BYTES = int(os.getenv("INBOUND_MAX_TEXT_BYTES", str(2 * 1024 * 1024)))
+# Whole request body, attachments included (base64 is 4/3 of the decoded size)
+MAX_BODY_BYTES = int(os.getenv("INBOUND_MAX_BODY_BYTES", str(100 * 1024 * 1024)))
+MAX_ATTACHMENTS = int(os.getenv("INBOUND_MAX_ATTACHMENTS", "20"))
+
+
+__all__ = [
+    "BlobStore",
+    "StoredBlob",
+    "StreamingEmailParser",
+    "PayloadTooLarge",
+    "attachment_store",
+    "MAX_TEXT_BYTES",
+    "MAX_BODY_BYTES",
+    "MAX_ATTACHMENTS",
+]
@@ -0,0 +1,282 @@
+# app/services/autotune.py
+"""Startup calibration of batched classification, saved per host.
+
+`autotune(classifier)` times the classifier on synthetic tickets with a
+realistic spread of lengths. It sweeps batch size × length-bucket boundaries
+× torch thread count and keeps the configuration with the highest measured
+throughput (tickets per second). The result is stored as JSON in
+`CLASSIFIER_TUNING_DIR/<hostname>.json` together with a fingerprint of the
+model, label set, device and CPU count. Later starts on the same host load it
+instead of sweeping again, as long as the fingerprint still matches.
+
+`CLASSIFIER_AUTOTUNE`:
+- `auto` (default): load the saved result, or calibrate if there is none.
+  The mock classifier is never calibrated.
+- `force`: always calibrate.
+- `0`: keep `CLASSIFIER_BATCH_SIZE` / `CLASSIFIER_LENGTH_BUCKETS`.
+
+A sweep stops early after `CLASSIFIER_AUTOTUNE_BUDGET_SECONDS`; the best
+configuration timed so far is kept.
+
+The app runs this in the background (`autotune_in_background`), so startup
+is not blocked; until it finishes, requests use the current configuration.
+A sweep holds an exclusive lock on `<hostname>.json.lock`: of several
+workers on one host only one calibrates, the others wait for the lock and
+then load its result.
+"""
+
+import asyncio
+import fcntl
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from prometheus_client import Gauge
+
+from app.services.classifier import (
+    InferenceConfig,
+    build_classification_prompt,
+    get_classifier_version,
+    get_inference_config,
+    get_model_info,
+    run_bucketed,
+    set_inference_config,
+)
+
+logger = logging.getLogger(__name__)
+
+AUTOTUNE_MODE = os.getenv("CLASSIFIER_AUTOTUNE", "auto")
+TUNING_DIR = os.getenv("CLASSIFIER_TUNING_DIR", "./data/inference_tuning")
+BUDGET_SECONDS = float(os.getenv("CLASSIFIER_AUTOTUNE_BUDGET_SECONDS", "300"))
+SAMPLES = int(os.getenv("CLASSIFIER_AUTOTUNE_SAMPLES", "48"))
+
+BATCH_SIZES = (4, 8, 16, 32)
+BOUNDARY_SETS: Tuple[Tuple[int, ...], ...] = ((), (256,), (128, 384), (64, 128, 256, 512))
+
+CLASSIFIER_THROUGHPUT = Gauge(
+    "classifier_tuned_throughput",
+    "Calibrated batched classification throughput (tickets per second)",
+)
+
+_WORDS = (
+    "order refund charged twice account password reset login invoice subscription cancel "
+    "app crash upload export error payment card billing support team please help thanks "
+    "update email address delivery late package missing broken screen settings sync"
+).split()
+
+
+def synthetic_tickets(n: int = SAMPLES, seed: int = 7) -> List[Tuple[str, str]]:
+    """(subject, body) pairs with log-uniform body lengths from ~10 to ~600 words."""
+    rng = random.Random(seed)
+    tickets = []
+    for _ in range(n):
+        words = int(10 * 60 ** rng.random())
+        subject = " ".join(rng.choices(_WORDS, k=rng.randint(3, 8))).capitalize()
+        body = " ".join(rng.choices(_WORDS, k=words)).capitalize() + "."
+        tickets.append((subject, body))
+    return tickets
+
+
+def thread_candidates(cpus: Optional[int] = None) -> List[Optional[int]]:
+    """Torch thread counts worth trying on CPU: 1, a quarter, half and all cores."""
+    cpus = cpus or os.cpu_count() or 1
+    return sorted({max(1, cpus // 4), max(1, cpus // 2), cpus, 1})
+
+
+def fingerprint() -> dict:
+    info = get_model_info()
+    return {
+        "classifier_version": get_classifier_version(),
+        "device": info.get("device", "cpu"),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def tuning_path(tuning_dir: str = TUNING_DIR, host: Optional[str] = None) -> str:
+    return os.path.join(tuning_dir, f"{host or socket.gethostname()}.json")
+
+
+def load_config(path: str, expected: dict) -> Optional[InferenceConfig]:
+    """The saved configuration at `path`, or None if missing or for another model / machine."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("fingerprint") != expected:
+        return None
+    config = data.get("config", {})
+    return InferenceConfig(
+        batch_size=int(config["batch_size"]),
+        boundaries=tuple(config.get("boundaries", ())),
+        threads=config.get("threads"),
+        source="cached",
+        throughput=config.get("throughput"),
+        host=config.get("host"),
+        calibrated_at=config.get("calibrated_at"),
+    )
+
+
+def save_config(path: str, config: InferenceConfig, expected: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"fingerprint": expected, "config": config.as_dict(trials=True)}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def calibrate(
+    classifier,
+    tickets: Optional[Sequence[Tuple[str, str]]] = None,
+    batch_sizes: Sequence[int] = BATCH_SIZES,
+    boundary_sets: Sequence[Tuple[int, ...]] = BOUNDARY_SETS,
+    threads: Optional[Sequence[Optional[int]]] = None,
+    budget_seconds: float = BUDGET_SECONDS,
+    clock: Callable[[], float] = time.perf_counter,
+    stop: Optional[threading.Event] = None,
+) -> InferenceConfig:
+    """Time every combination on `tickets` and return the fastest.
+
+    Blocking; run it in a worker thread. The configuration active before the
+    sweep is restored afterwards (the caller decides whether to apply the
+    result). On GPU the thread count is not swept. Setting `stop` ends the
+    sweep after the current trial.
+    """
+    prompts = [build_classification_prompt(s, b) for s, b in (tickets or synthetic_tickets())]
+    if threads is None:
+        threads = [None] if get_model_info().get("device", "cpu") != "cpu" else thread_candidates()
+    previous = get_inference_config()
+    try:
+        import torch  # type: ignore
+
+        default_threads = torch.get_num_threads()
+    except Exception:
+        default_threads = None
+    # One untimed pass so lazy initialisation is not charged to the first trial
+    run_bucketed(classifier, prompts[:4], previous)
+
+    trials, best = [], None
+    deadline = clock() + budget_seconds
+    try:
+        for thread_count, boundaries, batch_size in itertools.product(threads, boundary_sets, batch_sizes):
+            if trials and clock() > deadline:
+                logger.warning("Autotune budget of %ss used up after %s trials", budget_seconds, len(trials))
+                break
+            if trials and stop is not None and stop.is_set():
+                break
+            candidate = InferenceConfig(batch_size=batch_size, boundaries=tuple(boundaries), threads=thread_count)
+            set_inference_config(candidate)
+            start = clock()
+            run_bucketed(classifier, prompts, candidate)
+            elapsed = max(clock() - start, 1e-9)
+            throughput = round(len(prompts) / elapsed, 3)
+            trials.append({"batch_size": batch_size, "boundaries": list(boundaries), "threads": thread_count, "throughput": throughput})
+            if best is None or throughput > best.throughput:
+                candidate.throughput = throughput
+                best = candidate
+    finally:
+        if default_threads and not previous.threads:
+            # Put torch back to its own default thread count
+            set_inference_config(InferenceConfig(threads=default_threads))
+        set_inference_config(previous)
+
+    best.source = "calibrated"
+    best.host = socket.gethostname()
+    best.calibrated_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    best.trials = trials
+    return best
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+@contextmanager
+def _tuning_lock(path: str, stop: Optional[threading.Event] = None) -> Iterator[bool]:
+    """Hold the host's calibration lock; yields False if `stop` was set while waiting."""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        lock_file = open(f"{path}.lock", "a")
+    except OSError as e:
+        logger.warning(f"Could not open the autotune lock for {path}, calibrating without it: {e}")
+        yield True
+        return
+    with lock_file:
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if stop is not None and stop.is_set():
+                    yield False
+                    return
+                time.sleep(0.5)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def autotune(
+    classifier,
+    mode: str = AUTOTUNE_MODE,
+    tuning_dir: str = TUNING_DIR,
+    stop: Optional[threading.Event] = None,
+) -> InferenceConfig:
+    """Load or calibrate this host's configuration and apply it. Returns the active configuration.
+
+    Blocking. If `stop` is set while waiting for another worker's sweep or
+    during this one, nothing is saved or applied.
+    """
+    if mode == "0" or (mode == "auto" and get_model_info().get("backend") == "mock"):
+        return get_inference_config()
+    expected = fingerprint()
+    path = tuning_path(tuning_dir)
+    config = load_config(path, expected) if mode != "force" else None
+    if config is None:
+        saved_at = _mtime(path)
+        with _tuning_lock(path, stop) as locked:
+            if not locked:
+                return get_inference_config()
+            # Another worker may have calibrated while this one waited
+            if mode != "force" or _mtime(path) != saved_at:
+                config = load_config(path, expected)
+            if config is None:
+                config = calibrate(classifier, stop=stop)
+                if stop is not None and stop.is_set():
+                    return get_inference_config()
+                logger.warning(
+                    "Autotuned classifier: batch_size=%s buckets=%s threads=%s (%.1f tickets/s, %s trials)",
+                    config.batch_size, list(config.boundaries), config.threads, config.throughput, len(config.trials),
+                )
+                try:
+                    save_config(path, config, expected)
+                except OSError as e:
+                    logger.warning(f"Could not save autotune result to {path}: {e}")
+    set_inference_config(config)
+    if config.throughput:
+        CLASSIFIER_THROUGHPUT.set(config.throughput)
+    return config
+
+
+async def autotune_in_background(classifier, stop: threading.Event) -> Optional[InferenceConfig]:
+    """`autotune` in a worker thread for the app lifespan; logs failures instead of raising."""
+    try:
+        return await asyncio.to_thread(autotune, classifier, stop=stop)
+    except Exception as e:
+        logger.warning(f"Classifier autotune failed, keeping defaults: {e}")
+        return None
+
+
+__all__ = ["autotune", "autotune_in_background", "calibrate", "synthetic_tickets", "load_config", "save_config", "tuning_path"]
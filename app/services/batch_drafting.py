@@ -0,0 +1,309 @@
+# app/services/batch_drafting.py
+"""Batch drafting: many tickets per LLM call.
+
+Pending tickets (classified, no response yet) are drafted in groups with one
+structured multi-ticket prompt; the reply is parsed back per ticket and all
+Response rows of a group are stored with a single commit. Tickets whose
+draft is missing from the reply fall back to a single generate_response call.
+Tickets the draft cache can answer (app/services/draft_cache.py) are left
+out of the LLM call, and new drafts are added to the cache.
+
+With DRAFT_MODE=batch the API stops drafting per ticket and a periodic
+drafter started in the app lifespan drains pending tickets instead. The same
+routine backs the draft_backlog.py command. In per-ticket mode it runs as a
+recovery sweep (at startup, then every DRAFT_RECOVERY_INTERVAL_SECONDS) for
+tickets still without a draft DRAFT_RECOVERY_AFTER_SECONDS after creation:
+drafts lost to a restart, or given up on while the LLM circuit was open.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from prometheus_client import Counter
+from sqlalchemy import exists, or_, select, update
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Response, Ticket
+from app.services.draft_cache import draft_cache
+from app.services.events import publish_ticket_event
+from app.services.llm_client import CircuitOpenError, LLMError
+from app.services.response_gen import generate_batch_responses, generate_response
+
+logger = logging.getLogger(__name__)
+
+# "per_ticket" (default): one LLM call per ticket, scheduled on ingest
+# "batch": pending tickets are drafted in groups by the periodic drafter
+DRAFT_MODE = os.getenv("DRAFT_MODE", "per_ticket").lower()
+# Seconds after which a claimed ticket without a draft is claimed again
+DRAFT_CLAIM_TIMEOUT = float(os.getenv("DRAFT_CLAIM_TIMEOUT_SECONDS", "600"))
+# Per-ticket mode: age after which a ticket without a draft is recovered
+DRAFT_RECOVERY_AFTER = float(os.getenv("DRAFT_RECOVERY_AFTER_SECONDS", "300"))
+
+DRAFT_BATCH_FALLBACKS = Counter(
+    "draft_batch_fallbacks_total",
+    "Tickets drafted with a single call after the batch reply did not cover them",
+)
+DRAFT_BATCH_TICKETS = Counter(
+    "draft_batch_tickets_total",
+    "Tickets drafted by the batch drafter",
+    labelnames=("status",),
+)
+
+
+def _pending_tickets(limit: int, stale_before: datetime, created_before: Optional[datetime] = None):
+    has_response = exists().where(Response.ticket_id == Ticket.id)
+    query = select(Ticket)
+    if created_before is not None:
+        query = query.where(Ticket.created_at < created_before)
+    return (
+        query
+        .where(
+            Ticket.category.is_not(None),
+            ~has_response,
+            or_(Ticket.draft_claimed_at.is_(None), Ticket.draft_claimed_at < stale_before),
+            # Urgent tickets are drafted right away by schedule_draft; only
+            # pick one up if that draft never landed
+            or_(Ticket.priority.is_(None), Ticket.priority != "urgent", Ticket.created_at < stale_before),
+        )
+        .order_by(Ticket.id)
+        .limit(limit)
+        # Lets several drafters run against Postgres without drafting the
+        # same ticket twice; ignored by SQLite
+        .with_for_update(skip_locked=True)
+    )
+
+
+async def _claim_pending(
+    session_maker, batch_size: int, created_before: Optional[datetime] = None
+) -> tuple[datetime, list]:
+    """Mark a group of pending tickets as in flight and commit.
+
+    The claim timestamp doubles as the claim token: drafts are only stored
+    for tickets that still carry it. Claims older than DRAFT_CLAIM_TIMEOUT_SECONDS
+    (a drafter that died mid-call) are picked up again.
+    """
+    claimed_at = datetime.now(timezone.utc)
+    async with session_maker() as session:
+        tickets = (
+            await session.execute(
+                _pending_tickets(batch_size, claimed_at - timedelta(seconds=DRAFT_CLAIM_TIMEOUT), created_before)
+            )
+        ).scalars().all()
+        items = [
+            {
+                "ticket_id": t.id,
+                "subject": t.subject or "",
+                "body": t.body or "",
+                "category": t.category,
+                "language": t.language,
+            }
+            for t in tickets
+        ]
+        if items:
+            await session.execute(
+                update(Ticket)
+                .where(Ticket.id.in_([item["ticket_id"] for item in items]))
+                .values(draft_claimed_at=claimed_at)
+            )
+            await session.commit()
+    return claimed_at, items
+
+
+async def draft_pending_batch(
+    session_maker=AsyncSessionLocal, batch_size: int = 8, created_before: Optional[datetime] = None
+) -> int:
+    """Draft and store one group of pending tickets. Returns how many were drafted.
+
+    No transaction is open while the LLM runs: tickets are claimed and
+    committed first, and the drafts are stored in a second transaction.
+    With `created_before`, only tickets created before then are drafted.
+    """
+    claimed_at, items = await _claim_pending(session_maker, batch_size, created_before)
+    if not items:
+        return 0
+    async with session_maker() as session:
+        cached = {}
+        for item in items:
+            hit = await draft_cache.lookup(
+                session, item["subject"], item["body"], item["category"], item["language"]
+            )
+            if hit is not None:
+                cached[item["ticket_id"]] = hit
+    uncached = [item for item in items if item["ticket_id"] not in cached]
+    circuit_open = False
+    start = time.perf_counter()
+    try:
+        drafts: Dict[int, str] = await generate_batch_responses(uncached) if uncached else {}
+    except CircuitOpenError:
+        circuit_open, drafts = True, {}
+    except Exception as e:
+        logger.error(f"Batch drafting call failed for {len(items)} tickets, falling back: {e}")
+        drafts = {}
+
+    rows = []
+    # Left pending (claim released) while the LLM circuit is open
+    deferred = []
+    generation_seconds = (time.perf_counter() - start) / max(1, len(uncached))
+    for item in items:
+        hit = cached.get(item["ticket_id"])
+        if hit is not None:
+            rows.append(
+                Response(
+                    ticket_id=item["ticket_id"],
+                    generated_response=hit.text,
+                    reviewed=False,
+                    sent=False,
+                    status="completed",
+                    source=hit.source,
+                    source_response_id=hit.response_id,
+                )
+            )
+            continue
+        text = drafts.get(item["ticket_id"])
+        source, status = "llm_batch", "completed"
+        if text is None:
+            if circuit_open:
+                deferred.append(item["ticket_id"])
+                continue
+            DRAFT_BATCH_FALLBACKS.inc()
+            source = "llm"
+            try:
+                text = await generate_response(item["subject"], item["body"], item["category"], item["language"])
+            except CircuitOpenError:
+                circuit_open = True
+                deferred.append(item["ticket_id"])
+                continue
+            except LLMError as e:
+                text, status = f"Error: {e}", "failed"
+        rows.append(
+            Response(
+                ticket_id=item["ticket_id"],
+                generated_response=text,
+                reviewed=False,
+                sent=False,
+                status=status,
+                source=source,
+            )
+        )
+
+    async with session_maker() as session:
+        still_claimed = set(
+            (
+                await session.execute(
+                    select(Ticket.id).where(
+                        Ticket.id.in_([row.ticket_id for row in rows]), Ticket.draft_claimed_at == claimed_at
+                    )
+                )
+            ).scalars()
+        )
+        lost = len(rows) - len(still_claimed)
+        rows = [row for row in rows if row.ticket_id in still_claimed]
+        session.add_all(rows)
+        if deferred:
+            await session.execute(
+                update(Ticket)
+                .where(Ticket.id.in_(deferred), Ticket.draft_claimed_at == claimed_at)
+                .values(draft_claimed_at=None)
+            )
+        await session.commit()
+    if deferred:
+        logger.warning(f"LLM circuit is open; left {len(deferred)} tickets pending for the next pass.")
+    if lost:
+        logger.warning(f"Batch drafter dropped {lost} drafts whose claim expired and was taken over.")
+
+    by_ticket = {item["ticket_id"]: item for item in items}
+    for row in rows:
+        item = by_ticket[row.ticket_id]
+        if row.status == "completed" and row.source in ("llm", "llm_batch"):
+            draft_cache.put(
+                item["subject"], item["body"], item["category"],
+                row.generated_response, row.id, generation_seconds, language=item["language"],
+            )
+        DRAFT_BATCH_TICKETS.labels(row.status).inc()
+        await publish_ticket_event(
+            f"response.{row.status}",
+            row.ticket_id,
+            response_id=row.id,
+            status=row.status,
+            category=item["category"],
+            generated_response=row.generated_response,
+        )
+    logger.warning(
+        f"Batch drafter stored {len(rows)} drafts ({len(drafts)} from the batch reply, {len(cached)} from the draft cache)."
+    )
+    return len(rows)
+
+
+async def drain_pending_drafts(
+    session_maker=AsyncSessionLocal,
+    batch_size: int = 8,
+    limit: Optional[int] = None,
+    created_before: Optional[datetime] = None,
+) -> int:
+    """Draft pending tickets group by group until none remain (or `limit` is hit)."""
+    total = 0
+    while limit is None or total < limit:
+        size = batch_size if limit is None else min(batch_size, limit - total)
+        drafted = await draft_pending_batch(session_maker, size, created_before)
+        if not drafted:
+            break
+        total += drafted
+    return total
+
+
+class PeriodicBatchDrafter:
+    """Lifespan task that drains pending drafts every `interval` seconds.
+
+    With `min_age`, only tickets created at least that many seconds ago are
+    drafted (the per-ticket mode recovery sweep).
+    """
+
+    def __init__(self, batch_size: int = 8, interval: float = 2.0, min_age: Optional[float] = None):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.min_age = min_age
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                created_before = None
+                if self.min_age is not None:
+                    created_before = datetime.now(timezone.utc) - timedelta(seconds=self.min_age)
+                drafted = await drain_pending_drafts(batch_size=self.batch_size, created_before=created_before)
+                if drafted and self.min_age is not None:
+                    logger.warning(f"Draft recovery sweep drafted {drafted} tickets left without a draft.")
+            except Exception as e:
+                logger.error(f"EXCEPTION in periodic batch drafter: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+
+batch_drafter = PeriodicBatchDrafter(
+    batch_size=int(os.getenv("DRAFT_BATCH_SIZE", "8")),
+    interval=float(os.getenv("DRAFT_BATCH_INTERVAL_SECONDS", "2")),
+)
+draft_recovery = PeriodicBatchDrafter(
+    batch_size=int(os.getenv("DRAFT_BATCH_SIZE", "8")),
+    interval=float(os.getenv("DRAFT_RECOVERY_INTERVAL_SECONDS", "60")),
+    min_age=DRAFT_RECOVERY_AFTER,
+)
+
+
+__all__ = ["DRAFT_MODE", "draft_pending_batch", "drain_pending_drafts", "batch_drafter", "draft_recovery"]
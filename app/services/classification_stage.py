@@ -0,0 +1,343 @@
+# app/services/classification_stage.py
+"""Batched asynchronous classification stage for deferred ingest.
+
+Endpoints insert the ticket, hand its id to this stage and return. A single
+worker task drains the queue in micro-batches (up to `max_batch` ids or
+`max_wait_ms`), classifies them with one batched pipeline call, bulk-updates
+the categories (plus language / priority, see app/services/triage.py) and
+only then schedules response drafting. Tickets of different tenants share
+the batch, each scored against its tenant's labels (app/services/tenants.py).
+
+The queue lives in memory, so a periodic sweep (also run at startup)
+re-queues stored tickets that still have no category, e.g. after a restart.
+A failed batch is retried a few times with backoff before it is left to the
+sweep. Every worker sweeps, so before inference a batch claims its rows
+(`tickets.classification_claimed_at`, one atomic UPDATE); rows another
+worker claimed less than `claim_timeout` seconds ago are skipped. A ticket
+queued by two workers is therefore classified, stored and drafted once.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import or_, select, update
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Ticket
+from app.services.admission import classification_admission
+from app.services.batch_drafting import DRAFT_MODE
+from app.services.classifier import classify_batch_scored, get_classifier_version
+from app.services.events import publish_ticket_event
+from app.services.partitions import created_since
+from app.services.tenants import tenant_directory
+from app.services.triage import triage
+
+logger = logging.getLogger(__name__)
+
+STAGE_QUEUE_DEPTH = Gauge(
+    "classification_stage_queue_depth",
+    "Tickets waiting for deferred classification",
+)
+STAGE_BATCH_SIZE = Histogram(
+    "classification_stage_batch_size",
+    "Tickets classified per deferred batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+STAGE_PENDING_SECONDS = Histogram(
+    "classification_stage_pending_seconds",
+    "Time from ticket submission until its category is stored",
+)
+
+
+class ClassificationStage:
+    def __init__(
+        self,
+        session_maker=AsyncSessionLocal,
+        max_batch: int = 16,
+        max_wait_ms: int = 50,
+        sweep_interval: float = 60.0,
+        max_retries: int = 3,
+        retry_delay: float = 1.0,
+        claim_timeout: float = 300.0,
+    ):
+        self.session_maker = session_maker
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.sweep_interval = sweep_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.claim_timeout = claim_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self._events: Dict[int, asyncio.Event] = {}
+        self._waiters: Dict[int, int] = {}
+        self._attempts: Dict[int, int] = {}
+        # Queued or in-flight ids (the sweep skips them)
+        self._submitted_at: Dict[int, float] = {}
+        # Keep references to spawned draft tasks so they are not GC'd mid-flight
+        self._drafts: Set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        if self.sweep_interval > 0:
+            self._sweeper = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        if not self.running:
+            return
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._sweeper = None
+        await self._queue.put(None)
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except Exception:
+            self._task.cancel()
+        self._task = None
+
+    def submit(self, ticket_id: int) -> None:
+        self._submitted_at[ticket_id] = time.perf_counter()
+        self._queue.put_nowait(ticket_id)
+        STAGE_QUEUE_DEPTH.set(self._queue.qsize())
+
+    async def wait_for(self, ticket_id: int, timeout: float) -> bool:
+        """Wait until this process has classified `ticket_id` (or timeout)."""
+        event = self._events.setdefault(ticket_id, asyncio.Event())
+        self._waiters[ticket_id] = self._waiters.get(ticket_id, 0) + 1
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            # Drop the event with its last waiter, whoever classified the ticket
+            left = self._waiters.pop(ticket_id) - 1
+            if left:
+                self._waiters[ticket_id] = left
+            elif self._events.get(ticket_id) is event:
+                del self._events[ticket_id]
+
+    def _unclaimed(self, now: datetime):
+        stale = now - timedelta(seconds=self.claim_timeout)
+        return or_(Ticket.classification_claimed_at.is_(None), Ticket.classification_claimed_at < stale)
+
+    async def sweep(self) -> int:
+        """Queue stored tickets that are still uncategorised after `sweep_interval`."""
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=self.sweep_interval)
+        async with self.session_maker() as session:
+            ticket_ids = (
+                await session.execute(
+                    select(Ticket.id)
+                    .where(Ticket.category.is_(None), Ticket.created_at < cutoff, self._unclaimed(now))
+                    .order_by(Ticket.id)
+                    .limit(self.max_batch * 64)
+                )
+            ).scalars().all()
+        queued = [ticket_id for ticket_id in ticket_ids if ticket_id not in self._submitted_at]
+        for ticket_id in queued:
+            self.submit(ticket_id)
+        if queued:
+            logger.warning(f"Classification sweep re-queued {len(queued)} uncategorised tickets.")
+        return len(queued)
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"EXCEPTION in classification sweep: {e}", exc_info=True)
+            await asyncio.sleep(self.sweep_interval)
+
+    def _retry(self, ticket_ids: List[int]) -> None:
+        loop = asyncio.get_running_loop()
+        for ticket_id in ticket_ids:
+            attempts = self._attempts.get(ticket_id, 0) + 1
+            if attempts > self.max_retries:
+                self._attempts.pop(ticket_id, None)
+                self._submitted_at.pop(ticket_id, None)
+                logger.error(f"Giving up on deferred classification of ticket {ticket_id}; left to the sweep.")
+                continue
+            self._attempts[ticket_id] = attempts
+            loop.call_later(self.retry_delay * 2 ** (attempts - 1), self._requeue, ticket_id)
+
+    def _requeue(self, ticket_id: int) -> None:
+        if self.running:
+            self._queue.put_nowait(ticket_id)
+            STAGE_QUEUE_DEPTH.set(self._queue.qsize())
+        else:
+            self._attempts.pop(ticket_id, None)
+            self._submitted_at.pop(ticket_id, None)
+
+    async def _next_batch(self) -> Optional[List[int]]:
+        first = await self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                # Finish this batch, then stop
+                self._queue.put_nowait(None)
+                break
+            batch.append(item)
+        STAGE_QUEUE_DEPTH.set(self._queue.qsize())
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            if batch is None:
+                break
+            try:
+                await self._process(batch)
+            except Exception as e:
+                logger.error(f"EXCEPTION in deferred classification batch {batch}: {e}", exc_info=True)
+                self._retry(batch)
+
+    async def _claim(self, ticket_ids: List[int], claimed_at: datetime) -> list:
+        """Claim the uncategorised, unclaimed rows among `ticket_ids` and commit; returns them."""
+        async with self.session_maker() as session:
+            claimed = (
+                await session.execute(
+                    update(Ticket)
+                    .where(Ticket.id.in_(ticket_ids), Ticket.category.is_(None), self._unclaimed(claimed_at))
+                    .values(classification_claimed_at=claimed_at)
+                    .returning(Ticket.id)
+                )
+            ).scalars().all()
+            rows = []
+            if claimed:
+                rows = (
+                    await session.execute(
+                        select(
+                            Ticket.id, Ticket.created_at, Ticket.subject, Ticket.body, Ticket.language,
+                            Ticket.priority, Ticket.tenant,
+                        ).where(Ticket.id.in_(claimed))
+                    )
+                ).all()
+            await session.commit()
+        return rows
+
+    async def _release(self, ticket_ids: List[int], claimed_at: datetime) -> None:
+        async with self.session_maker() as session:
+            await session.execute(
+                update(Ticket)
+                .where(Ticket.id.in_(ticket_ids), Ticket.classification_claimed_at == claimed_at)
+                .values(classification_claimed_at=None)
+            )
+            await session.commit()
+
+    async def _process(self, ticket_ids: List[int]) -> None:
+        # Same model slots as inline classification, but never shed
+        await classification_admission.acquire(deadline=None, shed=False)
+        start = time.perf_counter()
+        updates: List[dict] = []
+        # Also the claim token: only rows still carrying it are stored
+        claimed_at = datetime.now(timezone.utc)
+        try:
+            rows = await self._claim(ticket_ids, claimed_at)
+            if rows:
+                try:
+                    tenants = {r.tenant: await tenant_directory.for_tenant(r.tenant) for r in rows}
+                    label_sets = [tenants[r.tenant] for r in rows]
+                    # One batch for every tenant (app/services/zero_shot.py)
+                    scored = await classify_batch_scored(
+                        [(r.subject or "", r.body or "") for r in rows], label_sets=label_sets
+                    )
+                    versions = {label_set: get_classifier_version(label_set) for label_set in tenants.values()}
+                except Exception:
+                    # Let the retry (or another worker) claim them straight away
+                    await self._release([r.id for r in rows], claimed_at)
+                    raise
+                classified = [
+                    {
+                        "category": label,
+                        "classifier_version": versions[label_set],
+                        **triage(
+                            r.subject or "", r.body or "", label, score,
+                            language=r.language, priority=r.priority,
+                        ),
+                    }
+                    for r, (label, score), label_set in zip(rows, scored, label_sets)
+                ]
+                async with self.session_maker() as session:
+                    for r, values in zip(rows, classified):
+                        # Skipped if the claim expired and another worker took the row over
+                        stored = await session.execute(
+                            update(Ticket)
+                            .where(
+                                Ticket.id == r.id,
+                                *created_since(r.created_at),
+                                Ticket.category.is_(None),
+                                Ticket.classification_claimed_at == claimed_at,
+                            )
+                            .values(**values, classification_claimed_at=None)
+                            .returning(Ticket.id)
+                        )
+                        if stored.scalar() is not None:
+                            updates.append({"id": r.id, **values})
+                    await session.commit()
+        finally:
+            classification_admission.release(held_for=time.perf_counter() - start)
+
+        STAGE_BATCH_SIZE.observe(len(rows))
+        logger.info(f"Deferred classification stored categories for {len(updates)} of {len(ticket_ids)} tickets.")
+        now = time.perf_counter()
+        for ticket_id in ticket_ids:
+            self._attempts.pop(ticket_id, None)
+            submitted = self._submitted_at.pop(ticket_id, None)
+            if submitted is not None:
+                STAGE_PENDING_SECONDS.observe(now - submitted)
+        for row in updates:
+            event = self._events.pop(row["id"], None)
+            if event is not None:
+                event.set()
+            await publish_ticket_event("ticket.classified", row["id"], category=row["category"])
+            self._schedule_draft(row["id"], row["priority"])
+
+    def _schedule_draft(self, ticket_id: int, priority: Optional[str] = None) -> None:
+        if DRAFT_MODE == "batch" and priority != "urgent":
+            return  # the periodic batch drafter picks it up
+        # Imported lazily: the tickets router imports this module
+        from app.routers.tickets import draft_and_store_response
+
+        task = asyncio.create_task(draft_and_store_response(ticket_id, self.session_maker))
+        self._drafts.add(task)
+        task.add_done_callback(self._drafts.discard)
+
+
+classification_stage = ClassificationStage(
+    max_batch=int(os.getenv("CLASSIFY_STAGE_MAX_BATCH", "16")),
+    max_wait_ms=int(os.getenv("CLASSIFY_STAGE_MAX_WAIT_MS", "50")),
+    sweep_interval=float(os.getenv("CLASSIFY_STAGE_SWEEP_SECONDS", "60")),
+    max_retries=int(os.getenv("CLASSIFY_STAGE_MAX_RETRIES", "3")),
+    claim_timeout=float(os.getenv("CLASSIFY_STAGE_CLAIM_SECONDS", "300")),
+)
+
+
+__all__ = ["ClassificationStage", "classification_stage"]
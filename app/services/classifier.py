@@ -1,37 +1,59 @@
 # app/services/classifier.py
 from functools import lru_cache
+import asyncio
+import hashlib
 import logging
 import os
 import time
-from typing import Callable, Dict
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 from prometheus_client import Counter, Histogram, Gauge
 from opentelemetry import trace
 
+from app.services.model_ipc import ModelServerError, ModelServerUnavailable, model_client_from_env
+from app.services.prompts import count_tokens
+from app.services.zero_shot import shared_pass_scorer
+
 logger = logging.getLogger(__name__)
 
 # Metrics
 CLASSIFIER_REQUESTS = Counter(
     "classifier_requests_total",
     "Total classification requests",
-    labelnames=("backend", "label"),
+    labelnames=("backend", "tenant", "label"),
 )
 CLASSIFIER_LATENCY = Histogram(
     "classifier_latency_seconds",
     "Classification latency in seconds",
-    labelnames=("backend",),
+    labelnames=("backend", "tenant"),
 )
 CLASSIFIER_ERRORS = Counter(
     "classifier_errors_total",
     "Total classification errors",
     labelnames=("reason",),
 )
+CLASSIFIER_BUCKET_ITEMS = Counter(
+    "classifier_bucket_items_total",
+    "Inputs classified in batched calls, by length bucket (upper bound in tokens)",
+    labelnames=("bucket",),
+)
+CLASSIFIER_PADDING = Histogram(
+    "classifier_padding_ratio",
+    "Share of each inference batch that is padding (estimated from prompt token counts)",
+    buckets=(0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
 GPU_SELECTED = Gauge(
     "gpu_selected",
     "Selected compute device for classifier (1 for selected)",
     labelnames=("device",),
 )
 
+# Classify through the standalone model server when MODEL_SERVER_SOCKET is set
+# (app/services/model_server.py); "local" loads the model here if it is unreachable
+model_client = model_client_from_env()
+MODEL_SERVER_FALLBACK = os.getenv("MODEL_SERVER_FALLBACK", "none")
+
 # Global info for health/tracing
 _MODEL_BACKEND = "unknown"
 _MODEL_NAME = "unknown"
@@ -54,6 +76,137 @@ def get_model_info() -> Dict[str, str]:
     return {"backend": _MODEL_BACKEND, "model": _MODEL_NAME, "device": _MODEL_DEVICE}
 
 
+def _parse_boundaries(spec: str) -> Tuple[int, ...]:
+    return tuple(sorted({int(item) for item in spec.split(",") if item.strip()}))
+
+
+@dataclass
+class InferenceConfig:
+    """How batched classification groups and sizes its pipeline calls.
+
+    Inputs are split into length buckets at `boundaries` (prompt tokens), so a
+    batch is only padded to the longest input of its own bucket, and each
+    bucket runs in chunks of `batch_size`. `threads` is the torch intra-op
+    thread count (None leaves torch's default). `source` is "default", "env",
+    "calibrated" or "cached" (see app/services/autotune.py).
+    """
+
+    batch_size: int = 16
+    boundaries: Tuple[int, ...] = (128, 384)
+    threads: Optional[int] = None
+    source: str = "default"
+    throughput: Optional[float] = None
+    host: Optional[str] = None
+    calibrated_at: Optional[str] = None
+    trials: List[dict] = field(default_factory=list)
+
+    def as_dict(self, trials: bool = False) -> dict:
+        data = asdict(self)
+        data["boundaries"] = list(self.boundaries)
+        if not trials:
+            data.pop("trials")
+        return data
+
+
+_INFERENCE = InferenceConfig(
+    batch_size=int(os.getenv("CLASSIFIER_BATCH_SIZE", "16")),
+    boundaries=_parse_boundaries(os.getenv("CLASSIFIER_LENGTH_BUCKETS", "128,384")),
+    source="env" if os.getenv("CLASSIFIER_BATCH_SIZE") or os.getenv("CLASSIFIER_LENGTH_BUCKETS") else "default",
+)
+
+
+def get_inference_config() -> InferenceConfig:
+    return _INFERENCE
+
+
+def set_inference_config(config: InferenceConfig) -> None:
+    """Use `config` for batched classification and apply its torch thread count."""
+    global _INFERENCE
+    _INFERENCE = config
+    if config.threads:
+        try:
+            import torch  # type: ignore
+
+            torch.set_num_threads(config.threads)
+        except Exception:
+            pass
+
+
+def bucket_batches(
+    lengths: Sequence[int], boundaries: Sequence[int], batch_size: int
+) -> List[Tuple[int, List[int]]]:
+    """Group input indexes into (bucket, indexes) batches by length.
+
+    `bucket` is the bucket's upper bound (0 for the open-ended last one).
+    Within a bucket inputs are ordered by length before chunking, so each
+    batch holds inputs of similar size.
+    """
+    bounds = sorted(boundaries)
+    grouped: Dict[int, List[int]] = {}
+    for index, length in enumerate(lengths):
+        bucket = next((bound for bound in bounds if length <= bound), 0)
+        grouped.setdefault(bucket, []).append(index)
+    size = max(1, batch_size)
+    batches = []
+    for bucket in bounds + [0]:
+        indexes = sorted(grouped.get(bucket, ()), key=lambda i: lengths[i])
+        batches.extend((bucket, indexes[i : i + size]) for i in range(0, len(indexes), size))
+    return batches
+
+
+def _infer(classifier, prompts: List[str], label_sets: List["LabelSet"]) -> List[dict]:
+    """One batch, possibly mixing label sets.
+
+    A transformers pipeline scores all pairs in one shared forward pass (see
+    app/services/zero_shot.py); other classifiers get one call per label set.
+    """
+    scorer = shared_pass_scorer(classifier)
+    if scorer is not None:
+        try:
+            return scorer(prompts, label_sets)
+        except Exception as e:
+            CLASSIFIER_ERRORS.labels(reason="shared_pass").inc()
+            logger.warning("Shared-pass scoring failed, using the pipeline per label set: %s", e)
+    results: List[Optional[dict]] = [None] * len(prompts)
+    groups: Dict[LabelSet, List[int]] = {}
+    for i, label_set in enumerate(label_sets):
+        groups.setdefault(label_set, []).append(i)
+    for label_set, indexes in groups.items():
+        batch = [prompts[i] for i in indexes]
+        out = classifier(batch, candidate_labels=list(label_set.labels), multi_label=False, batch_size=len(batch))
+        if isinstance(out, dict):
+            out = [out]
+        for i, result in zip(indexes, out):
+            results[i] = result
+    return results
+
+
+def run_bucketed(
+    classifier,
+    prompts: Sequence[str],
+    config: InferenceConfig,
+    batch_size: Optional[int] = None,
+    label_sets: Optional[Sequence[Optional["LabelSet"]]] = None,
+) -> List[dict]:
+    """Classify `prompts` bucket by bucket; results come back in input order.
+
+    `label_sets` gives each prompt's taxonomy (None: the default labels).
+    """
+    lengths = [count_tokens(prompt) for prompt in prompts]
+    sets = [label_set or DEFAULT_LABEL_SET for label_set in (label_sets or [None] * len(prompts))]
+    results: List[Optional[dict]] = [None] * len(prompts)
+    size = batch_size or config.batch_size
+    for bucket, indexes in bucket_batches(lengths, config.boundaries, size):
+        out = _infer(classifier, [prompts[i] for i in indexes], [sets[i] for i in indexes])
+        for i, result in zip(indexes, out):
+            results[i] = result
+        longest = max(lengths[i] for i in indexes)
+        if longest:
+            CLASSIFIER_PADDING.observe(1.0 - sum(lengths[i] for i in indexes) / (longest * len(indexes)))
+        CLASSIFIER_BUCKET_ITEMS.labels(str(bucket) if bucket else "inf").inc(len(indexes))
+    return results
+
+
 CANDIDATE_LABELS = [
     "Billing",
     "Technical",
@@ -65,11 +218,30 @@ CANDIDATE_LABELS = [
 ]
 
 
+@dataclass(frozen=True)
+class LabelSet:
+    """A tenant's label taxonomy (see app/services/tenants.py)."""
+
+    tenant: str
+    labels: Tuple[str, ...]
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha1("|".join(self.labels).encode()).hexdigest()[:8]
+
+
+DEFAULT_TENANT = "default"
+DEFAULT_LABEL_SET = LabelSet(DEFAULT_TENANT, tuple(CANDIDATE_LABELS))
+
+
 def _mock_classifier() -> Callable[[str, Dict, bool], Dict[str, list]]:
     """Return a simple mock classifier that always predicts 'Refund'."""
 
-    def _run(prompt: str, candidate_labels=None, multi_label: bool = False):  # type: ignore[override]
+    def _run(prompt, candidate_labels=None, multi_label: bool = False, **kwargs):  # type: ignore[override]
         label = "Refund" if (candidate_labels and "Refund" in candidate_labels) else (candidate_labels[0] if candidate_labels else "Other")
+        # Mirror the HF pipeline: a list of sequences yields a list of results
+        if isinstance(prompt, list):
+            return [{"labels": [label], "scores": [0.99]} for _ in prompt]
         return {"labels": [label], "scores": [0.99]}
 
     _set_model_info("mock", "mock-classifier", os.getenv("CUDA_VISIBLE_DEVICES", "") or "cpu")
@@ -137,33 +309,181 @@ def get_zero_shot_classifier():
         return _mock_classifier()
 
 
-async def classify_ticket(subject: str, body: str) -> str:
-    tracer = trace.get_tracer(__name__)
-    info = get_model_info()
+def configured_model_name() -> str:
+    """The model this deployment is configured to run, without loading it."""
+    if os.getenv("APP_MOCK_AI") == "1" or os.getenv("MOCK_CLASSIFIER") == "1":
+        return "mock-classifier"
+    return os.getenv("HF_MODEL", "facebook/bart-large-mnli")
 
-    prompt = (
+
+async def load_classifier_info() -> None:
+    """Ask the model server for its model unless a reply already carried it.
+
+    Call before `get_classifier_version` where no classification has run
+    yet in this process (e.g. the reclassify job). Raises ModelServerError
+    when the server cannot be reached.
+    """
+    if model_client is not None and MODEL_SERVER_FALLBACK != "local" and not model_client.info.get("model"):
+        await model_client.fetch_info()
+
+
+def get_classifier_version(label_set: Optional[LabelSet] = None) -> str:
+    """Identify the model + label set that produced a stored category.
+
+    Tickets carry this string so a change of HF_MODEL, CANDIDATE_LABELS or a
+    tenant's labels can be detected and backfilled (see
+    app/services/reclassify.py). With a model server the model name comes
+    from its replies (see `load_classifier_info`); with
+    MODEL_SERVER_FALLBACK=local either side may classify, so the configured
+    HF_MODEL is used. Raises ModelServerUnavailable rather than stamp an
+    unknown model.
+    """
+    if model_client is not None and MODEL_SERVER_FALLBACK == "local":
+        model = configured_model_name()
+    elif model_client is not None:
+        model = model_client.info.get("model", "unknown")
+    else:
+        get_zero_shot_classifier()
+        model = get_model_info().get("model", "unknown")
+    if model == "unknown":
+        raise ModelServerUnavailable("classifier model is unknown; the model server has not reported it yet")
+    return f"{model}:{(label_set or DEFAULT_LABEL_SET).digest}"
+
+
+def build_classification_prompt(subject: str, body: str, labels: Optional[Sequence[str]] = None) -> str:
+    return (
         f"Subject: {subject}\n"
         f"Body: {body}\n"
         "You are an expert support agent categorizing issues. Please classify this customer support message as one of: "
-        "Billing, Technical, Account, Complaint, Feedback, Refund, Other."
+        f"{', '.join(labels or CANDIDATE_LABELS)}."
         "Only choose one label from this list."
     )
 
+
+def _observe(backend: str, sets: Sequence[LabelSet], scored: Sequence[Tuple[str, float]], latency: float) -> None:
+    # Per-item latency keeps the histogram comparable with classify_ticket
+    per_item = latency / len(scored)
+    for label_set, (label, _) in zip(sets, scored):
+        CLASSIFIER_LATENCY.labels(backend, label_set.tenant).observe(per_item)
+        CLASSIFIER_REQUESTS.labels(backend, label_set.tenant, label).inc()
+
+
+async def _classify_remote(
+    items: Sequence[Tuple[str, str]], label_sets: Optional[Sequence[Optional[LabelSet]]] = None
+) -> List[Tuple[str, float]]:
+    sets = [label_set or DEFAULT_LABEL_SET for label_set in (label_sets or [None] * len(items))]
+    start = time.perf_counter()
+    scored = await model_client.classify(items, label_sets=label_sets)
+    _observe("model_server", sets, scored, time.perf_counter() - start)
+    return scored
+
+
+async def classify_batch_scored(
+    items: Sequence[Tuple[str, str]],
+    batch_size: Optional[int] = None,
+    label_sets: Optional[Sequence[Optional[LabelSet]]] = None,
+) -> List[Tuple[str, float]]:
+    """Classify many (subject, body) pairs; returns one (label, score) per input, in order.
+
+    `label_sets` gives each item's tenant taxonomy (None: the default
+    labels); items of different tenants share one batch. Goes to the model
+    server when one is configured (`batch_size` is then left to the server's
+    tuning), otherwise runs `classify_batch_local`.
+    """
+    if not items:
+        return []
+    if model_client is not None:
+        try:
+            return await _classify_remote(items, label_sets)
+        except ModelServerError as e:
+            CLASSIFIER_ERRORS.labels(reason="model_server").inc()
+            if MODEL_SERVER_FALLBACK != "local":
+                raise
+            logger.warning("Model server failed, classifying %s tickets in process: %s", len(items), e)
+    return await classify_batch_local(items, batch_size=batch_size, label_sets=label_sets)
+
+
+async def classify_batch_local(
+    items: Sequence[Tuple[str, str]],
+    batch_size: Optional[int] = None,
+    label_sets: Optional[Sequence[Optional[LabelSet]]] = None,
+) -> List[Tuple[str, float]]:
+    """Classify many (subject, body) pairs with batched pipeline inference in this process.
+
+    Inputs are grouped into length buckets and run in chunks of the tuned
+    batch size (`get_inference_config`, or `batch_size` when given).
+    Inference runs in a worker thread so a long batch does not stall the
+    event loop. Returns one (label, score) per input, in order.
+    """
+    if not items:
+        return []
     classifier = get_zero_shot_classifier()
+    info = get_model_info()
+    sets = [label_set or DEFAULT_LABEL_SET for label_set in (label_sets or [None] * len(items))]
+    prompts = [build_classification_prompt(subject, body, label_set.labels) for (subject, body), label_set in zip(items, sets)]
 
-    logger.warning(f"Classifying ticket with subject: {subject[:30]}...")
     start = time.perf_counter()
     try:
-        result = classifier(
-            prompt,
-            candidate_labels=CANDIDATE_LABELS,
-            multi_label=False,
-        )
+        results = await asyncio.to_thread(run_bucketed, classifier, prompts, get_inference_config(), batch_size, sets)
+    except Exception as e:
+        CLASSIFIER_ERRORS.labels(reason="batch_inference_error").inc()
+        logger.error(f"ERROR during batch classification: {e}", exc_info=True)
+        raise
+    latency = time.perf_counter() - start
+
+    scored = [(r["labels"][0], float(r["scores"][0])) for r in results]
+    _observe(info.get("backend", "unknown"), sets, scored, latency)
+    return scored
+
+
+async def classify_batch(
+    items: Sequence[Tuple[str, str]],
+    batch_size: Optional[int] = None,
+    label_sets: Optional[Sequence[Optional[LabelSet]]] = None,
+) -> List[str]:
+    """`classify_batch_scored` without the scores."""
+    return [label for label, _ in await classify_batch_scored(items, batch_size=batch_size, label_sets=label_sets)]
+
+
+async def classify_ticket(subject: str, body: str, label_set: Optional[LabelSet] = None) -> str:
+    label, _ = await classify_ticket_scored(subject, body, label_set)
+    return label
+
+
+async def classify_ticket_scored(subject: str, body: str, label_set: Optional[LabelSet] = None) -> Tuple[str, float]:
+    """Top label of `label_set` (default labels if None) and its score.
+
+    Inference errors and model server failures (ModelServerError, unless
+    MODEL_SERVER_FALLBACK=local) are raised, so callers store the ticket
+    uncategorised and classify it later instead of filing it as "Other".
+    """
+    label_set = label_set or DEFAULT_LABEL_SET
+    if model_client is not None:
+        try:
+            return (await _classify_remote([(subject, body)], [label_set]))[0]
+        except ModelServerError as e:
+            CLASSIFIER_ERRORS.labels(reason="model_server").inc()
+            if MODEL_SERVER_FALLBACK != "local":
+                logger.error(f"ERROR during classification via model server: {e}")
+                raise
+            logger.warning("Model server failed, classifying in process: %s", e)
+    tracer = trace.get_tracer(__name__)
+    info = get_model_info()
+
+    prompt = build_classification_prompt(subject, body, label_set.labels)
+
+    classifier = get_zero_shot_classifier()
+
+    logger.warning("Classifying ticket with subject: %.30s...", subject)
+    start = time.perf_counter()
+    try:
+        # Run inference off the event loop so admission control and other
+        # requests keep making progress while the model is busy
+        result = (await asyncio.to_thread(_infer, classifier, [prompt], [label_set]))[0]
         latency = time.perf_counter() - start
-        label = result["labels"][0]
+        label, score = result["labels"][0], float(result["scores"][0])
         # Metrics
-        CLASSIFIER_LATENCY.labels(info.get("backend", "unknown")).observe(latency)
-        CLASSIFIER_REQUESTS.labels(info.get("backend", "unknown"), label).inc()
+        _observe(info.get("backend", "unknown"), [label_set], [(label, score)], latency)
         # Tracing
         with tracer.start_as_current_span("classify_ticket") as span:
             span.set_attribute("classifier.backend", info.get("backend", "unknown"))
@@ -171,10 +491,10 @@ async def classify_ticket(subject: str, body: str) -> str:
             span.set_attribute("classifier.device", info.get("device", "cpu"))
             span.set_attribute("latency_ms", int(latency * 1000))
             span.set_attribute("label", label)
-        logger.warning(f"Classification result: {label}")
-        return label
+            span.set_attribute("tenant", label_set.tenant)
+        logger.warning("Classification result: %s", label, extra={"event_type": "classify.result"})
+        return label, score
     except Exception as e:
         CLASSIFIER_ERRORS.labels(reason="inference_error").inc()
         logger.error(f"ERROR during classification: {e}", exc_info=True)
-        # Return a safe fallback
-        return "Other"
+        raise
@@ -0,0 +1,190 @@
+# app/services/draft_cache.py
+"""Reuse response drafts for repeated or near-identical tickets.
+
+Two lookups, tried in order before paying for an LLM generation:
+
+1. Exact: an LRU/TTL map keyed on the SHA-256 of the `response.j2` prompt
+   rendered from the category, language and whitespace/case-normalized
+   subject+body, plus the language itself: a draft is only reused for a
+   ticket in the same language, whether or not a template variant exists.
+2. Similar (optional, `DRAFT_CACHE_SIMILARITY` > 0): the most recent
+   *reviewed* drafts in the same category and language are compared by
+   word-set Jaccard similarity; the best match above the threshold is reused.
+
+Hits are recorded on the stored Response via `source`/`source_response_id`.
+"""
+
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import select
+
+from app.db.models import Response, Ticket
+from app.services.response_gen import render_prompt
+
+DRAFT_CACHE_LOOKUPS = Counter(
+    "draft_cache_lookups_total",
+    "Draft cache lookups by result",
+    labelnames=("result",),
+)
+DRAFT_CACHE_SAVED_SECONDS = Counter(
+    "draft_cache_saved_llm_seconds_total",
+    "LLM generation time avoided by reusing cached drafts",
+)
+DRAFT_CACHE_ENTRIES = Gauge(
+    "draft_cache_entries",
+    "Entries in the exact-match draft cache",
+)
+
+_WS = re.compile(r"\s+")
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def normalize(text: str) -> str:
+    return _WS.sub(" ", (text or "").strip().lower())
+
+
+def _words(subject: str, body: str) -> FrozenSet[str]:
+    return frozenset(_WORD.findall(normalize(f"{subject} {body}")))
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class CachedDraft:
+    text: str
+    source: str  # "cache_exact" | "cache_similar"
+    response_id: Optional[int]
+    generation_seconds: float = 0.0
+
+
+class DraftCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        similarity: float = 0.0,
+        candidates: int = 200,
+        candidates_ttl: float = 60.0,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.similarity = similarity
+        self.candidates = candidates
+        self.candidates_ttl = candidates_ttl
+        # key -> (stored_at, text, response_id, generation_seconds)
+        self._entries: "OrderedDict[str, Tuple[float, str, Optional[int], float]]" = OrderedDict()
+        # (category, language) -> (loaded_at, [(words, text, response_id)])
+        self._reviewed: Dict[Tuple[str, Optional[str]], Tuple[float, List[Tuple[FrozenSet[str], str, int]]]] = {}
+        # EWMA of LLM generation time, credited as "saved" on similar hits
+        self._avg_generation = 0.0
+
+    @staticmethod
+    def key(subject: str, body: str, category: str, language: Optional[str] = None) -> str:
+        prompt = render_prompt(normalize(subject), normalize(body), category, language)
+        # Hashed with the prompt: without a variant for it, the language does not change the text
+        return hashlib.sha256(f"{language or ''}\n{prompt}".encode()).hexdigest()
+
+    def get_exact(self, subject: str, body: str, category: str, language: Optional[str] = None) -> Optional[CachedDraft]:
+        k = self.key(subject, body, category, language)
+        entry = self._entries.get(k)
+        if entry is None:
+            return None
+        stored_at, text, response_id, generation = entry
+        if time.monotonic() - stored_at > self.ttl:
+            self._entries.pop(k, None)
+            DRAFT_CACHE_ENTRIES.set(len(self._entries))
+            return None
+        self._entries.move_to_end(k)
+        return CachedDraft(text, "cache_exact", response_id, generation)
+
+    def put(
+        self,
+        subject: str,
+        body: str,
+        category: str,
+        text: str,
+        response_id: Optional[int],
+        generation_seconds: float,
+        language: Optional[str] = None,
+    ) -> None:
+        self._avg_generation = (
+            generation_seconds if not self._avg_generation else 0.9 * self._avg_generation + 0.1 * generation_seconds
+        )
+        if self.max_entries <= 0:
+            return
+        k = self.key(subject, body, category, language)
+        self._entries[k] = (time.monotonic(), text, response_id, generation_seconds)
+        self._entries.move_to_end(k)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        DRAFT_CACHE_ENTRIES.set(len(self._entries))
+
+    async def _reviewed_candidates(self, session, category: str, language: Optional[str]):
+        loaded = self._reviewed.get((category, language))
+        if loaded is not None and time.monotonic() - loaded[0] < self.candidates_ttl:
+            return loaded[1]
+        rows = (
+            await session.execute(
+                select(Ticket.subject, Ticket.body, Response.generated_response, Response.id)
+                .join(Response, Response.ticket_id == Ticket.id)
+                .where(
+                    Ticket.category == category,
+                    # IS NULL when the language is unknown
+                    Ticket.language == language,
+                    Response.reviewed.is_(True),
+                    Response.status == "completed",
+                )
+                .order_by(Response.id.desc())
+                .limit(self.candidates)
+            )
+        ).all()
+        candidates = [(_words(r.subject, r.body), r.generated_response, r.id) for r in rows]
+        self._reviewed[(category, language)] = (time.monotonic(), candidates)
+        return candidates
+
+    async def get_similar(
+        self, session, subject: str, body: str, category: str, language: Optional[str] = None
+    ) -> Optional[CachedDraft]:
+        if self.similarity <= 0:
+            return None
+        words = _words(subject, body)
+        best: Optional[Tuple[float, str, int]] = None
+        for cand_words, text, response_id in await self._reviewed_candidates(session, category, language):
+            score = _jaccard(words, cand_words)
+            if score >= self.similarity and (best is None or score > best[0]):
+                best = (score, text, response_id)
+        if best is None:
+            return None
+        return CachedDraft(best[1], "cache_similar", best[2], self._avg_generation)
+
+    async def lookup(
+        self, session, subject: str, body: str, category: str, language: Optional[str] = None
+    ) -> Optional[CachedDraft]:
+        hit = self.get_exact(subject, body, category, language)
+        if hit is None:
+            hit = await self.get_similar(session, subject, body, category, language)
+        DRAFT_CACHE_LOOKUPS.labels(hit.source if hit else "miss").inc()
+        if hit is not None and hit.generation_seconds:
+            DRAFT_CACHE_SAVED_SECONDS.inc(hit.generation_seconds)
+        return hit
+
+
+draft_cache = DraftCache(
+    max_entries=int(os.getenv("DRAFT_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("DRAFT_CACHE_TTL_SECONDS", "3600")),
+    similarity=float(os.getenv("DRAFT_CACHE_SIMILARITY", "0")),
+)
+
+
+__all__ = ["DraftCache", "CachedDraft", "draft_cache", "normalize"]
@@ -0,0 +1,221 @@
+# app/services/events.py
+"""Ticket event fan-out for push clients (SSE / WebSocket).
+
+Events are small JSON dicts such as
+`{"type": "ticket.classified", "ticket_id": 7, "category": "Refund"}`.
+On Postgres they are published with `pg_notify` and every API worker LISTENs
+on the same channel, so a subscriber connected to any worker sees events
+produced by all of them. On other databases (SQLite in tests/dev) events are
+delivered in-process only.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+
+from app.db.database import DATABASE_URL, engine
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "ticket_events"
+# NOTIFY payloads are capped at 8000 bytes by Postgres
+MAX_NOTIFY_BYTES = 7500
+
+EVENTS_PUBLISHED = Counter(
+    "ticket_events_published_total",
+    "Ticket events published",
+    labelnames=("type",),
+)
+EVENTS_DROPPED = Counter(
+    "ticket_events_dropped_total",
+    "Ticket events dropped because a subscriber queue was full",
+)
+EVENT_SUBSCRIBERS = Gauge(
+    "ticket_event_subscribers",
+    "Open push subscriptions",
+    labelnames=("kind",),
+)
+
+# Subscription keys: ("ticket", 7), ("category", "Refund"), ("all", None)
+Key = Tuple[str, Any]
+
+
+class TicketEventBus:
+    def __init__(self, database_url: str = DATABASE_URL):
+        self.database_url = database_url
+        self._subscribers: Dict[Key, Set[asyncio.Queue]] = {}
+        # Synchronous hooks (e.g. cache invalidation) run for every event,
+        # including events published by other workers
+        self._hooks: List[Callable[[Dict[str, Any]], None]] = []
+        self._listener = None
+        self._supervisor: Optional[asyncio.Task] = None
+
+    @property
+    def uses_postgres(self) -> bool:
+        return self.database_url.startswith("postgresql")
+
+    @property
+    def listening(self) -> bool:
+        return self._listener is not None and not self._listener.is_closed()
+
+    # --- lifecycle -------------------------------------------------------
+    async def start(self) -> None:
+        if self.uses_postgres and self._supervisor is None:
+            self._supervisor = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._supervisor = None
+        if self._listener is not None:
+            try:
+                await self._listener.close()
+            except Exception:
+                pass
+            self._listener = None
+
+    async def _listen_forever(self) -> None:
+        """Keep a dedicated LISTEN connection open, reconnecting on failure."""
+        import asyncpg  # type: ignore
+
+        dsn = self.database_url.replace("postgresql+asyncpg", "postgresql", 1)
+        backoff = 1.0
+        while True:
+            try:
+                self._listener = await asyncpg.connect(dsn)
+                await self._listener.add_listener(CHANNEL, self._on_notify)
+                backoff = 1.0
+                while not self._listener.is_closed():
+                    await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ticket event listener failed, retrying in {backoff:.0f}s: {e}")
+            self._listener = None
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+            self._run_hooks(event)
+            self._dispatch(event)
+        except Exception:
+            pass
+
+    # --- publish / subscribe --------------------------------------------
+    def add_hook(self, hook: Callable[[Dict[str, Any]], None]) -> None:
+        if hook not in self._hooks:
+            self._hooks.append(hook)
+
+    def _run_hooks(self, event: Dict[str, Any]) -> None:
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                logger.error(f"Ticket event hook failed for {event.get('type')}: {e}")
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        EVENTS_PUBLISHED.labels(event.get("type", "unknown")).inc()
+        # Hooks run immediately in the publishing worker; other workers run
+        # them when the NOTIFY arrives
+        self._run_hooks(event)
+        if not self.listening:
+            self._dispatch(event)
+            return
+        payload = json.dumps(event, default=str)
+        if len(payload.encode()) > MAX_NOTIFY_BYTES:
+            # Large fields (draft text) are fetched via the REST API instead
+            event = {k: v for k, v in event.items() if k != "generated_response"}
+            payload = json.dumps(event, default=str)
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+                await conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to NOTIFY ticket event, delivering locally: {e}")
+            self._dispatch(event)
+
+    def _dispatch(self, event: Dict[str, Any]) -> None:
+        keys = [("all", None)]
+        if event.get("ticket_id") is not None:
+            keys.append(("ticket", int(event["ticket_id"])))
+        if event.get("category"):
+            keys.append(("category", event["category"]))
+        for key in keys:
+            for queue in list(self._subscribers.get(key, ())):
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    EVENTS_DROPPED.inc()
+
+    def subscribe(self, kind: str, value: Any = None, queue: Optional[asyncio.Queue] = None) -> asyncio.Queue:
+        """Register a bounded queue for (kind, value); one queue may serve many keys."""
+        if queue is None:
+            queue = asyncio.Queue(maxsize=100)
+        queues = self._subscribers.setdefault((kind, value), set())
+        if queue not in queues:
+            queues.add(queue)
+            EVENT_SUBSCRIBERS.labels(kind).inc()
+        return queue
+
+    def unsubscribe(self, kind: str, value: Any, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get((kind, value))
+        if queues and queue in queues:
+            queues.discard(queue)
+            EVENT_SUBSCRIBERS.labels(kind).dec()
+            if not queues:
+                self._subscribers.pop((kind, value), None)
+
+
+event_bus = TicketEventBus()
+
+
+async def publish_ticket_event(event_type: str, ticket_id: int, **fields: Any) -> None:
+    """Publish an event; never raises into the caller's write path."""
+    try:
+        await event_bus.publish({"type": event_type, "ticket_id": ticket_id, **fields})
+    except Exception as e:
+        logger.error(f"Failed to publish {event_type} for ticket {ticket_id}: {e}")
+
+
+class DeltaPublisher:
+    """Coalesce streamed draft fragments into `response.delta` events.
+
+    One event per `interval` seconds keeps NOTIFY traffic bounded no matter
+    how small the model's token chunks are. `offset` is the character
+    position of the chunk so clients can stitch the text back together.
+    """
+
+    def __init__(self, ticket_id: int, interval: float = 0.1):
+        self.ticket_id = ticket_id
+        self.interval = interval
+        self._pending: list = []
+        self._sent = 0
+        self._last_flush = time.perf_counter()
+
+    async def add(self, delta: str) -> None:
+        self._pending.append(delta)
+        if time.perf_counter() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self) -> None:
+        self._last_flush = time.perf_counter()
+        if not self._pending:
+            return
+        chunk = "".join(self._pending)
+        self._pending.clear()
+        await publish_ticket_event("response.delta", self.ticket_id, delta=chunk, offset=self._sent)
+        self._sent += len(chunk)
+
+
+__all__ = ["TicketEventBus", "DeltaPublisher", "event_bus", "publish_ticket_event", "CHANNEL"]
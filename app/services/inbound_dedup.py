@@ -0,0 +1,104 @@
+# app/services/inbound_dedup.py
+"""Idempotency keys for inbound email.
+
+The Cloudflare worker retries `POST /email/inbound` after a timeout, so one
+email can arrive several times. Each email gets a message key: the
+Message-ID when the worker sends one, otherwise a digest of from / date /
+subject / text. The insert first claims the key in `inbound_message_keys`
+with ON CONFLICT DO NOTHING, so a duplicate never becomes a second ticket.
+
+`RecentKeys` sits in front of the database. It is a bounded map of recently
+seen keys to ticket ids (`INBOUND_RECENT_KEYS`). It also tracks keys still
+being processed, so a retry that arrives while the first delivery is still
+classifying waits for that ticket instead of running the model again.
+"""
+
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from prometheus_client import Counter
+
+INBOUND_DUPLICATES = Counter(
+    "inbound_email_duplicates_total",
+    "Inbound emails answered with an existing ticket, by where the key was found",
+    labelnames=("source",),
+)
+
+
+def message_key(message_id: Optional[str], sender: str, date: str, subject: str, text: str) -> str:
+    """Stable key for one email: the Message-ID if present, else a payload digest."""
+    message_id = (message_id or "").strip().strip("<>").strip().lower()
+    if message_id:
+        return "mid:" + hashlib.sha256(message_id.encode()).hexdigest()
+    digest = hashlib.sha256("\x00".join((sender.strip().lower(), date.strip(), subject, text)).encode())
+    return "sha:" + digest.hexdigest()
+
+
+class RecentKeys:
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._done: "OrderedDict[str, int]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def get(self, key: str) -> Optional[int]:
+        ticket_id = self._done.get(key)
+        if ticket_id is not None:
+            self._done.move_to_end(key)
+        return ticket_id
+
+    async def wait(self, key: str) -> Optional[int]:
+        """Ticket id for `key` if known, waiting for an in-flight delivery; else None."""
+        ticket_id = self.get(key)
+        if ticket_id is not None:
+            return ticket_id
+        pending = self._in_flight.get(key)
+        if pending is None:
+            return None
+        try:
+            return await asyncio.shield(pending)
+        except Exception:
+            # The first delivery failed; the caller may process this one
+            return None
+
+    def begin(self, key: str) -> bool:
+        """Claim `key` for processing; False if it is known or already claimed."""
+        if key in self._done or key in self._in_flight:
+            return False
+        self._in_flight[key] = asyncio.get_running_loop().create_future()
+        return True
+
+    def finish(self, key: str, ticket_id: int) -> None:
+        self.remember(key, ticket_id)
+        pending = self._in_flight.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_result(ticket_id)
+
+    def abort(self, key: str, error: BaseException) -> None:
+        pending = self._in_flight.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_exception(error)
+            # Mark retrieved so an unawaited failure is not logged by asyncio
+            pending.exception()
+
+    def remember(self, key: str, ticket_id: int) -> None:
+        if self.max_entries <= 0:
+            return
+        self._done[key] = ticket_id
+        self._done.move_to_end(key)
+        while len(self._done) > self.max_entries:
+            self._done.popitem(last=False)
+
+    def forget(self, key: str) -> None:
+        self._done.pop(key, None)
+
+    def clear(self) -> None:
+        self._done.clear()
+
+
+recent_inbound_keys = RecentKeys(max_entries=int(os.getenv("INBOUND_RECENT_KEYS", "10000")))
+
+
+__all__ = ["message_key", "RecentKeys", "recent_inbound_keys", "INBOUND_DUPLICATES"]
@@ -0,0 +1,368 @@
+# app/services/llm_client.py
+"""Resilient call layer for LLM provider requests.
+
+Every provider call goes through `llm_caller.call(op, make_request)`:
+
+- each attempt is bounded by a timeout (`LLM_ATTEMPT_TIMEOUT_SECONDS`);
+- retryable failures (timeouts, 429, 5xx, connection errors) are retried
+  with full-jitter exponential backoff (`LLM_MAX_ATTEMPTS`, honouring a
+  provider Retry-After when it is shorter than the cap);
+- with `LLM_HEDGE=1`, a second identical request is sent if the first has
+  not answered after the recent p95 latency, and the first reply wins;
+- a circuit breaker opens after `LLM_BREAKER_FAILURES` consecutive provider
+  failures. While open, callers wait (up to `LLM_BREAKER_QUEUE_SECONDS`,
+  at most `LLM_BREAKER_MAX_QUEUED` of them) for a half-open probe to
+  succeed instead of sending more requests.
+
+Failures surface as `LLMError` subclasses rather than "Error: ..." strings.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LLM_ATTEMPTS = Counter(
+    "llm_attempts_total",
+    "LLM request attempts by outcome",
+    labelnames=("op", "outcome"),
+)
+LLM_RETRIES = Counter(
+    "llm_retries_total",
+    "LLM request retries by the error that caused them",
+    labelnames=("op", "error"),
+)
+LLM_HEDGES = Counter(
+    "llm_hedged_requests_total",
+    "Hedged second requests by result (launched, won)",
+    labelnames=("op", "result"),
+)
+LLM_FAILURES = Counter(
+    "llm_failures_total",
+    "LLM calls that failed after retries, by error type",
+    labelnames=("op", "error"),
+)
+LLM_CIRCUIT_STATE = Gauge(
+    "llm_circuit_state",
+    "LLM circuit breaker state (0=closed, 1=half-open, 2=open)",
+)
+LLM_CIRCUIT_OPENED = Counter(
+    "llm_circuit_opened_total",
+    "Times the LLM circuit breaker opened",
+)
+LLM_CIRCUIT_QUEUED = Gauge(
+    "llm_circuit_queued",
+    "Calls waiting for the LLM circuit breaker to close",
+)
+LLM_CIRCUIT_REJECTED = Counter(
+    "llm_circuit_rejected_total",
+    "Calls rejected because the LLM circuit breaker stayed open",
+)
+
+
+class LLMError(Exception):
+    """Base class for LLM call failures."""
+
+    kind = "error"
+    retryable = False
+
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message or self.kind)
+        self.retry_after = retry_after
+
+
+class LLMConfigError(LLMError):
+    kind = "config"
+
+
+class LLMBadRequest(LLMError):
+    kind = "bad_request"
+
+
+class LLMEmptyResponse(LLMError):
+    kind = "empty_response"
+
+
+class LLMTimeout(LLMError):
+    kind = "timeout"
+    retryable = True
+
+
+class LLMRateLimited(LLMError):
+    kind = "rate_limited"
+    retryable = True
+
+
+class LLMUnavailable(LLMError):
+    kind = "unavailable"
+    retryable = True
+
+
+class CircuitOpenError(LLMError):
+    kind = "circuit_open"
+
+
+def classify_error(exc: BaseException) -> LLMError:
+    """Map provider/transport exceptions onto the LLMError hierarchy."""
+    if isinstance(exc, LLMError):
+        return exc
+    if isinstance(exc, asyncio.TimeoutError):
+        return LLMTimeout(str(exc) or "attempt timed out")
+    name = type(exc).__name__
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(exc, "response", None), "status_code", None)
+    retry_after = None
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers is not None:
+        try:
+            retry_after = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            retry_after = None
+    if "Timeout" in name:
+        return LLMTimeout(str(exc))
+    if status_code == 429 or "RateLimit" in name:
+        return LLMRateLimited(str(exc), retry_after=retry_after)
+    if (isinstance(status_code, int) and status_code >= 500) or "Connection" in name or isinstance(exc, OSError):
+        return LLMUnavailable(str(exc), retry_after=retry_after)
+    if isinstance(status_code, int) and 400 <= status_code < 500:
+        return LLMBadRequest(str(exc))
+    return LLMError(f"{name}: {exc}")
+
+
+class LatencyWindow:
+    """Recent successful attempt latencies, used to pick the hedge delay."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, max_queued: int = 100):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_queued = max_queued
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._queued = 0
+        self._closed = asyncio.Event()
+        self._closed.set()
+
+    def _set_state(self, state: int) -> None:
+        self.state = state
+        LLM_CIRCUIT_STATE.set(state)
+
+    def _allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    async def acquire(self, queue_timeout: float) -> None:
+        """Return once a request may be sent; raise CircuitOpenError otherwise."""
+        deadline = time.monotonic() + queue_timeout
+        while not self._allow():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._queued >= self.max_queued:
+                LLM_CIRCUIT_REJECTED.inc()
+                raise CircuitOpenError("LLM provider circuit is open")
+            if self.state == self.OPEN:
+                # Wake up for the half-open probe even if nothing closes the circuit
+                remaining = min(remaining, max(0.0, self._opened_at + self.reset_timeout - time.monotonic()) + 0.001)
+            self._queued += 1
+            LLM_CIRCUIT_QUEUED.set(self._queued)
+            try:
+                await asyncio.wait_for(self._closed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._queued -= 1
+                LLM_CIRCUIT_QUEUED.set(self._queued)
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probe_in_flight = False
+        if self.state != self.CLOSED:
+            logger.warning("LLM circuit breaker closed.")
+            self._set_state(self.CLOSED)
+        self._closed.set()
+
+    def record_failure(self, provider_fault: bool = True) -> None:
+        probe = self._probe_in_flight
+        self._probe_in_flight = False
+        if not provider_fault:
+            return
+        self._failures += 1
+        if probe or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"LLM circuit breaker opened after {self._failures} failures.")
+                LLM_CIRCUIT_OPENED.inc()
+            self._opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+            self._closed.clear()
+
+
+class ResilientCaller:
+    def __init__(
+        self,
+        attempt_timeout: float = 30.0,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.05,
+        breaker: Optional[CircuitBreaker] = None,
+        breaker_queue_timeout: float = 10.0,
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.breaker_queue_timeout = breaker_queue_timeout
+        self.latencies = LatencyWindow()
+
+    def backoff(self, attempt: int, error: LLMError) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if error.retry_after is not None:
+            delay = max(delay, min(error.retry_after, self.backoff_max))
+        return delay
+
+    async def _timed(self, make_request: Callable[[], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(make_request(), timeout=self.attempt_timeout)
+        except Exception as e:
+            raise classify_error(e) from e
+        self.latencies.add(time.perf_counter() - start)
+        return result
+
+    async def _attempt(self, op: str, make_request: Callable[[], Awaitable[T]], hedge: bool) -> T:
+        delay = self.latencies.p95() if hedge else None
+        if delay is None:
+            return await self._timed(make_request)
+
+        primary = asyncio.ensure_future(self._timed(make_request))
+        done, _ = await asyncio.wait({primary}, timeout=max(delay, self.hedge_min_delay))
+        if done:
+            return primary.result()
+        LLM_HEDGES.labels(op, "launched").inc()
+        secondary = asyncio.ensure_future(self._timed(make_request))
+        pending = {primary, secondary}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary:
+                            LLM_HEDGES.labels(op, "won").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error  # both requests failed
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(
+        self,
+        op: str,
+        make_request: Callable[[], Awaitable[T]],
+        hedge: Optional[bool] = None,
+        retry_timeouts: bool = True,
+    ) -> T:
+        """Run `make_request` with timeouts, retries, hedging and the circuit breaker.
+
+        `make_request` must create a fresh request each time it is called.
+        With `retry_timeouts=False` a timed-out attempt is not retried (for
+        backends where the timed-out work is still running and a retry would
+        only queue behind it). Raises an LLMError subclass when the call
+        cannot be completed.
+        """
+        hedge = self.hedge if hedge is None else hedge
+        attempt = 0
+        while True:
+            await self.breaker.acquire(self.breaker_queue_timeout)
+            try:
+                result = await self._attempt(op, make_request, hedge)
+            except LLMError as e:
+                LLM_ATTEMPTS.labels(op, e.kind).inc()
+                self.breaker.record_failure(provider_fault=e.retryable)
+                attempt += 1
+                retryable = e.retryable and (retry_timeouts or not isinstance(e, LLMTimeout))
+                if not retryable or attempt >= self.max_attempts:
+                    LLM_FAILURES.labels(op, e.kind).inc()
+                    raise
+                LLM_RETRIES.labels(op, e.kind).inc()
+                delay = self.backoff(attempt - 1, e)
+                logger.warning(f"LLM {op} attempt {attempt} failed ({e.kind}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (or an unexpected error): free a half-open probe slot
+                # without blaming the provider, or the breaker never lets a call through again
+                self.breaker.record_failure(provider_fault=False)
+                raise
+            LLM_ATTEMPTS.labels(op, "ok").inc()
+            self.breaker.record_success()
+            return result
+
+
+llm_caller = ResilientCaller(
+    attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "30")),
+    max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+    backoff_base=float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5")),
+    backoff_max=float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8")),
+    hedge=os.getenv("LLM_HEDGE", "0") == "1",
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+        max_queued=int(os.getenv("LLM_BREAKER_MAX_QUEUED", "100")),
+    ),
+    breaker_queue_timeout=float(os.getenv("LLM_BREAKER_QUEUE_SECONDS", "10")),
+)
+
+
+__all__ = [
+    "LLMError",
+    "LLMConfigError",
+    "LLMBadRequest",
+    "LLMEmptyResponse",
+    "LLMTimeout",
+    "LLMRateLimited",
+    "LLMUnavailable",
+    "CircuitOpenError",
+    "CircuitBreaker",
+    "ResilientCaller",
+    "classify_error",
+    "llm_caller",
+]
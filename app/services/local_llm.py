@@ -0,0 +1,355 @@
+# app/services/local_llm.py
+"""Local CPU response backend (RESPONSE_BACKEND=local).
+
+Drafts with a small transformers model loaded from the local HF cache
+(`HF_HOME`), so drafting keeps working offline and load tests do not pay
+per call. `LOCAL_LLM_MODEL` may be a seq2seq model (default
+google/flan-t5-small) or a causal LM; the pipeline task is picked from the
+model config.
+
+Inference runs on a bounded thread pool (`LOCAL_LLM_WORKERS`). Single
+requests are micro-batched (up to `LOCAL_LLM_MAX_BATCH` prompts or
+`LOCAL_LLM_MAX_WAIT_MS`) into one batched generate call, and at most
+`LOCAL_LLM_MAX_QUEUE` prompts may be waiting or running; beyond that
+requests fail fast with LLMUnavailable. Admitted requests go through
+`llm_caller` like remote ones (attempt timeout, retries, circuit breaker;
+never hedged, which would only duplicate CPU work). Every use of the pool,
+streaming included, holds one of `LOCAL_LLM_WORKERS` slots.
+
+A Python thread cannot be interrupted, so a generation that times out (or
+whose stream is abandoned) keeps its slot until the thread returns. It is
+asked to stop early through a stopping criterion, and timeouts are not
+retried, since a retry would only queue behind the work it gave up on.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from prometheus_client import Gauge, Histogram
+
+from app.services.llm_client import LLMConfigError, LLMUnavailable, llm_caller
+
+logger = logging.getLogger(__name__)
+
+LOCAL_LLM_QUEUE_DEPTH = Gauge(
+    "local_llm_queue_depth",
+    "Prompts waiting for or running on the local LLM backend",
+)
+LOCAL_LLM_BATCH_SIZE = Histogram(
+    "local_llm_batch_size",
+    "Prompts per batched local generate call",
+    buckets=(1, 2, 4, 8, 16, 32),
+)
+LOCAL_LLM_BUSY_WORKERS = Gauge(
+    "local_llm_busy_workers",
+    "Local LLM worker threads currently generating",
+)
+
+
+class _StopWhenSet:
+    """Stopping criterion for `generate`: stop once `event` is set.
+
+    Duck-types transformers' StoppingCriteria so the module imports
+    without the ML stack.
+    """
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.event.is_set()
+
+
+def _load_pipeline(model_name: str):
+    # Lazy imports so the API runs without the ML stack installed
+    try:
+        from transformers import AutoConfig, pipeline  # type: ignore
+    except Exception as e:
+        raise LLMConfigError(f"transformers not available for the local backend: {e}")
+    try:
+        # Resolved from the HF_HOME cache; no download when offline
+        config = AutoConfig.from_pretrained(model_name)
+        task = "text2text-generation" if getattr(config, "is_encoder_decoder", False) else "text-generation"
+        logger.warning(f"Loading local response model {model_name} ({task}) on CPU.")
+        return pipeline(task, model=model_name, device=-1)
+    except Exception as e:
+        raise LLMConfigError(f"Unable to load local model {model_name}: {e}")
+
+
+class LocalResponseBackend:
+    name = "local"
+
+    def __init__(
+        self,
+        model_name: str = "google/flan-t5-small",
+        workers: int = 2,
+        max_queue: int = 64,
+        max_batch: int = 8,
+        max_wait_ms: int = 20,
+        max_new_tokens: int = 256,
+        pipeline_factory: Callable[[str], object] = _load_pipeline,
+    ):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_new_tokens = max_new_tokens
+        self._pipeline_factory = pipeline_factory
+        self._pipe = None
+        self._load_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="local-llm")
+        self._pending = 0
+        self._busy = 0
+        # _busy is updated from the worker threads
+        self._busy_lock = threading.Lock()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    # -- model -----------------------------------------------------------
+
+    def _pipeline(self):
+        if self._pipe is None:
+            with self._load_lock:
+                if self._pipe is None:
+                    self._pipe = self._pipeline_factory(self.model_name)
+        return self._pipe
+
+    def _generate_kwargs(self, pipe, cancel: Optional[threading.Event] = None) -> dict:
+        kwargs = {"max_new_tokens": self.max_new_tokens}
+        if getattr(pipe, "task", "") == "text-generation":
+            kwargs["return_full_text"] = False
+        if cancel is not None:
+            kwargs["stopping_criteria"] = [_StopWhenSet(cancel)]
+        return kwargs
+
+    def _set_busy(self, delta: int) -> None:
+        with self._busy_lock:
+            self._busy += delta
+            LOCAL_LLM_BUSY_WORKERS.set(self._busy)
+
+    def _generate_sync(self, prompts: List[str], cancel: Optional[threading.Event] = None) -> List[str]:
+        self._set_busy(1)
+        try:
+            pipe = self._pipeline()
+            LOCAL_LLM_BATCH_SIZE.observe(len(prompts))
+            outputs = pipe(prompts, batch_size=len(prompts), **self._generate_kwargs(pipe, cancel))
+        finally:
+            self._set_busy(-1)
+        texts = []
+        for out in outputs:
+            # text-generation returns one list of candidates per prompt
+            if isinstance(out, list):
+                out = out[0]
+            texts.append(str(out.get("generated_text", "")).strip())
+        return texts
+
+    def count_tokens(self, text: str) -> Optional[int]:
+        tokenizer = getattr(self._pipe, "tokenizer", None)
+        if tokenizer is None:
+            return None
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    # -- queueing --------------------------------------------------------
+
+    def _admit(self, n: int) -> None:
+        if self._pending + n > self.max_queue:
+            raise LLMUnavailable(f"local LLM backend queue full ({self._pending} pending)")
+        self._pending += n
+        LOCAL_LLM_QUEUE_DEPTH.set(self._pending)
+
+    def _done(self, n: int) -> None:
+        self._pending -= n
+        LOCAL_LLM_QUEUE_DEPTH.set(self._pending)
+
+    def _ensure_batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            batch: List[Tuple[str, asyncio.Future]] = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Waits for a free worker so batches keep filling while all are busy
+            await self._slots.acquire()
+            asyncio.create_task(self._dispatch(batch))
+
+    def _release_slot_when_done(self, work: Future) -> None:
+        """Free the worker slot when `work` finishes, not when its caller gives up."""
+        loop, slots = self._loop, self._slots
+
+        def release(_):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(slots.release)
+
+        work.add_done_callback(release)
+
+    async def _on_worker(self, fn, *args, cancel: Optional[threading.Event] = None):
+        """Run `fn` on the inference pool once a worker slot is free.
+
+        If the caller is cancelled (e.g. its attempt timed out), `cancel` is
+        set and the slot stays taken until the thread returns.
+        """
+        self._ensure_batcher()
+        await self._slots.acquire()
+        work = self._executor.submit(fn, *args)
+        self._release_slot_when_done(work)
+        try:
+            return await asyncio.wrap_future(work)
+        except asyncio.CancelledError:
+            if cancel is not None:
+                cancel.set()
+            raise
+
+    async def _submit(self, prompt: str) -> str:
+        self._ensure_batcher()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, fut))
+        return await fut
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        # Callers that timed out while queued are dropped before generating
+        batch = [(p, fut) for p, fut in batch if not fut.done()]
+        if not batch:
+            self._slots.release()
+            return
+        cancel = threading.Event()
+
+        def on_caller_done(_):
+            # Stop generating once nobody is waiting for this batch
+            if all(fut.cancelled() for _, fut in batch):
+                cancel.set()
+
+        for _, fut in batch:
+            fut.add_done_callback(on_caller_done)
+        try:
+            texts = await self._loop.run_in_executor(
+                self._executor, self._generate_sync, [p for p, _ in batch], cancel
+            )
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            for (_, fut), text in zip(batch, texts):
+                if not fut.done():
+                    fut.set_result(text)
+        finally:
+            self._slots.release()
+
+    # -- backend interface ------------------------------------------------
+
+    async def generate(self, prompt: str, op: str = "response") -> str:
+        self._admit(1)
+        try:
+            return await llm_caller.call(op, lambda: self._submit(prompt), hedge=False, retry_timeouts=False)
+        finally:
+            self._done(1)
+
+    async def generate_many(self, prompts: List[str], op: str = "response_batch") -> List[str]:
+        """Generate for several prompts directly, in chunks of `max_batch`."""
+        self._admit(len(prompts))
+        try:
+            chunks = [prompts[i : i + self.max_batch] for i in range(0, len(prompts), self.max_batch)]
+            results = await asyncio.gather(
+                *(
+                    llm_caller.call(op, lambda chunk=chunk: self._run_chunk(chunk), hedge=False, retry_timeouts=False)
+                    for chunk in chunks
+                )
+            )
+            return [text for chunk in results for text in chunk]
+        finally:
+            self._done(len(prompts))
+
+    async def _run_chunk(self, prompts: List[str]) -> List[str]:
+        cancel = threading.Event()
+        return await self._on_worker(self._generate_sync, prompts, cancel, cancel=cancel)
+
+    async def stream(self, prompt: str, usage: dict) -> AsyncIterator[str]:
+        self._admit(1)
+        try:
+            # Loading goes through the call layer, like opening a remote stream
+            pipe = await llm_caller.call(
+                "response_stream", lambda: self._on_worker(self._pipeline), hedge=False, retry_timeouts=False
+            )
+            try:
+                from transformers import TextIteratorStreamer  # type: ignore
+            except Exception as e:
+                raise LLMConfigError(f"transformers not available for streaming: {e}")
+            streamer = TextIteratorStreamer(pipe.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=60)
+            cancel = threading.Event()
+            # The generation occupies a pool thread (and its slot) until it
+            # returns, even if the reader stops early
+            await self._slots.acquire()
+            generation = self._executor.submit(
+                lambda: pipe(prompt, streamer=streamer, **self._generate_kwargs(pipe, cancel))
+            )
+            self._release_slot_when_done(generation)
+            try:
+                done = object()
+                parts = []
+                while True:
+                    # Blocking iterator; read it off the inference pool
+                    piece = await asyncio.to_thread(next, streamer, done)
+                    if piece is done:
+                        break
+                    if piece:
+                        parts.append(piece)
+                        yield piece
+                await asyncio.wrap_future(generation)
+            finally:
+                # Abandoned or failed stream: let the generation stop early
+                cancel.set()
+            tokens = self.count_tokens("".join(parts))
+            if tokens:
+                usage["output_tokens"] = tokens
+        finally:
+            self._done(1)
+
+    def info(self) -> dict:
+        return {
+            "backend": self.name,
+            "model": self.model_name,
+            "loaded": self._pipe is not None,
+            "workers": self.workers,
+            "pending": self._pending,
+        }
+
+    def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def local_backend_from_env() -> LocalResponseBackend:
+    return LocalResponseBackend(
+        model_name=os.getenv("LOCAL_LLM_MODEL", "google/flan-t5-small"),
+        workers=int(os.getenv("LOCAL_LLM_WORKERS", "2")),
+        max_queue=int(os.getenv("LOCAL_LLM_MAX_QUEUE", "64")),
+        max_batch=int(os.getenv("LOCAL_LLM_MAX_BATCH", "8")),
+        max_wait_ms=int(os.getenv("LOCAL_LLM_MAX_WAIT_MS", "20")),
+        max_new_tokens=int(os.getenv("LOCAL_LLM_MAX_NEW_TOKENS", "256")),
+    )
+
+
+__all__ = ["LocalResponseBackend", "local_backend_from_env"]
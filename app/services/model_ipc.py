@@ -0,0 +1,234 @@
+# app/services/model_ipc.py
+"""Framing and pooled client for the standalone model server (serve_model.py).
+
+Each message is one frame: a 5-byte header (payload length, big-endian
+uint32, then a codec byte) followed by the payload. Payloads are msgpack when
+the package is installed and JSON otherwise. The server answers in the codec
+of the request, so mixed deployments keep working.
+
+Requests are maps with an `op`:
+
+- `{"op": "classify", "items": [[subject, body], ...]}`, answered with
+  `{"results": [[label, score], ...], "info": {...}}`. Items of tenants with
+  their own taxonomy add `"tenants": [name or null per item]` and
+  `"label_sets": {name: [label, ...]}`;
+- `{"op": "info"}`, answered with `{"info": {...}}`.
+
+A failed request is answered with `{"error": "..."}`.
+
+`ModelServerClient` keeps up to `pool_size` connections to the socket, with
+one request in flight per connection. Requests time out after `timeout`
+seconds. If the socket cannot be reached, calls fail fast with
+ModelServerUnavailable for `retry_after` seconds instead of each paying the
+connect timeout.
+"""
+
+import asyncio
+import json
+import os
+import struct
+import time
+from typing import Any, List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+
+try:
+    import msgpack  # type: ignore
+except Exception:  # optional: JSON framing without it
+    msgpack = None
+
+HEADER = struct.Struct("!IB")
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+MODEL_CLIENT_REQUESTS = Counter(
+    "model_client_requests_total",
+    "Requests from this API worker to the model server, by outcome",
+    labelnames=("op", "outcome"),
+)
+MODEL_CLIENT_LATENCY = Histogram(
+    "model_client_latency_seconds",
+    "Round trip of a model server request, including waiting in the server's batch",
+    labelnames=("op",),
+)
+
+
+class ModelServerError(Exception):
+    """The model server answered with an error, or the request could not be completed."""
+
+
+class ModelServerUnavailable(ModelServerError):
+    """The model server socket could not be reached."""
+
+
+def default_codec() -> int:
+    return CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+
+
+def encode_frame(message: Any, codec: Optional[int] = None) -> bytes:
+    codec = default_codec() if codec is None else codec
+    if codec == CODEC_MSGPACK:
+        payload = msgpack.packb(message, use_bin_type=True)
+    else:
+        payload = json.dumps(message, separators=(",", ":")).encode()
+    if len(payload) > MAX_FRAME_BYTES:
+        raise ModelServerError(f"frame of {len(payload)} bytes exceeds {MAX_FRAME_BYTES}")
+    return HEADER.pack(len(payload), codec) + payload
+
+
+def decode_payload(payload: bytes, codec: int) -> Any:
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ModelServerError("msgpack frame received but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    if codec == CODEC_JSON:
+        return json.loads(payload)
+    raise ModelServerError(f"unknown codec {codec}")
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[Any, int]:
+    """Next (message, codec) from `reader`; raises IncompleteReadError at EOF."""
+    length, codec = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_FRAME_BYTES:
+        raise ModelServerError(f"frame of {length} bytes exceeds {MAX_FRAME_BYTES}")
+    return decode_payload(await reader.readexactly(length), codec), codec
+
+
+class ModelServerClient:
+    def __init__(self, path: str, pool_size: int = 4, timeout: float = 10.0, connect_timeout: float = 1.0, retry_after: float = 5.0):
+        self.path = path
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retry_after = retry_after
+        # Latest model description from the server (model, device, classifier_version, ...)
+        self.info: dict = {}
+        self._down_until = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _ensure_pool(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections belong to the loop that opened them
+            self._loop = loop
+            self._idle = []
+            self._slots = asyncio.Semaphore(self.pool_size)
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        try:
+            return await asyncio.wait_for(asyncio.open_unix_connection(self.path), timeout=self.connect_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            self._down_until = time.monotonic() + self.retry_after
+            raise ModelServerUnavailable(f"model server at {self.path} unreachable: {e!r}")
+
+    async def _exchange(self, message: dict) -> dict:
+        # An idle connection may have been closed by a server restart; then retry once on a new one
+        reused = bool(self._idle)
+        reader, writer = self._idle.pop() if reused else await self._connect()
+        try:
+            writer.write(encode_frame(message))
+            await writer.drain()
+            reply, _ = await asyncio.wait_for(read_frame(reader), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # Before OSError, which TimeoutError subclasses
+            writer.close()
+            raise
+        except (OSError, asyncio.IncompleteReadError) as e:
+            writer.close()
+            if reused:
+                return await self._exchange(message)
+            raise ModelServerError(f"model server connection lost: {e!r}")
+        except BaseException:
+            # The stream may hold half a frame; never reuse it
+            writer.close()
+            raise
+        self._idle.append((reader, writer))
+        return reply
+
+    async def request(self, message: dict) -> dict:
+        op = message.get("op", "unknown")
+        if not self.available:
+            MODEL_CLIENT_REQUESTS.labels(op, "unavailable").inc()
+            raise ModelServerUnavailable(
+                f"model server at {self.path} unreachable, retrying in {self._down_until - time.monotonic():.1f}s"
+            )
+        self._ensure_pool()
+        start = time.perf_counter()
+        async with self._slots:
+            try:
+                reply = await self._exchange(message)
+            except ModelServerUnavailable:
+                MODEL_CLIENT_REQUESTS.labels(op, "unavailable").inc()
+                raise
+            except asyncio.TimeoutError:
+                MODEL_CLIENT_REQUESTS.labels(op, "timeout").inc()
+                raise ModelServerError(f"model server did not answer within {self.timeout}s")
+            except ModelServerError:
+                MODEL_CLIENT_REQUESTS.labels(op, "error").inc()
+                raise
+        MODEL_CLIENT_LATENCY.labels(op).observe(time.perf_counter() - start)
+        if "info" in reply:
+            self.info = reply["info"]
+        if "error" in reply:
+            MODEL_CLIENT_REQUESTS.labels(op, "error").inc()
+            raise ModelServerError(reply["error"])
+        MODEL_CLIENT_REQUESTS.labels(op, "ok").inc()
+        return reply
+
+    async def classify(self, items, label_sets=None) -> List[Tuple[str, float]]:
+        """(label, score) per (subject, body), in order; `label_sets` as in classify_batch_scored."""
+        if not items:
+            return []
+        message = {"op": "classify", "items": [[subject, body] for subject, body in items]}
+        if label_sets and any(label_sets):
+            message["tenants"] = [label_set.tenant if label_set else None for label_set in label_sets]
+            message["label_sets"] = {label_set.tenant: list(label_set.labels) for label_set in label_sets if label_set}
+        reply = await self.request(message)
+        return [(label, float(score)) for label, score in reply["results"]]
+
+    async def fetch_info(self) -> dict:
+        return (await self.request({"op": "info"}))["info"]
+
+    def status(self) -> dict:
+        return {
+            "socket": self.path,
+            "available": self.available,
+            "pool_size": self.pool_size,
+            "idle_connections": len(self._idle),
+            "info": self.info,
+        }
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+
+def model_client_from_env() -> Optional[ModelServerClient]:
+    """Client for `MODEL_SERVER_SOCKET`, or None to classify in this process."""
+    path = os.getenv("MODEL_SERVER_SOCKET", "")
+    if not path:
+        return None
+    return ModelServerClient(
+        path,
+        pool_size=int(os.getenv("MODEL_SERVER_POOL_SIZE", "4")),
+        timeout=float(os.getenv("MODEL_SERVER_TIMEOUT_SECONDS", "10")),
+        retry_after=float(os.getenv("MODEL_SERVER_RETRY_SECONDS", "5")),
+    )
+
+
+__all__ = [
+    "ModelServerClient",
+    "ModelServerError",
+    "ModelServerUnavailable",
+    "model_client_from_env",
+    "encode_frame",
+    "read_frame",
+]
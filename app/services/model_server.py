@@ -0,0 +1,223 @@
+# app/services/model_server.py
+"""Standalone classification server on a Unix domain socket (see serve_model.py).
+
+The server owns the model. API workers started with `MODEL_SERVER_SOCKET`
+send their classification requests here (framing and client in
+app/services/model_ipc.py) instead of loading the model themselves.
+
+Requests from all connections go into one queue. A single batcher drains it
+into cross-worker batches of up to `max_batch` items, waiting at most
+`max_wait_ms` for a batch to fill. Each batch is one `classify_batch_local`
+call, which applies the length bucketing and per-host tuning of
+app/services/autotune.py. While a batch runs the queue keeps filling, so
+batches grow with load. Beyond `max_queue` pending items, requests are
+answered with an error right away.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from prometheus_client import Gauge, Histogram
+
+from app.services.classifier import (
+    LabelSet,
+    classify_batch_local,
+    get_classifier_version,
+    get_inference_config,
+    get_model_info,
+)
+from app.services.model_ipc import ModelServerError, encode_frame, read_frame
+
+logger = logging.getLogger(__name__)
+
+MODEL_SERVER_BATCH_ITEMS = Histogram(
+    "model_server_batch_items",
+    "Items per cross-worker classification batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+MODEL_SERVER_BATCH_REQUESTS = Histogram(
+    "model_server_batch_requests",
+    "Client requests merged into one classification batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+MODEL_SERVER_PENDING = Gauge(
+    "model_server_pending_items",
+    "Items waiting for or running in a classification batch",
+)
+MODEL_SERVER_CONNECTIONS = Gauge(
+    "model_server_connections",
+    "Open client connections",
+)
+
+# classify(items, label_sets=...) like classify_batch_local
+ClassifyFn = Callable[..., Awaitable[List[Tuple[str, float]]]]
+
+
+class ModelServer:
+    def __init__(
+        self,
+        path: str,
+        max_batch: int = 64,
+        max_wait_ms: int = 10,
+        max_queue: int = 1024,
+        classify: Optional[ClassifyFn] = None,
+    ):
+        self.path = path
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self._classify = classify or classify_batch_local
+        self._pending = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._handlers: Set[asyncio.Task] = set()
+
+    def info(self) -> dict:
+        return {
+            **get_model_info(),
+            "classifier_version": get_classifier_version(),
+            "inference": get_inference_config().as_dict(),
+            "pid": os.getpid(),
+            "pending": self._pending,
+        }
+
+    async def start(self) -> None:
+        # A socket file left behind by a killed server blocks bind()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        logger.warning("Model server listening on %s", self.path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    # -- connections -----------------------------------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        MODEL_SERVER_CONNECTIONS.inc()
+        try:
+            while True:
+                try:
+                    message, codec = await read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                reply = await self._dispatch(message)
+                writer.write(encode_frame(reply, codec))
+                await writer.drain()
+        except ModelServerError as e:
+            # Unreadable frame: the stream can no longer be trusted
+            logger.warning(f"Closing model server connection: {e}")
+        finally:
+            self._handlers.discard(task)
+            MODEL_SERVER_CONNECTIONS.dec()
+            writer.close()
+
+    async def _dispatch(self, message: dict) -> dict:
+        op = message.get("op") if isinstance(message, dict) else None
+        try:
+            if op == "info":
+                return {"info": self.info()}
+            if op == "classify":
+                items = [(str(s), str(b)) for s, b in message.get("items", [])]
+                sets = {name: LabelSet(name, tuple(labels)) for name, labels in (message.get("label_sets") or {}).items()}
+                label_sets = [sets.get(name) if name else None for name in message.get("tenants") or [None] * len(items)]
+                results = await self.classify(items, label_sets)
+                return {"results": [[label, score] for label, score in results], "info": self.info()}
+            return {"error": f"unknown op {op!r}"}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+    # -- batching --------------------------------------------------------
+
+    async def classify(
+        self, items: List[Tuple[str, str]], label_sets: Optional[List[Optional[LabelSet]]] = None
+    ) -> List[Tuple[str, float]]:
+        if not items:
+            return []
+        if self._pending + len(items) > self.max_queue:
+            raise ModelServerError(f"model server overloaded ({self._pending} items pending)")
+        self._pending += len(items)
+        MODEL_SERVER_PENDING.set(self._pending)
+        try:
+            fut = asyncio.get_running_loop().create_future()
+            await self._queue.put((items, label_sets or [None] * len(items), fut))
+            return await fut
+        finally:
+            self._pending -= len(items)
+            MODEL_SERVER_PENDING.set(self._pending)
+
+    async def _run(self) -> None:
+        carry = None
+        while True:
+            batch = [carry if carry is not None else await self._queue.get()]
+            carry = None
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if size + len(entry[0]) > self.max_batch:
+                    # Starts the next batch; requests are never split
+                    carry = entry
+                    break
+                batch.append(entry)
+                size += len(entry[0])
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch) -> None:
+        # Tenants with different label sets share the batch (see app/services/zero_shot.py)
+        items = [item for entry_items, _, _ in batch for item in entry_items]
+        label_sets = [label_set for _, entry_sets, _ in batch for label_set in entry_sets]
+        MODEL_SERVER_BATCH_ITEMS.observe(len(items))
+        MODEL_SERVER_BATCH_REQUESTS.observe(len(batch))
+        try:
+            results = await self._classify(items, label_sets=label_sets)
+        except Exception as e:
+            logger.error(f"Model server batch of {len(items)} failed: {e}", exc_info=True)
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        offset = 0
+        for entry_items, _, fut in batch:
+            if not fut.done():
+                fut.set_result(results[offset : offset + len(entry_items)])
+            offset += len(entry_items)
+
+
+def model_server_from_env(path: Optional[str] = None) -> ModelServer:
+    return ModelServer(
+        path or os.getenv("MODEL_SERVER_SOCKET", "/tmp/ai-email-assistant-model.sock"),
+        max_batch=int(os.getenv("MODEL_SERVER_MAX_BATCH", "64")),
+        max_wait_ms=int(os.getenv("MODEL_SERVER_MAX_WAIT_MS", "10")),
+        max_queue=int(os.getenv("MODEL_SERVER_MAX_QUEUE", "1024")),
+    )
+
+
+__all__ = ["ModelServer", "model_server_from_env"]
@@ -0,0 +1,207 @@
+# app/services/normalize.py
+"""Inbound mail normalization: HTML to text, quoted history, signatures, footers.
+
+`normalize_email(text, html)` turns the parts the Cloudflare worker sends
+into the body we store in `tickets.body`, which every later tokenization and
+LLM prompt reads. It:
+
+- uses the text part, or extracts text from the HTML part when the text part
+  is empty (scripts / styles / quoted `<blockquote>` and Gmail quote blocks
+  are skipped);
+- cuts everything from the first reply header ("On ... wrote:",
+  "-----Original Message-----", an Outlook "From: / Sent:" block, ...) and
+  drops `>`-quoted lines;
+- cuts the signature ("-- " delimiter, "Sent from my ...") and a trailing
+  legal / confidentiality footer;
+- collapses runs of spaces and blank lines.
+
+If that leaves nothing, for example a message that is entirely quoted, the
+whitespace-collapsed original is kept. Each pass is linear in the message
+size; see bench_normalize.py.
+"""
+
+import json
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from html import unescape
+from typing import List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+
+from app.services.prompts import count_tokens
+
+INBOUND_TOKENS = Counter(
+    "inbound_body_tokens_total",
+    "Tokens in inbound email bodies before and after normalization",
+    labelnames=("stage",),
+)
+INBOUND_TOKEN_REDUCTION = Histogram(
+    "inbound_token_reduction_ratio",
+    "Per-ticket share of body tokens removed by normalization",
+    buckets=(0.0, 0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+INBOUND_NORMALIZE_SECONDS = Histogram(
+    "inbound_normalize_seconds",
+    "Time to normalize one inbound email body",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+)
+
+_SKIP_TAGS = {"script", "style", "head", "title", "blockquote"}
+_BLOCK_TAGS = {
+    "p", "div", "br", "tr", "li", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6",
+    "pre", "hr", "section", "article", "header", "footer",
+}
+_VOID_TAGS = {"br", "hr", "img", "meta", "link", "input", "col", "area", "base", "wbr", "source"}
+# Containers mail clients wrap quoted history in
+_QUOTE_MARKERS = ("gmail_quote", "yahoo_quoted", "moz-cite-prefix", "divrplyfwdmsg", "appendonsend")
+
+# A line that starts the quoted history of a reply / forward
+_REPLY_HEADER = re.compile(
+    r"^[ \t]*(?:"
+    r"On\s[^\n]{0,200}(?:\n[^\n]{0,200})?\bwrote:"
+    r"|-{2,}\s*(?:Original|Forwarded) Message\s*-{2,}"
+    r"|Begin forwarded message:"
+    r"|_{20,}"
+    r"|From:[^\n]*\n[ \t]*(?:Sent|Date):"
+    r"|Le\b.{0,200}\ba écrit\s?:"
+    r"|Am\b.{0,200}\bschrieb\b.{0,100}:"
+    r"|El\b.{0,200}\bescribió:"
+    r")",
+    re.IGNORECASE | re.MULTILINE,
+)
+_QUOTED_LINE = re.compile(r"^[ \t]*>.*(?:\n|$)", re.MULTILINE)
+_SIGNATURE = re.compile(
+    r"^(?:-- ?|Sent from my [^\n]{1,40}|Get Outlook for [^\n]{1,40}|Sent from (?:Mail|Yahoo Mail|Outlook)\b[^\n]{0,40})[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_FOOTER = re.compile(
+    r"^[^\n]{0,40}(?:CONFIDENTIALITY NOTICE|DISCLAIMER|"
+    r"This (?:e-?mail|message)(?: and any (?:files|attachments)[^\n]{0,40})? (?:is|are|may be|contains?) (?:confidential|privileged|intended)|"
+    r"The information (?:contained )?in this (?:e-?mail|message)[^\n]{0,40}(?:confidential|privileged)|"
+    r"If you (?:are not|have received this)[^\n]{0,40}(?:intended recipient|in error))",
+    re.IGNORECASE | re.MULTILINE,
+)
+_TAG = re.compile(r"<!--.*?-->|<!\[CDATA\[.*?\]\]>|<(/?)([a-zA-Z][a-zA-Z0-9]*)([^>]*)>|<![^>]*>", re.DOTALL)
+_MARKER_ATTR = re.compile(r"""\b(?:class|id)\s*=\s*["']?([^"'>]*)""", re.IGNORECASE)
+_MAX_FOOTER_CHARS = 2000
+_SPACES = re.compile(r"[ \t\f\v\u00a0\u200b]+")
+_BLANK_LINES = re.compile(r"\n\s*\n(?:\s*\n)+")
+
+
+def html_to_text(html: str) -> str:
+    """Visible text of an HTML part, one line per block element.
+
+    A single regex pass over the tags (much faster than `html.parser` on
+    large messages); content of skipped and quote elements is dropped.
+    """
+    parts: List[str] = []
+    # Open skipped element (repeated per nested element of the same tag)
+    skip: List[str] = []
+    pos = 0
+    for match in _TAG.finditer(html):
+        if not skip and match.start() > pos:
+            parts.append(unescape(html[pos : match.start()]))
+        pos = match.end()
+        tag = (match.group(2) or "").lower()
+        if not tag:
+            continue  # comment / doctype / CDATA
+        closing = bool(match.group(1))
+        if skip:
+            if tag == skip[-1]:
+                if closing:
+                    skip.pop()
+                elif tag not in _VOID_TAGS:
+                    skip.append(tag)
+            continue
+        if not closing:
+            marker = " ".join(_MARKER_ATTR.findall(match.group(3) or "")).lower()
+            if tag in _SKIP_TAGS or (marker and any(m in marker for m in _QUOTE_MARKERS)):
+                if tag not in _VOID_TAGS and not (match.group(3) or "").endswith("/"):
+                    skip.append(tag)
+                continue
+        if tag in _BLOCK_TAGS:
+            # Adjacent block boundaries make one line break, not blank lines
+            if parts and not parts[-1].endswith("\n"):
+                parts.append("\n")
+        elif tag in ("td", "th") and not closing:
+            parts.append(" ")
+    if not skip and pos < len(html):
+        parts.append(unescape(html[pos:]))
+    return "".join(parts)
+
+
+def collapse_whitespace(text: str) -> str:
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _SPACES.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def strip_reply_history(text: str) -> str:
+    match = _REPLY_HEADER.search(text)
+    if match:
+        text = text[: match.start()]
+    return _QUOTED_LINE.sub("", text)
+
+
+def strip_signature(text: str) -> str:
+    match = _SIGNATURE.search(text)
+    if match:
+        text = text[: match.start()]
+    # Legal footers are a short tail after the actual message
+    for match in _FOOTER.finditer(text):
+        if len(text) - match.start() <= _MAX_FOOTER_CHARS and text[: match.start()].strip():
+            return text[: match.start()]
+    return text
+
+
+@dataclass
+class NormalizedEmail:
+    body: str
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def reduction(self) -> float:
+        return 1.0 - self.tokens_after / self.tokens_before if self.tokens_before else 0.0
+
+
+def normalize_email(text: Optional[str], html: Optional[str] = None) -> NormalizedEmail:
+    """Clean body for storage and prompts, plus token counts before / after."""
+    start = time.perf_counter()
+    raw = text if text and text.strip() else (html_to_text(html) if html else "")
+    body = collapse_whitespace(strip_signature(strip_reply_history(raw.replace("\r\n", "\n"))))
+    if not body:
+        body = collapse_whitespace(raw)
+    INBOUND_NORMALIZE_SECONDS.observe(time.perf_counter() - start)
+
+    # Count against what the model would otherwise have seen
+    result = NormalizedEmail(body=body, tokens_before=count_tokens(text or html or ""), tokens_after=count_tokens(body))
+    INBOUND_TOKENS.labels("raw").inc(result.tokens_before)
+    INBOUND_TOKENS.labels("normalized").inc(result.tokens_after)
+    INBOUND_TOKEN_REDUCTION.observe(max(0.0, result.reduction))
+    return result
+
+
+def compress_raw(text: Optional[str], html: Optional[str]) -> Tuple[bytes, int]:
+    """zlib-compressed JSON of the original parts, and its uncompressed size."""
+    data = json.dumps({"text": text, "html": html}, ensure_ascii=False).encode()
+    return zlib.compress(data, 6), len(data)
+
+
+def decompress_raw(content: bytes) -> dict:
+    return json.loads(zlib.decompress(content))
+
+
+__all__ = [
+    "normalize_email",
+    "compress_raw",
+    "decompress_raw",
+    "NormalizedEmail",
+    "html_to_text",
+    "strip_reply_history",
+    "strip_signature",
+    "collapse_whitespace",
+]
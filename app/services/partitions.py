@@ -0,0 +1,545 @@
+# app/services/partitions.py
+"""Range partitions by `created_at` for `logs`, `tickets` and `responses`.
+
+The Alembic migration turns the three tables into `PARTITION BY RANGE
+(created_at)` tables on Postgres:
+
+- `logs`: one partition per day;
+- `tickets` / `responses`: one partition per month;
+- each also gets `<table>_archive` (everything older, lower bound MINVALUE;
+  itself partitioned by `created_at`) and `<table>_default` (safety net,
+  normally empty).
+
+`maintain_partitions()` runs every `PARTITION_MAINTENANCE_INTERVAL_SECONDS`
+in the app (and from manage_partitions.py). It does two things:
+
+- It creates the current period plus `PARTITION_PREMAKE` periods ahead. Rows
+  that already landed in the default partition move into the new partition.
+- It expires old periods:
+  - A log partition whose range ended more than `LOG_RETENTION_DAYS` ago is
+    written to `LOG_ARCHIVE_DIR/<partition>.jsonl.gz` and dropped. With
+    `LOG_ARCHIVE_DIR` empty it is only dropped.
+  - A ticket / response month that ended more than `ARCHIVE_AFTER_DAYS` ago
+    is folded into the archive partition. No rows are copied: the month is
+    moved under the archive as a whole. A validated CHECK constraint on the
+    month lets every attach skip its scan, so the exclusive lock on the
+    table covers only catalog changes. The lock is given up after
+    `PARTITION_LOCK_TIMEOUT_MS` and the fold retried on the next pass.
+- It deletes `inbound_message_keys` older than `INBOUND_KEY_RETENTION_DAYS`.
+
+Postgres requires every unique index of a partitioned table to include the
+partition key. So the primary keys become (id, created_at), inbound
+idempotency moves to `inbound_message_keys`, and foreign keys to or from
+these tables are not enforced by the database.
+
+Where `logs` is not partitioned (SQLite, or before the migration), expired
+log rows are archived and deleted in batches instead.
+
+Per-ticket reads by id carry no partition key. Postgres then probes the id
+index of every `tickets` partition. That is one per month in the retention
+window, the premade months, the default, and the archive's sub-partitions,
+which gain one per folded month. With the defaults it starts at about a
+dozen. `get_recent_ticket()` looks in the last
+`TICKET_LOOKUP_WINDOW_HOURS` first, which prunes to the newest partition
+or two. Background work (classify, draft, event snapshots) mostly touches
+tickets created moments ago. `response_filter()` bounds a ticket's
+responses by its `created_at` in the same way.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import delete, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.db.models import InboundMessageKey, Log, Response, Ticket
+
+logger = logging.getLogger(__name__)
+
+PARTITION_ACTIONS = Counter(
+    "db_partition_actions_total",
+    "Partition maintenance actions by table (created, archived, dropped)",
+    labelnames=("table", "action"),
+)
+PARTITIONS = Gauge(
+    "db_partitions",
+    "Attached partitions per partitioned table",
+    labelnames=("table",),
+)
+LOG_ROWS_ARCHIVED = Counter(
+    "log_rows_archived_total",
+    "Expired log rows written to LOG_ARCHIVE_DIR",
+)
+
+PREMAKE = int(os.getenv("PARTITION_PREMAKE", "3"))
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "30"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+# Retries of one email arrive within hours; older keys only take space
+INBOUND_KEY_RETENTION_DAYS = int(os.getenv("INBOUND_KEY_RETENTION_DAYS", "30"))
+LOCK_TIMEOUT_MS = int(os.getenv("PARTITION_LOCK_TIMEOUT_MS", "2000"))
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "./data/log_archive")
+TICKET_LOOKUP_WINDOW = timedelta(hours=float(os.getenv("TICKET_LOOKUP_WINDOW_HOURS", "24")))
+# Margin when bounding by a stored created_at (app/database clock skew;
+# SQLite compares timestamps as text)
+LOOKUP_SLACK = timedelta(days=1)
+ARCHIVE_CHUNK_ROWS = 1000
+# Session-level advisory lock: one maintenance pass at a time across workers
+_LOCK_ID = 0x70617274  # "part"
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    table: str
+    interval: str  # "day" or "month"
+    keep: timedelta
+    # "drop" (after writing the rows to LOG_ARCHIVE_DIR) or "archive" (fold into <table>_archive)
+    expire: str
+
+
+@dataclass
+class Partition:
+    name: str
+    lower: Optional[datetime]  # None: MINVALUE
+    upper: Optional[datetime]  # None: MAXVALUE
+    default: bool = False
+
+
+PARTITION_SPECS: Tuple[PartitionSpec, ...] = (
+    PartitionSpec("logs", "day", timedelta(days=LOG_RETENTION_DAYS), "drop"),
+    PartitionSpec("tickets", "month", timedelta(days=ARCHIVE_AFTER_DAYS), "archive"),
+    PartitionSpec("responses", "month", timedelta(days=ARCHIVE_AFTER_DAYS), "archive"),
+)
+
+
+# -- partition-pruned lookups ------------------------------------------------
+
+
+def _created_from(column, since: datetime) -> tuple:
+    # Bounded above too, or the premade and default partitions stay in the plan
+    return (column >= since, column < datetime.now(timezone.utc) + LOOKUP_SLACK)
+
+
+async def get_recent_ticket(session, ticket_id: int) -> Optional[Ticket]:
+    """Load a ticket, looking only in recent partitions first.
+
+    Falls back to the unbounded lookup for older tickets.
+    """
+    since = datetime.now(timezone.utc) - TICKET_LOOKUP_WINDOW
+    ticket = (
+        await session.execute(select(Ticket).where(Ticket.id == ticket_id, *_created_from(Ticket.created_at, since)))
+    ).scalars().first()
+    if ticket is None:
+        ticket = await session.get(Ticket, ticket_id)
+    return ticket
+
+
+def response_filter(ticket: Ticket) -> tuple:
+    """WHERE clauses for `ticket`'s responses, pruned to partitions from its creation on."""
+    if ticket.created_at is None:
+        return (Response.ticket_id == ticket.id,)
+    return (Response.ticket_id == ticket.id, *_created_from(Response.created_at, ticket.created_at - LOOKUP_SLACK))
+
+
+def created_since(created_at: Optional[datetime]) -> tuple:
+    """WHERE clauses that prune `tickets` to the partitions from `created_at` on."""
+    if created_at is None:
+        return ()
+    return _created_from(Ticket.created_at, created_at - LOOKUP_SLACK)
+
+
+# -- periods and bounds ------------------------------------------------------
+
+
+def period_start(ts: datetime, interval: str) -> datetime:
+    ts = ts.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts if interval == "day" else ts.replace(day=1)
+
+
+def next_period(start: datetime, interval: str) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def periods(start: datetime, end: datetime, interval: str) -> Iterator[Tuple[datetime, datetime]]:
+    """Consecutive [lower, upper) periods from the one containing `start` until `end`."""
+    lower = period_start(start, interval)
+    while lower < end:
+        upper = next_period(lower, interval)
+        yield lower, upper
+        lower = upper
+
+
+def partition_name(table: str, start: datetime) -> str:
+    return f"{table}_p{start:%Y%m%d}"
+
+
+def sql_timestamp(value: datetime) -> str:
+    return f"'{value.astimezone(timezone.utc).isoformat()}'"
+
+
+_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def _bound_value(raw: str) -> Optional[datetime]:
+    raw = raw.strip()
+    if raw in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(raw.strip("'")).astimezone(timezone.utc)
+
+
+def parse_bound(name: str, expr: str) -> Partition:
+    """Partition from `pg_get_expr(relpartbound, oid)` output."""
+    if expr.strip() == "DEFAULT":
+        return Partition(name, None, None, default=True)
+    match = _BOUND.search(expr)
+    if match is None:
+        raise ValueError(f"Unsupported partition bound for {name}: {expr}")
+    return Partition(name, _bound_value(match.group(1)), _bound_value(match.group(2)))
+
+
+def _overlaps(part: Partition, lower: datetime, upper: datetime) -> bool:
+    return (part.lower is None or part.lower < upper) and (part.upper is None or part.upper > lower)
+
+
+def missing_periods(
+    spec: PartitionSpec, existing: Sequence[Partition], now: datetime, premake: int = PREMAKE
+) -> List[Tuple[datetime, datetime]]:
+    """Current and upcoming periods that no partition covers yet."""
+    end = period_start(now, spec.interval)
+    for _ in range(premake + 1):
+        end = next_period(end, spec.interval)
+    ranges = [p for p in existing if not p.default]
+    return [(lo, hi) for lo, hi in periods(now, end, spec.interval) if not any(_overlaps(p, lo, hi) for p in ranges)]
+
+
+def expired_partitions(spec: PartitionSpec, existing: Sequence[Partition], now: datetime) -> List[Partition]:
+    """Partitions past retention, oldest first; the archive partition itself never expires."""
+    if spec.keep <= timedelta(0):
+        return []
+    cutoff = period_start(now - spec.keep, spec.interval)
+    parts = [p for p in existing if not p.default and p.upper is not None and p.upper <= cutoff]
+    if spec.expire == "archive":
+        parts = [p for p in parts if p.lower is not None]
+    return sorted(parts, key=lambda p: p.upper)
+
+
+# -- catalog -----------------------------------------------------------------
+
+
+async def is_partitioned(conn: AsyncConnection, table: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    found = await conn.scalar(
+        text("SELECT count(*) FROM pg_partitioned_table WHERE partrelid = to_regclass(:t)"), {"t": table}
+    )
+    return bool(found)
+
+
+async def list_partitions(conn: AsyncConnection, table: str) -> List[Partition]:
+    rows = await conn.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:t) ORDER BY c.relname"
+        ),
+        {"t": table},
+    )
+    return [parse_bound(name, expr) for name, expr in rows]
+
+
+# -- actions -----------------------------------------------------------------
+
+
+async def create_partition(conn: AsyncConnection, table: str, lower: datetime, upper: datetime) -> str:
+    """Attach a partition for [lower, upper), moving matching rows out of the default partition."""
+    name = partition_name(table, lower)
+    default = f"{table}_default"
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    if await conn.scalar(text("SELECT to_regclass(:t)"), {"t": default}) is not None:
+        await conn.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {default} WHERE created_at >= {sql_timestamp(lower)} "
+                f"AND created_at < {sql_timestamp(upper)} RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+            )
+        )
+    await conn.execute(
+        text(
+            f"ALTER TABLE {table} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ({sql_timestamp(lower)}) TO ({sql_timestamp(upper)})"
+        )
+    )
+    return name
+
+
+def _append_gzip(path: str, data: bytes) -> None:
+    # Each call adds a gzip member; readers see one continuous stream
+    with gzip.open(path, "ab") as f:
+        f.write(data)
+
+
+async def _archive_rows(result, path: str) -> int:
+    """Append streamed rows to `path` as gzip JSON lines; returns the row count."""
+    count = 0
+    async for chunk in result.partitions(ARCHIVE_CHUNK_ROWS):
+        data = "".join(json.dumps(dict(row._mapping), default=str) + "\n" for row in chunk).encode()
+        await asyncio.to_thread(_append_gzip, path, data)
+        count += len(chunk)
+    LOG_ROWS_ARCHIVED.inc(count)
+    return count
+
+
+async def drop_partition(conn: AsyncConnection, part: Partition, archive_dir: Optional[str]) -> int:
+    """Drop an expired partition, writing its rows to `archive_dir` first; returns rows archived."""
+    count = 0
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"{part.name}.jsonl.gz")
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        count = await _archive_rows(await conn.stream(text(f"SELECT * FROM {part.name} ORDER BY id")), tmp_path)
+        if count:
+            os.replace(tmp_path, path)
+    await conn.execute(text(f"DROP TABLE {part.name}"))
+    return count
+
+
+async def fold_into_archive(bind: AsyncEngine, table: str, part: Partition, archive: Partition) -> bool:
+    """Move one expired period under `archive` and extend the archive's upper bound.
+
+    Returns False when the table lock was not granted within
+    `LOCK_TIMEOUT_MS`; the next pass tries again.
+    """
+    check = f"{part.name}_bounds"
+    async with bind.begin() as conn:
+        if not await is_partitioned(conn, archive.name):
+            logger.warning(f"{archive.name} is not partitioned; run the migrations to fold {part.name} into it.")
+            return False
+        exists = await conn.scalar(
+            text("SELECT count(*) FROM pg_constraint WHERE conrelid = to_regclass(:t) AND conname = :c"),
+            {"t": part.name, "c": check},
+        )
+        if not exists:
+            await conn.execute(
+                text(
+                    f"ALTER TABLE {part.name} ADD CONSTRAINT {check} CHECK (created_at >= "
+                    f"{sql_timestamp(part.lower)} AND created_at < {sql_timestamp(part.upper)}) NOT VALID"
+                )
+            )
+    async with bind.begin() as conn:
+        # Scans the month, but reads and writes continue meanwhile
+        await conn.execute(text(f"ALTER TABLE {part.name} VALIDATE CONSTRAINT {check}"))
+    try:
+        async with bind.begin() as conn:
+            # Queued behind a long query, the DETACH would block every other query on the table
+            await conn.execute(text(f"SET LOCAL lock_timeout = {LOCK_TIMEOUT_MS}"))
+            await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {part.name}"))
+            await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {archive.name}"))
+            # The CHECKs on the month and the archive's older partitions imply both bounds: no scans
+            await conn.execute(
+                text(
+                    f"ALTER TABLE {archive.name} ATTACH PARTITION {part.name} "
+                    f"FOR VALUES FROM ({sql_timestamp(part.lower)}) TO ({sql_timestamp(part.upper)})"
+                )
+            )
+            await conn.execute(
+                text(
+                    f"ALTER TABLE {table} ATTACH PARTITION {archive.name} "
+                    f"FOR VALUES FROM (MINVALUE) TO ({sql_timestamp(part.upper)})"
+                )
+            )
+    except DBAPIError as e:
+        logger.warning(f"Could not fold {part.name} into {archive.name}, retrying on the next pass: {e}")
+        return False
+    archive.upper = part.upper
+    return True
+
+
+async def expire_log_rows(
+    bind: AsyncEngine, keep: timedelta, archive_dir: Optional[str], now: datetime, batch_size: int = 5000
+) -> int:
+    """Unpartitioned fallback: archive and delete log rows past retention in batches."""
+    if keep <= timedelta(0):
+        return 0
+    cutoff = period_start(now - keep, "day")
+    path = None
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"logs_before_{cutoff:%Y%m%d}.jsonl.gz")
+    total = 0
+    while True:
+        async with bind.begin() as conn:
+            ids = (
+                await conn.scalars(select(Log.id).where(Log.created_at < cutoff).order_by(Log.id).limit(batch_size))
+            ).all()
+            if not ids:
+                break
+            if path is not None:
+                await _archive_rows(
+                    await conn.stream(select(Log.__table__).where(Log.id.in_(ids)).order_by(Log.id)), path
+                )
+            await conn.execute(delete(Log).where(Log.id.in_(ids)))
+        total += len(ids)
+    if total:
+        PARTITION_ACTIONS.labels("logs", "deleted_rows").inc(total)
+    return total
+
+
+async def expire_message_keys(bind: AsyncEngine, keep: timedelta, now: datetime, batch_size: int = 5000) -> int:
+    """Delete inbound idempotency keys claimed more than `keep` ago, in batches."""
+    if keep <= timedelta(0):
+        return 0
+    cutoff = now - keep
+    total = 0
+    while True:
+        async with bind.begin() as conn:
+            keys = (
+                await conn.scalars(
+                    select(InboundMessageKey.message_key).where(InboundMessageKey.created_at < cutoff).limit(batch_size)
+                )
+            ).all()
+            if not keys:
+                break
+            await conn.execute(delete(InboundMessageKey).where(InboundMessageKey.message_key.in_(keys)))
+        total += len(keys)
+    if total:
+        PARTITION_ACTIONS.labels("inbound_message_keys", "deleted_rows").inc(total)
+    return total
+
+
+async def _maintain_table(
+    bind: AsyncEngine, spec: PartitionSpec, now: datetime, premake: int, archive_dir: Optional[str]
+) -> Dict[str, int]:
+    actions = {"created": 0, "archived": 0, "dropped": 0}
+    async with bind.connect() as conn:
+        partitioned = await is_partitioned(conn, spec.table)
+        existing = await list_partitions(conn, spec.table) if partitioned else []
+    if not partitioned:
+        if spec.expire == "drop":
+            actions["deleted_rows"] = await expire_log_rows(bind, spec.keep, archive_dir, now)
+        return actions
+
+    for lower, upper in missing_periods(spec, existing, now, premake):
+        async with bind.begin() as conn:
+            await create_partition(conn, spec.table, lower, upper)
+        actions["created"] += 1
+
+    expired = expired_partitions(spec, existing, now)
+    if spec.expire == "drop":
+        for part in expired:
+            async with bind.begin() as conn:
+                await drop_partition(conn, part, archive_dir)
+            actions["dropped"] += 1
+    elif expired:
+        archive = next((p for p in existing if not p.default and p.lower is None), None)
+        if archive is None:
+            logger.warning(f"No archive partition for {spec.table}; {len(expired)} expired partitions kept.")
+        else:
+            for part in expired:
+                if not await fold_into_archive(bind, spec.table, part, archive):
+                    break
+                actions["archived"] += 1
+
+    for action, count in actions.items():
+        if count:
+            PARTITION_ACTIONS.labels(spec.table, action).inc(count)
+    async with bind.connect() as conn:
+        PARTITIONS.labels(spec.table).set(len(await list_partitions(conn, spec.table)))
+    return actions
+
+
+async def maintain_partitions(
+    bind: Optional[AsyncEngine] = None,
+    now: Optional[datetime] = None,
+    specs: Sequence[PartitionSpec] = PARTITION_SPECS,
+    premake: int = PREMAKE,
+    archive_dir: Optional[str] = LOG_ARCHIVE_DIR,
+    key_retention: timedelta = timedelta(days=INBOUND_KEY_RETENTION_DAYS),
+) -> Dict[str, Dict[str, int]]:
+    """One maintenance pass; returns the actions taken per table."""
+    if bind is None:
+        # Imported here so the helpers above can be used without an app engine
+        from app.db.database import engine as bind
+    now = now or datetime.now(timezone.utc)
+    if bind.dialect.name != "postgresql":
+        report = {spec.table: await _maintain_table(bind, spec, now, premake, archive_dir) for spec in specs}
+        report["inbound_message_keys"] = {"deleted_rows": await expire_message_keys(bind, key_retention, now)}
+        return report
+
+    report: Dict[str, Dict[str, int]] = {}
+    async with bind.connect() as lock_conn:
+        if not await lock_conn.scalar(text("SELECT pg_try_advisory_lock(:id)"), {"id": _LOCK_ID}):
+            logger.warning("Partition maintenance is running in another process; skipping this pass.")
+            return report
+        # The lock is held by the session; do not keep this transaction open meanwhile
+        await lock_conn.commit()
+        try:
+            for spec in specs:
+                report[spec.table] = await _maintain_table(bind, spec, now, premake, archive_dir)
+            report["inbound_message_keys"] = {"deleted_rows": await expire_message_keys(bind, key_retention, now)}
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _LOCK_ID})
+            await lock_conn.commit()
+    return report
+
+
+class PartitionMaintenance:
+    """Lifespan task that runs `maintain_partitions` every `interval` seconds."""
+
+    def __init__(self, interval: float = 3600.0):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await maintain_partitions()
+            except Exception as e:
+                logger.error(f"EXCEPTION in partition maintenance: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+
+partition_maintenance = PartitionMaintenance(
+    interval=float(os.getenv("PARTITION_MAINTENANCE_INTERVAL_SECONDS", "3600")),
+)
+
+
+__all__ = [
+    "get_recent_ticket",
+    "response_filter",
+    "created_since",
+    "maintain_partitions",
+    "partition_maintenance",
+    "PartitionSpec",
+    "Partition",
+    "PARTITION_SPECS",
+    "parse_bound",
+    "missing_periods",
+    "expired_partitions",
+    "periods",
+    "period_start",
+    "partition_name",
+    "sql_timestamp",
+]
@@ -0,0 +1,67 @@
+# app/services/priority.py
+"""Ticket priority from cheap text signals plus the classifier's output.
+
+Points are added for:
+- urgency / risk phrases (outage, locked out, fraud, legal, ... in the
+  supported languages);
+- shouting in the subject (mostly capitals, "!!");
+- the category (complaints and money first, feedback last);
+- low classifier confidence (below `PRIORITY_LOW_CONFIDENCE`), since an
+  ambiguous ticket is better seen by a person early.
+
+The total maps to "urgent", "high", "normal" or "low". The score is
+deterministic and cheap enough to compute inline at ingest. A priority sent
+by the client is kept as is.
+"""
+
+import os
+import re
+from typing import Optional
+
+PRIORITIES = ("urgent", "high", "normal", "low")
+LOW_CONFIDENCE = float(os.getenv("PRIORITY_LOW_CONFIDENCE", "0.5"))
+
+_URGENT = re.compile(
+    r"\b(?:urgent\w*|asap|immediately|emergency|critical|outage|(?:is|are|went) down|"
+    r"not working|can'?t log ?in|cannot log ?in|locked out|hacked|fraud\w*|unauthori[sz]ed|"
+    r"security|data loss|lawyer|lawsuit|legal action|chargeback|"
+    r"urgente|inmediato|dringend|sofort|imm[ée]diatement|bloqu[ée]|gesperrt|"
+    r"subito|urgentemente|spoed)\b",
+    re.IGNORECASE,
+)
+
+_CATEGORY_POINTS = {
+    "Complaint": 2,
+    "Refund": 1,
+    "Billing": 1,
+    "Account": 1,
+    "Technical": 1,
+    "Other": 0,
+    "Feedback": -1,
+}
+
+
+def priority_score(subject: str, body: str, category: Optional[str] = None, confidence: Optional[float] = None) -> int:
+    text = f"{subject}\n{body[:2000]}"
+    score = min(4, 2 * len({m.lower() for m in _URGENT.findall(text)}))
+    letters = [ch for ch in subject if ch.isalpha()]
+    if "!!" in text or (len(letters) >= 8 and sum(ch.isupper() for ch in letters) / len(letters) > 0.6):
+        score += 1
+    score += _CATEGORY_POINTS.get(category or "", 0)
+    if confidence is not None and confidence < LOW_CONFIDENCE:
+        score += 1
+    return score
+
+
+def score_priority(subject: str, body: str, category: Optional[str] = None, confidence: Optional[float] = None) -> str:
+    score = priority_score(subject, body, category, confidence)
+    if score >= 5:
+        return "urgent"
+    if score >= 3:
+        return "high"
+    if score >= 1:
+        return "normal"
+    return "low"
+
+
+__all__ = ["score_priority", "priority_score", "PRIORITIES"]
@@ -0,0 +1,164 @@
+# app/services/prompts.py
+"""Prompt templates for response drafting.
+
+Templates are loaded through a Jinja `Environment` with a `PackageLoader`
+(so rendering does not depend on the working directory) and a filesystem
+bytecode cache. Templates are only re-checked for changes on disk outside
+production.
+
+Variants are picked at render time, most specific first:
+
+    response.<category>.<language>.j2
+    response.<category>.j2
+    response.<language>.j2
+    response.j2
+
+Names are lower-cased, e.g. `response.refund.de.j2`. The resolved template
+per (base, category, language) is cached.
+"""
+
+import logging
+import math
+import os
+import stat
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemBytecodeCache, PackageLoader, StrictUndefined, Template, TemplateNotFound
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+PROMPT_RENDER_SECONDS = Histogram(
+    "prompt_render_seconds",
+    "Time spent rendering a prompt template",
+    labelnames=("template",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1),
+)
+PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens",
+    "Prompt size in tokens sent to the LLM",
+    labelnames=("template",),
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+
+DEV_MODE = os.getenv("ENVIRONMENT", "development") != "production"
+
+
+def _bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    """Disk cache for compiled templates; None (no caching) if it is not safe to use.
+
+    Cached bytecode is unmarshalled and executed, so the directory must be
+    private to this user. By default Jinja picks a per-uid 0700 directory
+    under the temp dir and checks its owner itself. PROMPT_BYTECODE_CACHE_DIR
+    names an app-owned directory instead; it is created 0700 and rejected
+    unless this user owns it and nobody else can write to it.
+    """
+    directory = os.getenv("PROMPT_BYTECODE_CACHE_DIR")
+    try:
+        if not directory:
+            return FileSystemBytecodeCache()
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.lstat(directory)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.geteuid() or info.st_mode & 0o022:
+            logger.warning(f"Ignoring PROMPT_BYTECODE_CACHE_DIR {directory}: not a directory private to this user")
+            return None
+        return FileSystemBytecodeCache(directory)
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"Prompt bytecode cache disabled: {e}")
+        return None
+
+
+prompt_env = Environment(
+    loader=PackageLoader("app", "prompts"),
+    bytecode_cache=_bytecode_cache(),
+    auto_reload=DEV_MODE,
+    undefined=StrictUndefined,
+)
+
+_variant_cache: Dict[Tuple[str, Optional[str], Optional[str]], str] = {}
+
+
+def _slug(value: Optional[str]) -> Optional[str]:
+    return value.strip().lower().replace(" ", "_") if value else None
+
+
+def variant_candidates(base: str, category: Optional[str], language: Optional[str]) -> List[str]:
+    stem = base[: -len(".j2")] if base.endswith(".j2") else base
+    category, language = _slug(category), _slug(language)
+    names = []
+    if category and language:
+        names.append(f"{stem}.{category}.{language}.j2")
+    if category:
+        names.append(f"{stem}.{category}.j2")
+    if language:
+        names.append(f"{stem}.{language}.j2")
+    names.append(f"{stem}.j2")
+    return names
+
+
+def get_template(base: str = "response.j2", category: Optional[str] = None, language: Optional[str] = None) -> Template:
+    """Return the most specific template variant for this category/language."""
+    key = (base, _slug(category), _slug(language))
+    name = _variant_cache.get(key)
+    if name is None or DEV_MODE:
+        # In dev a newly added variant file is picked up without a restart
+        name = prompt_env.select_template(variant_candidates(base, category, language)).name
+        _variant_cache[key] = name
+    try:
+        return prompt_env.get_template(name)
+    except TemplateNotFound:
+        _variant_cache.pop(key, None)
+        raise
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken  # type: ignore
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Prompt token count; uses tiktoken when installed, else ~4 chars/token."""
+    encoder = _encoder()
+    if encoder is None:
+        return math.ceil(len(text) / 4)
+    return len(encoder.encode(text))
+
+
+def render(base: str = "response.j2", category: Optional[str] = None, language: Optional[str] = None, **context) -> str:
+    start = time.perf_counter()
+    template = get_template(base, category, language)
+    prompt = template.render(category=category, language=language, **context)
+    PROMPT_RENDER_SECONDS.labels(template.name).observe(time.perf_counter() - start)
+    return prompt
+
+
+def observe_prompt_tokens(template: str, prompt: str) -> int:
+    """Record the size of a prompt that is actually sent to the LLM."""
+    tokens = count_tokens(prompt)
+    PROMPT_TOKENS.labels(template).observe(tokens)
+    return tokens
+
+
+def prompt_size_bucket(tokens: int) -> str:
+    for limit in (256, 512, 1024, 2048, 4096):
+        if tokens < limit:
+            return f"<{limit}"
+    return ">=4096"
+
+
+__all__ = [
+    "prompt_env",
+    "get_template",
+    "render",
+    "count_tokens",
+    "observe_prompt_tokens",
+    "prompt_size_bucket",
+    "variant_candidates",
+]
@@ -0,0 +1,143 @@
+# app/services/read_cache.py
+"""In-process cache of serialized ticket / response payloads for hot GETs.
+
+`GET /tickets/{id}` and `GET /tickets/{id}/responses` store their JSON body
+here (bounded LRU, `READ_CACHE_MAX_ENTRIES`, TTL `READ_CACHE_TTL_SECONDS`)
+together with an ETag. A repeat poll is served from memory, and a matching
+`If-None-Match` gets a 304 without touching the database.
+
+Entries are invalidated from ticket events (`ticket.classified`,
+`response.completed`, ...), which every write path already publishes. On
+Postgres those arrive from other workers via LISTEN/NOTIFY, so all workers
+drop the entry. Writes that publish no event (the offline reclassify job)
+are bounded by the TTL.
+
+Only payloads read from the primary are stored (a lagging replica could
+put a pre-write row back right after its invalidation), and clients inside
+their read-your-writes window bypass the cache (another worker's
+invalidation may not have arrived yet); see app/db/routing.py.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from app.services.events import event_bus
+
+READ_CACHE_LOOKUPS = Counter(
+    "read_cache_lookups_total",
+    "Read cache lookups by payload kind and result (hit, miss, not_modified)",
+    labelnames=("kind", "result"),
+)
+READ_CACHE_INVALIDATIONS = Counter(
+    "read_cache_invalidations_total",
+    "Ticket entries dropped from the read cache after a write",
+)
+READ_CACHE_ENTRIES = Gauge(
+    "read_cache_entries",
+    "Payloads held in the read cache",
+)
+
+# Events that do not change stored rows
+_NON_WRITE_EVENTS = {"response.delta"}
+
+Key = Tuple[str, int]
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+class ReadCache:
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        # key -> (stored_at, etag, body)
+        self._entries: "OrderedDict[Key, Tuple[float, str, bytes]]" = OrderedDict()
+        # Set from a global counter on every invalidation so a read that raced
+        # a write is not stored. Tickets pruned from this map fall back to
+        # `_floor`, the counter at pruning time, so versions never go back
+        self._versions: Dict[int, int] = {}
+        self._counter = 0
+        self._floor = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def version(self, ticket_id: int) -> int:
+        return self._versions.get(ticket_id, self._floor)
+
+    def get(self, kind: str, ticket_id: int) -> Optional[Tuple[str, bytes]]:
+        entry = self._entries.get((kind, ticket_id))
+        if entry is None:
+            return None
+        stored_at, etag, body = entry
+        if time.monotonic() - stored_at > self.ttl:
+            self._entries.pop((kind, ticket_id), None)
+            READ_CACHE_ENTRIES.set(len(self._entries))
+            return None
+        self._entries.move_to_end((kind, ticket_id))
+        return etag, body
+
+    def put(self, kind: str, ticket_id: int, payload: Any, version: int, store: bool = True) -> Tuple[str, bytes]:
+        """Serialize `payload`, cache it (if `store`) unless the ticket changed since `version`."""
+        body = json.dumps(payload, separators=(",", ":"), default=str).encode()
+        etag = make_etag(body)
+        if store and self.enabled and self.version(ticket_id) == version:
+            self._entries[(kind, ticket_id)] = (time.monotonic(), etag, body)
+            self._entries.move_to_end((kind, ticket_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            READ_CACHE_ENTRIES.set(len(self._entries))
+        return etag, body
+
+    def invalidate(self, ticket_id: int) -> None:
+        self._counter += 1
+        # Re-inserted so the dict stays ordered oldest invalidation first
+        self._versions.pop(ticket_id, None)
+        self._versions[ticket_id] = self._counter
+        if len(self._versions) > 4 * max(self.max_entries, 1):
+            self._prune_versions(2 * max(self.max_entries, 1))
+        dropped = self._entries.pop(("ticket", ticket_id), None)
+        dropped = self._entries.pop(("responses", ticket_id), None) or dropped
+        if dropped is not None:
+            READ_CACHE_INVALIDATIONS.inc()
+            READ_CACHE_ENTRIES.set(len(self._entries))
+
+    def _prune_versions(self, keep: int) -> None:
+        self._floor = self._counter
+        while len(self._versions) > keep:
+            del self._versions[next(iter(self._versions))]
+
+    def on_event(self, event: Dict[str, Any]) -> None:
+        if event.get("type") in _NON_WRITE_EVENTS or event.get("ticket_id") is None:
+            return
+        self.invalidate(int(event["ticket_id"]))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._prune_versions(0)
+        READ_CACHE_ENTRIES.set(0)
+
+
+read_cache = ReadCache(
+    max_entries=int(os.getenv("READ_CACHE_MAX_ENTRIES", "2048")),
+    ttl_seconds=float(os.getenv("READ_CACHE_TTL_SECONDS", "30")),
+)
+event_bus.add_hook(read_cache.on_event)
+
+
+__all__ = ["ReadCache", "read_cache", "make_etag", "etag_matches", "READ_CACHE_LOOKUPS"]
@@ -0,0 +1,176 @@
+# app/services/reclassify.py
+"""Resumable backfill that re-labels tickets classified by an older model.
+
+Tickets whose `classifier_version` differs from the current
+`get_classifier_version()` are streamed in primary-key (keyset) order, classified
+with batched inference and written back with one bulk UPDATE per chunk. The
+cursor is persisted in `job_checkpoints` in the same transaction, so an
+interrupted run resumes where it stopped.
+
+A run covers one label set: the default labels, or one tenant's (`tenant=`,
+checkpointed as `reclassify:<tenant>`).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import and_, func, or_, select, update
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import JobCheckpoint, Ticket
+from app.services.classifier import classify_batch, get_classifier_version, load_classifier_info
+from app.services.tenants import tenant_directory
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "reclassify"
+
+RECLASSIFY_TICKETS = Counter(
+    "reclassify_tickets_total",
+    "Tickets re-labelled by the reclassification backfill",
+)
+RECLASSIFY_CHANGED = Counter(
+    "reclassify_category_changed_total",
+    "Re-labelled tickets whose category actually changed",
+)
+RECLASSIFY_REMAINING = Gauge(
+    "reclassify_remaining_tickets",
+    "Stale tickets still waiting for the reclassification backfill",
+)
+RECLASSIFY_CURSOR = Gauge(
+    "reclassify_cursor_ticket_id",
+    "Last ticket id committed by the reclassification backfill",
+)
+RECLASSIFY_CHUNK_LATENCY = Histogram(
+    "reclassify_chunk_seconds",
+    "Wall time to classify and persist one backfill chunk",
+)
+
+
+def _stale_filter(version: str, tenant: Optional[str] = None):
+    same_tenant = Ticket.tenant.is_(None) if tenant is None else Ticket.tenant == tenant
+    return and_(same_tenant, or_(Ticket.classifier_version.is_(None), Ticket.classifier_version != version))
+
+
+def _job_name(tenant: Optional[str]) -> str:
+    return JOB_NAME if tenant is None else f"{JOB_NAME}:{tenant}"
+
+
+async def _load_checkpoint(session, version: str, restart: bool, name: str = JOB_NAME) -> int:
+    checkpoint = await session.get(JobCheckpoint, name)
+    if checkpoint is None or restart:
+        return 0
+    # A checkpoint written for another model/label set does not apply
+    if (checkpoint.details or {}).get("version") != version:
+        return 0
+    return int(checkpoint.cursor or 0)
+
+
+async def _save_checkpoint(session, cursor: int, version: str, processed: int, name: str = JOB_NAME) -> None:
+    checkpoint = await session.get(JobCheckpoint, name)
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(name=name)
+        session.add(checkpoint)
+    checkpoint.cursor = cursor
+    checkpoint.details = {"version": version, "processed": processed}
+
+
+async def reclassify_stale_tickets(
+    session_maker=AsyncSessionLocal,
+    chunk_size: int = int(os.getenv("RECLASSIFY_CHUNK_SIZE", "256")),
+    batch_size: int = int(os.getenv("RECLASSIFY_BATCH_SIZE", "16")),
+    max_rows_per_second: float = float(os.getenv("RECLASSIFY_MAX_ROWS_PER_SECOND", "0")),
+    limit: Optional[int] = None,
+    restart: bool = False,
+    tenant: Optional[str] = None,
+) -> Dict[str, int]:
+    """Re-label every ticket of `tenant` (None: default labels) whose stored classifier version is stale.
+
+    `max_rows_per_second` (0 = unlimited) throttles the job by sleeping
+    between chunks so live classification keeps its share of the CPU.
+    `limit` caps the number of tickets handled in this invocation.
+    """
+    label_set = await tenant_directory.for_tenant(tenant)
+    if tenant is not None and label_set is None:
+        raise ValueError(f"Unknown tenant {tenant!r}")
+    # The version decides which tickets are stale: never guess the model
+    await load_classifier_info()
+    version = get_classifier_version(label_set)
+    name = _job_name(tenant)
+    async with session_maker() as session:
+        cursor = await _load_checkpoint(session, version, restart, name)
+        remaining = await session.scalar(
+            select(func.count(Ticket.id)).where(_stale_filter(version, tenant), Ticket.id > cursor)
+        )
+    remaining = int(remaining or 0)
+    RECLASSIFY_REMAINING.set(remaining)
+    logger.warning(
+        f"Reclassify backfill starting at ticket id {cursor} for version {version}: {remaining} stale tickets."
+    )
+
+    processed = 0
+    changed = 0
+    started = time.perf_counter()
+    while limit is None or processed < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - processed)
+        chunk_start = time.perf_counter()
+        async with session_maker() as session:
+            rows = (
+                await session.execute(
+                    select(Ticket.id, Ticket.subject, Ticket.body, Ticket.category)
+                    .where(_stale_filter(version, tenant), Ticket.id > cursor)
+                    .order_by(Ticket.id)
+                    .limit(size)
+                )
+            ).all()
+            if not rows:
+                break
+
+            labels = await classify_batch(
+                [(row.subject or "", row.body or "") for row in rows],
+                batch_size=batch_size,
+                label_sets=[label_set] * len(rows),
+            )
+            # ORM bulk UPDATE by primary key: one executemany per chunk
+            await session.execute(
+                update(Ticket),
+                [
+                    {"id": row.id, "category": label, "classifier_version": version}
+                    for row, label in zip(rows, labels)
+                ],
+            )
+            cursor = rows[-1].id
+            processed += len(rows)
+            chunk_changed = sum(1 for row, label in zip(rows, labels) if row.category != label)
+            changed += chunk_changed
+            await _save_checkpoint(session, cursor, version, processed, name)
+            await session.commit()
+
+        elapsed = time.perf_counter() - chunk_start
+        RECLASSIFY_CHUNK_LATENCY.observe(elapsed)
+        RECLASSIFY_TICKETS.inc(len(rows))
+        RECLASSIFY_CHANGED.inc(chunk_changed)
+        RECLASSIFY_CURSOR.set(cursor)
+        RECLASSIFY_REMAINING.set(max(remaining - processed, 0))
+
+        rate = processed / max(time.perf_counter() - started, 1e-9)
+        eta = max(remaining - processed, 0) / rate if rate else 0.0
+        logger.warning(
+            f"Reclassify backfill: {processed}/{remaining} tickets, cursor={cursor}, "
+            f"{rate:.1f} tickets/s, eta={eta:.0f}s"
+        )
+
+        if max_rows_per_second > 0:
+            budget = len(rows) / max_rows_per_second
+            if budget > elapsed:
+                await asyncio.sleep(budget - elapsed)
+
+    logger.warning(f"Reclassify backfill finished: {processed} tickets processed, {changed} changed.")
+    return {"processed": processed, "changed": changed, "cursor": cursor}
+
+
+__all__ = ["reclassify_stale_tickets", "JOB_NAME"]
@@ -1,54 +1,291 @@
+import asyncio
+import json
 import os
-from jinja2 import Template
+import time
+from functools import lru_cache
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Sequence
 from dotenv import load_dotenv
-from prometheus_client import Histogram
+from prometheus_client import Counter, Histogram
+
+from app.services.llm_client import (
+    LLMConfigError,
+    LLMEmptyResponse,
+    LLMUnavailable,
+    classify_error,
+    llm_caller,
+)
+from app.services.prompts import observe_prompt_tokens, prompt_size_bucket, render
 
 LLM_LATENCY = Histogram(
     "llm_api_latency_seconds",
-    "Time spent processing LLM API requests"
+    "Time spent processing LLM API requests",
+    labelnames=("backend",),
+)
+LLM_LATENCY_BY_PROMPT_SIZE = Histogram(
+    "llm_api_latency_by_prompt_size_seconds",
+    "LLM API latency split by prompt token bucket",
+    labelnames=("backend", "prompt_size"),
+)
+LLM_TTFT = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from request start until the first streamed token arrives",
+    labelnames=("backend",),
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_output_tokens_per_second",
+    "Streamed output tokens per second after the first token",
+    labelnames=("backend",),
+    buckets=(1, 5, 10, 25, 50, 100, 200, 400, 800),
+)
+LLM_BATCH_SIZE = Histogram(
+    "llm_batch_size",
+    "Tickets drafted per multi-ticket LLM call",
+    buckets=(1, 2, 4, 8, 16, 32),
+)
+LLM_BATCH_PARSE_FAILURES = Counter(
+    "llm_batch_parse_failures_total",
+    "Tickets whose draft could not be parsed from a batch LLM reply",
 )
 
 # Load environment only if not production
 if os.getenv("ENVIRONMENT") != "production":
     load_dotenv()
 
-def load_prompt():
-    with open("app/prompts/response.j2") as f:
-        return Template(f.read())
+def render_prompt(subject: str, body: str, category: str, language: Optional[str] = None) -> str:
+    # Picks response.<category>.<language>.j2 etc. when such a variant exists
+    return render("response.j2", category=category, language=language, subject=subject, body=body)
 
-PROMPT_TEMPLATE = load_prompt()
 
-async def generate_response(subject: str, body: str, category: str) -> str:
-    # Allow mocking to avoid network dependency and credentials in CI
-    if os.getenv("APP_MOCK_AI") == "1" or os.getenv("MOCK_OPENAI") == "1":
-        return f"[MOCK RESPONSE] Category={category}. Thank you for your message about '{subject}'."
+def _latency_timers(backend: str, template: str, prompt: str):
+    """Record the prompt size and return the latency timers for the call."""
+    tokens = observe_prompt_tokens(template, prompt)
+    return (
+        LLM_LATENCY.labels(backend).time(),
+        LLM_LATENCY_BY_PROMPT_SIZE.labels(backend, prompt_size_bucket(tokens)).time(),
+    )
+
+
+def _mock_enabled() -> bool:
+    return os.getenv("APP_MOCK_AI") == "1" or os.getenv("MOCK_OPENAI") == "1"
+
+
+def _mock_text(subject: str, category: str) -> str:
+    return f"[MOCK RESPONSE] Category={category}. Thank you for your message about '{subject}'."
+
 
+def _client(api_key: str):
+    from openai import AsyncOpenAI
+    # OPENAI_BASE_URL lets tests and load runs target a local stub server.
+    # Retries and timeouts are handled by llm_caller, not the SDK.
+    return AsyncOpenAI(api_key=api_key, base_url=os.getenv("OPENAI_BASE_URL") or None, max_retries=0)
+
+
+def _api_key() -> str:
     try:
-        from openai import AsyncOpenAI
+        import openai  # noqa: F401
     except Exception as e:
-        return f"Error: OpenAI client unavailable: {e}"
-
+        raise LLMConfigError(f"OpenAI client unavailable: {e}")
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
-        return "Error: OPENAI_API_KEY not set"
+        raise LLMConfigError("OPENAI_API_KEY not set")
+    return api_key
 
-    client = AsyncOpenAI(api_key=api_key)
-    prompt = PROMPT_TEMPLATE.render(subject=subject, body=body, category=category)
 
-    try:
-        with LLM_LATENCY.time():
-            # CORRECTED API CALL for GPT-5 using the Responses API
-            response = await client.responses.create(
+class OpenAIResponseBackend:
+    """Remote drafting through the OpenAI Responses API and llm_caller."""
+
+    name = "openai"
+
+    async def generate(self, prompt: str, op: str = "response") -> str:
+        client = _client(_api_key())
+        # CORRECTED API CALL for GPT-5 using the Responses API
+        response = await llm_caller.call(
+            op,
+            lambda: client.responses.create(
                 model=os.getenv("OPENAI_MODEL", "gpt-5-nano"),
                 input=prompt,
                 # As per the docs, nano is best for classification/instruction-following.
                 # 'minimal' reasoning is a good default for speed.
                 reasoning={"effort": "minimal"},
-            )
-        
+            ),
+        )
         # The output from the Responses API is in the 'output_text' attribute
-        content = getattr(response, "output_text", None)
-        return content.strip() if content else "Error: Empty response from model"
+        return getattr(response, "output_text", None) or ""
+
+    async def stream(self, prompt: str, usage: dict) -> AsyncIterator[str]:
+        client = _client(_api_key())
+        # Opening the stream goes through the call layer; once tokens have been
+        # forwarded a broken stream cannot be retried transparently
+        stream = await llm_caller.call(
+            "response_stream",
+            lambda: client.responses.create(
+                model=os.getenv("OPENAI_MODEL", "gpt-5-nano"),
+                input=prompt,
+                reasoning={"effort": "minimal"},
+                stream=True,
+            ),
+            hedge=False,
+        )
+        async for event in stream:
+            event_type = getattr(event, "type", "")
+            if event_type == "response.output_text.delta":
+                yield event.delta
+            elif event_type == "response.completed":
+                tokens = getattr(getattr(event.response, "usage", None), "output_tokens", None)
+                if tokens:
+                    usage["output_tokens"] = tokens
+            elif event_type in ("response.failed", "error"):
+                raise LLMUnavailable(f"stream error event: {event_type}")
+
+    def info(self) -> dict:
+        return {"backend": self.name, "model": os.getenv("OPENAI_MODEL", "gpt-5-nano")}
+
+
+@lru_cache(maxsize=1)
+def get_response_backend():
+    """Backend selected by RESPONSE_BACKEND: "openai" (default) or "local"."""
+    name = os.getenv("RESPONSE_BACKEND", "openai").lower()
+    if name == "local":
+        from app.services.local_llm import local_backend_from_env
 
+        return local_backend_from_env()
+    return OpenAIResponseBackend()
+
+
+def get_response_backend_info() -> dict:
+    if _mock_enabled():
+        return {"backend": "mock", "model": "mock"}
+    return get_response_backend().info()
+
+
+def shutdown_response_backend() -> None:
+    if get_response_backend.cache_info().currsize:
+        backend = get_response_backend()
+        if hasattr(backend, "shutdown"):
+            backend.shutdown()
+        get_response_backend.cache_clear()
+
+
+async def generate_response(subject: str, body: str, category: str, language: Optional[str] = None) -> str:
+    """Draft a reply to one ticket. Raises LLMError when no draft could be produced."""
+    # Allow mocking to avoid network dependency and credentials in CI
+    if _mock_enabled():
+        return _mock_text(subject, category)
+
+    backend = get_response_backend()
+    prompt = render_prompt(subject, body, category, language)
+    latency, latency_by_size = _latency_timers(backend.name, "response.j2", prompt)
+    with latency, latency_by_size:
+        content = await backend.generate(prompt)
+    if not content or not content.strip():
+        raise LLMEmptyResponse("Empty response from model")
+    return content.strip()
+
+
+async def _stream_deltas(prompt: str, subject: str, category: str, usage: dict) -> AsyncIterator[str]:
+    """Yield output text deltas; fills `usage["output_tokens"]` when reported."""
+    if _mock_enabled():
+        for word in _mock_text(subject, category).split(" "):
+            await asyncio.sleep(0)
+            yield word + " "
+        return
+
+    async for delta in get_response_backend().stream(prompt, usage):
+        yield delta
+
+
+async def generate_response_streaming(
+    subject: str,
+    body: str,
+    category: str,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+    language: Optional[str] = None,
+) -> str:
+    """Streaming variant of generate_response.
+
+    Calls `on_delta` with each text fragment as it arrives and returns the
+    full text at the end. Raises LLMError like generate_response.
+    Records time-to-first-token and output tokens/sec.
+    """
+    usage: dict = {}
+    parts = []
+    start = time.perf_counter()
+    first_token_at = None
+    backend_name = "mock" if _mock_enabled() else get_response_backend().name
+    prompt = render_prompt(subject, body, category, language)
+    latency, latency_by_size = _latency_timers(backend_name, "response.j2", prompt)
+    try:
+        with latency, latency_by_size:
+            async for delta in _stream_deltas(prompt, subject, category, usage):
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    LLM_TTFT.labels(backend_name).observe(first_token_at - start)
+                parts.append(delta)
+                if on_delta is not None:
+                    await on_delta(delta)
     except Exception as e:
-        return f"Error: Unable to get response from model: {str(e)}"
\ No newline at end of file
+        raise classify_error(e) from e
+
+    if first_token_at is not None:
+        generation = time.perf_counter() - first_token_at
+        tokens = usage.get("output_tokens") or len(parts)
+        if generation > 0:
+            LLM_TOKENS_PER_SECOND.labels(backend_name).observe(tokens / generation)
+
+    content = "".join(parts).strip()
+    if not content:
+        raise LLMEmptyResponse("Empty response from model")
+    return content
+
+
+def parse_batch_drafts(text: str, expected_ids: Iterable[int]) -> Dict[int, str]:
+    """Extract {ticket_id: draft} from a batch reply; unknown or empty entries are dropped."""
+    expected = set(expected_ids)
+    try:
+        data = json.loads(text[text.index("{"): text.rindex("}") + 1])
+    except ValueError:
+        return {}
+    drafts: Dict[int, str] = {}
+    for item in data.get("drafts", []) if isinstance(data, dict) else []:
+        try:
+            ticket_id = int(item.get("ticket_id"))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        draft = item.get("response")
+        if ticket_id in expected and isinstance(draft, str) and draft.strip():
+            drafts[ticket_id] = draft.strip()
+    return drafts
+
+
+async def generate_batch_responses(items: Sequence[dict]) -> Dict[int, str]:
+    """Draft several tickets at once.
+
+    `items` are dicts with ticket_id, subject, body, category and optionally
+    language. The remote backend gets one multi-ticket prompt; the local
+    backend runs the single ticket prompts as one batched generate call. Returns the drafts that
+    parsed; callers fall back to generate_response for the rest.
+    Raises LLMError on transport errors.
+    """
+    if not items:
+        return {}
+    LLM_BATCH_SIZE.observe(len(items))
+    if _mock_enabled():
+        return {i["ticket_id"]: _mock_text(i["subject"], i["category"]) for i in items}
+
+    backend = get_response_backend()
+    if hasattr(backend, "generate_many"):
+        prompts = [render_prompt(i["subject"], i["body"], i["category"], i.get("language")) for i in items]
+        latency, latency_by_size = _latency_timers(backend.name, "response.j2", max(prompts, key=len))
+        with latency, latency_by_size:
+            texts = await backend.generate_many(prompts)
+        return {i["ticket_id"]: t.strip() for i, t in zip(items, texts) if t and t.strip()}
+
+    prompt = render("response_batch.j2", tickets=items)
+    latency, latency_by_size = _latency_timers(backend.name, "response_batch.j2", prompt)
+    with latency, latency_by_size:
+        text = await backend.generate(prompt, op="response_batch")
+    drafts = parse_batch_drafts(text, [i["ticket_id"] for i in items])
+    LLM_BATCH_PARSE_FAILURES.inc(len(items) - len(drafts))
+    return drafts
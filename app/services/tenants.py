@@ -0,0 +1,127 @@
+# app/services/tenants.py
+"""Per-tenant label taxonomies, stored in the `tenants` table.
+
+A tenant has a name, a list of labels, and the inbound addresses it owns.
+Each address is either exact (`support@acme.com`) or a whole domain
+(`@acme.com`). Inbound mail is assigned by its `to` address. An exact match
+wins over a domain match, and mail for no tenant keeps the default
+CANDIDATE_LABELS. `POST /tickets/` takes the tenant name directly.
+
+The table is small and read on every ticket. `TenantDirectory` keeps it in
+memory and reloads it every `TENANT_REFRESH_SECONDS`, so a label change
+reaches every worker within that time without a restart. If a reload fails,
+the previous copy stays in use.
+
+Each ticket stores its tenant. Its classifier version carries the digest of
+that tenant's labels, so relabelling a tenant marks only that tenant's
+tickets as stale (see app/services/reclassify.py).
+"""
+
+import logging
+import os
+import time
+from email.utils import getaddresses
+from typing import Dict, Iterable, Optional
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Tenant
+from app.services.classifier import LabelSet
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = float(os.getenv("TENANT_REFRESH_SECONDS", "30"))
+
+TENANTS_CONFIGURED = Gauge(
+    "tenants_configured",
+    "Tenants with their own label set",
+)
+TENANT_ROUTED = Counter(
+    "tenant_routed_tickets_total",
+    "Inbound emails assigned to a tenant by their `to` address",
+    labelnames=("tenant",),
+)
+
+
+def _addresses(to: str) -> Iterable[str]:
+    for _, address in getaddresses([to or ""]):
+        if "@" in address:
+            yield address.strip().lower()
+
+
+class TenantDirectory:
+    def __init__(self, session_maker=AsyncSessionLocal, refresh_seconds: float = REFRESH_SECONDS):
+        self.session_maker = session_maker
+        self.refresh_seconds = refresh_seconds
+        self._label_sets: Dict[str, LabelSet] = {}
+        self._mailboxes: Dict[str, str] = {}
+        self._loaded_at: Optional[float] = None
+
+    def load(self, tenants: Iterable[Tenant]) -> None:
+        label_sets, mailboxes = {}, {}
+        for tenant in tenants:
+            labels = tuple(str(label) for label in (tenant.labels or []) if str(label).strip())
+            if not labels:
+                logger.warning(f"Tenant {tenant.name} has no labels, ignoring it")
+                continue
+            label_sets[tenant.name] = LabelSet(tenant.name, labels)
+            for mailbox in tenant.mailboxes or []:
+                mailboxes[str(mailbox).strip().lower()] = tenant.name
+        self._label_sets, self._mailboxes = label_sets, mailboxes
+        self._loaded_at = time.monotonic()
+        TENANTS_CONFIGURED.set(len(label_sets))
+
+    async def refresh(self) -> None:
+        async with self.session_maker() as session:
+            self.load((await session.execute(select(Tenant))).scalars().all())
+
+    async def _ensure_fresh(self) -> None:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        try:
+            await self.refresh()
+        except Exception as e:
+            # Keep the last good copy; retry on the next lookup after the interval
+            self._loaded_at = time.monotonic()
+            logger.warning(f"Could not load tenants, keeping {len(self._label_sets)} cached: {e}")
+
+    def label_set(self, tenant: Optional[str]) -> Optional[LabelSet]:
+        return self._label_sets.get(tenant) if tenant else None
+
+    def resolve(self, to: str) -> Optional[str]:
+        """Tenant owning one of the `to` addresses, exact addresses first."""
+        addresses = list(_addresses(to))
+        for address in addresses:
+            if address in self._mailboxes:
+                return self._mailboxes[address]
+        for address in addresses:
+            tenant = self._mailboxes.get("@" + address.rpartition("@")[2])
+            if tenant:
+                return tenant
+        return None
+
+    async def for_recipients(self, to: str) -> Optional[LabelSet]:
+        """Label set for an inbound email's `to`; None for the default labels."""
+        await self._ensure_fresh()
+        label_set = self.label_set(self.resolve(to))
+        if label_set is not None:
+            TENANT_ROUTED.labels(label_set.tenant).inc()
+        return label_set
+
+    async def for_tenant(self, tenant: Optional[str]) -> Optional[LabelSet]:
+        """Label set of a stored / requested tenant name; None for the default labels or unknown names."""
+        if not tenant:
+            return None
+        await self._ensure_fresh()
+        return self.label_set(tenant)
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+
+tenant_directory = TenantDirectory()
+
+
+__all__ = ["TenantDirectory", "tenant_directory"]
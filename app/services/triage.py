@@ -0,0 +1,41 @@
+# app/services/triage.py
+"""Language and priority for new tickets, computed next to classification.
+
+`triage()` fills `tickets.language` (app/services/language.py) and
+`tickets.priority` (app/services/priority.py). Values the client already
+sent win. Priority needs the category, so a ticket stored before
+classification (deferred ingest, overload) gets only its language at insert.
+Its priority is filled when the deferred stage classifies it.
+"""
+
+from typing import Optional
+
+from prometheus_client import Counter
+
+from app.services.language import detect_language
+from app.services.priority import score_priority
+
+TICKETS_TRIAGED = Counter(
+    "tickets_triaged_total",
+    "Tickets by detected language and priority at ingest",
+    labelnames=("language", "priority"),
+)
+
+
+def triage(
+    subject: str,
+    body: str,
+    category: Optional[str] = None,
+    confidence: Optional[float] = None,
+    language: Optional[str] = None,
+    priority: Optional[str] = None,
+) -> dict:
+    """`language` / `priority` column values for one ticket."""
+    language = language or detect_language(f"{subject}\n{body}")
+    if priority is None and category is not None:
+        priority = score_priority(subject, body, category, confidence)
+        TICKETS_TRIAGED.labels(language or "unknown", priority).inc()
+    return {"language": language, "priority": priority}
+
+
+__all__ = ["triage", "TICKETS_TRIAGED"]
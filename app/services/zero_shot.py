@@ -0,0 +1,137 @@
+# app/services/zero_shot.py
+"""Zero-shot NLI scoring of one batch against several label sets in one pass.
+
+The transformers zero-shot pipeline takes one `candidate_labels` list per
+call, so a batch mixing tenants with different taxonomies would need one
+call per taxonomy. `SharedPassScorer` builds the (premise, hypothesis)
+pairs itself instead:
+
+- each premise is tokenized once and reused for every hypothesis of its
+  ticket's label set;
+- hypothesis token ids ("This example is {label}.") are cached per label set
+  (`HypothesisCache`; hits and misses counted per tenant);
+- the pairs of every ticket in the batch, whatever its tenant, go through
+  the model in one padded forward pass.
+
+An NLI model reads premise and hypothesis jointly, so the encoder itself
+cannot be shared between pairs; the work saved is the per-taxonomy calls
+and the repeated tokenization. Scores match the pipeline with
+`multi_label=False`: a softmax of the entailment logits over the ticket's
+own labels.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from prometheus_client import Counter
+
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+HYPOTHESIS_CACHE = Counter(
+    "zero_shot_hypothesis_cache_total",
+    "Hypothesis encoding cache lookups, by tenant and result (hit, miss)",
+    labelnames=("tenant", "result"),
+)
+
+
+class HypothesisCache:
+    """Token ids of each label set's hypotheses, least recently used evicted."""
+
+    def __init__(self, tokenizer, template: str = HYPOTHESIS_TEMPLATE, max_entries: int = 256):
+        self.tokenizer = tokenizer
+        self.template = template
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, List[List[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, label_set) -> List[List[int]]:
+        key = tuple(label_set.labels)
+        with self._lock:
+            ids = self._entries.get(key)
+            if ids is not None:
+                self._entries.move_to_end(key)
+        if ids is not None:
+            HYPOTHESIS_CACHE.labels(label_set.tenant, "hit").inc()
+            return ids
+        HYPOTHESIS_CACHE.labels(label_set.tenant, "miss").inc()
+        hypotheses = [self.template.format(label) for label in label_set.labels]
+        ids = self.tokenizer(hypotheses, add_special_tokens=False)["input_ids"]
+        with self._lock:
+            self._entries[key] = ids
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return ids
+
+
+def entailment_id(model) -> int:
+    """Index of the entailment logit, or -1 if the model config does not name one."""
+    for label, index in (getattr(model.config, "label2id", None) or {}).items():
+        if str(label).lower().startswith("entail"):
+            return int(index)
+    return -1
+
+
+class SharedPassScorer:
+    def __init__(self, model, tokenizer, device=None, max_length: Optional[int] = None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.entailment = entailment_id(model)
+        limit = getattr(tokenizer, "model_max_length", None) or 1024
+        # Tokenizers without a limit report a huge sentinel value
+        self.max_length = max_length or (limit if limit < 100_000 else 1024)
+        self.hypotheses = HypothesisCache(tokenizer)
+
+    def __call__(self, premises: Sequence[str], label_sets: Sequence) -> List[dict]:
+        import torch  # type: ignore
+
+        tokenizer = self.tokenizer
+        hypothesis_ids = [self.hypotheses.get(label_set) for label_set in label_sets]
+        room = self.max_length - tokenizer.num_special_tokens_to_add(pair=True)
+        longest = max(len(ids) for per_set in hypothesis_ids for ids in per_set)
+        # One tokenizer call for all premises, cut so the longest hypothesis still fits
+        premise_ids = tokenizer(
+            list(premises), add_special_tokens=False, truncation=True, max_length=max(1, room - longest)
+        )["input_ids"]
+
+        sequences = []
+        for ids, per_set in zip(premise_ids, hypothesis_ids):
+            sequences.extend(tokenizer.build_inputs_with_special_tokens(ids, hyp) for hyp in per_set)
+        inputs = tokenizer.pad({"input_ids": sequences}, return_tensors="pt")
+        if self.device is not None:
+            inputs = {name: tensor.to(self.device) for name, tensor in inputs.items()}
+        with torch.inference_mode():
+            entail_logits = self.model(**inputs).logits[:, self.entailment].float().cpu()
+
+        results, offset = [], 0
+        for label_set in label_sets:
+            count = len(label_set.labels)
+            scores = entail_logits[offset : offset + count].softmax(dim=0).tolist()
+            offset += count
+            ranked = sorted(zip(label_set.labels, scores), key=lambda item: -item[1])
+            results.append({"labels": [label for label, _ in ranked], "scores": [score for _, score in ranked]})
+        return results
+
+
+def shared_pass_scorer(classifier) -> Optional[SharedPassScorer]:
+    """A scorer for a transformers zero-shot pipeline, or None (e.g. the mock classifier).
+
+    Built once per pipeline and kept on it.
+    """
+    scorer = getattr(classifier, "_shared_pass_scorer", None)
+    if scorer is not None:
+        return scorer
+    model = getattr(classifier, "model", None)
+    tokenizer = getattr(classifier, "tokenizer", None)
+    if model is None or tokenizer is None or getattr(model, "config", None) is None or entailment_id(model) < 0:
+        return None
+    scorer = SharedPassScorer(model, tokenizer, device=getattr(classifier, "device", None))
+    try:
+        classifier._shared_pass_scorer = scorer
+    except AttributeError:
+        pass
+    return scorer
+
+
+__all__ = ["SharedPassScorer", "HypothesisCache", "shared_pass_scorer", "HYPOTHESIS_TEMPLATE"]
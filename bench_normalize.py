@@ -0,0 +1,62 @@
+# bench_normalize.py
+"""Time inbound normalization on large synthetic messages.
+
+Builds replies with a long quoted thread, a signature and a legal footer
+(text and HTML-only variants) and reports throughput and token reduction:
+
+    python bench_normalize.py --size-kb 512 --n 20
+"""
+import argparse
+import statistics
+import time
+
+from app.services.normalize import compress_raw, normalize_email
+
+MESSAGE = "Hello,\n\nThe export to CSV fails with a 500 error since yesterday.\nSteps: open Reports, click Export.\n\nThanks,\nSam\n"
+SIGNATURE = "-- \nSam Lee | Example Ltd | +1 555 0100\n"
+FOOTER = "\nCONFIDENTIALITY NOTICE: This e-mail and any attachments are confidential and intended solely for the addressee.\n"
+
+
+def build_text(size: int) -> str:
+    thread = []
+    while sum(map(len, thread)) < size:
+        thread.append(
+            "On Mon, Oct 5, 2026 at 9:00 AM Support <support@example.com> wrote:\n"
+            + "> Thanks for reaching out, could you send us the exact steps and a screenshot?\n" * 20
+        )
+    return MESSAGE + SIGNATURE + FOOTER + "\n" + "".join(thread)
+
+
+def build_html(size: int) -> str:
+    quote = "<blockquote>" + "<p>Thanks for reaching out, could you send us the steps?</p>" * 20 + "</blockquote>"
+    body = "".join(f"<p>{line}</p>" for line in MESSAGE.splitlines())
+    html = f"<html><head><style>p {{ margin: 0 }}</style></head><body>{body}<div class=\"gmail_quote\">"
+    while len(html) < size:
+        html += quote
+    return html + "</div></body></html>"
+
+
+def run(variant: str, text: str, html, n: int) -> None:
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        result = normalize_email(text, html)
+        timings.append(time.perf_counter() - start)
+    raw = len((text or html).encode())
+    compressed, _ = compress_raw(text, html)
+    mean = statistics.mean(timings)
+    print(
+        f"{variant:>5}: {raw / 1024:.0f} KiB  mean {mean * 1000:.2f} ms  ({raw / mean / 1e6:.1f} MB/s)  "
+        f"tokens {result.tokens_before} -> {result.tokens_after} ({result.reduction:.1%} saved)  "
+        f"raw stored {len(compressed) / 1024:.1f} KiB"
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Benchmark inbound email normalization.")
+    p.add_argument("--size-kb", type=int, default=256, help="Approximate message size")
+    p.add_argument("--n", type=int, default=20, help="Runs per variant")
+    args = p.parse_args()
+    size = args.size_kb * 1024
+    run("text", build_text(size), None, args.n)
+    run("html", "", build_html(size), args.n)
@@ -0,0 +1,22 @@
+# draft_backlog.py
+"""Drain the backlog of classified tickets that have no draft yet.
+
+Groups pending tickets into multi-ticket LLM calls (see
+app/services/batch_drafting.py); tickets missing from a batch reply fall
+back to a single call.
+"""
+import argparse
+import asyncio
+import logging
+
+from app.services.batch_drafting import drain_pending_drafts
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Draft responses for pending tickets in batches.")
+    p.add_argument("--batch", type=int, default=8, help="Tickets per LLM call")
+    p.add_argument("--limit", type=int, default=None, help="Stop after this many tickets")
+    args = p.parse_args()
+    drafted = asyncio.run(drain_pending_drafts(batch_size=args.batch, limit=args.limit))
+    print(f"Drafted {drafted} tickets.")
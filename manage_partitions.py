@@ -0,0 +1,22 @@
+# manage_partitions.py
+"""Run one partition maintenance pass (normally done by the app every hour).
+
+Creates upcoming partitions of `logs`, `tickets` and `responses`, archives
+and drops expired log partitions, and folds old ticket / response months
+into their archive partitions. See app/services/partitions.py.
+"""
+import argparse
+import asyncio
+import logging
+
+from app.services.partitions import LOG_ARCHIVE_DIR, PREMAKE, maintain_partitions
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Create, archive and drop table partitions.")
+    p.add_argument("--premake", type=int, default=PREMAKE, help="Periods to create ahead of the current one")
+    p.add_argument("--archive-dir", default=LOG_ARCHIVE_DIR, help="Where expired log partitions are written ('' to only drop)")
+    args = p.parse_args()
+
+    print(asyncio.run(maintain_partitions(premake=args.premake, archive_dir=args.archive_dir or None)))
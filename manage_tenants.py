@@ -0,0 +1,71 @@
+# manage_tenants.py
+"""Create, list and delete tenants and their label sets.
+
+    python manage_tenants.py set acme --labels Billing,Shipping,Returns --mailbox support@acme.com --mailbox @acme.io
+    python manage_tenants.py list
+    python manage_tenants.py delete acme
+
+Running workers pick up changes within TENANT_REFRESH_SECONDS. Changing a
+tenant's labels changes its classifier version; re-label its existing
+tickets with `python reclassify_tickets.py --tenant acme`.
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Tenant
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+async def set_tenant(name: str, labels, mailboxes) -> None:
+    async with AsyncSessionLocal() as session:
+        tenant = await session.get(Tenant, name) or Tenant(name=name, mailboxes=[])
+        if labels is not None:
+            tenant.labels = labels
+        if mailboxes is not None:
+            tenant.mailboxes = mailboxes
+        if not tenant.labels:
+            raise SystemExit(f"Tenant {name} needs --labels")
+        session.add(tenant)
+        await session.commit()
+    print(f"{name}: labels={tenant.labels} mailboxes={tenant.mailboxes}")
+
+
+async def list_tenants() -> None:
+    async with AsyncSessionLocal() as session:
+        for tenant in (await session.execute(select(Tenant).order_by(Tenant.name))).scalars():
+            print(f"{tenant.name}: labels={tenant.labels} mailboxes={tenant.mailboxes}")
+
+
+async def delete_tenant(name: str) -> None:
+    async with AsyncSessionLocal() as session:
+        tenant = await session.get(Tenant, name)
+        if tenant is None:
+            raise SystemExit(f"No tenant {name}")
+        await session.delete(tenant)
+        await session.commit()
+    print(f"Deleted {name}; its existing tickets keep their tenant and category")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Manage per-tenant label sets.")
+    sub = p.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("set", help="Create or update a tenant")
+    s.add_argument("name")
+    s.add_argument("--labels", type=lambda v: [x.strip() for x in v.split(",") if x.strip()], default=None, help="Comma-separated labels")
+    s.add_argument("--mailbox", action="append", default=None, help="Inbound address or @domain (repeatable; replaces the list)")
+    sub.add_parser("list", help="List tenants")
+    d = sub.add_parser("delete", help="Delete a tenant")
+    d.add_argument("name")
+    args = p.parse_args()
+
+    if args.command == "set":
+        asyncio.run(set_tenant(args.name, args.labels, args.mailbox))
+    elif args.command == "list":
+        asyncio.run(list_tenants())
+    else:
+        asyncio.run(delete_tenant(args.name))
@@ -0,0 +1,41 @@
+# reclassify_tickets.py
+"""Re-label tickets after a change of HF_MODEL, CANDIDATE_LABELS or a tenant's labels.
+
+Resumable: progress is checkpointed per chunk, so re-running continues from
+the last committed ticket id. Use --restart to start from the beginning.
+"""
+import argparse
+import asyncio
+import logging
+
+from prometheus_client import start_http_server
+
+from app.services.reclassify import reclassify_stale_tickets
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Backfill stale ticket categories.")
+    p.add_argument("--chunk", type=int, default=256, help="Tickets per keyset chunk / UPDATE")
+    p.add_argument("--batch", type=int, default=16, help="Pipeline inference batch size")
+    p.add_argument("--max-rate", type=float, default=0.0, help="Max tickets per second (0 = unlimited)")
+    p.add_argument("--limit", type=int, default=None, help="Stop after this many tickets")
+    p.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint")
+    p.add_argument("--tenant", default=None, help="Re-label this tenant's tickets (default: tickets without a tenant)")
+    p.add_argument("--metrics-port", type=int, default=0, help="Expose Prometheus metrics on this port")
+    args = p.parse_args()
+
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+
+    result = asyncio.run(
+        reclassify_stale_tickets(
+            chunk_size=args.chunk,
+            batch_size=args.batch,
+            max_rows_per_second=args.max_rate,
+            limit=args.limit,
+            restart=args.restart,
+            tenant=args.tenant,
+        )
+    )
+    print(result)
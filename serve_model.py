@@ -0,0 +1,59 @@
+# serve_model.py
+"""Run the classifier as its own process, serving API workers over a Unix socket.
+
+    python serve_model.py --socket /run/ai-email-assistant/model.sock --metrics-port 9101
+    MODEL_SERVER_SOCKET=/run/ai-email-assistant/model.sock uvicorn app.main:app --workers 4
+
+The server loads the model once, runs the per-host autotuning
+(CLASSIFIER_AUTOTUNE) and batches classification requests from every API
+worker together. API workers with `MODEL_SERVER_SOCKET` set never load the
+model. See app/services/model_server.py for batching and
+app/services/model_ipc.py for the wire format.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+
+from prometheus_client import start_http_server
+
+from app.services import classifier
+from app.services.autotune import autotune
+from app.services.model_server import model_server_from_env
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+async def main(args) -> None:
+    # This process is the model server; never forward to itself
+    classifier.model_client = None
+    model = classifier.get_zero_shot_classifier()
+    model("Subject: warmup\nBody: test\n", candidate_labels=classifier.CANDIDATE_LABELS, multi_label=False)
+    config = await asyncio.to_thread(autotune, model)
+    print(f"Model {classifier.get_model_info()} ready, inference config {config.as_dict()}")
+
+    server = model_server_from_env(args.socket)
+    if args.max_batch:
+        server.max_batch = args.max_batch
+    if args.max_wait_ms is not None:
+        server.max_wait = args.max_wait_ms / 1000.0
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    await server.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Serve ticket classification over a Unix socket.")
+    p.add_argument("--socket", default=os.getenv("MODEL_SERVER_SOCKET") or None, help="Unix socket path (default MODEL_SERVER_SOCKET)")
+    p.add_argument("--max-batch", type=int, default=None, help="Items per cross-worker batch (default MODEL_SERVER_MAX_BATCH, 64)")
+    p.add_argument("--max-wait-ms", type=int, default=None, help="Longest wait for a batch to fill (default MODEL_SERVER_MAX_WAIT_MS, 10)")
+    p.add_argument("--metrics-port", type=int, default=int(os.getenv("MODEL_SERVER_METRICS_PORT", "0")), help="Expose Prometheus metrics on this port (0: off)")
+    asyncio.run(main(p.parse_args()))
@@ -0,0 +1,160 @@
+# stub_llm_server.py
+"""Local stand-in for the OpenAI Responses API (POST /v1/responses).
+
+Lets the drafting path, including token streaming, be exercised and
+load-tested without network access or API spend:
+
+    python stub_llm_server.py --port 8100 --ttft-ms 300 --token-ms 20
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=stub DRAFT_STREAMING=1 uvicorn app.main:app
+
+Faults can be injected to exercise retries, hedging and the circuit breaker,
+either at start-up (--error-rate 0.2 --slow-rate 0.05 --slow-ms 5000) or at
+runtime:
+
+    curl -X POST localhost:8100/_faults -d '{"fail_next": 5, "error_status": 503}'
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+SETTINGS = {
+    "ttft_ms": 200,
+    "token_ms": 15,
+    "tokens": 60,
+    # Fault injection
+    "error_rate": 0.0,  # fraction of requests answered with error_status
+    "error_status": 503,
+    "fail_next": 0,  # the next N requests fail regardless of error_rate
+    "slow_rate": 0.0,  # fraction of requests delayed by slow_ms before answering
+    "slow_ms": 5000,
+}
+STATS = {"requests": 0, "errors": 0, "slow": 0}
+
+
+@app.post("/_faults")
+async def set_faults(request: Request):
+    """Update stub settings at runtime; returns the settings and request stats."""
+    updates = await request.json()
+    SETTINGS.update({k: v for k, v in updates.items() if k in SETTINGS})
+    return {"settings": SETTINGS, "stats": STATS}
+
+
+def _injected_error():
+    if SETTINGS["fail_next"] > 0:
+        SETTINGS["fail_next"] -= 1
+    elif random.random() >= SETTINGS["error_rate"]:
+        return None
+    STATS["errors"] += 1
+    status = int(SETTINGS["error_status"])
+    headers = {"retry-after": "1"} if status == 429 else None
+    return JSONResponse(
+        {"error": {"message": "injected fault", "type": "server_error", "code": None}},
+        status_code=status,
+        headers=headers,
+    )
+
+
+def _draft_tokens(prompt: str) -> list:
+    subject = ""
+    for line in prompt.splitlines():
+        if line.startswith("Subject:"):
+            subject = line[len("Subject:"):].strip()
+            break
+    words = (
+        f"Hello, thank you for contacting us about '{subject}'. "
+        "We have reviewed your request and our team will follow up shortly with next steps. "
+        "Kind regards, Support"
+    ).split(" ")
+    return [(w if i == 0 else " " + w) for i, w in enumerate(words)][: SETTINGS["tokens"]]
+
+
+def _response_object(response_id: str, model: str, text: str, output_tokens: int) -> dict:
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "id": f"msg_{response_id}",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {"input_tokens": 0, "output_tokens": output_tokens, "total_tokens": output_tokens},
+    }
+
+
+def _sse(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps({'type': event_type, **data})}\n\n"
+
+
+@app.post("/v1/responses")
+async def create_response(request: Request):
+    payload = await request.json()
+    STATS["requests"] += 1
+    if random.random() < SETTINGS["slow_rate"]:
+        STATS["slow"] += 1
+        await asyncio.sleep(SETTINGS["slow_ms"] / 1000)
+    error = _injected_error()
+    if error is not None:
+        return error
+    model = payload.get("model", "stub-model")
+    tokens = _draft_tokens(str(payload.get("input", "")))
+    response_id = f"resp_{uuid.uuid4().hex[:12]}"
+
+    if not payload.get("stream"):
+        await asyncio.sleep((SETTINGS["ttft_ms"] + SETTINGS["token_ms"] * len(tokens)) / 1000)
+        return JSONResponse(_response_object(response_id, model, "".join(tokens), len(tokens)))
+
+    async def events():
+        yield _sse("response.created", {"response": {**_response_object(response_id, model, "", 0), "status": "in_progress", "output": []}})
+        await asyncio.sleep(SETTINGS["ttft_ms"] / 1000)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(SETTINGS["token_ms"] / 1000)
+            yield _sse(
+                "response.output_text.delta",
+                {"item_id": f"msg_{response_id}", "output_index": 0, "content_index": 0, "delta": token, "sequence_number": i + 1},
+            )
+        yield _sse("response.completed", {"response": _response_object(response_id, model, "".join(tokens), len(tokens))})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Stub OpenAI Responses API server.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8100)
+    p.add_argument("--ttft-ms", type=int, default=SETTINGS["ttft_ms"], help="Delay before the first token")
+    p.add_argument("--token-ms", type=int, default=SETTINGS["token_ms"], help="Delay between tokens")
+    p.add_argument("--tokens", type=int, default=SETTINGS["tokens"], help="Max tokens per draft")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    p.add_argument("--error-status", type=int, default=503, help="HTTP status for injected failures")
+    p.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests delayed by --slow-ms")
+    p.add_argument("--slow-ms", type=int, default=SETTINGS["slow_ms"], help="Extra delay for slow requests")
+    args = p.parse_args()
+    SETTINGS.update(
+        ttft_ms=args.ttft_ms,
+        token_ms=args.token_ms,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
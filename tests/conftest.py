@@ -50,4 +50,58 @@ async def setup_database(event_loop):
 
     # Drop all tables after the test session is over
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.drop_all)
+
+# --- Private Database Fixture ---
+@pytest.fixture
+async def isolated_db(tmp_path, monkeypatch):
+    """
+    A private SQLite file database for one test, swapped in for the app's
+    shared session factory. The default in-memory database is a single
+    connection shared by every session, so a test whose background work
+    runs concurrent sessions (or a task left over from an earlier test
+    closing its session) can roll back another session's writes. Also gives
+    the test its own event bus and an empty read cache, since ticket ids
+    restart at 1.
+    """
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app.db import database
+    from app.db.models import Base
+    from app.db.routing import read_router
+    from app.services import events
+    from app.services.classification_stage import classification_stage
+    from app.services.read_cache import read_cache
+    from app.services.tenants import tenant_directory
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'isolated.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    shared = database.AsyncSessionLocal
+    for name, module in list(sys.modules.items()):
+        # The log sink keeps writing to the shared database (it outlives the test)
+        if name == "app.logging_config":
+            continue
+        if name.split(".")[0] == "app" and getattr(module, "AsyncSessionLocal", None) is shared:
+            monkeypatch.setattr(module, "AsyncSessionLocal", session_maker)
+    monkeypatch.setattr(read_router, "primary", session_maker)
+    monkeypatch.setattr(classification_stage, "session_maker", session_maker)
+    monkeypatch.setattr(tenant_directory, "session_maker", session_maker)
+    tenant_directory.invalidate()
+
+    bus = events.TicketEventBus()
+    # Keep hooks such as read cache invalidation
+    for hook in events.event_bus._hooks:
+        bus.add_hook(hook)
+    for name, module in list(sys.modules.items()):
+        if name.split(".")[0] == "app" and getattr(module, "event_bus", None) is events.event_bus:
+            monkeypatch.setattr(module, "event_bus", bus)
+    read_cache.clear()
+
+    yield session_maker
+
+    tenant_directory.invalidate()
+    read_cache.clear()
+    await engine.dispose()
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+@pytest.mark.asyncio
+async def test_admission_sheds_when_queue_full_and_on_deadline():
+    controller = AdmissionController("test", max_concurrency=1, max_queue=1, deadline=0.05)
+    await controller.acquire()  # holds the only slot
+
+    # One waiter fits in the queue but runs out of time
+    with pytest.raises(AdmissionRejected) as deadline_exc:
+        await controller.acquire()
+    assert deadline_exc.value.reason == "deadline"
+    assert deadline_exc.value.retry_after >= 1
+
+    # With the queue occupied, the next request is refused without waiting
+    waiter = asyncio.create_task(controller.acquire(deadline=None, shed=False))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as full_exc:
+        await controller.acquire()
+    assert full_exc.value.reason == "queue_full"
+
+    # Non-shedding background work is admitted once the slot frees up
+    controller.release(held_for=0.01)
+    await asyncio.wait_for(waiter, timeout=1)
+    controller.release()
+
+
+@pytest.mark.asyncio
+async def test_create_ticket_returns_503_with_retry_after_when_saturated(monkeypatch):
+    from httpx import AsyncClient, ASGITransport
+    from app.main import app
+    from app.routers import tickets
+
+    saturated = AdmissionController("test", max_concurrency=1, max_queue=0, deadline=0.01)
+    await saturated.acquire()
+    monkeypatch.setattr(tickets, "classification_admission", saturated)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.post("/tickets/", json={"subject": "burst", "body": "overload"})
+    assert r.status_code == 503
+    assert int(r.headers["Retry-After"]) >= 1
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Response, Ticket
+from app.services.analytics import refresh_rollups, summary
+
+
+async def _summary():
+    async with AsyncSessionLocal() as session:
+        return await summary(session, granularity="hour", buckets=48)
+
+
+@pytest.mark.asyncio
+async def test_rollups_fold_only_new_rows_and_wait_for_classification():
+    # Catch up on rows left by other tests
+    await refresh_rollups(grace_seconds=0, settle_seconds=0)
+    before = await _summary()
+
+    created = datetime.now(timezone.utc) - timedelta(hours=2)
+    async with AsyncSessionLocal() as session:
+        ids = list(
+            (
+                await session.scalars(
+                    insert(Ticket).returning(Ticket.id),
+                    [
+                        {"subject": "a", "body": "x", "category": "Analytics", "created_at": created},
+                        {"subject": "b", "body": "x", "category": "Analytics", "created_at": created},
+                    ],
+                )
+            ).all()
+        )
+        await session.execute(
+            insert(Response),
+            [
+                {"ticket_id": ids[0], "status": "completed", "created_at": created + timedelta(seconds=4)},
+                {"ticket_id": ids[1], "status": "failed", "created_at": created + timedelta(seconds=2)},
+            ],
+        )
+        # Still waiting for its category: must hold the ticket watermark back
+        pending_id = await session.scalar(
+            insert(Ticket).values(subject="c", body="x", category=None).returning(Ticket.id)
+        )
+        await session.commit()
+
+    assert await refresh_rollups(grace_seconds=300, settle_seconds=0) == 4
+    after = await _summary()
+    assert after["tickets_by_category"]["Analytics"] == before["tickets_by_category"].get("Analytics", 0) + 2
+    assert after["drafts_by_status"]["completed"] == before["drafts_by_status"].get("completed", 0) + 1
+    assert after["drafts_by_status"]["failed"] == before["drafts_by_status"].get("failed", 0) + 1
+    assert after["watermark"]["ticket_id"] == ids[1]
+    assert 0 < after["draft_success_rate"] < 1
+    assert after["mean_draft_latency_seconds"] is not None
+    bucket = created.replace(minute=0, second=0, microsecond=0).isoformat()
+    point = next(p for p in after["series"] if p["bucket_start"] == bucket)
+    assert point["tickets"]["Analytics"] >= 2
+
+    # A second run without new rows changes nothing
+    assert await refresh_rollups(grace_seconds=300, settle_seconds=0) == 0
+    assert (await _summary())["tickets_by_category"] == after["tickets_by_category"]
+
+    # Past the grace period the pending ticket is counted as unclassified
+    await refresh_rollups(grace_seconds=0, settle_seconds=0)
+    final = await _summary()
+    assert final["watermark"]["ticket_id"] >= pending_id
+    assert final["tickets_by_category"]["Unclassified"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_summary_endpoint_validates_granularity():
+    from app.main import app
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.get("/analytics/summary", params={"granularity": "day", "buckets": 7})
+        assert r.status_code == 200
+        assert {"tickets_by_category", "drafts_by_status", "series", "watermark"} <= r.json().keys()
+        r = await ac.get("/analytics/summary", params={"granularity": "minute"})
+        assert r.status_code == 422
@@ -0,0 +1,151 @@
+import threading
+import time
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from app.services import autotune as autotune_mod
+from app.services import classifier
+from app.services.classifier import (
+    InferenceConfig,
+    bucket_batches,
+    classify_batch_scored,
+    get_inference_config,
+    set_inference_config,
+)
+
+
+@pytest.fixture
+def restore_config():
+    previous = get_inference_config()
+    yield
+    set_inference_config(previous)
+
+
+def test_bucket_batches_groups_by_length_and_chunks():
+    lengths = [500, 10, 200, 20, 90, 1000, 15]
+    batches = bucket_batches(lengths, [64, 256], batch_size=2)
+    assert batches == [
+        (64, [1, 6]),
+        (64, [3]),
+        (256, [4, 2]),
+        (0, [0, 5]),
+    ]
+    # Every input lands in exactly one batch
+    assert sorted(i for _, idx in batches for i in idx) == list(range(len(lengths)))
+
+
+@pytest.mark.asyncio
+async def test_classify_batch_runs_per_bucket_and_keeps_order(monkeypatch, restore_config):
+    calls = []
+
+    def fake_classifier(prompts, candidate_labels=None, multi_label=False, batch_size=None):
+        calls.append(len(prompts))
+        # Echo the subject back as the label so order can be checked
+        return [{"labels": [p.split("\n")[0][len("Subject: "):]], "scores": [0.5]} for p in prompts]
+
+    monkeypatch.setattr(classifier, "get_zero_shot_classifier", lambda: fake_classifier)
+    set_inference_config(InferenceConfig(batch_size=2, boundaries=(100,)))
+    items = [("a", "x" * 2000), ("b", "short"), ("c", "short too"), ("d", "tiny")]
+    scored = await classify_batch_scored(items)
+    assert [label for label, _ in scored] == ["a", "b", "c", "d"]
+    # Three short prompts in batches of two, then the long one on its own
+    assert calls == [2, 1, 1]
+
+
+def test_calibrate_picks_fastest_and_restores_previous(restore_config):
+    set_inference_config(InferenceConfig(batch_size=7, boundaries=(99,)))
+    ticks = iter(range(0, 10_000))
+
+    def fake_classifier(prompts, candidate_labels=None, multi_label=False, batch_size=None):
+        # Each call costs one tick, so fewer (larger) batches are faster
+        next(ticks)
+        return [{"labels": ["Other"], "scores": [0.5]} for _ in prompts]
+
+    best = autotune_mod.calibrate(
+        fake_classifier,
+        tickets=autotune_mod.synthetic_tickets(12),
+        batch_sizes=(2, 8),
+        boundary_sets=((), (128,)),
+        threads=[None],
+        clock=lambda: next(ticks),
+    )
+    assert best.batch_size == 8 and best.boundaries == ()
+    assert best.source == "calibrated"
+    assert len(best.trials) == 4
+    assert get_inference_config().batch_size == 7
+
+
+def test_autotune_saves_and_reuses_per_host(tmp_path, monkeypatch, restore_config):
+    runs = []
+
+    def fake_calibrate(clf, stop=None):
+        runs.append(clf)
+        return InferenceConfig(batch_size=32, boundaries=(256,), threads=2, source="calibrated", throughput=12.5, host="h1")
+
+    monkeypatch.setattr(autotune_mod, "calibrate", fake_calibrate)
+    monkeypatch.setattr(autotune_mod, "fingerprint", lambda: {"classifier_version": "m:1", "device": "cpu", "cpu_count": 4})
+    first = autotune_mod.autotune(object(), mode="auto-test", tuning_dir=str(tmp_path))
+    assert first.batch_size == 32 and get_inference_config() is first
+
+    second = autotune_mod.autotune(object(), mode="auto-test", tuning_dir=str(tmp_path))
+    assert len(runs) == 1
+    assert second.source == "cached"
+    assert (second.batch_size, second.boundaries, second.throughput) == (32, (256,), 12.5)
+
+    # A different model / machine invalidates the saved result
+    monkeypatch.setattr(autotune_mod, "fingerprint", lambda: {"classifier_version": "m:2", "device": "cpu", "cpu_count": 4})
+    autotune_mod.autotune(object(), mode="auto-test", tuning_dir=str(tmp_path))
+    assert len(runs) == 2
+
+
+def test_workers_on_one_host_calibrate_once(tmp_path, monkeypatch, restore_config):
+    runs = []
+    started = threading.Event()
+
+    def slow_calibrate(clf, stop=None):
+        runs.append(clf)
+        started.set()
+        time.sleep(0.3)
+        return InferenceConfig(batch_size=32, boundaries=(256,), threads=2, source="calibrated", throughput=12.5)
+
+    monkeypatch.setattr(autotune_mod, "calibrate", slow_calibrate)
+    monkeypatch.setattr(autotune_mod, "fingerprint", lambda: {"classifier_version": "m:1", "device": "cpu", "cpu_count": 4})
+    first = threading.Thread(target=autotune_mod.autotune, args=(object(),), kwargs={"mode": "auto-test", "tuning_dir": str(tmp_path)})
+    first.start()
+    started.wait(5)
+    # Waits for the first worker's lock, then loads its result
+    second = autotune_mod.autotune(object(), mode="auto-test", tuning_dir=str(tmp_path))
+    first.join()
+    assert len(runs) == 1
+    assert second.source == "cached" and second.batch_size == 32
+
+    # A worker shutting down stops waiting without applying anything
+    monkeypatch.setattr(autotune_mod, "fingerprint", lambda: {"classifier_version": "m:2", "device": "cpu", "cpu_count": 4})
+    stop = threading.Event()
+    stop.set()
+    before = get_inference_config()
+    with autotune_mod._tuning_lock(autotune_mod.tuning_path(str(tmp_path))):
+        assert autotune_mod.autotune(object(), mode="auto-test", tuning_dir=str(tmp_path), stop=stop) is before
+    assert len(runs) == 1
+
+
+def test_autotune_skips_mock_backend(tmp_path, restore_config):
+    classifier.get_zero_shot_classifier()  # mock under APP_MOCK_AI=1
+    before = get_inference_config()
+    assert autotune_mod.autotune(object(), mode="auto", tuning_dir=str(tmp_path)) is before
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_health_ml_reports_inference_config(restore_config):
+    from app.main import app
+
+    set_inference_config(InferenceConfig(batch_size=24, boundaries=(128, 384), threads=4, source="cached", throughput=40.0))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.get("/health/ml")
+    inference = r.json()["inference"]
+    assert inference["batch_size"] == 24
+    assert inference["boundaries"] == [128, 384]
+    assert inference["source"] == "cached"
+    assert "trials" not in inference
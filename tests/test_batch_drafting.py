@@ -0,0 +1,182 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Response, Ticket
+from app.services import batch_drafting
+from app.services.draft_cache import DraftCache
+from app.services.response_gen import parse_batch_drafts
+
+
+@pytest.fixture(autouse=True)
+def empty_draft_cache(monkeypatch):
+    cache = DraftCache(max_entries=64, ttl_seconds=60)
+    monkeypatch.setattr(batch_drafting, "draft_cache", cache)
+    return cache
+
+
+def test_parse_batch_drafts_keeps_only_expected_non_empty_entries():
+    reply = (
+        'Here you go: {"drafts": [{"ticket_id": 1, "response": "Hi A"}, '
+        '{"ticket_id": 2, "response": ""}, {"ticket_id": 99, "response": "stray"}, '
+        '{"ticket_id": "3", "response": "Hi C"}]}'
+    )
+    assert parse_batch_drafts(reply, [1, 2, 3]) == {1: "Hi A", 3: "Hi C"}
+    assert parse_batch_drafts("not json", [1]) == {}
+
+
+@pytest.mark.asyncio
+async def test_batch_drafter_stores_batch_drafts_and_falls_back_for_missing(monkeypatch):
+    async with AsyncSessionLocal() as session:
+        tickets = [Ticket(subject=f"batch {i}", body="pending", category="Billing") for i in range(3)]
+        for t in tickets:
+            session.add(t)
+            await session.flush()
+        await session.commit()
+        ids = [t.id for t in tickets]
+
+    async def fake_batch(items):
+        # Reply covers every ticket except the last one
+        return {i["ticket_id"]: f"batch draft {i['ticket_id']}" for i in items if i["ticket_id"] != ids[-1]}
+
+    monkeypatch.setattr(batch_drafting, "generate_batch_responses", fake_batch)
+    drafted = await batch_drafting.drain_pending_drafts(batch_size=10)
+    assert drafted >= 3
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(Response).where(Response.ticket_id.in_(ids)))).scalars().all()
+    by_ticket = {r.ticket_id: r for r in rows}
+    assert len(rows) == 3
+    assert by_ticket[ids[0]].source == "llm_batch"
+    assert by_ticket[ids[0]].generated_response == f"batch draft {ids[0]}"
+    assert by_ticket[ids[-1]].source == "llm"
+    assert all(r.status == "completed" for r in rows)
+
+    # Nothing pending for these tickets any more
+    assert await batch_drafting.draft_pending_batch(batch_size=10) == 0
+
+
+@pytest.mark.asyncio
+async def test_batch_drafter_commits_its_claim_before_calling_the_llm(monkeypatch):
+    async with AsyncSessionLocal() as session:
+        ticket = Ticket(subject="claimed", body="pending", category="Billing")
+        session.add(ticket)
+        await session.commit()
+        ticket_id = ticket.id
+
+    seen = {}
+
+    async def fake_batch(items):
+        # A second drafter running now must not pick the same ticket
+        async with AsyncSessionLocal() as session:
+            claimed = await session.get(Ticket, ticket_id)
+            seen["claimed_at"] = claimed.draft_claimed_at
+        seen["second_pass"] = await batch_drafting._claim_pending(AsyncSessionLocal, 10)
+        return {i["ticket_id"]: "drafted" for i in items}
+
+    monkeypatch.setattr(batch_drafting, "generate_batch_responses", fake_batch)
+    await batch_drafting.drain_pending_drafts(batch_size=10)
+
+    assert seen["claimed_at"] is not None
+    assert ticket_id not in [i["ticket_id"] for i in seen["second_pass"][1]]
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(Response).where(Response.ticket_id == ticket_id))).scalars().all()
+    assert [r.generated_response for r in rows] == ["drafted"]
+
+
+@pytest.mark.asyncio
+async def test_stale_claim_is_taken_over(monkeypatch):
+    stale = datetime.now(timezone.utc) - timedelta(seconds=batch_drafting.DRAFT_CLAIM_TIMEOUT + 60)
+    async with AsyncSessionLocal() as session:
+        ticket = Ticket(subject="abandoned", body="pending", category="Billing", draft_claimed_at=stale)
+        session.add(ticket)
+        await session.commit()
+        ticket_id = ticket.id
+
+    async def fake_batch(items):
+        return {i["ticket_id"]: "retried" for i in items}
+
+    monkeypatch.setattr(batch_drafting, "generate_batch_responses", fake_batch)
+    await batch_drafting.drain_pending_drafts(batch_size=10)
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(Response).where(Response.ticket_id == ticket_id))).scalars().all()
+    assert [r.generated_response for r in rows] == ["retried"]
+
+
+@pytest.mark.asyncio
+async def test_batch_drafter_leaves_urgent_tickets_and_passes_language(monkeypatch):
+    async with AsyncSessionLocal() as session:
+        urgent = Ticket(subject="down", body="site down", category="Technical", priority="urgent")
+        german = Ticket(subject="Rechnung", body="Hallo", category="Billing", priority="normal", language="de")
+        session.add_all([urgent, german])
+        await session.commit()
+        urgent_id, german_id = urgent.id, german.id
+
+    batched = []
+
+    async def fake_batch(items):
+        batched.extend(items)
+        return {i["ticket_id"]: "drafted" for i in items}
+
+    monkeypatch.setattr(batch_drafting, "generate_batch_responses", fake_batch)
+    await batch_drafting.drain_pending_drafts(batch_size=10)
+
+    by_id = {i["ticket_id"]: i for i in batched}
+    assert urgent_id not in by_id
+    assert by_id[german_id]["language"] == "de"
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_leaves_tickets_pending(monkeypatch):
+    from app.services.llm_client import CircuitOpenError
+
+    async with AsyncSessionLocal() as session:
+        ticket = Ticket(subject="provider down", body="pending", category="Billing")
+        session.add(ticket)
+        await session.commit()
+        ticket_id = ticket.id
+
+    async def circuit_open(*args, **kwargs):
+        raise CircuitOpenError("LLM provider circuit is open")
+
+    monkeypatch.setattr(batch_drafting, "generate_batch_responses", circuit_open)
+    monkeypatch.setattr(batch_drafting, "generate_response", circuit_open)
+    await batch_drafting.drain_pending_drafts(batch_size=10)
+
+    async with AsyncSessionLocal() as session:
+        assert (await session.execute(select(Response).where(Response.ticket_id == ticket_id))).first() is None
+        # Claim released: the next pass retries right away
+        assert (await session.get(Ticket, ticket_id)).draft_claimed_at is None
+
+
+@pytest.mark.asyncio
+async def test_batch_drafter_reuses_cached_drafts_per_language(isolated_db, monkeypatch):
+    async with isolated_db() as session:
+        tickets = [
+            Ticket(subject="cached batch", body="same text", category="Billing", language=language)
+            for language in ("en", "en", "es")
+        ]
+        session.add_all(tickets)
+        await session.commit()
+        ids = [t.id for t in tickets]
+
+    sent = []
+
+    async def fake_batch(items):
+        sent.append([i["ticket_id"] for i in items])
+        return {i["ticket_id"]: f"draft in {i['language']}" for i in items}
+
+    monkeypatch.setattr(batch_drafting, "generate_batch_responses", fake_batch)
+    await batch_drafting.draft_pending_batch(isolated_db, batch_size=1)
+    await batch_drafting.drain_pending_drafts(isolated_db, batch_size=10)
+
+    async with isolated_db() as session:
+        rows = (await session.execute(select(Response).where(Response.ticket_id.in_(ids)))).scalars().all()
+    by_ticket = {r.ticket_id: r for r in rows}
+    # The second English ticket comes from the cache; the Spanish one is generated
+    assert sent == [[ids[0]], [ids[2]]]
+    assert by_ticket[ids[1]].source == "cache_exact"
+    assert by_ticket[ids[1]].source_response_id == by_ticket[ids[0]].id
+    assert by_ticket[ids[2]].generated_response == "draft in es"
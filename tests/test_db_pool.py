@@ -0,0 +1,39 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.database import engine_options
+from app.db.pool import InstrumentedAsyncQueuePool, instrument_pool
+
+
+def test_engine_options_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "4")
+    monkeypatch.setenv("DB_STATEMENT_CACHE_SIZE", "0")
+    options = engine_options("postgresql+asyncpg://u:p@db/app")
+    assert options["echo"] is False
+    assert options["pool_size"] == 4
+    assert options["pool_pre_ping"] is True
+    assert options["poolclass"] is InstrumentedAsyncQueuePool
+    assert options["connect_args"] == {"prepared_statement_cache_size": 0}
+
+    assert "pool_size" not in engine_options("sqlite+aiosqlite:///:memory:")
+
+
+@pytest.mark.asyncio
+async def test_pool_metrics_track_checkouts(tmp_path):
+    eng = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path}/pool.db", poolclass=InstrumentedAsyncQueuePool, pool_size=2
+    )
+    instrument_pool(eng, "test")
+    sample = REGISTRY.get_sample_value
+    try:
+        async with eng.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            assert sample("db_pool_checked_out", {"pool": "test"}) == 1
+        assert sample("db_pool_checked_out", {"pool": "test"}) == 0
+        assert sample("db_pool_size", {"pool": "test"}) == 2
+        assert sample("db_pool_checkout_wait_seconds_count", {"pool": "test"}) >= 1
+        assert sample("db_pool_connections_opened_total", {"pool": "test"}) == 1
+    finally:
+        await eng.dispose()
@@ -0,0 +1,148 @@
+import asyncio
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+
+@pytest.mark.asyncio
+async def test_deferred_ingest_returns_pending_then_classifies_and_drafts(isolated_db, monkeypatch):
+    from app.main import app
+    from app.routers import tickets
+    from app.services.classification_stage import classification_stage
+
+    monkeypatch.setattr(tickets, "TICKET_INGEST_MODE", "deferred")
+    classification_stage.start()
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            r = await ac.post(
+                "/tickets/",
+                json={"subject": "Refund please", "body": "Charged twice for one order."},
+            )
+            assert r.status_code == 201
+            ticket = r.json()
+            assert ticket["category"] is None
+
+            r2 = await ac.get(f"/tickets/{ticket['id']}/category", params={"wait": 5})
+            assert r2.status_code == 200
+            assert r2.json()["category"] == "Refund"
+
+            for _ in range(50):
+                responses = (await ac.get(f"/tickets/{ticket['id']}/responses")).json()
+                if responses and responses[0]["status"] == "completed":
+                    break
+                await asyncio.sleep(0.05)
+            else:
+                pytest.fail("Draft was not generated after deferred classification")
+    finally:
+        await classification_stage.stop()
+
+
+async def _category(session_maker, ticket_id: int, attempts: int = 100):
+    from app.db.models import Ticket
+
+    for _ in range(attempts):
+        async with session_maker() as session:
+            category = (await session.get(Ticket, ticket_id)).category
+        if category is not None:
+            return category
+        await asyncio.sleep(0.05)
+    return None
+
+
+@pytest.mark.asyncio
+async def test_sweep_requeues_tickets_left_uncategorised(isolated_db):
+    from datetime import datetime, timedelta, timezone
+
+    from app.db.models import Ticket
+    from app.services.classification_stage import ClassificationStage
+
+    async with isolated_db() as session:
+        # Stored before a restart: nothing in memory knows about it
+        orphan = Ticket(subject="Refund please", body="Lost in a restart", created_at=datetime.now(timezone.utc) - timedelta(minutes=5))
+        session.add(orphan)
+        await session.commit()
+
+    stage = ClassificationStage(isolated_db, sweep_interval=60)
+    stage.start()
+    try:
+        assert await _category(isolated_db, orphan.id) == "Refund"
+    finally:
+        await stage.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried(isolated_db, monkeypatch):
+    from app.db.models import Ticket
+    from app.services import classification_stage as stage_module
+
+    real = stage_module.classify_batch_scored
+    calls = []
+
+    async def flaky(items, label_sets=None):
+        calls.append(len(items))
+        if len(calls) == 1:
+            raise RuntimeError("model server restarting")
+        return await real(items, label_sets=label_sets)
+
+    monkeypatch.setattr(stage_module, "classify_batch_scored", flaky)
+    async with isolated_db() as session:
+        ticket = Ticket(subject="Refund please", body="Charged twice")
+        session.add(ticket)
+        await session.commit()
+
+    stage = stage_module.ClassificationStage(isolated_db, sweep_interval=0, retry_delay=0.01)
+    stage.start()
+    try:
+        stage.submit(ticket.id)
+        assert await _category(isolated_db, ticket.id) == "Refund"
+        assert len(calls) == 2
+    finally:
+        await stage.stop()
+
+
+@pytest.mark.asyncio
+async def test_wait_for_does_not_keep_events_for_unclassified_tickets():
+    from app.services.classification_stage import ClassificationStage
+
+    stage = ClassificationStage(sweep_interval=0)
+    assert await stage.wait_for(987654, timeout=0.01) is False
+    assert stage._events == {} and stage._waiters == {}
+
+
+@pytest.mark.asyncio
+async def test_two_workers_classify_a_swept_ticket_once(isolated_db, monkeypatch):
+    from app.db.models import Response, Ticket
+    from app.services import classification_stage as stage_module
+    from sqlalchemy import func, select
+
+    real = stage_module.classify_batch_scored
+    calls = []
+
+    async def slow(items, label_sets=None):
+        calls.append(len(items))
+        await asyncio.sleep(0.1)
+        return await real(items, label_sets=label_sets)
+
+    monkeypatch.setattr(stage_module, "classify_batch_scored", slow)
+    async with isolated_db() as session:
+        ticket = Ticket(subject="Refund please", body="Seen by every sweep")
+        session.add(ticket)
+        await session.commit()
+
+    # Two workers' stages queue the same ticket, as their sweeps would
+    stages = [stage_module.ClassificationStage(isolated_db, sweep_interval=0) for _ in range(2)]
+    for stage in stages:
+        stage.start()
+        stage.submit(ticket.id)
+    try:
+        assert await _category(isolated_db, ticket.id) == "Refund"
+        await asyncio.sleep(0.2)
+        await asyncio.gather(*(task for stage in stages for task in stage._drafts))
+    finally:
+        for stage in stages:
+            await stage.stop()
+    assert calls == [1]
+    async with isolated_db() as session:
+        drafts = await session.scalar(select(func.count()).select_from(Response).where(Response.ticket_id == ticket.id))
+        claimed = (await session.get(Ticket, ticket.id)).classification_claimed_at
+    assert drafts == 1
+    assert claimed is None
@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Response, Ticket
+from app.services.draft_cache import DraftCache
+
+
+async def _ticket(subject, body, category="Refund", language=None):
+    async with AsyncSessionLocal() as session:
+        ticket = Ticket(subject=subject, body=body, category=category, language=language)
+        session.add(ticket)
+        await session.commit()
+        return ticket.id
+
+
+async def _responses(ticket_id):
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Response).where(Response.ticket_id == ticket_id))
+        return result.scalars().all()
+
+
+@pytest.mark.asyncio
+async def test_exact_hit_reuses_draft_for_normalized_duplicate(monkeypatch):
+    from app.routers import tickets
+
+    monkeypatch.setattr(tickets, "draft_cache", DraftCache(max_entries=8, ttl_seconds=60))
+
+    first = await _ticket("Please refund duplicate charge", "I was billed twice.")
+    second = await _ticket("please refund  DUPLICATE charge", "I was billed   twice.")
+    await tickets.draft_and_store_response(first, AsyncSessionLocal)
+    await tickets.draft_and_store_response(second, AsyncSessionLocal)
+
+    (original,) = await _responses(first)
+    (reused,) = await _responses(second)
+    assert original.source == "llm"
+    assert reused.source == "cache_exact"
+    assert reused.source_response_id == original.id
+    assert reused.generated_response == original.generated_response
+
+
+@pytest.mark.asyncio
+async def test_similar_lookup_only_reuses_reviewed_drafts():
+    cache = DraftCache(max_entries=0, similarity=0.6)
+    ticket_id = await _ticket("Refund for duplicate charge on order", "Charged twice for order 1234", category="Billing")
+    async with AsyncSessionLocal() as session:
+        draft = Response(ticket_id=ticket_id, generated_response="Reviewed refund reply", reviewed=True, status="completed")
+        session.add(draft)
+        await session.commit()
+        draft_id = draft.id
+
+        hit = await cache.lookup(session, "Refund for duplicate charge on my order", "Charged twice for order 1234", "Billing")
+        assert hit is not None
+        assert hit.source == "cache_similar"
+        assert hit.response_id == draft_id
+
+        miss = await cache.lookup(session, "App crashes on login", "Stack trace attached", "Billing")
+        assert miss is None
+
+
+@pytest.mark.asyncio
+async def test_exact_key_includes_the_language(monkeypatch):
+    from app.routers import tickets
+
+    monkeypatch.setattr(tickets, "draft_cache", DraftCache(max_entries=8, ttl_seconds=60))
+
+    english = await _ticket("Refund for order 77", "Charged twice.", language="en")
+    spanish = await _ticket("Refund for order 77", "Charged twice.", language="es")
+    await tickets.draft_and_store_response(english, AsyncSessionLocal)
+    await tickets.draft_and_store_response(spanish, AsyncSessionLocal)
+
+    (first,) = await _responses(english)
+    (second,) = await _responses(spanish)
+    assert (first.source, second.source) == ("llm", "llm")
+    assert tickets.draft_cache.get_exact("Refund for order 77", "Charged twice.", "Refund", "es") is not None
+    assert tickets.draft_cache.get_exact("Refund for order 77", "Charged twice.", "Refund", "fr") is None
@@ -0,0 +1,94 @@
+import json
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from app.services.events import TicketEventBus
+
+
+@pytest.mark.asyncio
+async def test_event_bus_routes_by_ticket_and_category():
+    bus = TicketEventBus("sqlite+aiosqlite:///:memory:")
+    ticket_q = bus.subscribe("ticket", 7)
+    refund_q = bus.subscribe("category", "Refund")
+    billing_q = bus.subscribe("category", "Billing")
+
+    await bus.publish({"type": "ticket.classified", "ticket_id": 7, "category": "Refund"})
+
+    assert ticket_q.get_nowait()["category"] == "Refund"
+    assert refund_q.get_nowait()["ticket_id"] == 7
+    assert billing_q.empty()
+
+    bus.unsubscribe("ticket", 7, ticket_q)
+    await bus.publish({"type": "response.completed", "ticket_id": 7, "category": "Refund"})
+    assert ticket_q.empty()
+
+
+@pytest.mark.asyncio
+async def test_ticket_sse_stream_reports_finished_draft(isolated_db):
+    from app.main import app
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.post("/tickets/", json={"subject": "Refund", "body": "Double charge"})
+        ticket_id = r.json()["id"]
+
+        r2 = await ac.get(f"/events/tickets/{ticket_id}", params={"until": "draft"}, timeout=10)
+        assert r2.status_code == 200
+        assert r2.headers["content-type"].startswith("text/event-stream")
+        events = [
+            json.loads(line[len("data: "):])
+            for line in r2.text.splitlines()
+            if line.startswith("data: ")
+        ]
+        assert events[-1]["ticket_id"] == ticket_id
+        assert events[-1]["status"] == "completed"
+
+        missing = await ac.get("/events/tickets/999999")
+        assert missing.status_code == 404
+
+
+def test_subscriber_gauge_counts_each_queue_once():
+    from app.services.events import EVENT_SUBSCRIBERS
+
+    bus = TicketEventBus("sqlite+aiosqlite:///:memory:")
+    gauge = EVENT_SUBSCRIBERS.labels("ticket")
+    before = gauge._value.get()
+    queue = bus.subscribe("ticket", 8)
+    bus.subscribe("ticket", 8, queue)
+    assert gauge._value.get() == before + 1
+    bus.unsubscribe("ticket", 8, queue)
+    assert gauge._value.get() == before
+
+
+def test_websocket_rejects_invalid_ticket_id():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app).websocket_connect("/events/ws") as ws:
+        for bad in ("seven", None, True, 1.5):
+            ws.send_json({"subscribe": "ticket", "id": bad})
+            reply = ws.receive_json()
+            assert reply["type"] == "error"
+            assert "invalid ticket id" in reply["detail"]
+        ws.send_json({"subscribe": "category", "id": 5})
+        assert ws.receive_json()["type"] == "error"
+
+
+def test_websocket_survives_malformed_messages():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app).websocket_connect("/events/ws") as ws:
+        ws.send_text("not json")
+        assert ws.receive_json() == {"type": "error", "detail": "message is not valid JSON"}
+        ws.send_bytes(b"\xff")
+        assert ws.receive_json()["type"] == "error"
+        for payload in ([], "ticket", 7, None):
+            ws.send_json(payload)
+            reply = ws.receive_json()
+            assert reply["type"] == "error"
+            assert "expected {subscribe" in reply["detail"]
+        # Still usable afterwards
+        ws.send_json({"subscribe": "ticket", "id": "seven"})
+        assert "invalid ticket id" in ws.receive_json()["detail"]
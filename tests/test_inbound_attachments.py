@@ -0,0 +1,206 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import TicketAttachment
+from app.services.attachments import BlobStore, PayloadTooLarge, StreamingEmailParser
+
+SECRET = "test-inbound-secret"
+
+
+def _email(attachments, **overrides):
+    payload = {
+        "to": "support@example.com",
+        "from": "bob@example.com",
+        "subject": "Invoice attached",
+        "date": "Tue, 6 Oct 2026 09:00:00 +0000",
+        "text": "See the \"attached\" invoice — thanks",
+        "attachments": attachments,
+    }
+    payload.update(overrides)
+    return payload
+
+
+def _feed(parser, body: bytes, size: int):
+    for i in range(0, len(body), size):
+        parser.feed(body[i : i + size])
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_parser_spools_attachment_data_and_keeps_other_fields(tmp_path, chunk_size):
+    first = os.urandom(3000)
+    second = b"hello/world?" * 10
+    # JSON encoders may escape "/" in base64
+    encoded = base64.b64encode(second).decode().replace("/", "\\/")
+    payload = _email(
+        [
+            {"filename": "a.bin", "contentType": "application/octet-stream", "data": base64.b64encode(first).decode()},
+            {"filename": "b.txt", "data": "__B__"},
+        ]
+    )
+    body = json.dumps(payload).replace('"__B__"', '"' + encoded + '"').encode()
+
+    store = BlobStore(str(tmp_path))
+    parser = StreamingEmailParser(store)
+    _feed(parser, body, chunk_size)
+    doc, _ = parser.result()
+    blobs = parser.commit()
+
+    assert doc["text"] == payload["text"]
+    assert [a["data"] for a in doc["attachments"]] == [None, None]
+    assert doc["attachments"][0]["filename"] == "a.bin"
+    assert blobs[0].sha256 == hashlib.sha256(first).hexdigest()
+    with store.open(blobs[1].sha256) as f:
+        assert f.read() == second
+    assert len(parser.skeleton) < 1000
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_parser_bounds_text_fields_and_discards_partial_blobs(tmp_path):
+    store = BlobStore(str(tmp_path))
+    parser = StreamingEmailParser(store, max_text_bytes=100)
+    body = json.dumps(_email([{"data": base64.b64encode(b"x" * 100).decode()}], text="y" * 500)).encode()
+    with pytest.raises(PayloadTooLarge):
+        _feed(parser, body, 64)
+    parser.discard()
+    assert os.listdir(store.tmp_dir) == []
+
+
+@pytest.mark.asyncio
+async def test_inbound_email_stores_attachment_refs_once(tmp_path, monkeypatch):
+    import app.routers.inbound_email as inbound
+
+    monkeypatch.setenv("CLOUDFLARE_WORKER_SHARED_SECRET", SECRET)
+    monkeypatch.setattr(inbound, "attachment_store", BlobStore(str(tmp_path)))
+    from app.main import app
+
+    content = os.urandom(200_000)
+    data = base64.b64encode(content).decode()
+
+    async def post(ac, subject, signature=None):
+        body = json.dumps(_email([{"filename": "scan.pdf", "contentType": "application/pdf", "data": data}], subject=subject)).encode()
+        sig = signature or hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+        return await ac.post("/email/inbound", content=body, headers={"X-Signature": sig})
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        assert (await post(ac, "forged", signature="0" * 64)).status_code == 401
+        assert not os.path.exists(os.path.join(tmp_path, hashlib.sha256(content).hexdigest()[:2]))
+        first = await post(ac, "scan one")
+        second = await post(ac, "scan two")
+    assert first.status_code == second.status_code == 201
+
+    sha = hashlib.sha256(content).hexdigest()
+    async with AsyncSessionLocal() as session:
+        rows = (
+            await session.execute(select(TicketAttachment).where(TicketAttachment.sha256 == sha))
+        ).scalars().all()
+    assert sorted(r.ticket_id for r in rows) == sorted([first.json()["id"], second.json()["id"]])
+    assert all(r.size == len(content) and r.filename == "scan.pdf" for r in rows)
+    # Same content stored once
+    assert os.listdir(os.path.join(tmp_path, sha[:2])) == [sha]
+
+
+def test_parser_limits_attachments_per_email(tmp_path):
+    store = BlobStore(str(tmp_path))
+    parser = StreamingEmailParser(store, max_attachments=2)
+    body = json.dumps(_email([{"data": "eA=="}] * 3)).encode()
+    with pytest.raises(PayloadTooLarge, match="attachments"):
+        _feed(parser, body, 64)
+    parser.discard()
+    assert os.listdir(store.tmp_dir) == []
+
+
+def _blob_files(root):
+    return sorted(name for _, _, files in os.walk(root) for name in files)
+
+
+@pytest.mark.asyncio
+async def test_oversized_body_is_rejected_before_spooling_it(tmp_path, monkeypatch):
+    import app.routers.inbound_email as inbound
+
+    monkeypatch.setenv("CLOUDFLARE_WORKER_SHARED_SECRET", SECRET)
+    monkeypatch.setattr(inbound, "attachment_store", BlobStore(str(tmp_path)))
+    monkeypatch.setattr(inbound, "MAX_BODY_BYTES", 10_000)
+    from app.main import app
+
+    body = json.dumps(_email([{"data": base64.b64encode(os.urandom(20_000)).decode()}])).encode()
+
+    async def chunks():
+        for i in range(0, len(body), 4096):
+            yield body[i : i + 4096]
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        # Unsigned and without Content-Length: still cut off while streaming
+        streamed = await ac.post("/email/inbound", content=chunks(), headers={"X-Signature": "0" * 64})
+        declared = await ac.post("/email/inbound", content=body, headers={"X-Signature": "0" * 64})
+    assert streamed.status_code == declared.status_code == 413
+    assert _blob_files(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_duplicate_delivery_keeps_no_blobs(tmp_path, monkeypatch):
+    import app.routers.inbound_email as inbound
+
+    monkeypatch.setenv("CLOUDFLARE_WORKER_SHARED_SECRET", SECRET)
+    monkeypatch.setattr(inbound, "attachment_store", BlobStore(str(tmp_path)))
+    monkeypatch.setattr(inbound, "schedule_draft", lambda ticket_id, background_tasks, priority=None: None)
+    from app.main import app
+
+    async def post(ac, content):
+        body = json.dumps(
+            _email([{"filename": "a.bin", "data": base64.b64encode(content).decode()}], messageId="<blob-dup@mail.example>")
+        ).encode()
+        return await ac.post(
+            "/email/inbound", content=body, headers={"X-Signature": hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()}
+        )
+
+    first_content, retry_content = os.urandom(1000), os.urandom(1000)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        assert (await post(ac, first_content)).status_code == 201
+        assert (await post(ac, retry_content)).status_code == 200
+    # Only the stored ticket's blob is kept; the replayed delivery's temp blob is gone
+    assert _blob_files(tmp_path) == [hashlib.sha256(first_content).hexdigest()]
+
+
+def test_parser_rejects_duplicate_data_keys(tmp_path):
+    store = BlobStore(str(tmp_path))
+    parser = StreamingEmailParser(store)
+    data = base64.b64encode(b"first").decode()
+    body = json.dumps(_email([{"data": data}])).encode().replace(
+        f'"data": "{data}"'.encode(), f'"data": "{data}", "data": "{data}"'.encode()
+    )
+    with pytest.raises(ValueError, match="Duplicate data key"):
+        _feed(parser, body, 16)
+    parser.discard()
+    assert os.listdir(store.tmp_dir) == []
+
+
+@pytest.mark.asyncio
+async def test_rejected_bodies_leave_no_temp_blobs(tmp_path, monkeypatch):
+    import app.routers.inbound_email as inbound
+
+    monkeypatch.setenv("CLOUDFLARE_WORKER_SHARED_SECRET", SECRET)
+    monkeypatch.setattr(inbound, "attachment_store", BlobStore(str(tmp_path)))
+    from app.main import app
+
+    data = base64.b64encode(os.urandom(5000)).decode()
+    body = json.dumps(_email([{"filename": "a.bin", "data": data}])).encode()
+    duplicate = body.replace(f'"data": "{data}"'.encode(), f'"data": "{data}", "data": "{data}"'.encode())
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        forged = await ac.post("/email/inbound", content=body, headers={"X-Signature": "0" * 64})
+        signed_duplicate = await ac.post(
+            "/email/inbound",
+            content=duplicate,
+            headers={"X-Signature": hmac.new(SECRET.encode(), duplicate, hashlib.sha256).hexdigest()},
+        )
+    assert forged.status_code == 401
+    assert signed_duplicate.status_code == 400
+    assert _blob_files(tmp_path) == []
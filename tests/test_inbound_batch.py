@@ -0,0 +1,112 @@
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, select
+
+from app.db.database import AsyncSessionLocal, engine
+from app.db.models import TicketAttachment
+from app.services.attachments import BlobStore
+
+SECRET = "test-inbound-secret"
+
+
+def _email(n, **overrides):
+    payload = {
+        "to": "support@example.com",
+        "from": f"user{n}@example.com",
+        "subject": f"Batch email {n}",
+        "date": "Wed, 7 Oct 2026 08:00:00 +0000",
+        "text": "Please refund my order.",
+        "messageId": f"<batch-{n}@mail.example>",
+    }
+    payload.update(overrides)
+    return payload
+
+
+def _signed(emails):
+    body = json.dumps({"emails": emails}).encode()
+    return body, {"X-Signature": hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()}
+
+
+@pytest.fixture
+def batch_env(tmp_path, monkeypatch):
+    import app.routers.inbound_email as inbound
+    import app.routers.tickets as tickets
+
+    calls = []
+
+    async def classify_batch_scored(items, batch_size=None, label_sets=None):
+        calls.append(len(items))
+        return [("Refund", 0.99)] * len(items)
+
+    monkeypatch.setenv("CLOUDFLARE_WORKER_SHARED_SECRET", SECRET)
+    monkeypatch.setattr(inbound, "attachment_store", BlobStore(str(tmp_path)))
+    monkeypatch.setattr(tickets, "classify_batch_scored", classify_batch_scored)
+    monkeypatch.setattr(inbound, "schedule_draft", lambda ticket_id, background_tasks, priority=None: None)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_batch_inserts_once_and_reports_per_item(batch_env):
+    from app.main import app
+
+    attachment = base64.b64encode(b"%PDF-1.4 batch").decode()
+    emails = [
+        _email(1, attachments=[{"filename": "one.pdf", "contentType": "application/pdf", "data": attachment}]),
+        _email(2),
+        {"to": "support@example.com", "subject": "missing fields"},
+        _email(1),  # repeated within the batch
+    ]
+    body, headers = _signed(emails)
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(" ".join(statement.split()).upper())
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            r = await ac.post("/email/inbound/batch", content=body, headers=headers)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["status"] for x in results] == ["created", "created", "invalid", "duplicate"]
+    assert results[3]["ticket"]["id"] == results[0]["ticket"]["id"]
+    assert results[0]["ticket"]["category"] == "Refund"
+    assert batch_env == [2]
+    assert len([s for s in statements if s.startswith("INSERT INTO TICKETS")]) == 1
+
+    async with AsyncSessionLocal() as session:
+        rows = (
+            await session.execute(select(TicketAttachment).where(TicketAttachment.ticket_id == results[0]["ticket"]["id"]))
+        ).scalars().all()
+    assert [(a.filename, a.sha256) for a in rows] == [("one.pdf", hashlib.sha256(b"%PDF-1.4 batch").hexdigest())]
+
+    # Worker retries the whole batch plus one new email: only the new one is classified
+    body, headers = _signed([_email(1), _email(2), _email(3)])
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.post("/email/inbound/batch", content=body, headers=headers)
+    assert [x["status"] for x in r.json()["results"]] == ["duplicate", "duplicate", "created"]
+    assert batch_env == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_bad_signature_and_oversized_batches(batch_env, monkeypatch):
+    import app.routers.inbound_email as inbound
+    from app.main import app
+
+    body, headers = _signed([_email(10)])
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.post("/email/inbound/batch", content=body, headers={"X-Signature": "0" * 64})
+        assert r.status_code == 401
+        monkeypatch.setattr(inbound, "INBOUND_BATCH_MAX_ITEMS", 0)
+        r = await ac.post("/email/inbound/batch", content=body, headers=headers)
+        assert r.status_code == 422
+    assert batch_env == []
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import hmac
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Ticket
+from app.services.inbound_dedup import message_key, recent_inbound_keys
+
+SECRET = "test-inbound-secret"
+
+
+def _signed(payload: dict):
+    body = json.dumps(payload).encode()
+    signature = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return body, {"X-Signature": signature, "Content-Type": "application/json"}
+
+
+def _email(**overrides):
+    payload = {
+        "to": "support@example.com",
+        "from": "alice@example.com",
+        "subject": "Refund for double charge",
+        "date": "Mon, 5 Oct 2026 10:00:00 +0000",
+        "text": "I was charged twice.",
+    }
+    payload.update(overrides)
+    return payload
+
+
+@pytest.fixture
+def counted_classifier(monkeypatch):
+    import app.routers.inbound_email as inbound
+    import app.routers.tickets as tickets
+
+    calls = []
+
+    async def classify(subject, body, label_set=None):
+        calls.append(subject)
+        await asyncio.sleep(0.05)
+        return "Refund", 0.99
+
+    monkeypatch.setenv("CLOUDFLARE_WORKER_SHARED_SECRET", SECRET)
+    monkeypatch.setattr(tickets, "classify_ticket_scored", classify)
+    monkeypatch.setattr(inbound, "schedule_draft", lambda ticket_id, background_tasks, priority=None: None)
+    return calls
+
+
+def test_message_key_prefers_message_id():
+    a = message_key("<ABC@mail.example>", "x@example.com", "d", "s", "t")
+    assert a == message_key("abc@mail.example", "y@example.com", "d2", "s2", "t2")
+    assert message_key(None, "x@example.com", "d", "s", "t") != message_key(None, "x@example.com", "d", "s", "t2")
+
+
+@pytest.mark.asyncio
+async def test_retried_email_returns_original_ticket_without_reclassifying(counted_classifier):
+    from app.main import app
+
+    body, headers = _signed(_email(messageId="<retry-1@mail.example>"))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        first = await ac.post("/email/inbound", content=body, headers=headers)
+        assert first.status_code == 201
+        retry = await ac.post("/email/inbound", content=body, headers=headers)
+        assert retry.status_code == 200
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert retry.json()["id"] == first.json()["id"]
+
+        # Key forgotten (e.g. another worker or a restart): the unique key in the DB still answers
+        recent_inbound_keys.clear()
+        again = await ac.post("/email/inbound", content=body, headers=headers)
+        assert again.status_code == 200
+        assert again.json()["id"] == first.json()["id"]
+
+    assert len(counted_classifier) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_deliveries_share_one_classification(counted_classifier):
+    from app.main import app
+
+    body, headers = _signed(_email(subject="Concurrent retry", text="no Message-ID, digest key"))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        results = await asyncio.gather(*(ac.post("/email/inbound", content=body, headers=headers) for _ in range(3)))
+
+    assert sorted(r.status_code for r in results) == [200, 200, 201]
+    assert len({r.json()["id"] for r in results}) == 1
+    assert len(counted_classifier) == 1
+    async with AsyncSessionLocal() as session:
+        stored = await session.scalar(select(func.count()).select_from(Ticket).where(Ticket.subject == "Concurrent retry"))
+    assert stored == 1
+
+
+@pytest.mark.asyncio
+async def test_conflict_without_readable_ticket_is_409(counted_classifier, monkeypatch):
+    import app.routers.inbound_email as inbound
+    from app.main import app
+
+    async def lost_race(email, key, background_tasks, session):
+        return None
+
+    monkeypatch.setattr(inbound, "_create_ticket", lost_race)
+    body, headers = _signed(_email(messageId="<gone-1@mail.example>"))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/email/inbound", content=body, headers=headers)
+    assert resp.status_code == 409
+    # The key is released, so a later delivery is tried again
+    key = message_key("<gone-1@mail.example>", "", "", "", "")
+    assert recent_inbound_keys.begin(key)
+    recent_inbound_keys.abort(key, RuntimeError("test done"))
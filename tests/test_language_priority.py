@@ -0,0 +1,98 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from app.services.language import detect_language
+from app.services.priority import score_priority
+from app.services.triage import triage
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("My invoice shows the wrong amount, please send a corrected one.", "en"),
+        ("No puedo acceder a mi cuenta y necesito cambiar la contraseña.", "es"),
+        ("Je n'arrive pas à me connecter à mon compte depuis hier soir.", "fr"),
+        ("Ich habe meine Bestellung storniert, aber noch kein Geld zurückbekommen.", "de"),
+        ("Não recebi o reembolso do meu pedido cancelado na semana passada.", "pt"),
+        ("Non riesco a scaricare la fattura del mese scorso dal mio account.", "it"),
+        ("Ik heb twee keer betaald voor dezelfde bestelling, kunnen jullie dat terugstorten?", "nl"),
+    ],
+)
+def test_detect_language(text, expected):
+    assert detect_language(text) == expected
+
+
+def test_detect_language_is_none_for_short_or_empty_text():
+    assert detect_language("") is None
+    assert detect_language("ok 123") is None
+
+
+def test_score_priority_uses_signals_and_category():
+    assert score_priority("URGENT: site is down", "Outage since 9am, we are losing orders!!", "Technical", 0.9) == "urgent"
+    assert score_priority("Refund", "Charged twice, please refund.", "Refund", 0.9) == "normal"
+    assert score_priority("Nice app", "Just wanted to say thanks.", "Feedback", 0.9) == "low"
+    # An ambiguous classification is surfaced earlier
+    assert score_priority("Question", "Where do I find this?", "Other", 0.2) == "normal"
+
+
+def test_triage_keeps_client_values_and_waits_for_category():
+    assert triage("Hola", "No puedo iniciar sesión en mi cuenta.") == {"language": "es", "priority": None}
+    assert triage("Hi", "I was charged twice for my order.", "Refund", 0.9, language="fr", priority="low") == {
+        "language": "fr",
+        "priority": "low",
+    }
+
+
+@pytest.mark.asyncio
+async def test_ingest_fills_language_and_priority_and_lists_by_them():
+    from app.main import app
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.post(
+            "/tickets/",
+            json={
+                "subject": "Reembolso urgente",
+                "body": "Me han cobrado dos veces por el mismo pedido y necesito el reembolso inmediato.",
+            },
+        )
+        assert r.status_code == 201
+        created = r.json()
+        assert created["language"] == "es"
+        assert created["priority"] in ("urgent", "high")
+
+        r = await ac.post(
+            "/tickets/",
+            json={"subject": "Refund", "body": "Charged twice.", "priority": "low", "language": "en"},
+        )
+        assert (r.json()["priority"], r.json()["language"]) == ("low", "en")
+
+        listed = (await ac.get("/tickets/", params={"language": "es", "limit": 500})).json()
+        assert created["id"] in {t["id"] for t in listed}
+        assert all(t["language"] == "es" for t in listed)
+        listed = (await ac.get("/tickets/", params={"priority": created["priority"], "limit": 500})).json()
+        assert created["id"] in {t["id"] for t in listed}
+
+
+@pytest.mark.asyncio
+async def test_deferred_ingest_scores_priority_with_the_category(monkeypatch):
+    from app.main import app
+    from app.routers import tickets
+    from app.services.classification_stage import classification_stage
+
+    monkeypatch.setattr(tickets, "TICKET_INGEST_MODE", "deferred")
+    classification_stage.start()
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            r = await ac.post(
+                "/tickets/",
+                json={"subject": "Erstattung", "body": "Mir wurde die Bestellung zweimal berechnet, bitte erstatten."},
+            )
+            ticket = r.json()
+            assert (ticket["category"], ticket["language"], ticket["priority"]) == (None, "de", None)
+
+            r = await ac.get(f"/tickets/{ticket['id']}/category", params={"wait": 5})
+            assert r.json()["category"] == "Refund"
+            ticket = (await ac.get(f"/tickets/{ticket['id']}")).json()
+            assert ticket["priority"] is not None
+    finally:
+        await classification_stage.stop()
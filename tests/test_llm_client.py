@@ -0,0 +1,220 @@
+import asyncio
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.services.llm_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMBadRequest,
+    LLMTimeout,
+    ResilientCaller,
+)
+
+
+@pytest.fixture
+async def stub():
+    from stub_llm_server import SETTINGS, STATS, app
+
+    saved = dict(SETTINGS)
+    SETTINGS.update(ttft_ms=0, token_ms=0)
+    STATS.update(requests=0, errors=0, slow=0)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://stub") as ac:
+
+        async def request():
+            resp = await ac.post("/v1/responses", json={"model": "stub", "input": "Subject: Refund"})
+            resp.raise_for_status()
+            return resp.json()
+
+        yield request, SETTINGS, STATS
+    SETTINGS.clear()
+    SETTINGS.update(saved)
+
+
+@pytest.mark.asyncio
+async def test_retries_injected_server_errors(stub):
+    request, settings, stats = stub
+    settings.update(fail_next=2, error_status=503)
+    caller = ResilientCaller(max_attempts=3, backoff_base=0, breaker=CircuitBreaker(failure_threshold=10))
+
+    result = await caller.call("test", request)
+    assert result["status"] == "completed"
+    assert stats["requests"] == 3
+
+
+@pytest.mark.asyncio
+async def test_bad_request_is_not_retried(stub):
+    request, settings, stats = stub
+    settings.update(fail_next=1, error_status=400)
+    caller = ResilientCaller(max_attempts=3, backoff_base=0)
+
+    with pytest.raises(LLMBadRequest):
+        await caller.call("test", request)
+    assert stats["requests"] == 1
+
+
+@pytest.mark.asyncio
+async def test_attempt_timeout_raises_typed_error():
+    async def hang():
+        await asyncio.sleep(1)
+
+    caller = ResilientCaller(attempt_timeout=0.01, max_attempts=2, backoff_base=0)
+    with pytest.raises(LLMTimeout):
+        await caller.call("test", hang)
+
+
+@pytest.mark.asyncio
+async def test_timeouts_can_be_left_unretried():
+    calls = []
+
+    async def hang():
+        calls.append(1)
+        await asyncio.sleep(1)
+
+    caller = ResilientCaller(attempt_timeout=0.01, max_attempts=3, backoff_base=0)
+    with pytest.raises(LLMTimeout):
+        await caller.call("test", hang, retry_timeouts=False)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_then_queued_call_recovers(stub):
+    request, settings, stats = stub
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    caller = ResilientCaller(max_attempts=1, breaker=breaker, breaker_queue_timeout=0)
+
+    settings.update(fail_next=2, error_status=503)
+    for _ in range(2):
+        with pytest.raises(Exception):
+            await caller.call("test", request)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Nothing is sent while the circuit is open
+    with pytest.raises(CircuitOpenError):
+        await caller.call("test", request)
+    assert stats["requests"] == 2
+
+    # A queued call waits for the half-open probe and goes through
+    caller.breaker_queue_timeout = 1.0
+    result = await caller.call("test", request)
+    assert result["status"] == "completed"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_cancelled_half_open_probe_frees_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    caller = ResilientCaller(max_attempts=1, breaker=breaker, breaker_queue_timeout=0)
+    started = asyncio.Event()
+
+    async def hang():
+        started.set()
+        await asyncio.sleep(10)
+
+    probe = asyncio.create_task(caller.call("test", hang))
+    await started.wait()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    async def ok():
+        return "ok"
+
+    # The next call becomes the probe instead of being rejected forever
+    assert await caller.call("test", ok) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_over_slow_primary():
+    calls = []
+
+    async def request():
+        calls.append(1)
+        await asyncio.sleep(1.0 if len(calls) == 1 else 0)
+        return len(calls)
+
+    caller = ResilientCaller(hedge=True, hedge_min_delay=0.01)
+    for _ in range(caller.latencies.min_samples):
+        caller.latencies.add(0.01)
+
+    start = asyncio.get_running_loop().time()
+    assert await caller.call("test", request) == 2
+    assert asyncio.get_running_loop().time() - start < 0.5
+
+
+async def _ticket_responses(session_maker, ticket_id):
+    from sqlalchemy import select
+
+    from app.db.models import Response
+
+    async with session_maker() as session:
+        rows = (await session.execute(select(Response).where(Response.ticket_id == ticket_id))).scalars().all()
+    return [(r.status, r.generated_response) for r in rows]
+
+
+async def _circuit_ticket(session_maker, **fields):
+    from app.db.models import Ticket
+
+    async with session_maker() as session:
+        ticket = Ticket(subject="circuit", body="pending", category="Billing", **fields)
+        session.add(ticket)
+        await session.commit()
+        return ticket.id
+
+
+@pytest.mark.asyncio
+async def test_per_ticket_draft_is_retried_after_the_circuit_opens(isolated_db, monkeypatch):
+    from app.routers import tickets
+
+    ticket_id = await _circuit_ticket(isolated_db)
+    calls = []
+
+    async def generate(subject, body, category, language=None):
+        calls.append(subject)
+        if len(calls) == 1:
+            raise CircuitOpenError("LLM provider circuit is open")
+        return "drafted after recovery"
+
+    monkeypatch.setattr(tickets, "generate_response", generate)
+    monkeypatch.setattr(tickets.llm_caller.breaker, "reset_timeout", 0.0)
+    await tickets.draft_and_store_response(ticket_id, isolated_db, use_cache=False)
+
+    # No failed draft is stored while the circuit is open
+    assert await _ticket_responses(isolated_db, ticket_id) == []
+    await asyncio.gather(*tickets._draft_retries)
+    assert await _ticket_responses(isolated_db, ticket_id) == [("completed", "drafted after recovery")]
+
+
+@pytest.mark.asyncio
+async def test_circuit_retries_are_capped_and_left_to_the_recovery_sweep(isolated_db, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    from app.routers import tickets
+    from app.services import batch_drafting
+
+    ticket_id = await _circuit_ticket(isolated_db, created_at=datetime.now(timezone.utc) - timedelta(minutes=10))
+    calls = []
+
+    async def circuit_open(*args, **kwargs):
+        calls.append(1)
+        raise CircuitOpenError("LLM provider circuit is open")
+
+    monkeypatch.setattr(tickets, "generate_response", circuit_open)
+    monkeypatch.setattr(tickets, "DRAFT_CIRCUIT_RETRIES", 2)
+    monkeypatch.setattr(tickets.llm_caller.breaker, "reset_timeout", 0.0)
+    await tickets.draft_and_store_response(ticket_id, isolated_db, use_cache=False)
+    while tickets._draft_retries:
+        await asyncio.gather(*tickets._draft_retries)
+    # The first try plus two retries, then nothing is scheduled any more
+    assert len(calls) == 3
+    assert await _ticket_responses(isolated_db, ticket_id) == []
+
+    # Once the provider is back, the sweep drafts tickets older than the recovery age
+    fresh_id = await _circuit_ticket(isolated_db)
+    created_before = datetime.now(timezone.utc) - timedelta(seconds=batch_drafting.DRAFT_RECOVERY_AFTER)
+    assert await batch_drafting.drain_pending_drafts(isolated_db, created_before=created_before) == 1
+    assert [status for status, _ in await _ticket_responses(isolated_db, ticket_id)] == ["completed"]
+    assert await _ticket_responses(isolated_db, fresh_id) == []
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services import response_gen
+from app.services import local_llm
+from app.services.llm_client import CircuitBreaker, LLMTimeout, LLMUnavailable, ResilientCaller
+from app.services.local_llm import LocalResponseBackend
+
+
+class FakePipeline:
+    task = "text2text-generation"
+
+    def __init__(self, delay: float = 0.0):
+        self.batches = []
+        self.delay = delay
+
+    def __call__(self, prompts, batch_size=1, **kwargs):
+        import time
+
+        self.batches.append(len(prompts))
+        time.sleep(self.delay)
+        return [{"generated_text": f"draft for {p.splitlines()[0]}"} for p in prompts]
+
+
+def _backend(pipe, **kwargs):
+    return LocalResponseBackend(pipeline_factory=lambda name: pipe, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_micro_batched():
+    pipe = FakePipeline()
+    backend = _backend(pipe, workers=1, max_batch=8, max_wait_ms=50)
+    try:
+        texts = await asyncio.gather(*(backend.generate(f"ticket {i}") for i in range(5)))
+    finally:
+        backend.shutdown()
+    assert texts == [f"draft for ticket {i}" for i in range(5)]
+    assert pipe.batches == [5]
+
+
+@pytest.mark.asyncio
+async def test_queue_bound_rejects_excess_requests():
+    backend = _backend(FakePipeline(delay=0.05), workers=1, max_queue=2, max_batch=1, max_wait_ms=0)
+    try:
+        results = await asyncio.gather(*(backend.generate(f"t{i}") for i in range(3)), return_exceptions=True)
+    finally:
+        backend.shutdown()
+    assert sum(isinstance(r, LLMUnavailable) for r in results) == 1
+    assert backend.info()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_local_backend_drafts_and_batches(monkeypatch):
+    pipe = FakePipeline()
+    backend = _backend(pipe, max_batch=4)
+    monkeypatch.setenv("APP_MOCK_AI", "0")
+    monkeypatch.setattr(response_gen, "get_response_backend", lambda: backend)
+    try:
+        draft = await response_gen.generate_response("Refund", "Charged twice", "Billing")
+        drafts = await response_gen.generate_batch_responses(
+            [{"ticket_id": i, "subject": f"S{i}", "body": "b", "category": "Billing"} for i in range(6)]
+        )
+    finally:
+        backend.shutdown()
+    assert draft.startswith("draft for")
+    assert sorted(drafts) == list(range(6))
+    assert pipe.batches[1:] == [4, 2]
+
+
+@pytest.mark.asyncio
+async def test_local_calls_go_through_the_circuit_breaker(monkeypatch):
+    from app.services.llm_client import CircuitOpenError
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    monkeypatch.setattr(local_llm, "llm_caller", ResilientCaller(breaker=breaker, breaker_queue_timeout=0))
+    pipe = FakePipeline()
+    backend = _backend(pipe)
+    try:
+        with pytest.raises(CircuitOpenError):
+            await backend.generate("ticket")
+        with pytest.raises(CircuitOpenError):
+            await backend.generate_many(["a", "b"])
+    finally:
+        backend.shutdown()
+    assert pipe.batches == []
+    assert backend.info()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_generate_many_holds_worker_slots():
+    pipe = FakePipeline(delay=0.05)
+    backend = _backend(pipe, workers=1, max_batch=2)
+    busy = []
+
+    real = backend._generate_sync
+
+    def tracked(prompts, cancel=None):
+        busy.append(backend._busy)
+        return real(prompts, cancel)
+
+    backend._generate_sync = tracked
+    try:
+        texts = await backend.generate_many([f"t{i}" for i in range(6)])
+    finally:
+        backend.shutdown()
+    assert len(texts) == 6
+    # One worker: chunks ran one after another
+    assert busy == [0, 0, 0]
+
+
+class StuckPipeline:
+    """Generates until the test lets it finish, noting whether it was asked to stop."""
+
+    task = "text2text-generation"
+
+    def __init__(self):
+        self.calls = 0
+        self.stop_requested = threading.Event()
+        self.finish = threading.Event()
+
+    def __call__(self, prompts, batch_size=1, stopping_criteria=(), **kwargs):
+        self.calls += 1
+        while not self.finish.wait(0.005):
+            if any(criterion(None, None) for criterion in stopping_criteria):
+                self.stop_requested.set()
+        return [{"generated_text": "late"} for _ in prompts]
+
+
+async def _wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("call", ["generate", "generate_many"])
+async def test_timed_out_generation_keeps_its_slot_and_is_not_retried(monkeypatch, call):
+    caller = ResilientCaller(attempt_timeout=0.05, max_attempts=3, backoff_base=0, breaker=CircuitBreaker(10))
+    monkeypatch.setattr(local_llm, "llm_caller", caller)
+    pipe = StuckPipeline()
+    backend = _backend(pipe, workers=1, max_wait_ms=0)
+    try:
+        with pytest.raises(LLMTimeout):
+            if call == "generate":
+                await backend.generate("ticket")
+            else:
+                await backend.generate_many(["a", "b"])
+        assert pipe.calls == 1
+        # The thread is told to stop, and its slot stays taken until it returns
+        await _wait_for(pipe.stop_requested.is_set)
+        assert backend._slots.locked()
+        pipe.finish.set()
+        await _wait_for(lambda: not backend._slots.locked())
+    finally:
+        pipe.finish.set()
+        backend.shutdown()
+    assert backend.info()["pending"] == 0
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import logging
+
+import pytest
+from sqlalchemy import event, select
+
+from app.db.database import AsyncSessionLocal, engine
+from app.db.models import Log
+from app.logging_config import (LOG_SUPPRESSED, AsyncDBQueueHandler, JsonFormatter,
+                                SamplingFilter, log_writer)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _record(name="app.routers.tickets", level=logging.WARNING, lineno=10, msg="Ticket %s stored", args=(1,)):
+    return logging.LogRecord(name, level, "/code/app/routers/tickets.py", lineno, msg, args, None)
+
+
+def _suppressed(name, reason):
+    return LOG_SUPPRESSED.labels(name, reason)._value.get()
+
+
+def test_rate_limit_is_per_call_site_and_reports_suppressed_count():
+    clock = FakeClock()
+    sampler = SamplingFilter(per_second=2, burst=2, clock=clock)
+    before = _suppressed("tests.rate", "rate_limited")
+
+    passed = [sampler.filter(_record("tests.rate")) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+    # Another call site has its own bucket
+    assert sampler.filter(_record("tests.rate", lineno=11))
+    # Errors are never dropped
+    assert sampler.filter(_record("tests.rate", level=logging.ERROR))
+    assert _suppressed("tests.rate", "rate_limited") - before == 3
+
+    clock.now += 1.0
+    resumed = _record("tests.rate")
+    assert sampler.filter(resumed)
+    assert resumed.suppressed == 3
+
+
+def test_sampling_uses_longest_logger_prefix_and_decides_once_per_record():
+    sampler = SamplingFilter(rates={"tests": 1.0, "tests.sampled": 0.25})
+    kept = [sampler.filter(_record("tests.sampled.child")) for _ in range(8)]
+    assert kept == [True, False, False, False, True, False, False, False]
+    assert all(sampler.filter(_record("tests.other")) for _ in range(4))
+
+    # A second handler with the same filter sees the same decision, not a new sample
+    record = _record("tests.sampled.child")
+    first = sampler.filter(record)
+    assert sampler.filter(record) is first
+
+
+def test_json_formatter_includes_extras_lazily_formatted_message():
+    record = _record(msg="Ticket %s created as %s", args=(7, "Refund"))
+    record.ticket_id, record.event_type = 7, "ticket.created"
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Ticket 7 created as Refund"
+    assert (entry["ticket_id"], entry["event_type"], entry["level"]) == (7, "ticket.created", "WARNING")
+
+
+def test_full_db_queue_counts_dropped_records():
+    handler = AsyncDBQueueHandler(asyncio.Queue(maxsize=1))
+    before = _suppressed("tests.queue", "queue_full")
+    handler.emit(_record("tests.queue"))
+    handler.emit(_record("tests.queue"))
+    assert _suppressed("tests.queue", "queue_full") - before == 1
+
+
+@pytest.mark.asyncio
+async def test_log_writer_stores_a_batch_with_one_insert():
+    queue = asyncio.Queue()
+    handler = AsyncDBQueueHandler(queue)
+    for i in range(5):
+        record = _record("tests.batch", msg="batched %s", args=(i,))
+        record.ticket_id, record.event_type = None, "test.batch"
+        handler.emit(record)
+    await queue.put(None)
+
+    inserts = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.upper().startswith("INSERT INTO LOGS"):
+            inserts.append(executemany)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        await log_writer(queue)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+    assert inserts == [True]
+    async with AsyncSessionLocal() as session:
+        rows = (await session.scalars(select(Log).where(Log.event_type == "test.batch"))).all()
+    assert sorted(row.message for row in rows) == [f"batched {i}" for i in range(5)]
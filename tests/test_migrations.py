@@ -0,0 +1,127 @@
+import os
+import re
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+import sqlalchemy as sa
+
+from app.db.models import Base
+
+ROOT = Path(__file__).resolve().parents[1]
+# A Postgres the tests may create scratch schemas in, e.g. postgresql+psycopg://user:pw@localhost/test
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+# tickets / responses / logs as the app created them before migrations existed
+BASELINE_DDL = [
+    "CREATE TABLE tickets (id INTEGER PRIMARY KEY, subject TEXT, body TEXT, category VARCHAR(50), "
+    "priority VARCHAR(20), language VARCHAR(10), created_at DATETIME DEFAULT CURRENT_TIMESTAMP)",
+    "CREATE TABLE responses (id INTEGER PRIMARY KEY, ticket_id INTEGER REFERENCES tickets (id), "
+    "generated_response TEXT, reviewed BOOLEAN, sent BOOLEAN, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, "
+    "status VARCHAR(20))",
+    "CREATE TABLE logs (id INTEGER PRIMARY KEY, ticket_id INTEGER REFERENCES tickets (id), event_type VARCHAR(50), "
+    "message TEXT, level VARCHAR(20), details JSON, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)",
+    "CREATE INDEX ix_tickets_id ON tickets (id)",
+    "CREATE INDEX ix_responses_id ON responses (id)",
+    "CREATE INDEX ix_logs_id ON logs (id)",
+    "INSERT INTO tickets (subject, body, category) VALUES ('Old', 'Existing ticket', 'Refund')",
+]
+
+
+def _alembic(db_path, *args):
+    return _alembic_url(f"sqlite:///{db_path}", *args)
+
+
+def _alembic_url(url, *args):
+    env = {**os.environ, "DATABASE_URL": url}
+    result = subprocess.run(
+        [sys.executable, "-m", "alembic", *args], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    return result
+
+
+def _columns(engine, table):
+    return {c["name"] for c in sa.inspect(engine).get_columns(table)}
+
+
+def _assert_matches_models(engine):
+    inspector = sa.inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert inspector.has_table(table.name), table.name
+        assert {c.name for c in table.columns} <= _columns(engine, table.name), table.name
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        assert {i.name for i in table.indexes} <= indexes, table.name
+
+
+def test_migrations_create_an_empty_database(tmp_path):
+    db = tmp_path / "empty.db"
+    _alembic(db, "upgrade", "head")
+    _assert_matches_models(sa.create_engine(f"sqlite:///{db}"))
+
+
+def test_migrations_upgrade_a_database_created_before_them(tmp_path):
+    db = tmp_path / "baseline.db"
+    engine = sa.create_engine(f"sqlite:///{db}")
+    with engine.begin() as conn:
+        for statement in BASELINE_DDL:
+            conn.execute(sa.text(statement))
+    _alembic(db, "upgrade", "head")
+    _assert_matches_models(engine)
+    with engine.connect() as conn:
+        assert conn.scalar(sa.text("SELECT category FROM tickets")) == "Refund"
+    _alembic(db, "downgrade", "0c87d0eba8c8")
+    assert _columns(engine, "tickets") == {"id", "subject", "body", "category", "priority", "language", "created_at"}
+
+
+def _scanned_partitions(conn, query):
+    plan = "\n".join(row[0] for row in conn.execute(sa.text(f"EXPLAIN {query}")))
+    return set(re.findall(r" on (tickets_\w+)", plan))
+
+
+@pytest.mark.postgres
+@pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+def test_migrations_partition_tables_on_postgres():
+    pytest.importorskip("psycopg")
+    schema = f"migrations_{uuid.uuid4().hex[:8]}"
+    admin = sa.create_engine(POSTGRES_URL)
+    with admin.begin() as conn:
+        conn.execute(sa.text(f"CREATE SCHEMA {schema}"))
+    url = sa.make_url(POSTGRES_URL).update_query_dict({"options": f"-csearch_path={schema}"})
+    engine = sa.create_engine(url)
+    try:
+        _alembic_url(url.render_as_string(hide_password=False), "upgrade", "head")
+        _assert_matches_models(engine)
+        with engine.begin() as conn:
+            kinds = dict(
+                conn.execute(
+                    sa.text(
+                        "SELECT relname, relkind FROM pg_class "
+                        "WHERE relnamespace = CAST(:schema AS regnamespace) AND relname IN ('logs', 'tickets', 'responses')"
+                    ),
+                    {"schema": schema},
+                ).all()
+            )
+            assert kinds == {"logs": "p", "tickets": "p", "responses": "p"}
+            ticket_id = conn.scalar(
+                sa.text("INSERT INTO tickets (subject, body) VALUES ('Refund', 'Charged twice') RETURNING id")
+            )
+            assert conn.scalar(sa.text("SELECT count(*) FROM tickets_default")) == 0
+
+            # What get_recent_ticket() saves over a lookup by id alone
+            now = datetime.now(timezone.utc)
+            since, until = (now - timedelta(hours=24)).isoformat(), (now + timedelta(days=1)).isoformat()
+            by_id = _scanned_partitions(conn, f"SELECT * FROM tickets WHERE id = {ticket_id}")
+            recent = _scanned_partitions(
+                conn,
+                f"SELECT * FROM tickets WHERE id = {ticket_id} AND created_at >= '{since}' AND created_at < '{until}'",
+            )
+            assert len(recent) <= 2 < len(by_id)
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(sa.text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
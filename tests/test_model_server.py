@@ -0,0 +1,214 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from app.services import classifier
+from app.services.model_ipc import (
+    CODEC_JSON,
+    ModelServerClient,
+    ModelServerError,
+    ModelServerUnavailable,
+    encode_frame,
+    read_frame,
+)
+from app.services.model_server import ModelServer
+
+
+@pytest.fixture
+def socket_path():
+    # Short path: Unix socket names are limited to ~100 bytes
+    directory = tempfile.mkdtemp(prefix="ms")
+    yield os.path.join(directory, "model.sock")
+
+
+async def _serve(path, classify, **kwargs):
+    server = ModelServer(path, classify=classify, **kwargs)
+    await server.start()
+    return server
+
+
+@pytest.mark.asyncio
+async def test_frame_roundtrip():
+    reader = asyncio.StreamReader()
+    reader.feed_data(encode_frame({"op": "classify", "items": [["Hi", "Body"]]}, CODEC_JSON))
+    reader.feed_eof()
+    message, codec = await read_frame(reader)
+    assert message == {"op": "classify", "items": [["Hi", "Body"]]}
+    assert codec == CODEC_JSON
+    with pytest.raises(asyncio.IncompleteReadError):
+        await read_frame(reader)
+
+
+@pytest.mark.asyncio
+async def test_client_classifies_through_server(socket_path):
+    async def classify(items, label_sets=None):
+        return [(subject.upper(), 0.5) for subject, _ in items]
+
+    server = await _serve(socket_path, classify)
+    client = ModelServerClient(socket_path, pool_size=2)
+    try:
+        assert await client.classify([("a", "x"), ("b", "y")]) == [("A", 0.5), ("B", 0.5)]
+        # The connection is kept for the next request
+        assert await client.classify([("c", "z")]) == [("C", 0.5)]
+        assert client.status()["idle_connections"] == 1
+        assert "classifier_version" in client.info
+        assert (await client.fetch_info())["pid"] == os.getpid()
+    finally:
+        await client.close()
+        await server.stop()
+    assert not os.path.exists(socket_path)
+
+
+@pytest.mark.asyncio
+async def test_server_batches_requests_across_clients(socket_path):
+    batches = []
+
+    async def classify(items, label_sets=None):
+        batches.append(len(items))
+        return [("Refund", 0.9)] * len(items)
+
+    server = await _serve(socket_path, classify, max_batch=16, max_wait_ms=100)
+    clients = [ModelServerClient(socket_path) for _ in range(4)]
+    try:
+        results = await asyncio.gather(*(c.classify([("s", "b")] * 3) for c in clients))
+        assert all(r == [("Refund", 0.9)] * 3 for r in results)
+        # Four workers' requests went to the model as one batch
+        assert batches == [12]
+
+        # A request is never split; one that does not fit waits for the next batch
+        batches.clear()
+        await asyncio.gather(clients[0].classify([("s", "b")] * 10), clients[1].classify([("s", "b")] * 10))
+        assert batches == [10, 10]
+    finally:
+        for c in clients:
+            await c.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_server_errors_reach_the_client(socket_path):
+    async def classify(items, label_sets=None):
+        raise RuntimeError("model exploded")
+
+    server = await _serve(socket_path, classify, max_queue=4)
+    client = ModelServerClient(socket_path)
+    try:
+        with pytest.raises(ModelServerError, match="model exploded"):
+            await client.classify([("s", "b")])
+        with pytest.raises(ModelServerError, match="overloaded"):
+            await client.classify([("s", "b")] * 5)
+    finally:
+        await client.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_client_timeout(socket_path):
+    async def classify(items, label_sets=None):
+        await asyncio.sleep(1)
+        return [("Other", 0.1)] * len(items)
+
+    server = await _serve(socket_path, classify)
+    client = ModelServerClient(socket_path, timeout=0.05)
+    try:
+        with pytest.raises(ModelServerError, match="did not answer"):
+            await client.classify([("s", "b")])
+        assert client.status()["idle_connections"] == 0
+    finally:
+        await client.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_classifier_falls_back_when_server_is_down(socket_path, monkeypatch):
+    client = ModelServerClient(socket_path, retry_after=60)
+    monkeypatch.setattr(classifier, "model_client", client)
+
+    monkeypatch.setattr(classifier, "MODEL_SERVER_FALLBACK", "none")
+    with pytest.raises(ModelServerUnavailable):
+        await classifier.classify_ticket_scored("Refund", "Charged twice")
+    assert not client.available
+    with pytest.raises(ModelServerUnavailable):
+        await classifier.classify_batch_scored([("Refund", "Charged twice")])
+
+    # In-process mock classifier
+    monkeypatch.setattr(classifier, "MODEL_SERVER_FALLBACK", "local")
+    assert await classifier.classify_ticket_scored("Refund", "Charged twice") == ("Refund", 0.99)
+    assert await classifier.classify_batch_scored([("Refund", "Charged twice")]) == [("Refund", 0.99)]
+
+
+@pytest.mark.asyncio
+async def test_classifier_uses_server_version(socket_path, monkeypatch):
+    async def classify(items, label_sets=None):
+        return [("Billing", 0.8)] * len(items)
+
+    server = await _serve(socket_path, classify)
+    client = ModelServerClient(socket_path)
+    monkeypatch.setattr(classifier, "model_client", client)
+    monkeypatch.setattr(classifier, "MODEL_SERVER_FALLBACK", "none")
+    monkeypatch.setattr(server, "info", lambda: {"model": "remote-model"})
+    try:
+        assert await classifier.classify_batch_scored([("Invoice", "Wrong amount")]) == [("Billing", 0.8)]
+        assert classifier.get_classifier_version() == f"remote-model:{classifier.DEFAULT_LABEL_SET.digest}"
+    finally:
+        await client.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_classifier_version_fetches_server_info_and_refuses_unknown(socket_path, monkeypatch):
+    async def classify(items, label_sets=None):
+        return [("Billing", 0.8)] * len(items)
+
+    client = ModelServerClient(socket_path, retry_after=60)
+    monkeypatch.setattr(classifier, "model_client", client)
+    monkeypatch.setattr(classifier, "MODEL_SERVER_FALLBACK", "none")
+    # No reply has carried the server's model yet
+    with pytest.raises(ModelServerUnavailable):
+        classifier.get_classifier_version()
+    with pytest.raises(ModelServerUnavailable):
+        await classifier.load_classifier_info()
+
+    server = await _serve(socket_path, classify)
+    monkeypatch.setattr(server, "info", lambda: {"model": "remote-model"})
+    client._down_until = 0.0
+    try:
+        await classifier.load_classifier_info()
+        assert classifier.get_classifier_version() == f"remote-model:{classifier.DEFAULT_LABEL_SET.digest}"
+    finally:
+        await client.close()
+        await server.stop()
+
+
+def test_local_fallback_versions_from_config_without_loading_the_model(monkeypatch):
+    monkeypatch.setattr(classifier, "model_client", ModelServerClient("/nonexistent.sock"))
+    monkeypatch.setattr(classifier, "MODEL_SERVER_FALLBACK", "local")
+    monkeypatch.setattr(classifier, "get_zero_shot_classifier", lambda: pytest.fail("model loaded"))
+    monkeypatch.delenv("APP_MOCK_AI", raising=False)
+    monkeypatch.setenv("HF_MODEL", "configured-model")
+    assert classifier.get_classifier_version() == f"configured-model:{classifier.DEFAULT_LABEL_SET.digest}"
+
+
+@pytest.mark.asyncio
+async def test_ticket_is_stored_uncategorised_while_the_server_is_down(isolated_db, socket_path, monkeypatch):
+    from httpx import ASGITransport, AsyncClient
+
+    from app.db.models import Ticket
+    from app.main import app
+
+    # Nothing listens on the socket
+    monkeypatch.setattr(classifier, "model_client", ModelServerClient(socket_path, retry_after=60))
+    monkeypatch.setattr(classifier, "MODEL_SERVER_FALLBACK", "none")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.post("/tickets/", json={"subject": "Refund", "body": "Charged twice"})
+    assert r.status_code == 201
+    assert r.json()["category"] is None
+
+    async with isolated_db() as session:
+        ticket = await session.get(Ticket, r.json()["id"])
+    # Not filed as "Other": no version stamp and no low-confidence priority bump
+    assert ticket.category is None
+    assert ticket.classifier_version is None
+    assert ticket.priority is None
@@ -0,0 +1,101 @@
+import zlib
+
+from app.services.normalize import compress_raw, decompress_raw, html_to_text, normalize_email
+
+REPLY = """Hi team,
+
+My invoice   #4411 was charged twice. Please refund one of them.
+
+
+
+Thanks,
+Dana
+--
+Dana Smith | Acme Corp
++1 555 0100
+
+On Mon, Oct 5, 2026 at 9:00 AM Support <support@example.com> wrote:
+> Thanks for reaching out.
+> How can we help?
+"""
+
+OUTLOOK = """Still not working after the update.
+
+From: Support <support@example.com>
+Sent: Monday, October 5, 2026 9:00 AM
+Subject: RE: login issue
+
+Please try again.
+"""
+
+FOOTER = """The export button does nothing.
+It fails on every browser.
+
+CONFIDENTIALITY NOTICE: This e-mail and any attachments are confidential and intended solely for the addressee.
+"""
+
+
+def test_strips_quoted_reply_signature_and_whitespace():
+    result = normalize_email(REPLY)
+    assert result.body == "Hi team,\n\nMy invoice #4411 was charged twice. Please refund one of them.\n\nThanks,\nDana"
+    assert result.tokens_after < result.tokens_before
+
+
+def test_strips_outlook_history_and_legal_footer():
+    assert normalize_email(OUTLOOK).body == "Still not working after the update."
+    assert normalize_email(FOOTER).body == "The export button does nothing.\nIt fails on every browser."
+
+
+def test_html_part_is_used_when_text_is_missing():
+    html = (
+        "<html><head><style>p{color:red}</style></head><body>"
+        "<p>Refund&nbsp;please &amp; thanks</p><div>Order 12</div>"
+        "<div class=\"gmail_quote\"><div>On Mon wrote:</div><blockquote>old</blockquote></div>"
+        "<script>alert(1)</script></body></html>"
+    )
+    assert normalize_email("", html).body == "Refund please & thanks\nOrder 12"
+    assert "old" not in html_to_text("<blockquote><blockquote>old</blockquote>older</blockquote>new")
+
+
+def test_fully_quoted_message_keeps_original_text():
+    assert normalize_email("> only quoted text").body == "> only quoted text"
+
+
+def test_raw_parts_round_trip_compressed():
+    content, size = compress_raw(REPLY * 20, None)
+    assert len(content) < size
+    assert decompress_raw(content) == {"text": REPLY * 20, "html": None}
+    assert zlib.decompress(content)
+
+
+async def test_inbound_stores_normalized_body_and_compressed_raw(monkeypatch):
+    import hashlib
+    import hmac
+    import json
+
+    from httpx import ASGITransport, AsyncClient
+
+    from app.db.database import AsyncSessionLocal
+    from app.db.models import RawEmail, Ticket
+    from app.main import app
+
+    monkeypatch.setenv("CLOUDFLARE_WORKER_SHARED_SECRET", "normalize-secret")
+    payload = {
+        "to": "support@example.com",
+        "from": "dana@example.com",
+        "subject": "Double charge",
+        "date": "Thu, 8 Oct 2026 10:00:00 +0000",
+        "text": REPLY,
+        "html": "<p>Hi team</p>",
+    }
+    body = json.dumps(payload).encode()
+    signature = hmac.new(b"normalize-secret", body, hashlib.sha256).hexdigest()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.post("/email/inbound", content=body, headers={"X-Signature": signature})
+    assert r.status_code == 201
+
+    async with AsyncSessionLocal() as session:
+        ticket = await session.get(Ticket, r.json()["id"])
+        raw = await session.get(RawEmail, ticket.id)
+    assert "wrote:" not in ticket.body and ticket.body.endswith("Dana")
+    assert decompress_raw(raw.content) == {"text": REPLY, "html": "<p>Hi team</p>"}
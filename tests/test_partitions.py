@@ -0,0 +1,138 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.db.database import engine
+from app.db.models import InboundMessageKey, Log, Response, Ticket
+from app.services.partitions import (Partition, PartitionSpec, expired_partitions, get_recent_ticket,
+                                     maintain_partitions, missing_periods, parse_bound, response_filter)
+
+UTC = timezone.utc
+MONTHLY = PartitionSpec("tickets", "month", timedelta(days=90), "archive")
+DAILY = PartitionSpec("logs", "day", timedelta(days=7), "drop")
+
+
+def test_parse_bound_handles_range_minvalue_and_default():
+    part = parse_bound("t_p20261001", "FOR VALUES FROM ('2026-10-01 02:00:00+02') TO ('2026-11-01 00:00:00+00')")
+    assert (part.lower, part.upper) == (datetime(2026, 10, 1, tzinfo=UTC), datetime(2026, 11, 1, tzinfo=UTC))
+    archive = parse_bound("t_archive", "FOR VALUES FROM (MINVALUE) TO ('2026-04-01 00:00:00+00')")
+    assert archive.lower is None and archive.upper == datetime(2026, 4, 1, tzinfo=UTC)
+    assert parse_bound("t_default", "DEFAULT").default
+
+
+def test_missing_periods_cover_current_and_upcoming_across_year_end():
+    now = datetime(2026, 11, 15, 13, 30, tzinfo=UTC)
+    existing = [Partition("tickets_p20261101", datetime(2026, 11, 1, tzinfo=UTC), datetime(2026, 12, 1, tzinfo=UTC))]
+    assert missing_periods(MONTHLY, existing, now, premake=2) == [
+        (datetime(2026, 12, 1, tzinfo=UTC), datetime(2027, 1, 1, tzinfo=UTC)),
+        (datetime(2027, 1, 1, tzinfo=UTC), datetime(2027, 2, 1, tzinfo=UTC)),
+    ]
+    # A default partition does not count as coverage
+    assert len(missing_periods(DAILY, [Partition("logs_default", None, None, default=True)], now, premake=1)) == 2
+
+
+def test_expired_partitions_keep_the_archive_and_drop_old_log_days():
+    now = datetime(2026, 10, 19, tzinfo=UTC)
+    months = [
+        Partition("tickets_archive", None, datetime(2026, 6, 1, tzinfo=UTC)),
+        Partition("tickets_p20260601", datetime(2026, 6, 1, tzinfo=UTC), datetime(2026, 7, 1, tzinfo=UTC)),
+        Partition("tickets_p20260701", datetime(2026, 7, 1, tzinfo=UTC), datetime(2026, 8, 1, tzinfo=UTC)),
+        Partition("tickets_p20261001", datetime(2026, 10, 1, tzinfo=UTC), datetime(2026, 11, 1, tzinfo=UTC)),
+        Partition("tickets_default", None, None, default=True),
+    ]
+    # 90 days before Oct 19 falls in July, so only months ending by July 1 go
+    assert [p.name for p in expired_partitions(MONTHLY, months, now)] == ["tickets_p20260601"]
+
+    days = [
+        Partition("logs_archive", None, datetime(2026, 10, 1, tzinfo=UTC)),
+        Partition("logs_p20261011", datetime(2026, 10, 11, tzinfo=UTC), datetime(2026, 10, 12, tzinfo=UTC)),
+        Partition("logs_p20261012", datetime(2026, 10, 12, tzinfo=UTC), datetime(2026, 10, 13, tzinfo=UTC)),
+    ]
+    assert [p.name for p in expired_partitions(DAILY, days, now)] == ["logs_archive", "logs_p20261011"]
+    assert expired_partitions(PartitionSpec("logs", "day", timedelta(0), "drop"), days, now) == []
+
+
+@pytest.mark.asyncio
+async def test_unpartitioned_logs_are_archived_to_disk_then_deleted(tmp_path):
+    now = datetime.now(UTC)
+    old = now - timedelta(days=20)
+    async with engine.begin() as conn:
+        await conn.execute(
+            insert(Log),
+            [
+                {"level": "WARNING", "message": "expired one", "created_at": old, "details": {"n": 1}},
+                {"level": "WARNING", "message": "expired two", "created_at": old, "details": None},
+                {"level": "WARNING", "message": "recent", "created_at": now - timedelta(days=1), "details": None},
+            ],
+        )
+
+    report = await maintain_partitions(bind=engine, now=now, specs=(DAILY,), archive_dir=str(tmp_path))
+
+    assert report["logs"]["deleted_rows"] == 2
+    async with engine.connect() as conn:
+        remaining = set((await conn.scalars(select(Log.message).where(Log.message.in_(["expired one", "recent"])))).all())
+        assert remaining == {"recent"}
+        assert await conn.scalar(select(func.count()).select_from(Log).where(Log.created_at < now - timedelta(days=8))) == 0
+    (path,) = tmp_path.iterdir()
+    with gzip.open(path, "rt") as f:
+        archived = [json.loads(line) for line in f]
+    assert [row["message"] for row in archived] == ["expired one", "expired two"]
+    assert archived[0]["details"] == {"n": 1}
+
+
+@pytest.mark.asyncio
+async def test_old_inbound_message_keys_are_deleted():
+    now = datetime.now(UTC)
+    async with engine.begin() as conn:
+        await conn.execute(
+            insert(InboundMessageKey),
+            [
+                {"message_key": "sha:expired-key", "created_at": now - timedelta(days=40)},
+                {"message_key": "sha:recent-key", "created_at": now - timedelta(days=1)},
+            ],
+        )
+
+    report = await maintain_partitions(bind=engine, now=now, specs=(), key_retention=timedelta(days=30))
+
+    assert report["inbound_message_keys"]["deleted_rows"] >= 1
+    async with engine.connect() as conn:
+        keys = set(
+            (
+                await conn.scalars(
+                    select(InboundMessageKey.message_key).where(
+                        InboundMessageKey.message_key.in_(["sha:expired-key", "sha:recent-key"])
+                    )
+                )
+            ).all()
+        )
+    assert keys == {"sha:recent-key"}
+
+
+@pytest.mark.asyncio
+async def test_pruned_lookups_find_recent_and_old_tickets(isolated_db):
+    now = datetime.now(UTC)
+    async with isolated_db() as session:
+        fresh = Ticket(subject="New", body="b")
+        old = Ticket(subject="Old", body="b", created_at=now - timedelta(days=400))
+        session.add_all([fresh, old])
+        await session.flush()
+        session.add_all(
+            [
+                Response(ticket_id=fresh.id, generated_response="draft", status="completed"),
+                Response(ticket_id=old.id, generated_response="draft", status="completed", created_at=old.created_at),
+            ]
+        )
+        await session.commit()
+        fresh_id, old_id = fresh.id, old.id
+
+    for ticket_id, subject in ((fresh_id, "New"), (old_id, "Old")):
+        async with isolated_db() as session:
+            ticket = await get_recent_ticket(session, ticket_id)
+            assert ticket.subject == subject
+            responses = (await session.execute(select(Response).where(*response_filter(ticket)))).scalars().all()
+            assert [r.ticket_id for r in responses] == [ticket_id]
+    async with isolated_db() as session:
+        assert await get_recent_ticket(session, old_id + 100) is None
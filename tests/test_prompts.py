@@ -0,0 +1,43 @@
+from jinja2 import ChoiceLoader, DictLoader
+
+from app.services import prompts
+from app.services.response_gen import render_prompt
+
+
+def test_variant_candidates_most_specific_first():
+    assert prompts.variant_candidates("response.j2", "Refund", "DE") == [
+        "response.refund.de.j2",
+        "response.refund.j2",
+        "response.de.j2",
+        "response.j2",
+    ]
+    assert prompts.variant_candidates("response.j2", None, None) == ["response.j2"]
+
+
+def test_render_does_not_depend_on_cwd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    prompt = render_prompt("Card declined", "My card was declined.", "Billing")
+    assert "Subject: Card declined" in prompt
+    assert "Category: Billing" in prompt
+
+
+def test_category_variant_is_selected(monkeypatch):
+    loader = ChoiceLoader([DictLoader({"response.refund.j2": "REFUND {{ subject }}"}), prompts.prompt_env.loader])
+    monkeypatch.setattr(prompts.prompt_env, "loader", loader)
+    monkeypatch.setattr(prompts, "_variant_cache", {})
+
+    assert render_prompt("Money back", "...", "Refund") == "REFUND Money back"
+    assert render_prompt("Money back", "...", "Billing").startswith("You are an expert")
+
+
+def test_bytecode_cache_dir_must_be_private(tmp_path, monkeypatch):
+    private = tmp_path / "private"
+    monkeypatch.setenv("PROMPT_BYTECODE_CACHE_DIR", str(private))
+    assert prompts._bytecode_cache() is not None
+    assert private.stat().st_mode & 0o777 == 0o700
+
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    monkeypatch.setenv("PROMPT_BYTECODE_CACHE_DIR", str(shared))
+    assert prompts._bytecode_cache() is None
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import REGISTRY
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Ticket
+from app.services.events import publish_ticket_event
+from app.services.read_cache import read_cache
+
+
+def _lookups(result):
+    return REGISTRY.get_sample_value("read_cache_lookups_total", {"kind": "ticket", "result": result}) or 0.0
+
+
+@pytest.mark.asyncio
+async def test_ticket_reads_are_cached_with_etag_and_invalidated_by_events():
+    from app.main import app
+
+    async with AsyncSessionLocal() as session:
+        ticket = Ticket(subject="Hot ticket", body="Polled a lot")
+        session.add(ticket)
+        await session.commit()
+        ticket_id = ticket.id
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        first = await ac.get(f"/tickets/{ticket_id}")
+        assert first.status_code == 200
+        assert first.json()["category"] is None
+        etag = first.headers["etag"]
+
+        hits = _lookups("hit")
+        second = await ac.get(f"/tickets/{ticket_id}")
+        assert second.json() == first.json()
+        assert _lookups("hit") == hits + 1
+
+        not_modified = await ac.get(f"/tickets/{ticket_id}", headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+
+        # A classification elsewhere updates the row and publishes an event
+        async with AsyncSessionLocal() as session:
+            (await session.get(Ticket, ticket_id)).category = "Billing"
+            await session.commit()
+        await publish_ticket_event("ticket.classified", ticket_id, category="Billing")
+
+        fresh = await ac.get(f"/tickets/{ticket_id}", headers={"If-None-Match": etag})
+        assert fresh.status_code == 200
+        assert fresh.json()["category"] == "Billing"
+        assert fresh.headers["etag"] != etag
+
+
+def test_read_started_before_invalidation_is_not_cached():
+    version = read_cache.version(999_999)
+    read_cache.invalidate(999_999)
+    read_cache.put("ticket", 999_999, {"id": 999_999, "category": None}, version)
+    assert read_cache.get("ticket", 999_999) is None
+
+
+def test_version_never_goes_back_when_versions_are_pruned():
+    from app.services.read_cache import ReadCache
+
+    cache = ReadCache(max_entries=1)
+    version = cache.version(1)
+    cache.invalidate(1)
+    # Enough other writes to prune ticket 1 from the version map
+    for ticket_id in range(2, 10):
+        cache.invalidate(ticket_id)
+    assert 1 not in cache._versions
+    cache.put("ticket", 1, {"id": 1}, version)
+    assert cache.get("ticket", 1) is None
+
+
+@pytest.mark.asyncio
+async def test_only_primary_reads_populate_the_cache(monkeypatch):
+    from app.db.routing import read_router
+    from app.main import app
+
+    async with AsyncSessionLocal() as session:
+        ticket = Ticket(subject="Replica read", body="Maybe stale")
+        session.add(ticket)
+        await session.commit()
+        ticket_id = ticket.id
+
+    # The test database stands in for the replica
+    monkeypatch.setattr(read_router, "replica", AsyncSessionLocal)
+    monkeypatch.setattr(read_router, "_recent_writes", {})
+    monkeypatch.setattr(read_router, "_checked_at", float("-inf"))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        assert (await ac.get(f"/tickets/{ticket_id}", headers={"X-Client-Id": "reader"})).status_code == 200
+        assert read_cache.get("ticket", ticket_id) is None
+
+        monkeypatch.setattr(read_router, "replica", None)
+        assert (await ac.get(f"/tickets/{ticket_id}", headers={"X-Client-Id": "reader"})).status_code == 200
+        assert read_cache.get("ticket", ticket_id) is not None
+
+
+@pytest.mark.asyncio
+async def test_client_that_just_wrote_bypasses_the_cache(monkeypatch):
+    from app.db.routing import read_router
+    from app.main import app
+
+    async with AsyncSessionLocal() as session:
+        ticket = Ticket(subject="Pinned", body="Fresh reads")
+        session.add(ticket)
+        await session.commit()
+        ticket_id = ticket.id
+
+    monkeypatch.setattr(read_router, "replica", AsyncSessionLocal)
+    monkeypatch.setattr(read_router, "_recent_writes", {})
+    monkeypatch.setattr(read_router, "_checked_at", float("-inf"))
+    # A stale entry whose invalidation has not arrived from another worker yet
+    read_cache.put("ticket", ticket_id, {"id": ticket_id, "subject": "stale"}, read_cache.version(ticket_id))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        read_router._recent_writes["writer"] = time.time()
+        fresh = await ac.get(f"/tickets/{ticket_id}", headers={"X-Client-Id": "writer"})
+    assert fresh.json()["subject"] == "Pinned"
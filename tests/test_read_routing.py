@@ -0,0 +1,100 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import REGISTRY
+
+from app.db.database import AsyncSessionLocal
+from app.db.routing import read_router
+
+
+def _reads(target, reason):
+    return REGISTRY.get_sample_value("db_read_sessions_total", {"target": target, "reason": reason}) or 0.0
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_except_after_own_write_or_when_down(monkeypatch):
+    from app.main import app
+
+    # The test database stands in for the replica
+    monkeypatch.setattr(read_router, "replica", AsyncSessionLocal)
+    monkeypatch.setattr(read_router, "_recent_writes", {})
+    monkeypatch.setattr(read_router, "_checked_at", float("-inf"))
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.post(
+            "/tickets/", json={"subject": "Replica test", "body": "body"}, headers={"X-Client-Id": "writer"}
+        )
+        assert r.status_code == 201
+        ticket_id = r.json()["id"]
+
+        before = _reads("primary", "read_your_writes")
+        assert (await ac.get(f"/tickets/{ticket_id}", headers={"X-Client-Id": "writer"})).status_code == 200
+        assert _reads("primary", "read_your_writes") == before + 1
+
+        # A different client (no last_write cookie) reads from the replica
+        ac.cookies.clear()
+        before = _reads("replica", "ok")
+        assert (await ac.get(f"/tickets/{ticket_id}", headers={"X-Client-Id": "reader"})).status_code == 200
+        assert _reads("replica", "ok") == before + 1
+
+        async def replica_down():
+            raise ConnectionRefusedError("replica down")
+
+        monkeypatch.setattr(read_router, "_measure_lag", replica_down)
+        await read_router.check_replica(force=True)
+        before = _reads("primary", "replica_unhealthy")
+        assert (await ac.get("/tickets/", headers={"X-Client-Id": "reader"})).status_code == 200
+        assert _reads("primary", "replica_unhealthy") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_pinning_needs_an_explicit_client_identity(monkeypatch):
+    from app.main import app
+
+    monkeypatch.setattr(read_router, "replica", AsyncSessionLocal)
+    monkeypatch.setattr(read_router, "_recent_writes", {})
+    monkeypatch.setattr(read_router, "_checked_at", float("-inf"))
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.post("/tickets/", json={"subject": "Shared address", "body": "body"})
+        assert r.status_code == 201
+        # Nothing keyed on the (shared) client address
+        assert read_router._recent_writes == {}
+
+        # Another caller from the same address, without the writer's cookie
+        ac.cookies.clear()
+        before = _reads("replica", "ok")
+        assert (await ac.get(f"/tickets/{r.json()['id']}")).status_code == 200
+        assert _reads("replica", "ok") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_falls_back_to_primary(monkeypatch):
+    from sqlalchemy.exc import OperationalError
+
+    from app.main import app
+
+    class UnreachableReplica:
+        closed = False
+
+        async def connection(self):
+            raise OperationalError("connect", {}, ConnectionRefusedError("replica down"))
+
+        async def close(self):
+            UnreachableReplica.closed = True
+
+    monkeypatch.setattr(read_router, "replica", UnreachableReplica)
+    monkeypatch.setattr(read_router, "healthy", True)
+    monkeypatch.setattr(read_router, "_recent_writes", {})
+    monkeypatch.setattr(read_router, "_checked_at", float("-inf"))
+    monkeypatch.setattr(read_router, "_measure_lag", lambda: _no_lag())
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        before = _reads("primary", "replica_error")
+        assert (await ac.get("/tickets/")).status_code == 200
+        assert _reads("primary", "replica_error") == before + 1
+    assert UnreachableReplica.closed
+    assert read_router.healthy is False
+
+
+async def _no_lag():
+    return 0.0
@@ -0,0 +1,93 @@
+import logging
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import JobCheckpoint, Tenant, Ticket
+from app.logging_config import AsyncDBQueueHandler
+from app.services.classifier import get_classifier_version
+from app.services.reclassify import JOB_NAME, reclassify_stale_tickets
+from app.services.tenants import tenant_directory
+
+
+@pytest.fixture
+def no_db_log_sink(monkeypatch):
+    # The in-memory SQLite connection is shared; keep the DB log writer from
+    # interleaving commits with the job's transactions.
+    root = logging.getLogger()
+    handlers = [h for h in root.handlers if not isinstance(h, AsyncDBQueueHandler)]
+    monkeypatch.setattr(root, "handlers", handlers)
+
+
+@pytest.mark.asyncio
+async def test_reclassify_updates_stale_tickets_and_checkpoints(no_db_log_sink):
+    version = get_classifier_version()
+    async with AsyncSessionLocal() as session:
+        stale_ids = list(
+            (
+                await session.scalars(
+                    insert(Ticket).returning(Ticket.id),
+                    [
+                        {"subject": f"stale {i}", "body": "old label", "category": "Other", "classifier_version": "old-model:0000"}
+                        for i in range(5)
+                    ],
+                )
+            ).all()
+        )
+        current_id = await session.scalar(
+            insert(Ticket)
+            .values(subject="fresh", body="new label", category="Billing", classifier_version=version)
+            .returning(Ticket.id)
+        )
+        await session.commit()
+
+    result = await reclassify_stale_tickets(chunk_size=2, batch_size=2, restart=True)
+    assert result["processed"] >= 5
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(Ticket).where(Ticket.id.in_(stale_ids)))).scalars().all()
+        assert all(t.classifier_version == version for t in rows)
+        assert all(t.category == "Refund" for t in rows)  # mock classifier label
+        # Up-to-date tickets are not touched
+        assert (await session.get(Ticket, current_id)).category == "Billing"
+        checkpoint = await session.get(JobCheckpoint, JOB_NAME)
+        assert checkpoint.cursor >= max(stale_ids)
+
+    # Nothing left to do on a resumed run
+    again = await reclassify_stale_tickets(chunk_size=2)
+    assert again["processed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_reclassify_one_tenant_uses_its_labels(no_db_log_sink):
+    async with AsyncSessionLocal() as session:
+        session.add(Tenant(name="globex", labels=["Outage", "Billing"], mailboxes=[]))
+        ids = list(
+            (
+                await session.scalars(
+                    insert(Ticket).returning(Ticket.id),
+                    [
+                        {"subject": "down", "body": "site down", "category": "Other", "classifier_version": "old-model:0000", "tenant": tenant}
+                        for tenant in ("globex", None)
+                    ],
+                )
+            ).all()
+        )
+        await session.commit()
+    tenant_directory.invalidate()
+
+    with pytest.raises(ValueError, match="Unknown tenant"):
+        await reclassify_stale_tickets(tenant="nobody")
+    await reclassify_stale_tickets(chunk_size=10, restart=True, tenant="globex")
+
+    async with AsyncSessionLocal() as session:
+        tenant_ticket, default_ticket = [await session.get(Ticket, i) for i in ids]
+        assert tenant_ticket.category == "Outage"  # mock: first label without "Refund"
+        assert tenant_ticket.classifier_version == get_classifier_version(tenant_directory.label_set("globex"))
+        # Tickets of other label sets are left to their own runs
+        assert default_ticket.classifier_version == "old-model:0000"
+        assert (await session.get(JobCheckpoint, f"{JOB_NAME}:globex")) is not None
+        await session.delete(await session.get(Tenant, "globex"))
+        await session.commit()
+    tenant_directory.invalidate()
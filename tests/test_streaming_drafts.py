@@ -0,0 +1,76 @@
+import json
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select
+
+from app.db.models import Response, Ticket
+from app.services import events as events_module
+from app.services.draft_cache import DraftCache
+
+
+async def _draft_events(tickets, session_maker, subject, body):
+    async with session_maker() as session:
+        ticket = Ticket(subject=subject, body=body, category="Refund")
+        session.add(ticket)
+        await session.commit()
+        ticket_id = ticket.id
+
+    # The fixture's bus, not the one imported at collection time
+    bus = events_module.event_bus
+    queue = bus.subscribe("ticket", ticket_id)
+    try:
+        await tickets.draft_and_store_response(ticket_id, session_maker)
+    finally:
+        bus.unsubscribe("ticket", ticket_id, queue)
+
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    async with session_maker() as session:
+        stored = (
+            await session.execute(select(Response).where(Response.ticket_id == ticket_id))
+        ).scalars().all()
+    return events, stored
+
+
+@pytest.mark.asyncio
+async def test_streaming_draft_publishes_deltas_and_stores_final_text(isolated_db, monkeypatch):
+    from app.routers import tickets
+
+    monkeypatch.setenv("APP_MOCK_AI", "1")
+    monkeypatch.setattr(tickets, "DRAFT_STREAMING", True)
+    monkeypatch.setattr(tickets, "DRAFT_STREAM_FLUSH_SECONDS", 0.0)
+    monkeypatch.setattr(tickets, "draft_cache", DraftCache(max_entries=8, ttl_seconds=60))
+
+    # Cache miss: the draft is streamed, stored once and cached
+    events, stored = await _draft_events(tickets, isolated_db, "Streaming refund", "Please refund")
+    deltas = [e for e in events if e["type"] == "response.delta"]
+    assert len(deltas) > 1
+    assert events[-1]["type"] == "response.completed"
+    assert len(stored) == 1
+    assert stored[0].source == "llm"
+    assert stored[0].generated_response == "".join(d["delta"] for d in deltas).strip()
+
+    # Cache hit: the same email is answered from the cache without streaming
+    events, reused = await _draft_events(tickets, isolated_db, "Streaming refund", "Please refund")
+    assert [e["type"] for e in events] == ["response.completed"]
+    assert len(reused) == 1
+    assert reused[0].source == "cache_exact"
+    assert reused[0].source_response_id == stored[0].id
+    assert reused[0].generated_response == stored[0].generated_response
+
+
+@pytest.mark.asyncio
+async def test_stub_llm_server_streams_responses_api_events(monkeypatch):
+    from stub_llm_server import SETTINGS, app
+
+    monkeypatch.setitem(SETTINGS, "ttft_ms", 0)
+    monkeypatch.setitem(SETTINGS, "token_ms", 0)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://stub") as ac:
+        r = await ac.post("/v1/responses", json={"model": "m", "input": "Subject: Hi\nBody: x", "stream": True})
+    events = [json.loads(line[6:]) for line in r.text.splitlines() if line.startswith("data: ")]
+    deltas = "".join(e["delta"] for e in events if e["type"] == "response.output_text.delta")
+    completed = events[-1]
+    assert completed["type"] == "response.completed"
+    assert completed["response"]["output"][0]["content"][0]["text"] == deltas
+    assert completed["response"]["usage"]["output_tokens"] > 0
@@ -0,0 +1,125 @@
+import hashlib
+import hmac
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, select
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import Tenant, Ticket
+from app.services import classifier
+from app.services.classifier import DEFAULT_LABEL_SET, LabelSet, get_classifier_version
+from app.services.tenants import TenantDirectory, tenant_directory
+from app.services.zero_shot import HypothesisCache
+
+SECRET = "test-inbound-secret"
+
+ACME = LabelSet("acme", ("Shipping", "Returns", "Billing"))
+
+
+@pytest.fixture
+async def acme_tenant():
+    async with AsyncSessionLocal() as session:
+        session.add(Tenant(name="acme", labels=list(ACME.labels), mailboxes=["@acme.example"]))
+        await session.commit()
+    tenant_directory.invalidate()
+    yield
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Tenant).where(Tenant.name == "acme"))
+        await session.commit()
+    tenant_directory.invalidate()
+
+
+def test_resolve_prefers_exact_address_over_domain():
+    directory = TenantDirectory()
+    directory.load(
+        [
+            Tenant(name="acme", labels=["Shipping"], mailboxes=["@acme.example"]),
+            Tenant(name="acme-vip", labels=["Priority"], mailboxes=["VIP@acme.example"]),
+            Tenant(name="empty", labels=[], mailboxes=["@empty.example"]),
+        ]
+    )
+    assert directory.resolve("Support <help@acme.example>") == "acme"
+    assert directory.resolve("help@acme.example, vip@acme.example") == "acme-vip"
+    assert directory.resolve("help@other.example") is None
+    # A tenant without labels is ignored
+    assert directory.resolve("help@empty.example") is None
+    assert directory.label_set("acme") == LabelSet("acme", ("Shipping",))
+
+
+def test_label_sets_version_independently():
+    assert get_classifier_version(ACME) != get_classifier_version()
+    assert get_classifier_version(ACME).endswith(ACME.digest)
+    assert get_classifier_version(LabelSet("other", ACME.labels)) == get_classifier_version(ACME)
+
+
+def test_mixed_batch_uses_each_tickets_labels():
+    calls = []
+
+    def pipeline(prompts, candidate_labels=None, multi_label=False, **kwargs):
+        calls.append((len(prompts), tuple(candidate_labels)))
+        return [{"labels": [candidate_labels[0]], "scores": [0.9]} for _ in prompts]
+
+    out = classifier._infer(pipeline, ["a", "b", "c"], [ACME, DEFAULT_LABEL_SET, ACME])
+    assert [r["labels"][0] for r in out] == ["Shipping", DEFAULT_LABEL_SET.labels[0], "Shipping"]
+    # No shared-pass scorer for a plain callable: one call per label set
+    assert sorted(calls) == sorted([(2, ACME.labels), (1, DEFAULT_LABEL_SET.labels)])
+
+
+def test_hypothesis_cache_tokenizes_each_label_set_once():
+    tokenized = []
+
+    def tokenizer(texts, add_special_tokens=True):
+        tokenized.append(list(texts))
+        return {"input_ids": [[len(t)] for t in texts]}
+
+    cache = HypothesisCache(tokenizer, max_entries=1)
+    first = cache.get(ACME)
+    assert cache.get(LabelSet("acme-copy", ACME.labels)) == first
+    assert tokenized == [[f"This example is {label}." for label in ACME.labels]]
+    cache.get(DEFAULT_LABEL_SET)
+    cache.get(ACME)  # evicted by the default set
+    assert len(tokenized) == 3
+
+
+@pytest.mark.asyncio
+async def test_inbound_email_is_classified_with_its_tenants_labels(acme_tenant, monkeypatch):
+    import app.routers.inbound_email as inbound
+
+    from app.main import app
+
+    monkeypatch.setenv("CLOUDFLARE_WORKER_SHARED_SECRET", SECRET)
+    monkeypatch.setattr(inbound, "schedule_draft", lambda ticket_id, background_tasks, priority=None: None)
+    body = json.dumps(
+        {
+            "to": "orders@acme.example",
+            "from": "bob@example.com",
+            "subject": "Parcel never arrived",
+            "date": "Thu, 8 Oct 2026 09:00:00 +0000",
+            "text": "Where is my order?",
+            "messageId": "<tenant-1@mail.example>",
+        }
+    ).encode()
+    headers = {"X-Signature": hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/email/inbound", content=body, headers=headers)
+    assert resp.status_code == 201
+    assert resp.json()["tenant"] == "acme"
+    assert resp.json()["category"] == "Shipping"  # the mock picks the first label without "Refund"
+
+    async with AsyncSessionLocal() as session:
+        ticket = (await session.execute(select(Ticket).where(Ticket.id == resp.json()["id"]))).scalar_one()
+    assert ticket.classifier_version == get_classifier_version(ACME)
+
+
+@pytest.mark.asyncio
+async def test_create_ticket_rejects_unknown_tenant(acme_tenant):
+    from app.main import app
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        unknown = await ac.post("/tickets/", json={"subject": "Hi", "body": "Hello", "tenant": "nobody"})
+        assert unknown.status_code == 422
+        known = await ac.post("/tickets/", json={"subject": "Hi", "body": "Hello", "tenant": "acme"})
+        assert known.status_code in (200, 201)
+        assert known.json()["tenant"] == "acme"
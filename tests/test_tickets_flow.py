@@ -43,3 +43,64 @@ async def test_tickets_flow_returns_refund_and_response():
         else:
             pytest.fail("Response generation did not complete in time")
 
+
+@pytest.mark.asyncio
+async def test_create_ticket_persists_category_in_a_single_insert():
+    from sqlalchemy import event
+
+    from app.db.database import engine
+    from app.main import app
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(" ".join(statement.split()).upper())
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            r = await ac.post("/tickets/", json={"subject": "Refund my order", "body": "Charged twice."})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert r.status_code == 201
+    assert r.json()["category"] == "Refund"
+    ticket_writes = [s for s in statements if s.startswith(("INSERT INTO TICKETS", "UPDATE TICKETS"))]
+    assert len(ticket_writes) == 1
+    assert "RETURNING" in ticket_writes[0]
+
+
+@pytest.mark.asyncio
+async def test_failed_classification_stores_ticket_uncategorised_and_defers(isolated_db, monkeypatch):
+    from sqlalchemy import select
+
+    from app.db.models import Response, Ticket
+    from app.main import app
+    from app.routers import tickets
+    from app.services import classifier
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("CUDA out of memory")
+
+    real = classifier.get_zero_shot_classifier
+    monkeypatch.setattr(classifier, "get_zero_shot_classifier", lambda: broken)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        r = await ac.post("/tickets/", json={"subject": "Refund my order", "body": "Charged twice."})
+    assert r.status_code == 201
+    assert r.json()["category"] is None
+
+    async with isolated_db() as session:
+        ticket = await session.get(Ticket, r.json()["id"])
+        drafts = (await session.execute(select(Response).where(Response.ticket_id == ticket.id))).all()
+    assert (ticket.category, ticket.classifier_version) == (None, None)
+    # The deferred retry failed as well, so nothing was drafted for an unknown category
+    assert drafts == []
+
+    # Once inference works again the deferred path classifies, then drafts
+    monkeypatch.setattr(classifier, "get_zero_shot_classifier", real)
+    await tickets.classify_then_draft(ticket.id, isolated_db)
+    async with isolated_db() as session:
+        ticket = await session.get(Ticket, ticket.id)
+        drafts = (await session.execute(select(Response).where(Response.ticket_id == ticket.id))).scalars().all()
+    assert ticket.category == "Refund"
+    assert [d.status for d in drafts] == ["completed"]